@@ -29,7 +29,6 @@ import re
 
 import logging
 
-from gns3server.utils.asyncio import cancellable_wait_run_in_executor
 
 log = logging.getLogger(__name__)
 
@@ -37,6 +36,7 @@ from uuid import UUID, uuid4
 from gns3server.utils.interfaces import is_interface_up
 from ..config import Config
 from ..utils.asyncio import wait_run_in_executor
+from ..utils.asyncio.file_tail import follow_file
 from ..utils import force_unix_path
 from .project_manager import ProjectManager
 from .port_manager import PortManager
@@ -44,7 +44,9 @@ from .port_manager import PortManager
 from .nios.nio_udp import NIOUDP
 from .nios.nio_tap import NIOTAP
 from .nios.nio_ethernet import NIOEthernet
-from ..utils.images import md5sum, remove_checksum, images_directories, default_images_directory, list_images
+from ..utils.images import images_directories, default_images_directory, find_image_file
+from ..utils.checksum import md5sum_async, remove_checksum
+from .image_inventory import ImageInventory
 from .error import NodeError, ImageMissingError
 
 CHUNK_SIZE = 1024 * 8  # 8KB
@@ -64,6 +66,7 @@ class BaseManager:
         BaseManager._convert_lock = asyncio.Lock()
         self._nodes = {}
         self._port_manager = None
+        self._image_inventory = None
         self._config = Config.instance()
 
     @classmethod
@@ -456,14 +459,13 @@ class BaseManager:
         response.enable_chunked_encoding()
 
         try:
-            with open(path, "rb") as f:
+            # the captures streamed to several clients are read once
+            with follow_file(path) as reader:
                 await response.prepare(request)
                 while nio.capturing:
-                    data = f.read(CHUNK_SIZE)
-                    if not data:
-                        await asyncio.sleep(0.1)
-                        continue
-                    await response.write(data)
+                    data = await reader.read()
+                    if data:
+                        await response.write(data)
         except FileNotFoundError:
             raise aiohttp.web.HTTPNotFound()
         except PermissionError:
@@ -541,14 +543,7 @@ class BaseManager:
         :returns: Path or None if not found
         """
 
-        s = os.path.split(searched_file)
-        for root, dirs, files in os.walk(directory):
-            for file in files:
-                if s[1] == file and (s[0] == '' or root == os.path.join(directory, s[0])):
-                    path = os.path.normpath(os.path.join(root, s[1]))
-                    if os.path.exists(path):
-                        return path
-        return None
+        return find_image_file(directory, searched_file)
 
     def get_relative_image_path(self, path, extra_dir=None):
         """
@@ -580,15 +575,31 @@ class BaseManager:
                     return relpath
         return path
 
-    async def list_images(self):
+    @property
+    def image_inventory(self):
+        """
+        Returns the inventory of the images for this node type
+
+        :returns: ImageInventory instance
+        """
+
+        if self._image_inventory is None:
+            self._image_inventory = ImageInventory(self._NODE_TYPE)
+        return self._image_inventory
+
+    async def list_images(self, filter=None, offset=0, limit=None):
         """
         Return the list of available images for this node type
 
+        :param filter: only returns the images with this string in their path
+        :param offset: number of images to skip
+        :param limit: maximum number of images to return
+
         :returns: Array of hash
         """
 
         try:
-            return list_images(self._NODE_TYPE)
+            return await self.image_inventory.images(filter=filter, offset=offset, limit=limit)
         except OSError as e:
             raise aiohttp.web.HTTPConflict(text="Can not list images {}".format(e))
 
@@ -621,7 +632,8 @@ class BaseManager:
                     await f.write(chunk)
             os.chmod(tmp_path, stat.S_IWRITE | stat.S_IREAD | stat.S_IEXEC)
             shutil.move(tmp_path, path)
-            await cancellable_wait_run_in_executor(md5sum, path)
+            await md5sum_async(path)
+            self.image_inventory.invalidate()
         except OSError as e:
             raise aiohttp.web.HTTPConflict(text="Could not write image: {} because {}".format(filename, e))
 
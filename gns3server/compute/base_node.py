@@ -632,6 +632,22 @@ class BaseNode:
         except UbridgeError as e:
             raise UbridgeError("Error while sending command '{}': {}: {}".format(command, e, self._ubridge_hypervisor.read_stdout()))
 
+    async def _ubridge_send_batch(self, commands):
+        """
+        Sends several commands to uBridge hypervisor in one round trip.
+
+        :param commands: list of commands to send
+        """
+
+        if not self._ubridge_hypervisor or not self._ubridge_hypervisor.is_running():
+            await self._start_ubridge(self._ubridge_require_privileged_access)
+        if not self._ubridge_hypervisor or not self._ubridge_hypervisor.is_running():
+            raise NodeError("Cannot send commands {}: uBridge is not running".format(commands))
+        try:
+            await self._ubridge_hypervisor.send_batch(commands)
+        except UbridgeError as e:
+            raise UbridgeError("Error while sending commands {}: {}: {}".format(commands, e, self._ubridge_hypervisor.read_stdout()))
+
     @locking
     async def _start_ubridge(self, require_privileged_access=False):
         """
@@ -679,26 +695,25 @@ class BaseNode:
         :param destination_nio: destination NIO instance
         """
 
-        await self._ubridge_send("bridge create {name}".format(name=bridge_name))
-
         if not isinstance(destination_nio, NIOUDP):
             raise NodeError("Destination NIO is not UDP")
 
-        await self._ubridge_send('bridge add_nio_udp {name} {lport} {rhost} {rport}'.format(name=bridge_name,
-                                                                                                 lport=source_nio.lport,
-                                                                                                 rhost=source_nio.rhost,
-                                                                                                 rport=source_nio.rport))
-
-        await self._ubridge_send('bridge add_nio_udp {name} {lport} {rhost} {rport}'.format(name=bridge_name,
-                                                                                                 lport=destination_nio.lport,
-                                                                                                 rhost=destination_nio.rhost,
-                                                                                                 rport=destination_nio.rport))
+        commands = ["bridge create {name}".format(name=bridge_name),
+                    'bridge add_nio_udp {name} {lport} {rhost} {rport}'.format(name=bridge_name,
+                                                                               lport=source_nio.lport,
+                                                                               rhost=source_nio.rhost,
+                                                                               rport=source_nio.rport),
+                    'bridge add_nio_udp {name} {lport} {rhost} {rport}'.format(name=bridge_name,
+                                                                               lport=destination_nio.lport,
+                                                                               rhost=destination_nio.rhost,
+                                                                               rport=destination_nio.rport)]
 
         if destination_nio.capturing:
-            await self._ubridge_send('bridge start_capture {name} "{pcap_file}"'.format(name=bridge_name,
-                                                                                             pcap_file=destination_nio.pcap_output_file))
+            commands.append('bridge start_capture {name} "{pcap_file}"'.format(name=bridge_name,
+                                                                               pcap_file=destination_nio.pcap_output_file))
 
-        await self._ubridge_send('bridge start {name}'.format(name=bridge_name))
+        commands.append('bridge start {name}'.format(name=bridge_name))
+        await self._ubridge_send_batch(commands)
         await self._ubridge_apply_filters(bridge_name, destination_nio.filters)
 
     async def update_ubridge_udp_connection(self, bridge_name, source_nio, destination_nio):
@@ -813,8 +828,7 @@ class BaseNode:
         """
 
         m = PortManager.instance()
-        lport = m.get_free_udp_port(self.project)
-        rport = m.get_free_udp_port(self.project)
+        lport, rport = m.reserve_many(self.project, 2)
         source_nio_settings = {'lport': lport, 'rhost': '127.0.0.1', 'rport': rport, 'type': 'nio_udp'}
         destination_nio_settings = {'lport': rport, 'rhost': '127.0.0.1', 'rport': lport, 'type': 'nio_udp'}
         source_nio = self.manager.create_nio(source_nio_settings)
@@ -29,12 +29,15 @@ import asyncio
 import tempfile
 import logging
 import glob
+import json
 import re
+import psutil
 
 log = logging.getLogger(__name__)
 
 from gns3server.utils.interfaces import interfaces, is_interface_up
 from gns3server.utils.asyncio import wait_run_in_executor
+from gns3server.utils.checksum import md5sum_async
 from gns3server.utils import parse_version
 from uuid import uuid4
 from ..base_manager import BaseManager
@@ -108,6 +111,18 @@ PLATFORMS_DEFAULT_RAM = {"c1700": 160,
                          "c7200": 512}
 
 
+# Idle-PC values validated for each IOS image (by md5), stored in the images directory
+IDLEPCS_FILENAME = ".idlepcs"
+# An idle-PC value is good when the router uses less CPU than this percentage
+IDLEPC_MAX_CPU_USAGE = 70
+# Time to boot the routers before the CPU usage is measured
+IDLEPC_BOOT_TIME = 20
+# Dynamips proposes up to 10 idle-PC values
+IDLEPC_MAX_PROPOSALS = 10
+# Time during which the CPU usage is measured
+IDLEPC_SAMPLE_TIME = 3
+
+
 class Dynamips(BaseManager):
 
     _NODE_CLASS = DynamipsFactory
@@ -122,6 +137,7 @@ class Dynamips(BaseManager):
         self._ghost_files = set()
         self._dynamips_path = None
         self._dynamips_ids = {}
+        self._idlepcs = None
 
     @classmethod
     def node_types(cls):
@@ -548,61 +564,195 @@ class Dynamips(BaseManager):
 
         return os.path.join("configs", os.path.basename(path))
 
+    def _idlepcs_path(self):
+
+        return os.path.join(self.get_images_directory(), IDLEPCS_FILENAME)
+
+    def _load_idlepcs(self):
+        """
+        :returns: dictionary with the validated idle-PC value of each IOS image md5
+        """
+
+        if self._idlepcs is None:
+            self._idlepcs = {}
+            try:
+                with open(self._idlepcs_path(), encoding="utf-8") as f:
+                    self._idlepcs = json.load(f)
+            except FileNotFoundError:
+                pass
+            except (OSError, ValueError) as e:
+                log.warning("Cannot read the idle-PC values '{}': {}".format(self._idlepcs_path(), e))
+        return self._idlepcs
+
+    def _save_idlepc(self, image_md5, idlepc):
+        """
+        Stores the validated idle-PC value of an IOS image.
+
+        :param image_md5: md5 of the IOS image
+        :param idlepc: idle-PC value
+        """
+
+        self._load_idlepcs()[image_md5] = idlepc
+        path = self._idlepcs_path()
+        tmp_path = path + ".tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self._idlepcs, f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            log.warning("Cannot write the idle-PC values '{}': {}".format(path, e))
+
+    async def _start_idlepc_routers(self, vm, count, routers):
+        """
+        Creates and starts throwaway routers running the same IOS image
+        than a VM, without idle-PC value.
+
+        :param vm: VM instance
+        :param count: number of routers
+        :param routers: list where the routers are added as soon as they are created
+        """
+
+        for index in range(count):
+            # each router has its own hypervisor so the routers don't share their files
+            router = Router("idlepc-{}".format(index + 1), str(uuid4()), vm.project, vm.manager, console_type="none", platform=vm.platform, ghost_flag=True)
+            routers.append(router)
+            await router.create()
+            await router.set_image(vm.image)
+            await router.set_ram(vm.ram)
+            await router.start()
+            if sys.platform.startswith("win"):
+                router.set_process_priority_windows(router.hypervisor.process.pid)
+
+    async def _delete_idlepc_routers(self, routers):
+        """
+        Stops and deletes throwaway routers.
+
+        :param routers: list of Router instances
+        """
+
+        for router in routers:
+            hypervisor = router.hypervisor
+            if hypervisor is None:
+                # the router has not been created, only its directory exists
+                try:
+                    await wait_run_in_executor(shutil.rmtree, router._working_directory)
+                except OSError as e:
+                    log.warning("Could not delete file {}".format(e))
+                continue
+            try:
+                await router.stop()
+                await router.clean_delete()
+            except DynamipsError as e:
+                log.warning("Could not delete the Idle-PC router {}: {}".format(router.name, e))
+            await hypervisor.stop()
+
+    async def _measure_idlepcs(self, routers, idlepcs):
+        """
+        Measures the CPU usage of running routers, each one
+        with an idle-PC value, all at the same time.
+
+        :param routers: list of Router instances
+        :param idlepcs: list of idle-PC values, at most one per router
+
+        :returns: list of (CPU usage, idle-PC value) tuples
+        """
+
+        routers = routers[:len(idlepcs)]
+        for router, idlepc in zip(routers, idlepcs):
+            await router.set_idlepc(idlepc)
+
+        start_time = time.time()
+        initial_cpu_usages = await asyncio.gather(*[router.get_cpu_usage() for router in routers])
+        await asyncio.sleep(IDLEPC_SAMPLE_TIME)
+        elapsed_time = time.time() - start_time
+        cpu_usages = await asyncio.gather(*[router.get_cpu_usage() for router in routers])
+
+        results = []
+        for idlepc, initial_cpu_usage, cpu_usage in zip(idlepcs, initial_cpu_usages, cpu_usages):
+            cpu_usage = min(abs((cpu_usage - initial_cpu_usage) * 100.0 / elapsed_time), 100)
+            log.debug("Auto Idle-PC: CPU usage with idle-PC value {} is {}% after {:.2} seconds".format(idlepc, cpu_usage, elapsed_time))
+            results.append((cpu_usage, idlepc))
+        return results
+
     async def auto_idlepc(self, vm):
         """
         Try to find the best possible idle-pc value.
 
+        Throwaway routers boot while the VM computes the idle-PC
+        proposals, then the proposals are tried on them, several values
+        at the same time. The value validated for an IOS image is
+        remembered.
+
         :param vm: VM instance
         """
 
+        image_md5 = await md5sum_async(vm.image)
+        if image_md5 and image_md5 in self._load_idlepcs():
+            validated_idlepc = self._load_idlepcs()[image_md5]
+            log.debug("Auto Idle-PC: idle-PC value {} already validated for {}".format(validated_idlepc, vm.image))
+            await vm.set_idlepc(validated_idlepc)
+            return validated_idlepc
+
+        workers = max(1, self.config.get_section_config("Dynamips").getint("auto_idlepc_workers", 4))
+        workers = min(workers, IDLEPC_MAX_PROPOSALS)
+        # the throwaway routers are started without checking the RAM, each one needs the RAM of the VM
+        available_ram = int(psutil.virtual_memory().available / (1024 * 1024))
+        if vm.ram > 0:
+            workers = max(1, min(workers, available_ram // vm.ram))
+        vm.check_available_ram(vm.ram)
+
+        loop = asyncio.get_event_loop()
+
+        async def start_routers():
+            await self._start_idlepc_routers(vm, workers, routers)
+            return loop.time()
+
         await vm.set_idlepc("0x0")
-        was_auto_started = False
-        old_priority = None
+        routers = []
+        validated_idlepc = None
         try:
-            status = await vm.get_status()
-            if status != "running":
-                await vm.start()
-                was_auto_started = True
-                await asyncio.sleep(20)  # leave time to the router to boot
-            validated_idlepc = None
-            idlepcs = await vm.get_idle_pc_prop()
+            results = await asyncio.gather(vm.get_idle_pc_prop(), start_routers(), return_exceptions=True)
+            for result in results:
+                if isinstance(result, BaseException):
+                    raise result
+            idlepcs, started = results
             if not idlepcs:
                 raise DynamipsError("No Idle-PC values found")
-
-            if sys.platform.startswith("win"):
-                old_priority = vm.set_process_priority_windows(vm.hypervisor.process.pid)
+            candidates = []
             for idlepc in idlepcs:
                 match = re.search(r"^0x[0-9a-f]{8}$", idlepc.split()[0])
-                if not match:
-                   continue
-                await vm.set_idlepc(idlepc.split()[0])
-                log.debug("Auto Idle-PC: trying idle-PC value {}".format(vm.idlepc))
-                start_time = time.time()
-                initial_cpu_usage = await vm.get_cpu_usage()
-                log.debug("Auto Idle-PC: initial CPU usage is {}%".format(initial_cpu_usage))
-                await asyncio.sleep(3)  # wait 3 seconds to probe the cpu again
-                elapsed_time = time.time() - start_time
-                cpu_usage = await vm.get_cpu_usage()
-                cpu_elapsed_usage = cpu_usage - initial_cpu_usage
-                cpu_usage = abs(cpu_elapsed_usage * 100.0 / elapsed_time)
-                if cpu_usage > 100:
-                    cpu_usage = 100
-                log.debug("Auto Idle-PC: CPU usage is {}% after {:.2} seconds".format(cpu_usage, elapsed_time))
-                if cpu_usage < 70:
-                    validated_idlepc = vm.idlepc
-                    log.debug("Auto Idle-PC: idle-PC value {} has been validated".format(validated_idlepc))
-                    break
-
-            if validated_idlepc is None:
+                if match and idlepc.split()[0] not in candidates:
+                    candidates.append(idlepc.split()[0])
+            if not candidates:
                 raise DynamipsError("Sorry, no idle-pc value was suitable")
 
-        except DynamipsError:
-            raise
+            if len(candidates) < len(routers):
+                unused = routers[len(candidates):]
+                del routers[len(candidates):]
+                await self._delete_idlepc_routers(unused)
+            boot_time = IDLEPC_BOOT_TIME - (loop.time() - started)
+            if boot_time > 0:
+                await asyncio.sleep(boot_time)  # leave time to the routers to boot
+
+            # the routers keep running, the next values are set online
+            for index in range(0, len(candidates), len(routers)):
+                results = await self._measure_idlepcs(routers, candidates[index:index + len(routers)])
+                cpu_usage, idlepc = min(results)
+                if cpu_usage < IDLEPC_MAX_CPU_USAGE:
+                    # stop with the best value of the first values with a good one
+                    validated_idlepc = idlepc
+                    log.debug("Auto Idle-PC: idle-PC value {} has been validated with {}% of CPU usage".format(validated_idlepc, cpu_usage))
+                    break
         finally:
-            if old_priority is not None:
-                vm.set_process_priority_windows(vm.hypervisor.process.pid, old_priority)
-            if was_auto_started:
-                await vm.stop()
+            await self._delete_idlepc_routers(routers)
+
+        if validated_idlepc is None:
+            raise DynamipsError("Sorry, no idle-pc value was suitable")
+
+        await vm.set_idlepc(validated_idlepc)
+        if image_md5:
+            self._save_idlepc(image_md5, validated_idlepc)
         return validated_idlepc
 
     async def duplicate_node(self, source_node_id, destination_node_id):
@@ -29,6 +29,9 @@ from .dynamips_error import DynamipsError
 
 log = logging.getLogger(__name__)
 
+# Size of the chunks read from the hypervisor
+READ_SIZE = 65536
+
 
 class DynamipsHypervisor:
 
@@ -58,6 +61,8 @@ class DynamipsHypervisor:
         self._reader = None
         self._writer = None
         self._io_lock = asyncio.Lock()
+        self._buffer = bytearray()
+        self._scanned = 0
 
     async def connect(self, timeout=10):
         """
@@ -84,6 +89,8 @@ class DynamipsHypervisor:
                 last_exception = e
                 continue
             connection_success = True
+            self._buffer = bytearray()
+            self._scanned = 0
             break
 
         if not connection_success:
@@ -225,6 +232,22 @@ class DynamipsHypervisor:
         :returns: results as a list
         """
 
+        results = await self.send_batch([command])
+        return results[0]
+
+    async def send_batch(self, commands):
+        """
+        Sends several commands to this hypervisor at once.
+
+        The commands are written in one go and the responses are read
+        afterwards, so there is only one round trip for the whole batch.
+        Dynamips runs the commands in order, even after a failed one.
+
+        :param commands: list of Dynamips hypervisor commands
+
+        :returns: list with the results of each command
+        """
+
         # Dynamips responses are of the form:
         #   1xx yyyyyy\r\n
         #   1xx yyyyyy\r\n
@@ -242,77 +265,90 @@ class DynamipsHypervisor:
             if self._writer is None or self._reader is None:
                 raise DynamipsError("Not connected")
 
+            commands = [command.strip() for command in commands]
             try:
-                command = command.strip() + '\n'
-                log.debug("sending {}".format(command))
-                self._writer.write(command.encode())
+                log.debug("sending {}".format(commands))
+                self._writer.write("".join(command + '\n' for command in commands).encode())
                 await self._writer.drain()
             except OSError as e:
                 raise DynamipsError("Could not send Dynamips command '{command}' to {host}:{port}: {error}, process running: {run}"
-                                    .format(command=command.strip(), host=self._host, port=self._port, error=e, run=self.is_running()))
-
-            # Now retrieve the result
-            data = []
-            buf = ''
-            retries = 0
-            max_retries = 10
-            while True:
-                try:
-                    try:
-                        # line = await self._reader.readline()  # this can lead to ValueError: Line is too long
-                        chunk = await self._reader.read(1024)  # match to Dynamips' buffer size
-                    except asyncio.CancelledError:
-                        # task has been canceled but continue to read
-                        # any remaining data sent by the hypervisor
-                        continue
-                    except ConnectionResetError as e:
-                        # Sometimes WinError 64 (ERROR_NETNAME_DELETED) is returned here on Windows.
-                        # These happen if connection reset is received before IOCP could complete
-                        # a previous operation. Ignore and try again....
-                        log.warning("Connection reset received while reading Dynamips response: {}".format(e))
-                        continue
-                    if not chunk:
-                        if retries > max_retries:
-                            raise DynamipsError("No data returned from {host}:{port}, Dynamips process running: {run}"
-                                                .format(host=self._host, port=self._port, run=self.is_running()))
-                        else:
-                            retries += 1
-                            await asyncio.sleep(0.1)
-                            continue
-                    retries = 0
-                    buf += chunk.decode("utf-8", errors="ignore")
-                except OSError as e:
-                    raise DynamipsError("Could not read response for '{command}' from {host}:{port}: {error}, process running: {run}"
-                                        .format(command=command.strip(), host=self._host, port=self._port, error=e, run=self.is_running()))
-
-                # If the buffer doesn't end in '\n' then we can't be done
+                                    .format(command=commands[0], host=self._host, port=self._port, error=e, run=self.is_running()))
+
+            # Now retrieve the results, all of them must be read
+            # even if a command fails to keep the next responses in sync
+            results = []
+            error = None
+            for command in commands:
+                data = []
+                while True:
+                    line = await self._read_line(command)
+                    # Does it contain an error code?
+                    if self.error_re.match(line):
+                        if error is None:
+                            error = DynamipsError("Dynamips error when running command '{}': {}".format(command, line[4:]))
+                        break
+                    # Or does the line begin with '100-'? Then we are done!
+                    if line[:4] == '100-':
+                        line = line[4:]
+                        if line != 'OK':
+                            data.append(line)
+                        break
+                    # Remove success responses codes
+                    if self.success_re.match(line):
+                        line = line[4:]
+                    data.append(line)
+                log.debug("returned result {}".format(data))
+                results.append(data)
+
+            if error is not None:
+                raise error
+            return results
+
+    async def _read_line(self, command):
+        """
+        Reads a response line sent by this hypervisor.
+
+        :param command: command the line is a response to
+
+        :returns: line without the line terminator
+        """
+
+        retries = 0
+        max_retries = 10
+        while True:
+            end = self._buffer.find(b'\r\n', self._scanned)
+            if end >= 0:
+                line = self._buffer[:end].decode("utf-8", errors="ignore")
+                del self._buffer[:end + 2]
+                self._scanned = 0
+                return line
+            # the line terminator could be split between two chunks
+            self._scanned = max(len(self._buffer) - 1, 0)
+
+            try:
                 try:
-                    if buf[-1] != '\n':
+                    # line = await self._reader.readline()  # this can lead to ValueError: Line is too long
+                    chunk = await self._reader.read(READ_SIZE)
+                except asyncio.CancelledError:
+                    # task has been canceled but continue to read
+                    # any remaining data sent by the hypervisor
+                    continue
+                except ConnectionResetError as e:
+                    # Sometimes WinError 64 (ERROR_NETNAME_DELETED) is returned here on Windows.
+                    # These happen if connection reset is received before IOCP could complete
+                    # a previous operation. Ignore and try again....
+                    log.warning("Connection reset received while reading Dynamips response: {}".format(e))
+                    continue
+                if not chunk:
+                    if retries > max_retries:
+                        raise DynamipsError("No data returned from {host}:{port}, Dynamips process running: {run}"
+                                            .format(host=self._host, port=self._port, run=self.is_running()))
+                    else:
+                        retries += 1
+                        await asyncio.sleep(0.1)
                         continue
-                except IndexError:
-                    raise DynamipsError("Could not communicate with {host}:{port}, Dynamips process running: {run}"
-                                        .format(host=self._host, port=self._port, run=self.is_running()))
-
-                data += buf.split('\r\n')
-                if data[-1] == '':
-                    data.pop()
-                buf = ''
-
-                # Does it contain an error code?
-                if self.error_re.search(data[-1]):
-                    raise DynamipsError("Dynamips error when running command '{}': {}".format(command, data[-1][4:]))
-
-                # Or does the last line begin with '100-'? Then we are done!
-                if data[-1][:4] == '100-':
-                    data[-1] = data[-1][4:]
-                    if data[-1] == 'OK':
-                        data.pop()
-                    break
-
-            # Remove success responses codes
-            for index in range(len(data)):
-                if self.success_re.search(data[index]):
-                    data[index] = data[index][4:]
-
-            log.debug("returned result {}".format(data))
-            return data
+                retries = 0
+                self._buffer += chunk
+            except OSError as e:
+                raise DynamipsError("Could not read response for '{command}' from {host}:{port}: {error}, process running: {run}"
+                                    .format(command=command, host=self._host, port=self._port, error=e, run=self.is_running()))
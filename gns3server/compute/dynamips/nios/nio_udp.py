@@ -63,8 +63,7 @@ class NIOUDP(NIO):
                                                                                                     rhost=self._rhost,
                                                                                                     rport=self._rport))
             return
-        self._local_tunnel_lport = self._node.manager.port_manager.get_free_udp_port(self._node.project)
-        self._local_tunnel_rport = self._node.manager.port_manager.get_free_udp_port(self._node.project)
+        self._local_tunnel_lport, self._local_tunnel_rport = self._node.manager.port_manager.reserve_many(self._node.project, 2)
         self._bridge_name = 'DYNAMIPS-{}-{}'.format(self._local_tunnel_lport, self._local_tunnel_rport)
         await self._hypervisor.send("nio create_udp {name} {lport} {rhost} {rport}".format(name=self._name,
                                                                                                 lport=self._local_tunnel_lport,
@@ -213,26 +213,30 @@ class Router(BaseNode):
             self._hypervisor = await self.manager.start_new_hypervisor(working_dir=self.project.module_working_directory(self.manager.module_name.lower()))
             await self._hypervisor.set_working_dir(self._working_directory)
 
-        await self._hypervisor.send('vm create "{name}" {id} {platform}'.format(name=self._name,
-                                                                                     id=self._dynamips_id,
-                                                                                     platform=self._platform))
+        # the router is created and configured in one round trip
+        commands = ['vm create "{name}" {id} {platform}'.format(name=self._name,
+                                                                id=self._dynamips_id,
+                                                                platform=self._platform)]
 
         if not self._ghost_flag:
 
-            log.info('Router {platform} "{name}" [{id}] has been created'.format(name=self._name,
-                                                                                 platform=self._platform,
-                                                                                 id=self._id))
-
             if self._console:
-                await self._hypervisor.send('vm set_con_tcp_port "{name}" {console}'.format(name=self._name, console=self._console))
+                commands.append('vm set_con_tcp_port "{name}" {console}'.format(name=self._name, console=self._console))
 
             if self.aux is not None:
-                await self._hypervisor.send('vm set_aux_tcp_port "{name}" {aux}'.format(name=self._name, aux=self.aux))
+                commands.append('vm set_aux_tcp_port "{name}" {aux}'.format(name=self._name, aux=self.aux))
 
             # get the default base MAC address
-            mac_addr = await self._hypervisor.send('{platform} get_mac_addr "{name}"'.format(platform=self._platform,
-                                                                                                  name=self._name))
-            self._mac_addr = mac_addr[0]
+            commands.append('{platform} get_mac_addr "{name}"'.format(platform=self._platform, name=self._name))
+
+        results = await self._hypervisor.send_batch(commands)
+
+        if not self._ghost_flag:
+
+            log.info('Router {platform} "{name}" [{id}] has been created'.format(name=self._name,
+                                                                                 platform=self._platform,
+                                                                                 id=self._id))
+            self._mac_addr = results[-1][0]
 
         self._hypervisor.devices.append(self)
 
@@ -1095,9 +1099,16 @@ class Router(BaseNode):
             raise DynamipsError('Adapter {adapter} cannot be added while router "{name}" is running'.format(adapter=adapter,
                                                                                                             name=self._name))
 
-        await self._hypervisor.send('vm slot_add_binding "{name}" {slot_number} 0 {adapter}'.format(name=self._name,
-                                                                                                         slot_number=slot_number,
-                                                                                                         adapter=adapter))
+        commands = ['vm slot_add_binding "{name}" {slot_number} 0 {adapter}'.format(name=self._name,
+                                                                                    slot_number=slot_number,
+                                                                                    adapter=adapter)]
+
+        # Generate an OIR event if the router is running
+        if is_running:
+            commands.append('vm slot_oir_start "{name}" {slot_number} 0'.format(name=self._name,
+                                                                                slot_number=slot_number))
+
+        await self._hypervisor.send_batch(commands)
 
         log.info('Router "{name}" [{id}]: adapter {adapter} inserted into slot {slot_number}'.format(name=self._name,
                                                                                                      id=self._id,
@@ -1106,12 +1117,7 @@ class Router(BaseNode):
 
         self._slots[slot_number] = adapter
 
-        # Generate an OIR event if the router is running
         if is_running:
-
-            await self._hypervisor.send('vm slot_oir_start "{name}" {slot_number} 0'.format(name=self._name,
-                                                                                                 slot_number=slot_number))
-
             log.info('Router "{name}" [{id}]: OIR start event sent to slot {slot_number}'.format(name=self._name,
                                                                                                  id=self._id,
                                                                                                  slot_number=slot_number))
@@ -1273,20 +1279,23 @@ class Router(BaseNode):
             raise DynamipsError("Port {port_number} does not exist on adapter {adapter}".format(adapter=adapter,
                                                                                                 port_number=port_number))
 
+        add_nio_binding = 'vm slot_add_nio_binding "{name}" {slot_number} {port_number} {nio}'.format(name=self._name,
+                                                                                                       slot_number=slot_number,
+                                                                                                       port_number=port_number,
+                                                                                                       nio=nio)
+        # the router status is retrieved in the same round trip
+        # to know if the NIO must be enabled
+        get_status = 'vm get_status "{name}"'.format(name=self._name)
         try:
-            await self._hypervisor.send('vm slot_add_nio_binding "{name}" {slot_number} {port_number} {nio}'.format(name=self._name,
-                                                                                                                         slot_number=slot_number,
-                                                                                                                         port_number=port_number,
-                                                                                                                         nio=nio))
+            status = (await self._hypervisor.send_batch([add_nio_binding, get_status]))[-1]
         except DynamipsError:
             # in case of error try to remove and add the nio binding
-            await self._hypervisor.send('vm slot_remove_nio_binding "{name}" {slot_number} {port_number}'.format(name=self._name,
-                                                                                                                      slot_number=slot_number,
-                                                                                                                      port_number=port_number))
-            await self._hypervisor.send('vm slot_add_nio_binding "{name}" {slot_number} {port_number} {nio}'.format(name=self._name,
-                                                                                                                         slot_number=slot_number,
-                                                                                                                         port_number=port_number,
-                                                                                                                         nio=nio))
+            remove_nio_binding = 'vm slot_remove_nio_binding "{name}" {slot_number} {port_number}'.format(name=self._name,
+                                                                                                          slot_number=slot_number,
+                                                                                                          port_number=port_number)
+            # the binding is added only if it has been removed
+            await self._hypervisor.send(remove_nio_binding)
+            status = (await self._hypervisor.send_batch([add_nio_binding, get_status]))[-1]
 
         log.info('Router "{name}" [{id}]: NIO {nio_name} bound to port {slot_number}/{port_number}'.format(name=self._name,
                                                                                                            id=self._id,
@@ -1294,7 +1303,9 @@ class Router(BaseNode):
                                                                                                            slot_number=slot_number,
                                                                                                            port_number=port_number))
 
-        await self.slot_enable_nio(slot_number, port_number)
+        if status and self._status[int(status[0])] == "running":
+            # the status is already known, don't ask it again
+            await self._enable_nio(slot_number, port_number)
         adapter.add_nio(port_number, nio)
 
     async def slot_update_nio_binding(self, slot_number, port_number, nio):
@@ -1361,14 +1372,24 @@ class Router(BaseNode):
 
         is_running = await self.is_running()
         if is_running:  # running router
-            await self._hypervisor.send('vm slot_enable_nio "{name}" {slot_number} {port_number}'.format(name=self._name,
-                                                                                                              slot_number=slot_number,
-                                                                                                              port_number=port_number))
+            await self._enable_nio(slot_number, port_number)
 
-            log.info('Router "{name}" [{id}]: NIO enabled on port {slot_number}/{port_number}'.format(name=self._name,
-                                                                                                      id=self._id,
-                                                                                                      slot_number=slot_number,
-                                                                                                      port_number=port_number))
+    async def _enable_nio(self, slot_number, port_number):
+        """
+        Enables a slot NIO binding of a running router.
+
+        :param slot_number: slot number
+        :param port_number: port number
+        """
+
+        await self._hypervisor.send('vm slot_enable_nio "{name}" {slot_number} {port_number}'.format(name=self._name,
+                                                                                                          slot_number=slot_number,
+                                                                                                          port_number=port_number))
+
+        log.info('Router "{name}" [{id}]: NIO enabled on port {slot_number}/{port_number}'.format(name=self._name,
+                                                                                                  id=self._id,
+                                                                                                  slot_number=slot_number,
+                                                                                                  port_number=port_number))
 
     def get_nio(self, slot_number, port_number):
         """
@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2022 GNS3 Technologies Inc.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+
+from ..utils.asyncio import wait_run_in_executor
+from ..utils.images import scan_images, directories_changed, images_directories
+from ..utils.checksum import checksum_index, md5sum_async
+
+import logging
+log = logging.getLogger(__name__)
+
+# Minimum interval in seconds between two checks of the image directories
+POLL_INTERVAL = 5
+
+
+class ImageInventory:
+    """
+    In memory inventory of the images available for a node type.
+
+    The image directories are scanned in a thread the first time the
+    inventory is used, then they are polled for changes when the inventory is
+    requested. Checksums of the new images are computed in the background,
+    the listing never waits for them: until then their md5sum is None and
+    they are flagged with "hashing".
+
+    :param node_type: emulator type (dynamips, qemu, iou)
+    """
+
+    def __init__(self, node_type):
+
+        self._node_type = node_type
+        self._images = {}  # absolute path -> image
+        self._stats = {}  # absolute path -> os.stat_result
+        self._directories = {}  # directory -> modification time
+        self._roots = None
+        self._invalidated = True
+        self._build = None
+        self._last_check = None
+        self._hashing = {}  # absolute path -> checksum task
+        self._lock = asyncio.Lock()
+
+    @property
+    def hashing(self):
+        """
+        :returns: number of images being hashed
+        """
+
+        return len(self._hashing)
+
+    async def wait_hashing(self):
+        """
+        Waits for the checksums of the images being hashed.
+        """
+
+        pending = list(self._hashing.values())
+        if pending:
+            await asyncio.wait([asyncio.shield(task) for task in pending])
+
+    def invalidate(self):
+        """
+        Forces a new scan of the image directories before the next listing.
+        """
+
+        self._invalidated = True
+
+    async def images(self, filter=None, offset=0, limit=None):
+        """
+        Returns the images of the inventory.
+
+        :param filter: only returns the images with this string in their path
+        :param offset: number of images to skip
+        :param limit: maximum number of images to return
+
+        :returns: list of images
+        """
+
+        await self.refresh()
+        images = self._images.values()
+        if filter:
+            filter = filter.lower()
+            images = [image for image in images if filter in image["path"].lower()]
+        images = list(images)[offset:]
+        if limit is not None:
+            images = images[:limit]
+        return [dict(image) for image in images]
+
+    async def refresh(self):
+        """
+        Updates the inventory. A scan is awaited only if the inventory has
+        never been built or has been invalidated, otherwise the image
+        directories are checked for changes in the background. The
+        checksums of the new images are never awaited.
+        """
+
+        roots = images_directories(self._node_type)
+        if roots != self._roots:
+            self._roots = roots
+            self._invalidated = True
+
+        if self._invalidated:
+            self._invalidated = False
+            self._build = asyncio.ensure_future(self._scan())
+        if self._build is not None:
+            build = self._build
+            try:
+                await asyncio.shield(build)
+            except OSError:
+                self._invalidated = True
+                raise
+            finally:
+                if build.done() and self._build is build:
+                    self._build = None
+            return
+
+        loop = asyncio.get_event_loop()
+        if self._last_check is None or loop.time() - self._last_check >= POLL_INTERVAL:
+            self._last_check = loop.time()
+            asyncio.ensure_future(self._poll())
+
+    async def _poll(self):
+        """
+        Scans the image directories again if files have been added or removed.
+        """
+
+        try:
+            if await wait_run_in_executor(directories_changed, self._directories):
+                await self._scan()
+        except OSError as e:
+            log.warning("Can't update the {} image inventory: {}".format(self._node_type, e))
+
+    async def _scan(self):
+        """
+        Scans the image directories and starts hashing the new images.
+        """
+
+        async with self._lock:
+            scanned, directories = await wait_run_in_executor(scan_images, self._node_type, self._stats)
+            index = checksum_index()
+            images = {}
+            stats = {}
+            for path, image, st in scanned:
+                image["md5sum"] = index.get(path, st)
+                if image["md5sum"] is None:
+                    image["hashing"] = True
+                    if path not in self._hashing:
+                        self._hashing[path] = asyncio.ensure_future(self._hash(path))
+                images[path] = image
+                stats[path] = st
+            self._images = images
+            self._stats = stats
+            self._directories = directories
+            self._last_check = asyncio.get_event_loop().time()
+            log.debug("{} image inventory updated: {} images, {} being hashed".format(self._node_type,
+                                                                                     len(images),
+                                                                                     len(self._hashing)))
+
+    async def _hash(self, path):
+        """
+        Computes the checksum of an image and updates the inventory.
+
+        :param path: absolute path of the image
+        """
+
+        try:
+            md5 = await md5sum_async(path)
+        finally:
+            self._hashing.pop(path, None)
+        image = self._images.get(path)
+        if image is not None:
+            image["md5sum"] = md5
+            image.pop("hashing", None)
@@ -16,6 +16,7 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import socket
+import functools
 from aiohttp.web import HTTPConflict
 from gns3server.config import Config
 
@@ -30,6 +31,71 @@ BANNED_PORTS = set((1, 7, 9, 11, 13, 15, 17, 19, 20, 21, 22, 23, 25, 37, 42, 43,
                     6668, 6669))
 
 
+class PortAllocator:
+    """
+    Bitmap of the free ports of a range.
+
+    With a rotating cursor, the search starts after the last allocated port
+    instead of the beginning of the range so allocations do not slow down
+    when the range fills up and released ports are not reused immediately.
+    Otherwise the lowest free port is always allocated first.
+
+    :param start_port: first port in the range
+    :param end_port: last port in the range
+    :param used_ports: ports already in use
+    :param rotate: allocate the ports from a rotating cursor
+    """
+
+    def __init__(self, start_port, end_port, used_ports=(), rotate=True):
+
+        self._start_port = start_port
+        self._end_port = end_port
+        self._bitmap = bytearray(end_port - start_port + 1)
+        self._cursor = 0
+        self._rotate = rotate
+        for port in BANNED_PORTS:
+            self.mark_used(port)
+        for port in used_ports:
+            self.mark_used(port)
+
+    def __contains__(self, port):
+
+        return self._start_port <= port <= self._end_port
+
+    def mark_used(self, port):
+
+        if port in self:
+            self._bitmap[port - self._start_port] = 1
+
+    def mark_free(self, port):
+
+        if port in self and port not in BANNED_PORTS:
+            self._bitmap[port - self._start_port] = 0
+
+    def free_ports(self):
+        """
+        Iterates over the free ports once, starting from the cursor.
+        The cursor is moved after each returned port if it rotates.
+        """
+
+        size = len(self._bitmap)
+        start = self._cursor
+        index = start
+        wrapped = False
+        while True:
+            index = self._bitmap.find(0, index, size if not wrapped else start)
+            if index == -1:
+                if wrapped or start == 0:
+                    return
+                wrapped = True
+                index = 0
+                continue
+            if self._rotate:
+                self._cursor = (index + 1) % size
+            yield self._start_port + index
+            index += 1
+
+
 class PortManager:
 
     """
@@ -42,6 +108,7 @@ class PortManager:
         self._udp_host = "0.0.0.0"
         self._used_tcp_ports = set()
         self._used_udp_ports = set()
+        self._allocators = {}
 
         server_config = Config.instance().get_section_config("Server")
 
@@ -185,13 +252,86 @@ class PortManager:
         else:
             socket_type = socket.SOCK_STREAM
 
-        for res in socket.getaddrinfo(host, port, socket.AF_UNSPEC, socket_type, 0, socket.AI_PASSIVE):
-            af, socktype, proto, _, sa = res
+        for af, socktype, proto, sa in _bind_addresses(host, socket_type):
+            # replace the port in the (host, port) or (host, port, flowinfo, scope_id) address
+            sa = (sa[0], port) + sa[2:]
             with socket.socket(af, socktype, proto) as s:
                 s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
                 s.bind(sa)  # the port is available if bind is a success
             return True
 
+    def _allocator(self, socket_type, start_port, end_port):
+        """
+        Returns the free port bitmap of a range, created on first use.
+
+        :param socket_type: TCP or UDP
+        :param start_port: first port in the range
+        :param end_port: last port in the range
+        """
+
+        if end_port < start_port:
+            raise HTTPConflict(text="Invalid port range {}-{}".format(start_port, end_port))
+
+        key = (socket_type, start_port, end_port)
+        allocator = self._allocators.get(key)
+        if allocator is None:
+            used_ports = self._used_tcp_ports if socket_type == "TCP" else self._used_udp_ports
+            # console ports are allocated lowest first, users expect predictable console ports
+            allocator = self._allocators[key] = PortAllocator(start_port, end_port, used_ports, rotate=socket_type == "UDP")
+        return allocator
+
+    def _mark_used(self, socket_type, port):
+
+        for (allocator_socket_type, _, _), allocator in self._allocators.items():
+            if allocator_socket_type == socket_type:
+                allocator.mark_used(port)
+
+    def _mark_free(self, socket_type, port):
+
+        for (allocator_socket_type, _, _), allocator in self._allocators.items():
+            if allocator_socket_type == socket_type:
+                allocator.mark_free(port)
+
+    def _allocate_ports(self, count, start_port, end_port, host, socket_type):
+        """
+        Finds unused ports in a range using the free port bitmap,
+        bind() is only tried on the free candidates.
+
+        :param count: number of ports to find
+        :param start_port: first port in the range
+        :param end_port: last port in the range
+        :param host: host/address for bind()
+        :param socket_type: TCP or UDP
+
+        :returns: list of ports
+        """
+
+        allocator = self._allocator(socket_type, start_port, end_port)
+        used_ports = self._used_tcp_ports if socket_type == "TCP" else self._used_udp_ports
+        ports = []
+        last_exception = None
+        for port in allocator.free_ports():
+            if port in used_ports:
+                # the port has been reserved without the bitmap
+                allocator.mark_used(port)
+                continue
+            try:
+                PortManager._check_port(host, port, socket_type)
+                if host != "0.0.0.0":
+                    PortManager._check_port("0.0.0.0", port, socket_type)
+            except OSError as e:
+                last_exception = e
+                continue
+            ports.append(port)
+            if len(ports) == count:
+                return ports
+
+        raise HTTPConflict(text="Could not find {} free port(s) between {} and {} on host {}, last exception: {}".format(count,
+                                                                                                                         start_port,
+                                                                                                                         end_port,
+                                                                                                                         host,
+                                                                                                                         last_exception))
+
     def get_free_tcp_port(self, project, port_range_start=None, port_range_end=None):
         """
         Get an available TCP port and reserve it
@@ -204,16 +344,7 @@ class PortManager:
             port_range_start = self._console_port_range[0]
             port_range_end = self._console_port_range[1]
 
-        port = self.find_unused_port(port_range_start,
-                                     port_range_end,
-                                     host=self._console_host,
-                                     socket_type="TCP",
-                                     ignore_ports=self._used_tcp_ports)
-
-        self._used_tcp_ports.add(port)
-        project.record_tcp_port(port)
-        log.debug("TCP port {} has been allocated".format(port))
-        return port
+        return self.reserve_many(project, 1, "TCP", port_range_start, port_range_end)[0]
 
     def reserve_tcp_port(self, port, project, port_range_start=None, port_range_end=None):
         """
@@ -254,6 +385,7 @@ class PortManager:
             return port
 
         self._used_tcp_ports.add(port)
+        self._mark_used("TCP", port)
         project.record_tcp_port(port)
         log.debug("TCP port {} has been reserved".format(port))
         return port
@@ -268,6 +400,7 @@ class PortManager:
 
         if port in self._used_tcp_ports:
             self._used_tcp_ports.remove(port)
+            self._mark_free("TCP", port)
             project.remove_tcp_port(port)
             log.debug("TCP port {} has been released".format(port))
 
@@ -277,16 +410,43 @@ class PortManager:
 
         :param project: Project instance
         """
-        port = self.find_unused_port(self._udp_port_range[0],
-                                     self._udp_port_range[1],
-                                     host=self._udp_host,
-                                     socket_type="UDP",
-                                     ignore_ports=self._used_udp_ports)
+        return self.reserve_many(project, 1)[0]
 
-        self._used_udp_ports.add(port)
-        project.record_udp_port(port)
-        log.debug("UDP port {} has been allocated".format(port))
-        return port
+    def reserve_many(self, project, count, socket_type="UDP", port_range_start=None, port_range_end=None):
+        """
+        Get several available ports at once and reserve them
+
+        :param project: Project instance
+        :param count: number of ports
+        :param socket_type: TCP or UDP (default)
+        :param port_range_start: Port range to use, default is the console or UDP range
+        :param port_range_end: Port range to use, default is the console or UDP range
+
+        :returns: list of ports
+        """
+
+        if socket_type == "TCP":
+            host = self._console_host
+            used_ports = self._used_tcp_ports
+            record = project.record_tcp_port
+            default_range = self._console_port_range
+        else:
+            host = self._udp_host
+            used_ports = self._used_udp_ports
+            record = project.record_udp_port
+            default_range = self._udp_port_range
+
+        # use the default range is not specific one is given
+        if port_range_start is None and port_range_end is None:
+            port_range_start, port_range_end = default_range
+
+        ports = self._allocate_ports(count, port_range_start, port_range_end, host, socket_type)
+        for port in ports:
+            used_ports.add(port)
+            self._mark_used(socket_type, port)
+            record(port)
+        log.debug("{} ports {} have been allocated".format(socket_type, ports))
+        return ports
 
     def reserve_udp_port(self, port, project):
         """
@@ -301,6 +461,7 @@ class PortManager:
         if port < self._udp_port_range[0] or port > self._udp_port_range[1]:
             raise HTTPConflict(text="UDP port {} is outside the range {}-{}".format(port, self._udp_port_range[0], self._udp_port_range[1]))
         self._used_udp_ports.add(port)
+        self._mark_used("UDP", port)
         project.record_udp_port(port)
         log.debug("UDP port {} has been reserved".format(port))
 
@@ -314,5 +475,21 @@ class PortManager:
 
         if port in self._used_udp_ports:
             self._used_udp_ports.remove(port)
+            self._mark_free("UDP", port)
             project.remove_udp_port(port)
             log.debug("UDP port {} has been released".format(port))
+
+
+@functools.lru_cache(maxsize=32)
+def _bind_addresses(host, socket_type):
+    """
+    Resolves the addresses to bind for a host, the result is cached
+    because the same hosts are probed for every allocated port.
+
+    :param host: host/address for bind()
+    :param socket_type: socket.SOCK_STREAM or socket.SOCK_DGRAM
+
+    :returns: list of (family, socket type, protocol, address)
+    """
+
+    return [(af, socktype, proto, sa) for af, socktype, proto, _, sa in socket.getaddrinfo(host, 0, socket.AF_UNSPEC, socket_type, 0, socket.AI_PASSIVE)]
@@ -19,19 +19,40 @@ import os
 import aiohttp
 import shutil
 import asyncio
-import hashlib
 
 from uuid import UUID, uuid4
 
 from .port_manager import PortManager
 from .notification_manager import NotificationManager
+from .error import NodeError
+from ..ubridge.ubridge_error import UbridgeError
 from ..config import Config
 from ..utils.asyncio import wait_run_in_executor
+from ..utils.checksum import md5sum_async, checksum_index, release_checksum_index, INDEX_FILENAME
+from ..utils.file_copy import copy_project_files
 from ..utils.path import check_path_allowed, get_default_project_directory
 
 import logging
 log = logging.getLogger(__name__)
 
+# Name of the module managing each node type
+NODE_TYPE_MODULES = {
+    "vpcs": "VPCS",
+    "traceng": "TraceNG",
+    "virtualbox": "VirtualBox",
+    "vmware": "VMware",
+    "qemu": "Qemu",
+    "docker": "Docker",
+    "iou": "IOU",
+    "dynamips": "Dynamips",
+    "ethernet_switch": "Dynamips",
+    "ethernet_hub": "Dynamips",
+    "atm_switch": "Dynamips",
+    "frame_relay_switch": "Dynamips",
+    "cloud": "Builtin",
+    "nat": "Builtin"
+}
+
 
 class Project:
 
@@ -365,6 +386,8 @@ class Project:
         if self._used_udp_ports:
             log.warning("Project {} has UDP ports still in use: {}".format(self.id, self._used_udp_ports))
 
+        release_checksum_index(self.path)
+
         # clean the remaining ports that have not been cleaned by their respective node.
         port_manager = PortManager.instance()
         for port in self._used_tcp_ports.copy():
@@ -407,34 +430,118 @@ class Project:
         """
 
         files = []
+        # the checksums are only computed for the files changed since the last call
+        index = checksum_index(self.path)
         for dirpath, dirnames, filenames in os.walk(self.path, followlinks=False):
             for filename in filenames:
+                if dirpath == self.path and filename.startswith(INDEX_FILENAME):
+                    continue
                 if not filename.endswith(".ghost"):
                     path = os.path.relpath(dirpath, self.path)
                     path = os.path.join(path, filename)
                     path = os.path.normpath(path)
                     file_info = {"path": path}
 
-                    try:
-                        file_info["md5sum"] = await wait_run_in_executor(self._hash_file, os.path.join(dirpath, filename))
-                    except OSError:
+                    file_info["md5sum"] = await md5sum_async(os.path.join(dirpath, filename), index=index)
+                    if file_info["md5sum"] is None:
                         continue
                     files.append(file_info)
 
         return files
 
-    def _hash_file(self, path):
+    async def duplicate_files(self, project_id, node_ids):
+        """
+        Copy the files of the project to the directory of a new project,
+        the temporary files and the packet captures are not copied.
+
+        :param project_id: ID of the new project
+        :param node_ids: dictionary of new node IDs indexed by node ID
+        """
+
+        def ignore(path):
+            parts = path.split(os.path.sep)
+            if parts[0] in ("tmp", "snapshots") or (parts[0] == "project-files" and len(parts) > 1 and parts[1] in ("tmp", "captures")):
+                return True
+            if path.startswith(INDEX_FILENAME):
+                return True
+            return path.endswith((".ghost", "_log.txt", ".log"))
+
+        path = os.path.join(get_default_project_directory(), project_id)
+        if os.path.exists(path):
+            raise aiohttp.web.HTTPConflict(text="The project directory '{}' already exists".format(path))
+        try:
+            await copy_project_files(self.path, path, node_ids, ignore=ignore)
+        except OSError as e:
+            raise aiohttp.web.HTTPConflict(text="Could not duplicate the project files: {}".format(e))
+
+    async def add_udp_nios(self, nios):
         """
-        Compute and md5 hash for file
+        Create UDP NIOs on several nodes of the project. The NIOs
+        of a node are added one after the other and the nodes
+        are handled at the same time.
+
+        :param nios: List of dictionaries with the node type, node ID,
+        adapter number, port number and NIO settings
 
-        :returns: hexadecimal md5
+        :returns: List of results in the same order, with the HTTP
+        status and the NIO or an error message
         """
 
-        m = hashlib.md5()
-        with open(path, "rb") as f:
-            while True:
-                buf = f.read(128)
-                if not buf:
-                    break
-                m.update(buf)
-        return m.hexdigest()
+        # We import it at the last time to avoid circular dependencies
+        from ..web.route import Route
+
+        results = [None] * len(nios)
+        nios_by_node = {}
+        for index, settings in enumerate(nios):
+            nios_by_node.setdefault(settings["node_id"], []).append(index)
+
+        async def add_node_nios(indexes):
+            # like the NIO creation endpoints, don't run at the same time as other requests to the node
+            lock_key = "compute:{}:{}".format(self.id, nios[indexes[0]]["node_id"])
+            await Route.run_with_node_lock(lock_key, add_nios, indexes)
+
+        async def add_nios(indexes):
+            for index in indexes:
+                try:
+                    nio = await self._add_udp_nio(**nios[index])
+                    results[index] = {"status": 201, "nio": nio.__json__()}
+                except aiohttp.web.HTTPException as e:
+                    results[index] = {"status": e.status, "message": e.text}
+                except (NodeError, UbridgeError) as e:
+                    results[index] = {"status": 409, "message": str(e)}
+                except Exception as e:
+                    # an error must not prevent the creation of the other NIOs
+                    log.error("Could not add UDP NIO to node {}: {}".format(nios[index]["node_id"], e), exc_info=1)
+                    results[index] = {"status": 500, "message": str(e)}
+
+        await asyncio.gather(*[add_node_nios(indexes) for indexes in nios_by_node.values()])
+        return results
+
+    async def _add_udp_nio(self, node_type, node_id, adapter_number, port_number, nio):
+        """
+        Add an UDP NIO to a node, like the NIO creation endpoint of the node type.
+        """
+
+        modules = {module.__name__: module for module in self.compute()}
+        module = modules.get(NODE_TYPE_MODULES.get(node_type))
+        if module is None:
+            raise aiohttp.web.HTTPBadRequest(text="Node type {} is not supported".format(node_type))
+        # the node must be of the requested type
+        node = module.instance().get_node(node_id, project_id=self.id)
+        if node_type in ("dynamips", "ethernet_switch", "ethernet_hub", "atm_switch", "frame_relay_switch"):
+            # Dynamips NIOs are created on the hypervisor of the node
+            udp_nio = await node.manager.create_nio(node, nio)
+        else:
+            udp_nio = node.manager.create_nio(nio)
+
+        if node_type == "dynamips":
+            await node.slot_add_nio_binding(adapter_number, port_number, udp_nio)
+        elif node_type == "iou":
+            await node.adapter_add_nio_binding(adapter_number, port_number, udp_nio)
+        elif node_type in ("qemu", "virtualbox", "vmware", "docker"):
+            await node.adapter_add_nio_binding(adapter_number, udp_nio)
+        elif node_type in ("vpcs", "traceng"):
+            await node.port_add_nio_binding(port_number, udp_nio)
+        else:
+            await node.add_nio(udp_nio, port_number)
+        return udp_nio
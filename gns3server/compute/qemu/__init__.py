@@ -33,6 +33,7 @@ from ..error import NodeError, ImageMissingError
 from .qemu_error import QemuError
 from .qemu_vm import QemuVM
 from .utils.guest_cid import get_next_guest_cid
+from .utils.image_cache import QemuImageCache
 from .utils.ziputils import unpack_zip
 
 import logging
@@ -48,9 +49,20 @@ class Qemu(BaseManager):
 
         super().__init__()
         self._guest_cid_lock = asyncio.Lock()
+        self._image_cache = QemuImageCache()
         self.config_disk = "config.img"
         self._init_config_disk()
 
+    @property
+    def image_cache(self):
+        """
+        Returns the cache of the disk images metadata shared by the VMs.
+
+        :returns: QemuImageCache instance
+        """
+
+        return self._image_cache
+
     async def create_node(self, *args, **kwargs):
         """
         Creates a new Qemu VM.
@@ -320,6 +332,7 @@ class Qemu(BaseManager):
 
             process = await asyncio.create_subprocess_exec(*command)
             await process.wait()
+            self.image_inventory.invalidate()
         except (OSError, subprocess.SubprocessError) as e:
             raise QemuError("Could not create disk image {}:{}".format(path, e))
 
@@ -343,6 +356,7 @@ class Qemu(BaseManager):
             command = [qemu_img, "resize", path, "+{}M".format(extend)]
             process = await asyncio.create_subprocess_exec(*command)
             await process.wait()
+            self.image_inventory.invalidate()
             log.info("Qemu disk '{}' extended by {} MB".format(path, extend))
         except (OSError, subprocess.SubprocessError) as e:
             raise QemuError("Could not update disk image {}:{}".format(path, e))
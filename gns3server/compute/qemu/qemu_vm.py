@@ -31,14 +31,15 @@ import asyncio
 import socket
 import gns3server
 import subprocess
-import time
 import json
 
 from gns3server.utils import parse_version, shlex_quote
-from gns3server.utils.asyncio import subprocess_check_output, cancellable_wait_run_in_executor
+from gns3server.utils.asyncio import subprocess_check_output
 from .qemu_error import QemuError
 from .utils.qcow2 import Qcow2, Qcow2Error
 from .utils.ziputils import pack_zip, unpack_zip
+from .utils.qmp import QmpClient, QmpError
+from .utils.image_cache import QemuImageCacheError
 from ..adapters.ethernet_adapter import EthernetAdapter
 from ..error import NodeError, ImageMissingError
 from ..nios.nio_udp import NIOUDP
@@ -47,6 +48,7 @@ from ..base_node import BaseNode
 from ...schemas.qemu import QEMU_OBJECT_SCHEMA, QEMU_PLATFORMS
 from ...utils.asyncio import monitor_process
 from ...utils.images import md5sum
+from ...utils.checksum import md5sum_async
 from ...utils import macaddress_to_int, int_to_macaddress
 
 
@@ -79,6 +81,9 @@ class QemuVM(BaseNode):
         self._process = None
         self._cpulimit_process = None
         self._monitor = None
+        self._qmp = None
+        self._qmp_lock = asyncio.Lock()
+        self._vm_status = None
         self._stdout_file = ""
         self._qemu_img_stdout_file = ""
         self._execute_lock = asyncio.Lock()
@@ -1018,10 +1023,10 @@ class QemuVM(BaseNode):
         # In case user upload image manually we don't have md5 sums.
         # We need generate hashes at this point, otherwise they will be generated
         # at __json__ but not on separate thread.
-        await cancellable_wait_run_in_executor(md5sum, self._hda_disk_image)
-        await cancellable_wait_run_in_executor(md5sum, self._hdb_disk_image)
-        await cancellable_wait_run_in_executor(md5sum, self._hdc_disk_image)
-        await cancellable_wait_run_in_executor(md5sum, self._hdd_disk_image)
+        await asyncio.gather(md5sum_async(self._hda_disk_image),
+                             md5sum_async(self._hdb_disk_image),
+                             md5sum_async(self._hdc_disk_image),
+                             md5sum_async(self._hdd_disk_image))
 
         super(QemuVM, self).create()
 
@@ -1084,7 +1089,7 @@ class QemuVM(BaseNode):
                 self._hw_virtualization = True
 
             await self._start_ubridge()
-            set_link_commands = []
+            links_down = []
             for adapter_number, adapter in enumerate(self._ethernet_adapters):
                 nio = adapter.get_nio(0)
                 if nio:
@@ -1092,13 +1097,16 @@ class QemuVM(BaseNode):
                                                                self._local_udp_tunnels[adapter_number][1],
                                                                nio)
                     if nio.suspend and self._replicate_network_connection_state:
-                        set_link_commands.append("set_link gns3-{} off".format(adapter_number))
+                        links_down.append(adapter_number)
                 elif self._replicate_network_connection_state:
-                    set_link_commands.append("set_link gns3-{} off".format(adapter_number))
+                    links_down.append(adapter_number)
 
-            if "-loadvm" not in command_string and self._replicate_network_connection_state:
+            # keep a connection to the monitor to receive the status changes of the VM,
+            # the links cannot be set if the monitor cannot be reached
+            qmp = await self._connect_qmp()
+            if qmp is not None and "-loadvm" not in command_string and self._replicate_network_connection_state:
                 # only set the link statuses if not restoring a previous VM state
-                await self._control_vm_commands(set_link_commands)
+                await asyncio.gather(*[self._set_link(adapter_number, False) for adapter_number in links_down])
 
         try:
             if self.is_running():
@@ -1134,7 +1142,7 @@ class QemuVM(BaseNode):
                 try:
 
                     if self.on_close == "save_vm_state":
-                        await self._control_vm("stop")
+                        await self._qmp_command("stop")
                         await self._control_vm("savevm GNS3_SAVED_STATE")
                         wait_for_savevm = 120
                         while wait_for_savevm:
@@ -1145,7 +1153,7 @@ class QemuVM(BaseNode):
                                 break
 
                     if self.on_close == "shutdown_signal":
-                        await self._control_vm("system_powerdown")
+                        await self._qmp_command("system_powerdown")
                         await gns3server.utils.asyncio.wait_for_process_termination(self._process, timeout=120)
                     else:
                         self._process.terminate()
@@ -1161,117 +1169,125 @@ class QemuVM(BaseNode):
                         if self._process.returncode is None:
                             log.warning('QEMU VM "{}" PID={} is still running'.format(self._name, self._process.pid))
             self._process = None
+            self._close_qmp()
             self._stop_cpulimit()
             if self.on_close != "save_vm_state":
                 await self._clear_save_vm_stated()
             await self._export_config()
             await super().stop()
 
-    async def _open_qemu_monitor_connection_vm(self, timeout=10):
+    async def _connect_qmp(self):
         """
-        Opens a connection to the QEMU monitor.
+        Opens the QMP connection to the monitor of this VM if needed.
 
-        :param timeout: timeout to connect to the monitor TCP server
-        :returns: The reader returned is a StreamReader instance; the writer is a StreamWriter instance
+        :returns: QmpClient instance or None if the monitor cannot be reached
         """
 
-        begin = time.time()
-        connection_success = False
-        last_exception = None
-        reader = writer = None
-        while time.time() - begin < timeout:
-            await asyncio.sleep(0.01)
-            try:
-                log.debug("Connecting to Qemu monitor on {}:{}".format(self._monitor_host, self._monitor))
-                reader, writer = await asyncio.open_connection(self._monitor_host, self._monitor)
-            except (asyncio.TimeoutError, OSError) as e:
-                last_exception = e
-                continue
-            connection_success = True
-            break
+        async with self._qmp_lock:
+            if self._qmp is None or not self._qmp.connected:
+                if not self.is_running() or not self._monitor:
+                    return None
+                qmp = QmpClient(self._monitor_host, self._monitor, event_callback=self._qmp_event)
+                try:
+                    await qmp.connect()
+                    status = await qmp.execute("query-status")
+                except (QmpError, OSError, asyncio.TimeoutError) as e:
+                    log.warning("Could not connect to QEMU monitor on {}:{}: {}".format(self._monitor_host, self._monitor, e))
+                    qmp.close()
+                    return None
+                self._qmp = qmp
+                # the status is then updated by the events
+                self._vm_status = status["status"]
+        return self._qmp
 
-        if not connection_success:
-            log.warning("Could not connect to QEMU monitor on {}:{}: {}".format(self._monitor_host, self._monitor,
-                                                                                last_exception))
-        else:
-            log.info("Connected to QEMU monitor on {}:{} after {:.4f} seconds".format(self._monitor_host, self._monitor, time.time() - begin))
-        return reader, writer
+    def _close_qmp(self):
+        """
+        Closes the QMP connection to the monitor of this VM.
+        """
 
-    async def _control_vm(self, command, expected=None):
+        if self._qmp is not None:
+            self._qmp.close()
+            self._qmp = None
+        self._vm_status = None
+
+    def _qmp_event(self, event, data):
+        """
+        Called when QEMU sends an event.
+
+        :param event: Event name
+        :param data: Event data
         """
-        Executes a command with QEMU monitor when this VM is running.
 
-        :param command: QEMU monitor command (e.g. info status, stop etc.)
-        :param expected: An array of expected strings
+        log.info('QEMU VM "{}" [{}] received event {}'.format(self._name, self._id, event))
+        if event == "STOP":
+            self._vm_status = "paused"
+            if self.status == "started":
+                self.status = "suspended"
+        elif event == "RESUME":
+            self._vm_status = "running"
+            if self.status == "suspended":
+                self.status = "started"
+        elif event == "SUSPEND":
+            # the guest has suspended itself (ACPI S3)
+            self._vm_status = "suspended"
+            if self.status == "started":
+                self.status = "suspended"
+        elif event == "WAKEUP":
+            self._vm_status = "running"
+            if self.status == "suspended":
+                self.status = "started"
+        elif event == "RESET":
+            # the status after a reset depends on the status before it, it is queried again
+            self._vm_status = None
+        elif event == "SHUTDOWN":
+            # QEMU exits, the termination callback stops the node
+            self._vm_status = "shutdown"
 
-        :returns: result of the command (matched object or None)
+    async def _qmp_command(self, command, arguments=None):
         """
+        Executes a QMP command when this VM is running.
 
-        result = None
-        if self.is_running() and self._monitor:
-            log.info("Execute QEMU monitor command: {}".format(command))
-            reader, writer = await self._open_qemu_monitor_connection_vm()
-            if reader is None and writer is None:
-                return result
+        :param command: QMP command (e.g. stop, query-status etc.)
+        :param arguments: Dictionary with the arguments of the command
 
-            try:
-                cmd_byte = command.encode('ascii')
-                writer.write(cmd_byte + b"\n")
-                if not expected:
-                    while True:
-                        line = await asyncio.wait_for(reader.readline(), timeout=3)  # echo of the command
-                        if not line or cmd_byte in line:
-                            break
-            except asyncio.TimeoutError:
-                log.warning("Missing echo of command '{}'".format(command))
-            except OSError as e:
-                log.warning("Could not write to QEMU monitor: {}".format(e))
-                writer.close()
-                return result
-            if expected:
-                try:
-                    while result is None:
-                        line = await asyncio.wait_for(reader.readline(), timeout=3)
-                        if not line:
-                            break
-                        for expect in expected:
-                            if expect in line:
-                                result = line.decode("utf-8").strip()
-                                break
-                except asyncio.TimeoutError:
-                    log.warning("Timeout while waiting for result of command '{}'".format(command))
-                except (ConnectionError, EOFError) as e:
-                    log.warning("Could not read from QEMU monitor: {}".format(e))
-            writer.close()
-        return result
+        :returns: result of the command or None if the command could not be executed
+        """
+
+        qmp = await self._connect_qmp()
+        if qmp is None:
+            return None
+        log.info("Execute QMP command: {} {}".format(command, arguments or ""))
+        try:
+            return await qmp.execute(command, arguments)
+        except QmpError as e:
+            log.warning("QMP command '{}' has failed: {}".format(command, e))
+        except asyncio.TimeoutError:
+            log.warning("Timeout while waiting for result of QMP command '{}'".format(command))
+        except OSError as e:
+            log.warning("Could not execute QMP command '{}': {}".format(command, e))
+        return None
 
-    async def _control_vm_commands(self, commands):
+    async def _control_vm(self, command):
         """
-        Executes commands with QEMU monitor when this VM is running.
+        Executes a command of the human monitor when this VM is running,
+        only for the commands without an equivalent in QMP.
 
-        :param commands: a list of QEMU monitor commands (e.g. info status, stop etc.)
+        :param command: QEMU monitor command (e.g. savevm, eject etc.)
+
+        :returns: output of the command or None
         """
 
-        if self.is_running() and self._monitor:
+        return await self._qmp_command("human-monitor-command", {"command-line": command})
 
-            reader, writer = await self._open_qemu_monitor_connection_vm()
-            if reader is None and writer is None:
-                return
+    async def _set_link(self, adapter_number, up):
+        """
+        Changes the link state of an adapter when this VM is running.
 
-            for command in commands:
-                log.info("Execute QEMU monitor command: {}".format(command))
-                try:
-                    cmd_byte = command.encode('ascii')
-                    writer.write(cmd_byte + b"\n")
-                    while True:
-                        line = await asyncio.wait_for(reader.readline(), timeout=3)  # echo of the command
-                        if not line or cmd_byte in line:
-                            break
-                except asyncio.TimeoutError:
-                    log.warning("Missing echo of command '{}'".format(command))
-                except OSError as e:
-                    log.warning("Could not write to QEMU monitor: {}".format(e))
-            writer.close()
+        :param adapter_number: adapter number
+        :param up: True to set the link up
+        """
+
+        await self._qmp_command("set_link", {"name": "gns3-{}".format(adapter_number), "up": up})
 
     async def close(self):
         """
@@ -1299,23 +1315,24 @@ class QemuVM(BaseNode):
 
     async def _get_vm_status(self):
         """
-        Returns this VM suspend status.
+        Returns this VM suspend status, as known from the events
+        sent by QEMU since the monitor connection has been opened.
+        The status is queried when the events don't tell it.
 
         Status are extracted from:
-          https://github.com/qemu/qemu/blob/master/qapi-schema.json#L152
+          https://github.com/qemu/qemu/blob/master/qapi/run-state.json
 
         :returns: status (string)
         """
 
-        result = await self._control_vm("info status", [
-            b"debug", b"inmigrate", b"internal-error", b"io-error",
-            b"paused", b"postmigrate", b"prelaunch", b"finish-migrate",
-            b"restore-vm", b"running", b"save-vm", b"shutdown", b"suspended",
-            b"watchdog", b"guest-panicked"
-        ])
-        if result is None:
-            return result
-        status = result.rsplit(' ', 1)[1]
+        if await self._connect_qmp() is None:
+            return None
+        if self._vm_status is None:
+            result = await self._qmp_command("query-status")
+            if result is None:
+                return None
+            self._vm_status = result["status"]
+        status = self._vm_status
         if status == "running" or status == "prelaunch":
             self.status = "started"
         elif status == "suspended":
@@ -1334,7 +1351,7 @@ class QemuVM(BaseNode):
             if vm_status is None:
                 raise QemuError("Suspending a QEMU VM is not supported")
             elif vm_status == "running" or vm_status == "prelaunch":
-                await self._control_vm("stop")
+                await self._qmp_command("stop")
                 self.status = "suspended"
                 log.debug("QEMU VM has been suspended")
             else:
@@ -1349,7 +1366,7 @@ class QemuVM(BaseNode):
             await self.stop()
             await self.start()
         else:
-            await self._control_vm("system_reset")
+            await self._qmp_command("system_reset")
         log.debug("QEMU VM has been reset")
 
     async def resume(self):
@@ -1361,7 +1378,7 @@ class QemuVM(BaseNode):
         if vm_status is None:
             raise QemuError("Resuming a QEMU VM is not supported")
         elif vm_status == "paused":
-            await self._control_vm("cont")
+            await self._qmp_command("cont")
             self.status = "started"
             log.debug("QEMU VM has been resumed")
         else:
@@ -1387,7 +1404,7 @@ class QemuVM(BaseNode):
                                                            self._local_udp_tunnels[adapter_number][1],
                                                            nio)
                 if self._replicate_network_connection_state:
-                    await self._control_vm("set_link gns3-{} on".format(adapter_number))
+                    await self._set_link(adapter_number, True)
             except (IndexError, KeyError):
                 raise QemuError('Adapter {adapter_number} does not exist on QEMU VM "{name}"'.format(name=self._name,
                                                                                                      adapter_number=adapter_number))
@@ -1412,10 +1429,7 @@ class QemuVM(BaseNode):
                                                               self._local_udp_tunnels[adapter_number][1],
                                                               nio)
                 if self._replicate_network_connection_state:
-                    if nio.suspend:
-                        await self._control_vm("set_link gns3-{} off".format(adapter_number))
-                    else:
-                        await self._control_vm("set_link gns3-{} on".format(adapter_number))
+                    await self._set_link(adapter_number, not nio.suspend)
             except IndexError:
                 raise QemuError('Adapter {adapter_number} does not exist on QEMU VM "{name}"'.format(name=self._name,
                                                                                                      adapter_number=adapter_number))
@@ -1438,7 +1452,7 @@ class QemuVM(BaseNode):
         await self.stop_capture(adapter_number)
         if self.is_running():
             if self._replicate_network_connection_state:
-                await self._control_vm("set_link gns3-{} off".format(adapter_number))
+                await self._set_link(adapter_number, False)
             await self._ubridge_send("bridge delete {name}".format(name="QEMU-{}-{}".format(self._id, adapter_number)))
 
         nio = adapter.get_nio(0)
@@ -1640,7 +1654,7 @@ class QemuVM(BaseNode):
     def _monitor_options(self):
 
         if self._monitor:
-            return ["-monitor", "tcp:{}:{},server,nowait".format(self._monitor_host, self._monitor)]
+            return ["-qmp", "tcp:{}:{},server,nowait".format(self._monitor_host, self._monitor)]
         else:
             return []
 
@@ -1674,15 +1688,31 @@ class QemuVM(BaseNode):
 
         qemu_img_path = self._get_qemu_img()
         try:
-            output = await subprocess_check_output(qemu_img_path, "info", "--output=json", disk)
-        except subprocess.SubprocessError as e:
-            raise QemuError("Error received while checking Qemu disk format: {}".format(e))
-        if output:
-            try:
-                json_data = json.loads(output)
-            except ValueError as e:
-                raise QemuError("Invalid JSON data returned by qemu-img: {}".format(e))
-            return json_data.get("format")
+            info = await self.manager.image_cache.info(qemu_img_path, disk)
+        except QemuImageCacheError as e:
+            raise QemuError(str(e))
+        return info["format"]
+
+    async def _check_disk_image(self, disk_image):
+        """
+        Checks a disk image for corruption and tries to fix it.
+
+        :param disk_image: path to the disk image
+
+        :returns: qemu-img check return code, after the image has been fixed
+        """
+
+        qemu_img_path = self._get_qemu_img()
+        retcode = await self._qemu_img_exec([qemu_img_path, "check", disk_image])
+        if retcode == 3:
+            # image has leaked clusters, but is not corrupted, let's try to fix it
+            log.warning("Qemu image {} has leaked clusters".format(disk_image))
+            retcode = await self._qemu_img_exec([qemu_img_path, "check", "-r", "leaks", "{}".format(disk_image)])
+        elif retcode == 2:
+            # image is corrupted, let's try to fix it
+            log.warning("Qemu image {} is corrupted".format(disk_image))
+            retcode = await self._qemu_img_exec([qemu_img_path, "check", "-r", "all", "{}".format(disk_image)])
+        return retcode
 
     async def _create_linked_clone(self, disk_name, disk_image, disk):
 
@@ -1698,6 +1728,18 @@ class QemuVM(BaseNode):
                 command = [qemu_img_path, "create", "-b", backing_options,
                            "-F", backing_file_format, "-f", "qcow2", "-u", disk, str(base_qcow2.size)]
             else:
+                # the virtual size of qcow2 and raw base images is known without qemu-img
+                if backing_file_format == "qcow2" and base_qcow2:
+                    size = base_qcow2.size
+                elif backing_file_format == "raw":
+                    # qemu-img rounds the size of raw images up to a sector
+                    size = (os.path.getsize(disk_image) + 511) // 512 * 512
+                else:
+                    size = None
+                if size is not None:
+                    Qcow2.create(disk, size, disk_image, backing_file_format)
+                    log.info("Created '{}' disk image on top of {}".format(disk_name, disk_image))
+                    return
                 command = [qemu_img_path, "create", "-o", "backing_file={}".format(disk_image),
                            "-F", backing_file_format, "-f", "qcow2", disk]
 
@@ -1707,7 +1749,7 @@ class QemuVM(BaseNode):
                 raise QemuError("Could not create '{}' disk image: qemu-img returned with {}\n{}".format(disk_name,
                                                                                                          retcode,
                                                                                                          stdout))
-        except (OSError, subprocess.SubprocessError) as e:
+        except (OSError, subprocess.SubprocessError, Qcow2Error) as e:
             stdout = self.read_qemu_img_stdout()
             raise QemuError("Could not create '{}' disk image: {}\n{}".format(disk_name, e, stdout))
 
@@ -1859,18 +1901,12 @@ class QemuVM(BaseNode):
                     raise QemuError("{} disk image '{}' is not accessible".format(disk_name, disk_image))
             else:
                 try:
-                    # check for corrupt disk image
-                    retcode = await self._qemu_img_exec([qemu_img_path, "check", disk_image])
+                    # check for corrupt disk image, the result is shared by the VMs using the same image
+                    retcode = await self.manager.image_cache.check(disk_image, lambda: self._check_disk_image(disk_image))
                     if retcode == 3:
-                        # image has leaked clusters, but is not corrupted, let's try to fix it
-                        log.warning("Qemu image {} has leaked clusters".format(disk_image))
-                        if await self._qemu_img_exec([qemu_img_path, "check", "-r", "leaks", "{}".format(disk_image)]) == 3:
-                            self.project.emit("log.warning", {"message": "Qemu image '{}' has leaked clusters and could not be fixed".format(disk_image)})
+                        self.project.emit("log.warning", {"message": "Qemu image '{}' has leaked clusters and could not be fixed".format(disk_image)})
                     elif retcode == 2:
-                        # image is corrupted, let's try to fix it
-                        log.warning("Qemu image {} is corrupted".format(disk_image))
-                        if await self._qemu_img_exec([qemu_img_path, "check", "-r", "all", "{}".format(disk_image)]) == 2:
-                            self.project.emit("log.warning", {"message": "Qemu image '{}' is corrupted and could not be fixed".format(disk_image)})
+                        self.project.emit("log.warning", {"message": "Qemu image '{}' is corrupted and could not be fixed".format(disk_image)})
                     # ignore retcode == 1.  One reason is that the image is encrypted and there is no encrypt.key-secret available
                 except (OSError, subprocess.SubprocessError) as e:
                     stdout = self.read_qemu_img_stdout()
@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2020 GNS3 Technologies Inc.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import json
+import asyncio
+import subprocess
+
+from gns3server.utils.asyncio import subprocess_check_output
+
+import logging
+log = logging.getLogger(__name__)
+
+
+class QemuImageCacheError(Exception):
+    pass
+
+
+class QemuImageCache:
+    """
+    Cache of the metadata of the disk images (format, virtual size and
+    result of the last check) used by the VMs of a compute.
+
+    The metadata of an image are kept as long as its size, modification
+    time and inode don't change, and the VMs asking for the same metadata
+    at the same time share the same qemu-img execution.
+    """
+
+    def __init__(self):
+
+        self._images = {}
+        self._pending = {}
+
+    @staticmethod
+    def _identity(path):
+        """
+        :returns: Tuple identifying the content of an image
+        """
+
+        path = os.path.realpath(path)
+        st = os.stat(path)
+        return path, st.st_size, st.st_mtime_ns, st.st_ino
+
+    def _metadata(self, identity):
+        """
+        :returns: Dictionary with the metadata of an image, empty if the image has changed
+        """
+
+        cached_identity, metadata = self._images.get(identity[0], (None, None))
+        if cached_identity != identity:
+            metadata = {}
+            self._images[identity[0]] = (identity, metadata)
+        return metadata
+
+    async def _get(self, path, key, compute):
+        """
+        Returns the cached value or compute it once for all the callers.
+
+        :param path: Path of the image
+        :param key: Metadata name
+        :param compute: Function returning a coroutine computing the metadata
+        """
+
+        identity = self._identity(path)
+        metadata = self._metadata(identity)
+        if key in metadata:
+            return metadata[key]
+
+        future = self._pending.get((key, identity))
+        if future is None:
+            future = self._pending[(key, identity)] = asyncio.ensure_future(compute())
+            future.add_done_callback(lambda f: self._pending.pop((key, identity), None))
+        value = await asyncio.shield(future)
+        # the image may have been changed by the computation (qemu-img check -r)
+        self._metadata(self._identity(path))[key] = value
+        return value
+
+    @staticmethod
+    async def _qemu_img_info(qemu_img_path, path):
+        """
+        :returns: JSON output of qemu-img info, None if there is no output
+        """
+
+        try:
+            output = await subprocess_check_output(qemu_img_path, "info", "--output=json", path)
+        except subprocess.SubprocessError as e:
+            raise QemuImageCacheError("Error received while checking Qemu disk format: {}".format(e))
+        if not output:
+            return None
+        try:
+            return json.loads(output)
+        except ValueError as e:
+            raise QemuImageCacheError("Invalid JSON data returned by qemu-img: {}".format(e))
+
+    async def info(self, qemu_img_path, path):
+        """
+        Returns the format and the virtual size of an image.
+
+        :param qemu_img_path: qemu-img binary path
+        :param path: Path of the image
+
+        :returns: Dictionary with the format and virtual_size keys
+        """
+
+        async def image_info():
+            info = await self._qemu_img_info(qemu_img_path, path) or {}
+            return {"format": info.get("format"), "virtual_size": info.get("virtual-size")}
+
+        return await self._get(path, "info", image_info)
+
+    async def check(self, path, check):
+        """
+        Returns the result of the check of an image,
+        the image is checked only when it has changed.
+
+        :param path: Path of the image
+        :param check: Function returning a coroutine checking the image and returning the qemu-img return code
+
+        :returns: qemu-img check return code
+        """
+
+        return await self._get(path, "check", check)
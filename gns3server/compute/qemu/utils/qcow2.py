@@ -21,6 +21,17 @@ import asyncio
 import struct
 
 
+QCOW2_MAGIC = 1363560955  # The first 4 bytes contain the characters 'Q', 'F', 'I' followed by 0xfb.
+# Fixed part of the header of the version 2 and version 3 images
+QCOW2_HEADER_FORMAT = ">IIQIIQIIQQIIQ"
+QCOW2_V3_HEADER_FORMAT = QCOW2_HEADER_FORMAT + "QQQII"
+# Header extensions
+QCOW2_EXT_END = 0x00000000
+QCOW2_EXT_BACKING_FORMAT = 0xE2792ACA
+# Maximum length of the backing file name accepted by QEMU
+QCOW2_MAX_BACKING_FILE_SIZE = 1023
+
+
 class Qcow2Error(Exception):
     pass
 
@@ -69,7 +80,7 @@ class Qcow2:
             except struct.error:
                 raise Qcow2Error("Invalid file header for {}".format(self._path))
 
-        if self.magic != 1363560955:  # The first 4 bytes contain the characters 'Q', 'F', 'I' followed by 0xfb.
+        if self.magic != QCOW2_MAGIC:
             raise Qcow2Error("Invalid magic for {}".format(self._path))
 
     @property
@@ -118,6 +129,145 @@ class Qcow2:
         except Qcow2Error:
             return (base_image, None)  # non-qcow2 base images are acceptable (e.g. vmdk, raw image)
 
+    @staticmethod
+    def _backing_file_extensions(backing_file_format):
+        """
+        :returns: Header extensions recording the format of the backing file
+        """
+
+        data = backing_file_format.encode()
+        padding = b"\0" * (-len(data) % 8)
+        return struct.pack(">II", QCOW2_EXT_BACKING_FORMAT, len(data)) + data + padding
+
+    @staticmethod
+    def create(path, size, backing_file, backing_file_format, cluster_bits=16):
+        """
+        Creates an empty qcow2 image on top of a backing file,
+        like "qemu-img create -b backing_file -F backing_file_format".
+
+        The image only contains the header, the refcount table, one refcount
+        block and the L1 table, all the data is read from the backing file.
+
+        :param path: Path of the new image
+        :param size: Virtual size of the image in bytes
+        :param backing_file: Path to the backing file
+        :param backing_file_format: File format of the backing file
+        :param cluster_bits: Number of bits of the offsets inside a cluster
+        """
+
+        cluster_size = 1 << cluster_bits
+        backing_file = backing_file.encode()
+        extensions = Qcow2._backing_file_extensions(backing_file_format) + struct.pack(">II", QCOW2_EXT_END, 0)
+        header_length = struct.calcsize(QCOW2_V3_HEADER_FORMAT)
+        backing_file_offset = header_length + len(extensions)
+        if len(backing_file) > QCOW2_MAX_BACKING_FILE_SIZE or backing_file_offset + len(backing_file) > cluster_size:
+            raise Qcow2Error("Backing file name is too long: {}".format(backing_file))
+
+        # each L2 table maps a cluster of 8 bytes entries to data clusters
+        l1_size = -(-size // (cluster_size * (cluster_size // 8)))
+        l1_clusters = max(1, -(-l1_size * 8 // cluster_size))
+        # header, refcount table, refcount block and L1 table
+        clusters = 3 + l1_clusters
+        if clusters > cluster_size // 2:
+            raise Qcow2Error("Image is too big to be created: {} bytes".format(size))
+
+        header = struct.pack(QCOW2_V3_HEADER_FORMAT,
+                             QCOW2_MAGIC,
+                             3,  # version
+                             backing_file_offset,
+                             len(backing_file),
+                             cluster_bits,
+                             size,
+                             0,  # crypt method
+                             l1_size,
+                             3 * cluster_size,  # L1 table offset
+                             cluster_size,  # refcount table offset
+                             1,  # refcount table clusters
+                             0,  # number of snapshots
+                             0,  # snapshots offset
+                             0,  # incompatible features
+                             0,  # compatible features
+                             0,  # autoclear features
+                             4,  # refcount order, 16 bits refcounts
+                             header_length)
+        refcount_table = struct.pack(">Q", 2 * cluster_size)
+        refcount_block = struct.pack(">{}H".format(clusters), *([1] * clusters))
+
+        with open(path, "wb") as f:
+            f.write(header + extensions + backing_file)
+            f.seek(cluster_size)
+            f.write(refcount_table)
+            f.seek(2 * cluster_size)
+            f.write(refcount_block)
+            # the L1 table is empty, QEMU only needs the file to cover its first sectors
+            f.truncate(3 * cluster_size + max(512, -(-l1_size * 8 // 512) * 512))
+
+    def _set_backing_file(self, backing_file, backing_file_format):
+        """
+        Rewrites the backing file name and format in the header, like
+        "qemu-img rebase -u" when all the header is in the first cluster.
+
+        :param backing_file: Path to the backing file
+        :param backing_file_format: File format of the backing file
+
+        :returns: False if the image layout is not supported
+        """
+
+        cluster_size = 1 << self.cluster_bits
+        with open(self._path, "r+b") as f:
+            header = f.read(cluster_size)
+            if self.version == 2:
+                header_length = struct.calcsize(QCOW2_HEADER_FORMAT)
+            elif self.version == 3:
+                header_length = struct.unpack_from(">I", header, 100)[0]
+            else:
+                return False
+            (l1_table_offset, refcount_table_offset) = struct.unpack_from(">QQ", header, 40)
+            (nb_snapshots, snapshots_offset) = struct.unpack_from(">IQ", header, 60)
+            if min(l1_table_offset, refcount_table_offset) < cluster_size or (nb_snapshots and snapshots_offset < cluster_size):
+                # something else than the header is in the first cluster
+                return False
+            if header_length > len(header) or self.backing_file_offset + self.backing_file_size > len(header):
+                return False
+
+            # keep the header extensions except the backing file format
+            extensions = b""
+            current_format = None
+            offset = header_length
+            while True:
+                if offset + 8 > len(header):
+                    return False
+                ext_type, ext_length = struct.unpack_from(">II", header, offset)
+                if ext_type == QCOW2_EXT_END:
+                    end = offset + 8
+                    break
+                ext_size = 8 + ext_length + (-ext_length % 8)
+                if ext_type == QCOW2_EXT_BACKING_FORMAT:
+                    current_format = header[offset + 8:offset + 8 + ext_length].decode(errors="replace")
+                else:
+                    extensions += header[offset:offset + ext_size]
+                offset += ext_size
+
+            if self.backing_file == backing_file and current_format == backing_file_format:
+                return True
+
+            backing_file = backing_file.encode()
+            extensions += Qcow2._backing_file_extensions(backing_file_format) + struct.pack(">II", QCOW2_EXT_END, 0)
+            backing_file_offset = header_length + len(extensions)
+            if len(backing_file) > QCOW2_MAX_BACKING_FILE_SIZE or backing_file_offset + len(backing_file) > cluster_size:
+                return False
+
+            new_header = bytearray(header[:header_length])
+            struct.pack_into(">QI", new_header, 8, backing_file_offset, len(backing_file))
+            new_header += extensions + backing_file
+            # clear what is left of the previous extensions and backing file name
+            old_end = max(end, self.backing_file_offset + self.backing_file_size)
+            new_header += b"\0" * max(0, old_end - len(new_header))
+            f.seek(0)
+            f.write(new_header)
+        self._reload()
+        return True
+
     async def rebase(self, qemu_img, base_image, backing_file_format):
         """
         Rebase a linked clone in order to use the correct disk
@@ -129,7 +279,11 @@ class Qcow2:
 
         if not os.path.exists(base_image):
             raise FileNotFoundError(base_image)
-        backing_options, _ = Qcow2.backing_options(base_image)
+        backing_options, base_qcow2 = Qcow2.backing_options(base_image)
+        if not (base_qcow2 and base_qcow2.crypt_method):
+            # only the header changes, qemu-img is used for the unusual image layouts
+            if self._set_backing_file(base_image, backing_file_format):
+                return
         command = [qemu_img, "rebase", "-u", "-b", backing_options, "-F", backing_file_format, self._path]
         process = await asyncio.create_subprocess_exec(*command)
         retcode = await process.wait()
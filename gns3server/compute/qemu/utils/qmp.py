@@ -0,0 +1,181 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2020 GNS3 Technologies Inc.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import json
+import time
+import asyncio
+import itertools
+
+import logging
+log = logging.getLogger(__name__)
+
+# Maximum size of a message received from QEMU
+READ_LIMIT = 1024 * 1024  # 1MB
+
+
+class QmpError(Exception):
+    pass
+
+
+class QmpClient:
+    """
+    Client of the QEMU Machine Protocol (QMP).
+
+    The connection to the monitor stays open while the VM is running,
+    each command is sent with its own id so several commands can be
+    waiting for their result at the same time, and the asynchronous
+    events sent by QEMU (STOP, RESUME, SHUTDOWN etc.) are passed to
+    a callback.
+
+    :param host: Host of the QMP server
+    :param port: Port of the QMP server
+    :param event_callback: Function called with the name and the data of each event
+    """
+
+    def __init__(self, host, port, event_callback=None):
+
+        self._host = host
+        self._port = port
+        self._event_callback = event_callback
+        self._reader = None
+        self._writer = None
+        self._read_task = None
+        self._pending = {}
+        self._ids = itertools.count(1)
+
+    @property
+    def connected(self):
+        """
+        :returns: True if the connection with QEMU is open
+        """
+
+        return self._writer is not None
+
+    async def connect(self, timeout=10):
+        """
+        Connects to QEMU, retries until the QMP server is listening.
+
+        :param timeout: Maximum time to wait for the QMP server
+        """
+
+        begin = time.time()
+        last_exception = None
+        while True:
+            try:
+                reader, writer = await asyncio.open_connection(self._host, self._port, limit=READ_LIMIT)
+                break
+            except OSError as e:
+                last_exception = e
+            if time.time() - begin >= timeout:
+                raise QmpError("Could not connect to QMP server on {}:{}: {}".format(self._host, self._port, last_exception))
+            await asyncio.sleep(0.01)
+
+        try:
+            # the server sends its version and capabilities first
+            greeting = json.loads((await asyncio.wait_for(reader.readline(), timeout=timeout)).decode("utf-8"))
+        except (OSError, ValueError, asyncio.TimeoutError) as e:
+            writer.close()
+            raise QmpError("Invalid greeting from QMP server on {}:{}: {}".format(self._host, self._port, e))
+        if "QMP" not in greeting:
+            writer.close()
+            raise QmpError("Invalid greeting from QMP server on {}:{}: {}".format(self._host, self._port, greeting))
+
+        self._reader = reader
+        self._writer = writer
+        self._read_task = asyncio.ensure_future(self._read())
+        # leave the capabilities negotiation mode
+        await self.execute("qmp_capabilities", timeout=timeout)
+        log.info("Connected to QMP server on {}:{} after {:.4f} seconds".format(self._host, self._port, time.time() - begin))
+
+    async def execute(self, command, arguments=None, timeout=30):
+        """
+        Executes a command, the command is sent without waiting
+        for the result of the previous ones.
+
+        :param command: QMP command (e.g. stop, query-status etc.)
+        :param arguments: Dictionary with the arguments of the command
+        :param timeout: Maximum time to wait for the result
+
+        :returns: result of the command
+        """
+
+        if self._writer is None:
+            raise ConnectionResetError("Not connected to QMP server on {}:{}".format(self._host, self._port))
+
+        command_id = next(self._ids)
+        message = {"execute": command, "id": command_id}
+        if arguments:
+            message["arguments"] = arguments
+        future = asyncio.get_event_loop().create_future()
+        self._pending[command_id] = future
+        try:
+            log.debug("Execute QMP command: {}".format(message))
+            self._writer.write(json.dumps(message).encode("utf-8") + b"\n")
+            return await asyncio.wait_for(future, timeout=timeout)
+        finally:
+            self._pending.pop(command_id, None)
+
+    async def _read(self):
+        """
+        Reads the results and the events sent by QEMU
+        """
+
+        try:
+            while True:
+                line = await self._reader.readline()
+                if not line:
+                    break
+                try:
+                    message = json.loads(line.decode("utf-8"))
+                except ValueError as e:
+                    log.warning("Invalid message from QMP server on {}:{}: {}".format(self._host, self._port, e))
+                    continue
+                if "event" in message:
+                    log.debug("Received QMP event: {}".format(message))
+                    if self._event_callback:
+                        self._event_callback(message["event"], message.get("data", {}))
+                    continue
+                future = self._pending.get(message.get("id"))
+                if future is None or future.done():
+                    continue
+                if "error" in message:
+                    future.set_exception(QmpError(message["error"].get("desc", "Unknown QMP error")))
+                else:
+                    future.set_result(message.get("return"))
+        except (OSError, ValueError) as e:
+            log.warning("Could not read from QMP server on {}:{}: {}".format(self._host, self._port, e))
+        finally:
+            self._disconnected()
+
+    def _disconnected(self):
+
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        for future in self._pending.values():
+            if not future.done():
+                future.set_exception(ConnectionResetError("Connection to QMP server on {}:{} closed".format(self._host, self._port)))
+
+    def close(self):
+        """
+        Closes the connection
+        """
+
+        if self._read_task is not None:
+            self._read_task.cancel()
+            self._read_task = None
+        self._disconnected()
@@ -205,6 +205,7 @@ class Controller:
                                                         "protocol": compute.protocol,
                                                         "user": compute.user,
                                                         "password": compute.password,
+                                                        "keep_alive": compute._keep_alive,
                                                         "compute_id": compute.id})
 
         try:
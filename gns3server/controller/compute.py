@@ -24,8 +24,10 @@ import json
 import uuid
 import sys
 import io
+import weakref
 from operator import itemgetter
 
+from ..config import Config
 from ..utils import parse_version
 from ..utils.asyncio import locking
 from ..controller.controller_error import ControllerError
@@ -35,6 +37,12 @@ from ..version import __version__, __version_info__
 import logging
 log = logging.getLogger(__name__)
 
+# Seconds before the list of interfaces of a compute is refreshed in background
+INTERFACES_CACHE_TTL = 300
+
+# Maximum number of UDP NIOs sent to a compute in a single request
+UDP_NIO_BATCH_SIZE = 50
+
 
 class ComputeError(ControllerError):
     pass
@@ -58,7 +66,7 @@ class Compute:
     """
 
     def __init__(self, compute_id, controller=None, protocol="http", host="localhost",
-                 port=3080, user=None, password=None, name=None, console_host=None, ssl_context=None):
+                 port=3080, user=None, password=None, name=None, console_host=None, ssl_context=None, keep_alive=None):
         self._http_session = None
         assert controller is not None
         log.info("Create compute %s", compute_id)
@@ -68,6 +76,15 @@ class Compute:
         else:
             self._id = compute_id
 
+        # Cache of interfaces on remote host
+        self._interfaces_cache = None
+        self._interfaces_updated = None
+        self._interfaces_refresh = None
+        # Incremented each time the host or the interfaces of the compute change
+        self._network_version = 0
+        # IPs to use for the communication with other computes
+        self._subnet_cache = weakref.WeakKeyDictionary()
+
         self.protocol = protocol
         self._console_host = console_host
         self.host = host
@@ -83,20 +100,28 @@ class Compute:
         self._memory_usage_percent = None
         self._last_error = None
         self._ssl_context = ssl_context
+        # Reuse connections to the compute instead of closing them after each query
+        self._keep_alive = keep_alive
         self._capabilities = {
             "version": None,
             "node_types": []
         }
         self.name = name
-        # Cache of interfaces on remote host
-        self._interfaces_cache = None
         self._connection_failure = 0
+        # UDP NIOs waiting to be sent, indexed by project ID
+        self._udp_nio_batches = {}
 
     def _session(self):
         if self._http_session is None or self._http_session.closed is True:
-            self._http_session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=None,
-                                                                                      force_close=True,
-                                                                                      ssl_context=self._ssl_context))
+            if self.keep_alive:
+                server_config = Config.instance().get_section_config("Server")
+                connector = aiohttp.TCPConnector(limit=None,
+                                                 limit_per_host=server_config.getint("compute_pool_size", 100),
+                                                 keepalive_timeout=server_config.getfloat("compute_keep_alive_timeout", 15),
+                                                 ssl_context=self._ssl_context)
+            else:
+                connector = aiohttp.TCPConnector(limit=None, force_close=True, ssl_context=self._ssl_context)
+            self._http_session = aiohttp.ClientSession(connector=connector)
         return self._http_session
 
     #def __del__(self):
@@ -135,12 +160,57 @@ class Compute:
     async def interfaces(self):
         """
         Get the list of network on compute
+
+        The list is cached, once it is older than INTERFACES_CACHE_TTL
+        it is still returned while being refreshed in background.
         """
+
         if not self._interfaces_cache:
-            response = await self.get("/network/interfaces")
-            self._interfaces_cache = response.json
+            # concurrent callers share the same query
+            await asyncio.shield(self._refresh_interfaces())
+        elif self._interfaces_updated is not None and asyncio.get_event_loop().time() - self._interfaces_updated > INTERFACES_CACHE_TTL:
+            self._refresh_interfaces(background=True)
         return self._interfaces_cache
 
+    def _refresh_interfaces(self, background=False):
+        """
+        Start a refresh of the list of interfaces unless one is already running.
+
+        :param background: Log the errors instead of raising them
+
+        :returns: Future of the refresh
+        """
+
+        if self._interfaces_refresh is None or self._interfaces_refresh.done():
+            self._interfaces_refresh = asyncio.ensure_future(self._fetch_interfaces())
+            if background:
+                self._interfaces_refresh.add_done_callback(self._interfaces_refreshed)
+        return self._interfaces_refresh
+
+    def _interfaces_refreshed(self, future):
+
+        if not future.cancelled() and future.exception():
+            log.warning("Cannot refresh the interfaces of compute '{}': {}".format(self._id, future.exception()))
+
+    async def _fetch_interfaces(self):
+
+        response = await self.get("/network/interfaces")
+        if response.json != self._interfaces_cache:
+            self._interfaces_cache = response.json
+            self._network_version += 1
+        self._interfaces_updated = asyncio.get_event_loop().time()
+
+    def _invalidate_network_cache(self):
+        """
+        Forget the interfaces and the IPs used to reach other computes,
+        the host or the network of the compute may have changed.
+        """
+
+        self._interfaces_cache = None
+        self._interfaces_updated = None
+        self._network_version += 1
+        self._subnet_cache.clear()
+
     async def update(self, **kwargs):
         for kw in kwargs:
             if kw not in ("user", "password"):
@@ -187,6 +257,26 @@ class Compute:
             else:
                 self._name = "{}://{}:{}".format(self._protocol, self._host, self._port)
 
+    @property
+    def keep_alive(self):
+        """
+        :returns: True if connections to the compute are kept alive and reused
+        """
+
+        if self._keep_alive is None:
+            return Config.instance().get_section_config("Server").getboolean("compute_keep_alive", False)
+        return self._keep_alive
+
+    @keep_alive.setter
+    def keep_alive(self, keep_alive):
+        old_keep_alive = self.keep_alive
+        self._keep_alive = keep_alive
+        if self.keep_alive != old_keep_alive and self._http_session is not None:
+            # the next requests use a session with the new connection pooling
+            if not self._http_session.closed:
+                asyncio.ensure_future(self._http_session.close())
+            self._http_session = None
+
     @property
     def connected(self):
         """
@@ -221,6 +311,7 @@ class Compute:
     @host.setter
     def host(self, host):
         self._host = host
+        self._invalidate_network_cache()
         if self._console_host is None:
             self._console_host = host
 
@@ -293,6 +384,7 @@ class Compute:
             "host": self._host,
             "port": self._port,
             "user": self._user,
+            "keep_alive": self.keep_alive,
             "connected": self._connected,
             "cpu_usage_percent": self._cpu_usage_percent,
             "memory_usage_percent": self._memory_usage_percent,
@@ -300,36 +392,48 @@ class Compute:
             "last_error": self._last_error
         }
 
-    async def download_file(self, project, path):
+    async def download_file(self, project, path, offset=0):
         """
         Read file of a project and download it
 
         :param project: A project object
         :param path: The path of the file in the project
+        :param offset: Resume the download at this offset, the status of the response is 206 if the compute supports it
         :returns: A file stream
         """
 
         url = self._getUrl("/projects/{}/files/{}".format(project.id, path))
-        response = await self._session().request("GET", url, auth=self._auth)
+        response = await self._session().request("GET", url, auth=self._auth, **self._range_headers(offset))
         if response.status == 404:
             raise aiohttp.web.HTTPNotFound(text="File '{}' not found on compute".format(path))
         return response
 
-    async def download_image(self, image_type, image):
+    async def download_image(self, image_type, image, offset=0):
         """
         Read file of a project and download it
 
         :param image_type: Image type
         :param image: The path of the image
+        :param offset: Resume the download at this offset, the status of the response is 206 if the compute supports it
         :returns: A file stream
         """
 
         url = self._getUrl("/{}/images/{}".format(image_type, image))
-        response = await self._session().request("GET", url, auth=self._auth)
+        response = await self._session().request("GET", url, auth=self._auth, **self._range_headers(offset))
         if response.status == 404:
             raise aiohttp.web.HTTPNotFound(text="Image '{}' not found on compute".format(image))
         return response
 
+    @staticmethod
+    def _range_headers(offset):
+        """
+        :returns: request arguments to download a file from an offset
+        """
+
+        if offset:
+            return {"headers": {"Range": "bytes={}-".format(offset)}}
+        return {}
+
     async def http_query(self, method, path, data=None, dont_connect=False, **kwargs):
         """
         :param dont_connect: If true do not reconnect if not connected
@@ -418,6 +522,8 @@ class Compute:
                     self._controller.notification.controller_emit("log.warning", {"message": msg})
 
             self._notifications = asyncio.gather(self._connect_notification())
+            # the compute may have been restarted with another network configuration
+            self._invalidate_network_cache()
             self._connected = True
             self._connection_failure = 0
             self._last_error = None
@@ -441,7 +547,7 @@ class Compute:
                         if action == "ping":
                             self._cpu_usage_percent = event["cpu_usage_percent"]
                             self._memory_usage_percent = event["memory_usage_percent"]
-                            #FIXME: slow down number of compute events
+                            # compute.updated notifications are rate limited by the controller notification manager
                             self._controller.notification.controller_emit("compute.updated", self.__json__())
                         else:
                             await self._controller.notification.dispatch(action, event, project_id=project_id, compute_id=self.id)
@@ -458,6 +564,9 @@ class Compute:
         finally:
             self._connected = False
             log.info("Connection closed to compute '{}' WebSocket '{}'".format(self._id, ws_url))
+            if self.keep_alive and self._http_session and not self._http_session.closed:
+                # Drop the pooled connections, the compute may have been restarted
+                await self._http_session.close()
 
         # Try to reconnect after 1 second if server unavailable only if not during tests (otherwise we create a ressources usage bomb)
         if not hasattr(sys, "_called_from_test") or not sys._called_from_test:
@@ -509,9 +618,18 @@ class Compute:
                     headers['content-type'] = 'application/octet-stream'
                 else:
                     data = json.dumps(data).encode("utf-8")
+            if self.keep_alive:
+                headers['X-GNS3-Keep-Alive'] = 'true'
         try:
             log.debug("Attempting request to compute: {method} {url} {headers}".format(method=method, url=url, headers=headers))
-            response = await self._session().request(method, url, headers=headers, data=data, auth=self._auth, chunked=chunked, timeout=timeout)
+            try:
+                response = await self._session().request(method, url, headers=headers, data=data, auth=self._auth, chunked=chunked, timeout=timeout)
+            except (aiohttp.ServerDisconnectedError, aiohttp.ClientOSError):
+                if not self.keep_alive or chunked or method not in ("GET", "PUT", "DELETE"):
+                    raise
+                # The compute may have closed an idle connection of the pool, retry once with a new connection
+                log.debug("Connection to compute '{}' lost, retrying {} {}".format(self._id, method, url))
+                response = await self._session().request(method, url, headers=headers, data=data, auth=self._auth, chunked=chunked, timeout=timeout)
         except asyncio.TimeoutError:
             raise ComputeError("Timeout error for {} call to {} after {}s".format(method, url, timeout))
         except (aiohttp.ClientError, aiohttp.ServerDisconnectedError, ValueError, KeyError, socket.gaierror) as e:
@@ -621,13 +739,84 @@ class Compute:
         res = await self.http_query("GET", path, timeout=None)
         return res.json
 
+    def add_udp_nio(self, project_id, node_type, node_id, adapter_number, port_number, nio):
+        """
+        Add an UDP NIO to a node. The NIOs requested during the same
+        iteration of the event loop are sent in requests of at most
+        UDP_NIO_BATCH_SIZE NIOs.
+
+        :param project_id: Project UUID
+        :param node_type: Type of the node
+        :param node_id: Node UUID
+        :param adapter_number: Adapter number
+        :param port_number: Port number
+        :param nio: NIO settings
+
+        :returns: Future of the NIO created by the compute
+        """
+
+        loop = asyncio.get_event_loop()
+        batch = self._udp_nio_batches.get(project_id)
+        if batch is None or len(batch) >= UDP_NIO_BATCH_SIZE:
+            batch = self._udp_nio_batches[project_id] = []
+            loop.call_soon(lambda: asyncio.ensure_future(self._send_udp_nios(project_id, batch)))
+        future = loop.create_future()
+        batch.append(({"node_type": node_type,
+                       "node_id": node_id,
+                       "adapter_number": adapter_number,
+                       "port_number": port_number,
+                       "nio": nio}, future))
+        return future
+
+    async def _send_udp_nios(self, project_id, batch):
+        """
+        Send a batch of UDP NIOs of a project
+        """
+
+        if self._udp_nio_batches.get(project_id) is batch:
+            del self._udp_nio_batches[project_id]
+        try:
+            response = await self.post("/projects/{}/nios/udp".format(project_id), data={"nios": [settings for settings, _ in batch]}, timeout=120)
+        except asyncio.CancelledError:
+            for _, future in batch:
+                future.cancel()
+            raise
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future), result in zip(batch, response.json["nios"]):
+            if future.done():
+                continue
+            if result["status"] < 300:
+                future.set_result(result["nio"])
+            elif result["status"] == 404:
+                future.set_exception(aiohttp.web.HTTPNotFound(text=result["message"]))
+            else:
+                future.set_exception(aiohttp.web.HTTPConflict(text=result["message"]))
+
     async def get_ip_on_same_subnet(self, other_compute):
         """
         Try to find the best ip for communication from one compute
         to another
 
+        The result is cached until the host or the interfaces
+        of one of the computes change.
+
         :returns: Tuple (ip_for_this_compute, ip_for_other_compute)
         """
+
+        cached = self._subnet_cache.get(other_compute)
+        if cached and cached[0] == (self._network_version, other_compute._network_version):
+            return cached[1]
+        ips = await self._find_ip_on_same_subnet(other_compute)
+        self._subnet_cache[other_compute] = ((self._network_version, other_compute._network_version), ips)
+        return ips
+
+    async def _find_ip_on_same_subnet(self, other_compute):
+
         if other_compute == self:
             return (self.host_ip, self.host_ip)
 
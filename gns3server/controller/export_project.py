@@ -18,18 +18,28 @@
 import os
 import sys
 import json
+import uuid
 import asyncio
 import aiofiles
 import aiohttp
-import zipfile
 import tempfile
 
 from datetime import datetime
 
+from ..utils.asyncio import wait_run_in_executor
+from ..utils.asyncio.pool import Pool
+from ..utils.checksum import INDEX_FILENAME
+from ..utils.file_copy import clone_file
+from .snapshot_store import SnapshotStore
+
 import logging
 log = logging.getLogger(__name__)
 
 CHUNK_SIZE = 1024 * 8  # 8KB
+# Number of files downloaded at the same time from each compute
+DOWNLOAD_CONCURRENCY = 4
+# Number of attempts to download a file when the transfer is interrupted
+DOWNLOAD_RETRIES = 3
 
 
 async def export_project(zstream, project, temporary_dir, include_images=False, include_snapshots=False, keep_compute_id=False, allow_all_nodes=False, reset_mac_addresses=False):
@@ -54,7 +64,7 @@ async def export_project(zstream, project, temporary_dir, include_images=False,
         raise aiohttp.web.HTTPConflict(text="Project must be stopped in order to export it")
 
     # Make sure we save the project
-    project.dump()
+    await project.save()
 
     if not os.path.exists(project._path):
         raise aiohttp.web.HTTPNotFound(text="Project could not be found at '{}'".format(project._path))
@@ -64,8 +74,21 @@ async def export_project(zstream, project, temporary_dir, include_images=False,
         if file.endswith(".gns3"):
             await _patch_project_file(project, os.path.join(project._path, file), zstream, include_images, keep_compute_id, allow_all_nodes, temporary_dir, reset_mac_addresses)
 
+    store = SnapshotStore(os.path.join(project._path, "snapshots", "store"))
+    snapshot_objects = None
+    if include_snapshots:
+        # We import it at the last time to avoid circular dependencies
+        from .snapshot import snapshot_files
+
+        # only the files of the store used by a snapshot are exported
+        snapshot_objects = {store.object_path(md5) for md5 in snapshot_files(project) or ()}
+
     # Export the local files
     for root, dirs, files in os.walk(project._path, topdown=True, followlinks=False):
+        if os.path.commonpath([root, store.path]) == store.path:
+            if snapshot_objects is None:
+                continue
+            files = [f for f in files if os.path.join(root, f) in snapshot_objects]
         try:
             files = [f for f in files if _is_exportable(os.path.join(root, f), include_snapshots)]
             for file in files:
@@ -88,29 +111,148 @@ async def export_project(zstream, project, temporary_dir, include_images=False,
             continue
 
     # Export files from remote computes
-    for compute in project.computes:
-        if compute.id != "local":
-            compute_files = await compute.list_files(project)
-            for compute_file in compute_files:
-                if _is_exportable(compute_file["path"], include_snapshots):
-                    log.debug("Downloading file '{}' from compute '{}'".format(compute_file["path"], compute.id))
-                    response = await compute.download_file(project, compute_file["path"])
-                    if response.status != 200:
-                        log.warning("Cannot export file from compute '{}'. Compute returned status code {}.".format(compute.id, response.status))
-                        continue
-                    (fd, temp_path) = tempfile.mkstemp(dir=temporary_dir)
-                    async with aiofiles.open(fd, 'wb') as f:
-                        while True:
-                            try:
-                                data = await response.content.read(CHUNK_SIZE)
-                            except asyncio.TimeoutError:
-                                raise aiohttp.web.HTTPRequestTimeout(text="Timeout when downloading file '{}' from remote compute {}:{}".format(compute_file["path"], compute.host, compute.port))
-                            if not data:
-                                break
-                            await f.write(data)
-                    response.close()
-                    _patch_mtime(temp_path)
-                    zstream.write(temp_path, arcname=compute_file["path"])
+    remote_computes = [compute for compute in project.computes if compute.id != "local"]
+    if remote_computes:
+        cache = SnapshotStore(export_cache_path(project))
+        # the files of the store are not deleted by a snapshot deletion during the export
+        async with project.snapshot_lock:
+            results = await asyncio.gather(*[_fetch_compute_files(project, compute, store, cache, include_snapshots) for compute in remote_computes])
+            compute_files = [compute_file for files in results for compute_file in files]
+            # the zip stream is read after the export, it reads links to the files of the stores
+            paths = await wait_run_in_executor(_link_store_files, compute_files, temporary_dir)
+            # only the files of the last export are kept in the cache
+            deleted = await wait_run_in_executor(cache.collect_garbage, {md5 for _, md5, _ in compute_files})
+            log.debug("{} files deleted from the export cache".format(deleted))
+        for arcname, md5, _ in compute_files:
+            _patch_mtime(paths[md5])
+            zstream.write(paths[md5], arcname=arcname)
+
+
+def export_cache_path(project):
+    """
+    Returns the directory caching the files downloaded from the remote
+    computes by the last export of a project. It is not exported and
+    not saved in the snapshots.
+
+    :param project: Project instance
+    """
+
+    return os.path.join(project.path, "project-files", "tmp", "export")
+
+
+def _link_store_files(compute_files, temporary_dir):
+    """
+    Links files of the stores to a temporary directory, they are copied
+    if the filesystem does not support hard links or if their modification
+    time must be patched (a link shares the modification time of the stored file).
+
+    :param compute_files: list of (path in the project, checksum, path of the stored file)
+
+    :returns: dictionary of the paths in the temporary directory indexed by checksum
+    """
+
+    paths = {}
+    directory = tempfile.mkdtemp(dir=temporary_dir)
+    for _, md5, object_path in compute_files:
+        if md5 in paths:
+            continue
+        path = os.path.join(directory, md5)
+        try:
+            if _before_1980(os.stat(object_path).st_mtime):
+                raise OSError("The modification time of the file must be patched")
+            os.link(object_path, path)
+        except OSError:
+            clone_file(object_path, path)
+        paths[md5] = path
+    return paths
+
+
+async def _fetch_compute_files(project, compute, store, cache, include_snapshots):
+    """
+    Download the files of a project from a remote compute to the export cache of the project.
+    Files already in the snapshot store or in the cache are not downloaded again and several
+    files are downloaded at the same time.
+
+    :returns: list of (path in the project, checksum, path of the stored file)
+    """
+
+    files = []
+
+    async def fetch(compute_file):
+        path = os.path.join(cache.path, "partial", str(uuid.uuid4()))
+        log.debug("Downloading file '{}' from compute '{}'".format(compute_file["path"], compute.id))
+        try:
+            if not await _download(lambda offset: compute.download_file(project, compute_file["path"], offset=offset), path, compute_file["path"]):
+                log.warning("Cannot export file '{}' from compute '{}'".format(compute_file["path"], compute.id))
+                return
+            md5 = await wait_run_in_executor(cache.add, path, True)
+        finally:
+            # remove the partial download if the file has not been added to the cache
+            if os.path.exists(path):
+                os.remove(path)
+        if compute_file.get("md5sum") not in (None, md5):
+            log.warning("File '{}' from compute '{}' has changed during the export".format(compute_file["path"], compute.id))
+        files.append((compute_file["path"], md5, cache.object_path(md5)))
+
+    pool = Pool(concurrency=DOWNLOAD_CONCURRENCY)
+    for compute_file in await compute.list_files(project):
+        if not _is_exportable(compute_file["path"], include_snapshots):
+            continue
+        md5 = compute_file.get("md5sum")
+        if md5 and store.has(md5):
+            # the file has not changed since the last snapshot
+            files.append((compute_file["path"], md5, store.object_path(md5)))
+        elif md5 and cache.has(md5):
+            # the file has not changed since the last export
+            files.append((compute_file["path"], md5, cache.object_path(md5)))
+        else:
+            pool.append(fetch, compute_file)
+    await pool.join()
+    return files
+
+
+async def _download(request, path, name):
+    """
+    Download a file, an interrupted download is resumed where it stopped.
+
+    :param request: function called with an offset, returns the response of a download request
+    :param path: destination of the file
+    :param name: name of the file on the compute
+
+    :returns: False if the file is not available
+    """
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    for attempt in range(DOWNLOAD_RETRIES):
+        try:
+            offset = os.path.getsize(path)
+        except OSError:
+            offset = 0
+        response = None
+        try:
+            response = await request(offset)
+            if response.status == 200:
+                # the download starts from the beginning
+                mode = "wb"
+            elif response.status == 206:
+                mode = "ab"
+            else:
+                log.warning("Cannot download file. Compute returned status code {}.".format(response.status))
+                return False
+            async with aiofiles.open(path, mode) as f:
+                while True:
+                    data = await response.content.read(CHUNK_SIZE)
+                    if not data:
+                        break
+                    await f.write(data)
+            return True
+        except (asyncio.TimeoutError, aiohttp.ClientError) as e:
+            if attempt == DOWNLOAD_RETRIES - 1:
+                raise aiohttp.web.HTTPRequestTimeout(text="Cannot download file '{}' from compute: {}".format(name, e))
+            log.warning("Download interrupted ({}), resuming".format(e))
+        finally:
+            if response is not None:
+                response.close()
 
 
 def _patch_mtime(path):
@@ -124,12 +266,19 @@ def _patch_mtime(path):
         # only UNIX type platforms
         return
     st = os.stat(path)
-    file_date = datetime.fromtimestamp(st.st_mtime)
-    if file_date.year < 1980:
-        new_mtime = file_date.replace(year=1980).timestamp()
+    if _before_1980(st.st_mtime):
+        new_mtime = datetime.fromtimestamp(st.st_mtime).replace(year=1980).timestamp()
         os.utime(path, (st.st_atime, new_mtime))
 
 
+def _before_1980(mtime):
+    """
+    :returns: True if a modification time cannot be stored in a ZIP file
+    """
+
+    return datetime.fromtimestamp(mtime).year < 1980
+
+
 def _is_exportable(path, include_snapshots=False):
     """
     :returns: True if file should not be included in the final archive
@@ -162,6 +311,10 @@ def _is_exportable(path, include_snapshots=False):
     filename = os.path.basename(path)
     if filename.endswith('_log.txt') or filename.endswith('.log') or filename == '.DS_Store':
         return False
+
+    # do not export the checksum index of the compute
+    if filename.startswith(INDEX_FILENAME):
+        return False
     return True
 
 
@@ -232,8 +385,10 @@ async def _patch_project_file(project, path, zstream, include_images, keep_compu
         (i['compute_id'], i['image_type'], i['image'])
         for i in images if i['compute_id'] != 'local'])
 
+    pools = {}
     for compute_id, image_type, image in remote_images:
-        await _export_remote_images(project, compute_id, image_type, image, zstream, temporary_dir)
+        pools.setdefault(compute_id, Pool(concurrency=DOWNLOAD_CONCURRENCY)).append(_export_remote_images, project, compute_id, image_type, image, zstream, temporary_dir)
+    await asyncio.gather(*[pool.join() for pool in pools.values()])
 
     zstream.writestr("project.gns3", json.dumps(topology).encode())
     return images
@@ -279,20 +434,9 @@ async def _export_remote_images(project, compute_id, image_type, image, project_
     except IndexError:
         raise aiohttp.web.HTTPConflict(text="Cannot export image from '{}' compute. Compute doesn't exist.".format(compute_id))
 
-    response = await compute.download_image(image_type, image)
-    if response.status != 200:
-        raise aiohttp.web.HTTPConflict(text="Cannot export image from compute '{}'. Compute returned status code {}.".format(compute_id, response.status))
-
     (fd, temp_path) = tempfile.mkstemp(dir=temporary_dir)
-    async with aiofiles.open(fd, 'wb') as f:
-        while True:
-            try:
-                data = await response.content.read(CHUNK_SIZE)
-            except asyncio.TimeoutError:
-                raise aiohttp.web.HTTPRequestTimeout(text="Timeout when downloading image '{}' from remote compute {}:{}".format(image, compute.host, compute.port))
-            if not data:
-                break
-            await f.write(data)
-    response.close()
+    os.close(fd)
+    if not await _download(lambda offset: compute.download_image(image_type, image, offset=offset), temp_path, image):
+        raise aiohttp.web.HTTPConflict(text="Cannot export image '{}' from compute '{}'".format(image, compute_id))
     arcname = os.path.join("images", image_type, image)
-    project_zipfile.write(temp_path, arcname=arcname, compress_type=zipfile.ZIP_DEFLATED)
+    project_zipfile.write(temp_path, arcname=arcname)
@@ -17,9 +17,11 @@
 
 import os
 import sys
+import zlib
 import json
 import uuid
 import shutil
+import asyncio
 import zipfile
 import aiohttp
 import aiofiles
@@ -27,12 +29,20 @@ import itertools
 import tempfile
 
 from .topology import load_topology
+from .snapshot_store import SnapshotStore
 from ..utils.asyncio import wait_run_in_executor
 from ..utils.asyncio import aiozipstream
+from ..utils.asyncio.pool import Pool
 
 import logging
 log = logging.getLogger(__name__)
 
+CHUNK_SIZE = 1024 * 8  # 8KB
+# Number of files extracted or uploaded at the same time for each destination
+IMPORT_CONCURRENCY = 4
+# Loading a topology older than this revision may move the project files
+EXTRACT_ALL_REVISION = 7
+
 """
 Handle the import of project from a .gns3project
 """
@@ -59,101 +69,123 @@ async def import_project(controller, project_id, stream, location=None, name=Non
         raise aiohttp.web.HTTPConflict(text="The destination path should not contain .gns3")
 
     try:
-        with zipfile.ZipFile(stream) as zip_file:
-            project_file = zip_file.read("project.gns3").decode()
+        zip_file = zipfile.ZipFile(stream)
     except zipfile.BadZipFile:
         raise aiohttp.web.HTTPConflict(text="Cannot import project, not a GNS3 project (invalid zip)")
-    except KeyError:
-        raise aiohttp.web.HTTPConflict(text="Cannot import project, project.gns3 file could not be found")
 
-    try:
-        topology = json.loads(project_file)
-        # We import the project on top of an existing project (snapshots)
-        if topology["project_id"] == project_id:
-            project_name = topology["name"]
-        else:
-            # If the project name is already used we generate a new one
-            if name:
-                project_name = controller.get_free_project_name(name)
+    with zip_file:
+        try:
+            project_file = zip_file.read("project.gns3")
+        except KeyError:
+            raise aiohttp.web.HTTPConflict(text="Cannot import project, project.gns3 file could not be found")
+        except zipfile.BadZipFile:
+            raise aiohttp.web.HTTPConflict(text="Cannot import project, not a GNS3 project (invalid zip)")
+
+        try:
+            topology = json.loads(project_file.decode())
+            # We import the project on top of an existing project (snapshots)
+            if topology["project_id"] == project_id:
+                project_name = topology["name"]
             else:
-                project_name = controller.get_free_project_name(topology["name"])
-    except (ValueError, KeyError):
-        raise aiohttp.web.HTTPConflict(text="Cannot import project, the project.gns3 file is corrupted")
-
-    if location:
-        path = location
-    else:
-        projects_path = controller.projects_directory()
-        path = os.path.join(projects_path, project_id)
-    try:
-        os.makedirs(path, exist_ok=True)
-    except UnicodeEncodeError:
-        raise aiohttp.web.HTTPConflict(text="The project name contain non supported or invalid characters")
-
-    try:
-        with zipfile.ZipFile(stream) as zip_file:
-            await wait_run_in_executor(zip_file.extractall, path)
-    except zipfile.BadZipFile:
-        raise aiohttp.web.HTTPConflict(text="Cannot extract files from GNS3 project (invalid zip)")
-
-    topology = load_topology(os.path.join(path, "project.gns3"))
-    topology["name"] = project_name
-    # To avoid unexpected behavior (project start without manual operations just after import)
-    topology["auto_start"] = auto_start
-    topology["auto_open"] = auto_open
-    topology["auto_close"] = auto_close
-
-    # Generate a new node id
-    node_old_to_new = {}
-    for node in topology["topology"]["nodes"]:
-        if "node_id" in node:
-            node_old_to_new[node["node_id"]] = str(uuid.uuid4())
-            _move_node_file(path, node["node_id"], node_old_to_new[node["node_id"]])
-            node["node_id"] = node_old_to_new[node["node_id"]]
+                # If the project name is already used we generate a new one
+                if name:
+                    project_name = controller.get_free_project_name(name)
+                else:
+                    project_name = controller.get_free_project_name(topology["name"])
+        except (ValueError, KeyError):
+            raise aiohttp.web.HTTPConflict(text="Cannot import project, the project.gns3 file is corrupted")
+
+        if location:
+            path = location
         else:
-            node["node_id"] = str(uuid.uuid4())
-
-    # Update link to use new id
-    for link in topology["topology"]["links"]:
-        link["link_id"] = str(uuid.uuid4())
-        for node in link["nodes"]:
-            node["node_id"] = node_old_to_new[node["node_id"]]
-
-    # Generate new drawings id
-    for drawing in topology["topology"]["drawings"]:
-        drawing["drawing_id"] = str(uuid.uuid4())
-
-    # Modify the compute id of the node depending of compute capacity
-    if not keep_compute_id:
-        # For some VM type we move them to the GNS3 VM if possible
-        # unless it's a linux host without GNS3 VM
-        if not sys.platform.startswith("linux") or controller.has_compute("vm"):
-            for node in topology["topology"]["nodes"]:
-                if node["node_type"] in ("docker", "qemu", "iou", "nat"):
-                    node["compute_id"] = "vm"
+            projects_path = controller.projects_directory()
+            path = os.path.join(projects_path, project_id)
+        try:
+            os.makedirs(path, exist_ok=True)
+        except UnicodeEncodeError:
+            raise aiohttp.web.HTTPConflict(text="The project name contain non supported or invalid characters")
+
+        # The conversion of topologies older than this revision moves the
+        # project files, they must be extracted before loading the topology
+        extract_all = not isinstance(topology.get("revision"), int) or topology["revision"] < EXTRACT_ALL_REVISION
+        if extract_all:
+            try:
+                await wait_run_in_executor(zip_file.extractall, path)
+            except zipfile.BadZipFile:
+                raise aiohttp.web.HTTPConflict(text="Cannot extract files from GNS3 project (invalid zip)")
         else:
-            # Round-robin through available compute resources.
-            # computes = []
-            # for compute_id in controller.computes:
-            #     compute = controller.get_compute(compute_id)
-            #     # only use the local compute or any connected compute
-            #     if compute_id == "local" or compute.connected:
-            #         computes.append(compute_id)
-            #     else:
-            #         log.warning(compute.name, "is not connected!")
-            compute_nodes = itertools.cycle(controller.computes)
+            with open(os.path.join(path, "project.gns3"), "wb") as f:
+                f.write(project_file)
+
+        topology = load_topology(os.path.join(path, "project.gns3"))
+        topology["name"] = project_name
+        # To avoid unexpected behavior (project start without manual operations just after import)
+        topology["auto_start"] = auto_start
+        topology["auto_open"] = auto_open
+        topology["auto_close"] = auto_close
+
+        # Generate a new node id
+        node_old_to_new = {}
+        for node in topology["topology"]["nodes"]:
+            if "node_id" in node:
+                node_old_to_new[node["node_id"]] = str(uuid.uuid4())
+                if extract_all:
+                    _move_node_file(path, node["node_id"], node_old_to_new[node["node_id"]])
+                node["node_id"] = node_old_to_new[node["node_id"]]
+            else:
+                node["node_id"] = str(uuid.uuid4())
+
+        # Update link to use new id
+        for link in topology["topology"]["links"]:
+            link["link_id"] = str(uuid.uuid4())
+            for node in link["nodes"]:
+                node["node_id"] = node_old_to_new[node["node_id"]]
+
+        # Generate new drawings id
+        for drawing in topology["topology"]["drawings"]:
+            drawing["drawing_id"] = str(uuid.uuid4())
+
+        # Modify the compute id of the node depending of compute capacity
+        if not keep_compute_id:
+            # For some VM type we move them to the GNS3 VM if possible
+            # unless it's a linux host without GNS3 VM
+            if not sys.platform.startswith("linux") or controller.has_compute("vm"):
+                for node in topology["topology"]["nodes"]:
+                    if node["node_type"] in ("docker", "qemu", "iou", "nat"):
+                        node["compute_id"] = "vm"
+            else:
+                # Round-robin through available compute resources.
+                # computes = []
+                # for compute_id in controller.computes:
+                #     compute = controller.get_compute(compute_id)
+                #     # only use the local compute or any connected compute
+                #     if compute_id == "local" or compute.connected:
+                #         computes.append(compute_id)
+                #     else:
+                #         log.warning(compute.name, "is not connected!")
+                compute_nodes = itertools.cycle(controller.computes)
+                for node in topology["topology"]["nodes"]:
+                    node["compute_id"] = next(compute_nodes)
+
+        # Project created on the remote computes
+        remote_nodes = {}
+        computes = {}
+        for node in topology["topology"]["nodes"]:
+            if node["compute_id"] != "local":
+                if node["compute_id"] not in computes:
+                    computes[node["compute_id"]] = controller.get_compute(node["compute_id"])
+                remote_nodes[node["node_id"]] = computes[node["compute_id"]]
+        await asyncio.gather(*[compute.post("/projects", data={"name": project_name, "project_id": project_id}) for compute in computes.values()])
+
+        if extract_all:
             for node in topology["topology"]["nodes"]:
-                node["compute_id"] = next(compute_nodes)
-
-    compute_created = set()
-    for node in topology["topology"]["nodes"]:
-        if node["compute_id"] != "local":
-            # Project created on the remote GNS3 VM?
-            if node["compute_id"] not in compute_created:
-                compute = controller.get_compute(node["compute_id"])
-                await compute.post("/projects", data={"name": project_name, "project_id": project_id,})
-                compute_created.add(node["compute_id"])
-            await _move_files_to_compute(compute, project_id, path, os.path.join("project-files", node["node_type"], node["node_id"]))
+                if node["node_id"] in remote_nodes:
+                    await _move_files_to_compute(remote_nodes[node["node_id"]], project_id, path, os.path.join("project-files", node["node_type"], node["node_id"]))
+        else:
+            try:
+                await _extract_files(controller, zip_file, path, project_id, node_old_to_new, remote_nodes)
+            except zipfile.BadZipFile:
+                raise aiohttp.web.HTTPConflict(text="Cannot extract files from GNS3 project (invalid zip)")
 
     # And we dump the updated.gns3
     dot_gns3_path = os.path.join(path, project_name + ".gns3")
@@ -169,12 +201,144 @@ async def import_project(controller, project_id, stream, location=None, name=Non
 
     snapshots_path = os.path.join(path, "snapshots")
     if os.path.exists(snapshots_path):
-        await _import_snapshots(snapshots_path, project_name, project_id)
+        await _import_snapshots(snapshots_path, project_name, project_id, topology, node_old_to_new)
 
     project = await controller.load_project(dot_gns3_path, load=False)
     return project
 
 
+async def _extract_files(controller, zip_file, path, project_id, node_ids, remote_nodes):
+    """
+    Extract the files of a project archive directly to their destination: the
+    project directory, the images directory or the project on a remote compute.
+    Several files are extracted at the same time and the progress is sent with
+    "project.importing" notifications.
+
+    :param controller: GNS3 Controller
+    :param zip_file: ZipFile of the project
+    :param path: Path of the project
+    :param project_id: ID of the project
+    :param node_ids: dictionary of new node IDs indexed by old node ID
+    :param remote_nodes: dictionary of computes indexed by ID of the nodes not on the local compute
+    """
+
+    pools = {}
+    progress = {"project_id": project_id, "files": 0, "files_total": 0}
+
+    async def extract(func, *args):
+        await func(*args)
+        progress["files"] += 1
+        controller.notification.controller_emit("project.importing", dict(progress))
+
+    for info in zip_file.infolist():
+        if info.filename.endswith("/") or info.filename == "project.gns3":
+            continue
+        parts = [part for part in info.filename.split("/") if part not in ("", ".")]
+        if not parts or ".." in parts or ":" in parts[0] or "\\" in info.filename:
+            log.warning("File '{}' ignored, its path is not valid".format(info.filename))
+            continue
+
+        compute = None
+        if parts[0] == "images" and len(parts) > 1:
+            func, args = _extract_image, (zip_file, info, os.path.join(controller.images_path(), *parts[1:]))
+        elif len(parts) > 3 and parts[0] == "project-files" and parts[2] in node_ids:
+            # the directory of a node is renamed with its new ID
+            parts[2] = node_ids[parts[2]]
+            compute = remote_nodes.get(parts[2])
+            if compute:
+                func, args = _upload_member, (compute, project_id, zip_file, info, "/".join(parts))
+            else:
+                func, args = _extract_member, (zip_file, info, os.path.join(path, *parts))
+        else:
+            func, args = _extract_member, (zip_file, info, os.path.join(path, *parts))
+
+        if compute not in pools:
+            pools[compute] = Pool(concurrency=IMPORT_CONCURRENCY)
+        pools[compute].append(extract, func, *args)
+        progress["files_total"] += 1
+
+    controller.notification.controller_emit("project.importing", dict(progress))
+    # the archive is closed after the extraction, an error must not leave the other destinations extracting
+    results = await asyncio.gather(*[pool.join() for pool in pools.values()], return_exceptions=True)
+    for result in results:
+        if isinstance(result, Exception):
+            raise result
+
+
+async def _extract_member(zip_file, info, path):
+    """
+    Extract a file from the project archive. The file is written to a temporary
+    file replacing the destination once complete, a file in use (e.g. an image)
+    is never seen partially written.
+
+    :param path: Destination of the file
+    """
+
+    def extract():
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # hidden files are not listed in the images directory
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".", suffix=".tmp")
+        try:
+            with zip_file.open(info) as src, open(fd, "wb") as dst:
+                shutil.copyfileobj(src, dst, CHUNK_SIZE)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    await wait_run_in_executor(extract)
+
+
+async def _extract_image(zip_file, info, path):
+    """
+    Extract an image from the project archive, unless
+    the same image is already in the images directory.
+
+    :param path: Destination of the image
+    """
+
+    if await wait_run_in_executor(_same_content, path, info):
+        log.info("Image '{}' already exists, not imported".format(path))
+        return
+    await _extract_member(zip_file, info, path)
+
+
+def _same_content(path, info):
+    """
+    :param path: Path of a file
+    :param info: ZipInfo of a file of the archive
+
+    :returns: True if the file has the same content as the file of the archive
+    """
+
+    try:
+        if os.path.getsize(path) != info.file_size:
+            return False
+        crc = 0
+        with open(path, "rb") as f:
+            while True:
+                data = f.read(CHUNK_SIZE)
+                if not data:
+                    break
+                crc = zlib.crc32(data, crc)
+        return crc == info.CRC
+    except OSError:
+        return False
+
+
+async def _upload_member(compute, project_id, zip_file, info, path):
+    """
+    Upload a file of the project archive to a remote project
+
+    :param path: File path on the remote system relative to project directory
+    """
+
+    path = "/projects/{}/files/{}".format(project_id, path)
+    with zip_file.open(info) as f:
+        await compute.http_query("POST", path, f, timeout=None)
+
+
 def _move_node_file(path, old_id, new_id):
     """
     Move a file from a node when changing its id
@@ -201,13 +365,15 @@ async def _move_files_to_compute(compute, project_id, directory, files_path):
 
     location = os.path.join(directory, files_path)
     if os.path.exists(location):
+        pool = Pool(concurrency=IMPORT_CONCURRENCY)
         for (dirpath, dirnames, filenames) in os.walk(location, followlinks=False):
             for filename in filenames:
                 path = os.path.join(dirpath, filename)
                 if os.path.islink(path):
                     continue
                 dst = os.path.relpath(path, directory)
-                await _upload_file(compute, project_id, path, dst)
+                pool.append(_upload_file, compute, project_id, path, dst)
+        await pool.join()
         await wait_run_in_executor(shutil.rmtree, os.path.join(directory, files_path))
 
 
@@ -241,15 +407,34 @@ async def _import_images(controller, images_path):
             await wait_run_in_executor(shutil.move, path, dst)
 
 
-async def _import_snapshots(snapshots_path, project_name, project_id):
+async def _import_snapshots(snapshots_path, project_name, project_id, topology, node_ids):
     """
     Import the snapshots and update their project name and ID to be the same as the main project.
+
+    :param topology: topology of the imported project
+    :param node_ids: dictionary of new node IDs indexed by old node ID
     """
 
+    # We import it at the last time to avoid circular dependencies
+    from .snapshot import Snapshot, SNAPSHOT_EXTENSION
+
+    # the nodes deleted before the export get the same new ID in all the snapshots
+    node_ids = dict(node_ids)
+    node_computes = {node["node_id"]: node["compute_id"] for node in topology["topology"]["nodes"]}
+    store = SnapshotStore(os.path.join(snapshots_path, "store"))
     for snapshot in os.listdir(snapshots_path):
+        snapshot_path = os.path.join(snapshots_path, snapshot)
+        if snapshot.endswith(SNAPSHOT_EXTENSION):
+            manifest = Snapshot._load_manifest(snapshot_path)
+            try:
+                await wait_run_in_executor(_import_snapshot_manifest, store, snapshot_path, manifest, project_id, topology, node_ids, node_computes)
+            except OSError as e:
+                raise aiohttp.web.HTTPConflict(text="Cannot update snapshot '{}': {}".format(snapshot, e))
+            except (ValueError, KeyError, TypeError):
+                raise aiohttp.web.HTTPConflict(text="Cannot update snapshot '{}': the topology of the snapshot is corrupted".format(snapshot))
+            continue
         if not snapshot.endswith(".gns3project"):
             continue
-        snapshot_path = os.path.join(snapshots_path, snapshot)
         with tempfile.TemporaryDirectory(dir=snapshots_path) as tmpdir:
 
             # extract everything to a temporary directory
@@ -289,3 +474,64 @@ async def _import_snapshots(snapshots_path, project_name, project_id):
                             await f.write(chunk)
             except OSError as e:
                 raise aiohttp.web.HTTPConflict(text="Cannot update snapshot '{}': the snapshot cannot be recreated: {}".format(os.path.basename(snapshot), e))
+
+
+def _import_snapshot_manifest(store, path, manifest, project_id, topology, node_ids, node_computes):
+    """
+    Update a snapshot of the snapshot store for the imported project: the nodes
+    get the new IDs of the project and the files of a node are restored on the
+    compute the node has been imported on.
+
+    :param store: SnapshotStore of the project
+    :param path: path of the snapshot manifest
+    :param manifest: content of the snapshot manifest
+    :param topology: topology of the imported project
+    :param node_ids: dictionary of new node IDs indexed by old node ID, the nodes only in the snapshot are added
+    :param node_computes: dictionary of compute IDs indexed by new node ID
+    """
+
+    with open(store.object_path(manifest["topology"]), encoding="utf-8") as f:
+        snapshot_topology = json.load(f)
+    for node in snapshot_topology["topology"]["nodes"]:
+        if node["node_id"] not in node_ids:
+            node_ids[node["node_id"]] = str(uuid.uuid4())
+        node["node_id"] = node_ids[node["node_id"]]
+        # the nodes deleted before the export run on the local compute
+        node["compute_id"] = node_computes.get(node["node_id"], "local")
+    for link in snapshot_topology["topology"]["links"]:
+        for node in link["nodes"]:
+            node["node_id"] = node_ids.get(node["node_id"], node["node_id"])
+    snapshot_topology["topology"]["computes"] = topology["topology"].get("computes", [])
+    snapshot_topology["project_id"] = project_id
+
+    files = {}
+    computes = {}
+    snapshot_files = list(manifest["files"].items())
+    for compute_files in manifest["computes"].values():
+        snapshot_files.extend(compute_files.items())
+    for relpath, md5 in snapshot_files:
+        parts = relpath.replace("\\", "/").split("/")
+        compute_id = "local"
+        if len(parts) > 3 and parts[0] == "project-files" and parts[2] in node_ids:
+            # the directory of a node is renamed with its new ID
+            parts[2] = node_ids[parts[2]]
+            compute_id = node_computes.get(parts[2], "local")
+        if compute_id == "local":
+            files[os.path.join(*parts)] = md5
+        else:
+            computes.setdefault(compute_id, {})["/".join(parts)] = md5
+
+    fd, topology_path = tempfile.mkstemp(dir=store.path)
+    try:
+        with open(fd, "w", encoding="utf-8") as f:
+            json.dump(snapshot_topology, f, indent=4, sort_keys=True)
+        manifest["topology"] = store.add(topology_path, move=True)
+    finally:
+        if os.path.exists(topology_path):
+            os.remove(topology_path)
+    manifest["project_id"] = project_id
+    manifest["files"] = files
+    manifest["computes"] = computes
+    with open(path + ".tmp", "w+", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=4, sort_keys=True)
+    os.replace(path + ".tmp", path)
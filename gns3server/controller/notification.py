@@ -16,10 +16,18 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import os
+import asyncio
 import aiohttp
 from contextlib import contextmanager
 
-from ..notification_queue import NotificationQueue
+from ..config import Config
+from ..notification_queue import NotificationQueue, NotificationFrame
+
+import logging
+log = logging.getLogger(__name__)
+
+# Minimum interval in seconds between two notifications for the same entity
+DEFAULT_RATE_LIMITS = "compute.updated:2,node.updated:0.5,project.importing:0.5"
 
 
 class Notification:
@@ -31,6 +39,10 @@ class Notification:
         self._controller = controller
         self._project_listeners = {}
         self._controller_listeners = []
+        self._rate_limits_setting = None
+        self._rate_limits = {}
+        self._last_emit = {}
+        self._pending = {}
 
     @contextmanager
     def project_queue(self, project_id):
@@ -61,6 +73,129 @@ class Notification:
         finally:
             self._controller_listeners.remove(queue)
 
+    def _get_rate_limit(self, action):
+        """
+        Returns the minimum interval between two notifications
+        of this action for the same entity.
+
+        :param action: Action name
+        """
+
+        setting = Config.instance().get_section_config("Server").get("notification_rate_limits", DEFAULT_RATE_LIMITS)
+        if setting != self._rate_limits_setting:
+            self._rate_limits = {}
+            for rate_limit in setting.split(","):
+                if not rate_limit.strip():
+                    continue
+                try:
+                    limited_action, interval = rate_limit.strip().split(":")
+                    self._rate_limits[limited_action.strip()] = float(interval)
+                except ValueError:
+                    log.error("Invalid notification rate limit '{}'".format(rate_limit))
+            self._rate_limits_setting = setting
+        return self._rate_limits.get(action, 0)
+
+    def _coalesce(self, action, event, send, *args):
+        """
+        Rate limit notifications for the same entity, the first one is sent
+        immediately and the following ones during the interval are merged,
+        only the latest state is sent at the end of the interval.
+
+        A notification which is not rate limited, or which changes the
+        status of the entity, is sent immediately after the delayed
+        notifications for the same entity so clients never receive
+        an outdated state after it.
+
+        :param action: Action name
+        :param event: Event to send
+        :param send: Function to call to send the notification
+        :param args: Arguments of the send function
+
+        :returns: True if the notification has been delayed
+        """
+
+        if not isinstance(event, dict):
+            return False
+        entity_id = event.get("node_id", event.get("compute_id", event.get("project_id")))
+        if entity_id is None:
+            return False
+
+        interval = self._get_rate_limit(action)
+        key = (action, entity_id)
+        if interval <= 0:
+            self._flush_entity(entity_id, drop=action.endswith(".deleted"))
+            return False
+
+        status = event.get("status")
+        last_emit, last_status = self._last_emit.get(key, (None, None))
+        if status != last_status and last_emit is not None:
+            # A status change is never delayed and replaces the delayed state
+            self._cancel(key)
+        elif key in self._pending:
+            # A notification is already waiting, only keep the latest state
+            timer = self._pending[key][3]
+            self._pending[key] = (send, args, status, timer)
+            return True
+        else:
+            loop = asyncio.get_event_loop()
+            now = loop.time()
+            if last_emit is not None and now - last_emit < interval:
+                timer = loop.call_later(interval - (now - last_emit), self._flush, key)
+                self._pending[key] = (send, args, status, timer)
+                return True
+
+        now = asyncio.get_event_loop().time()
+        if len(self._last_emit) > 4096:
+            # forget entities not updated recently (deleted nodes, closed projects...)
+            max_interval = max(self._rate_limits.values())
+            self._last_emit = {k: v for k, v in self._last_emit.items() if now - v[0] < max_interval}
+        self._last_emit[key] = (now, status)
+        return False
+
+    def _cancel(self, key):
+        """
+        Drop the delayed notification for an entity and its timer.
+
+        :param key: Tuple (action, entity ID)
+        :returns: Tuple (send, args, status) of the notification, None if there is none
+        """
+
+        try:
+            send, args, status, timer = self._pending.pop(key)
+        except KeyError:
+            return None
+        timer.cancel()
+        return send, args, status
+
+    def _flush(self, key):
+        """
+        Send the latest delayed notification for an entity.
+
+        :param key: Tuple (action, entity ID)
+        """
+
+        pending = self._cancel(key)
+        if pending is None:
+            return
+        send, args, status = pending
+        self._last_emit[key] = (asyncio.get_event_loop().time(), status)
+        send(*args)
+
+    def _flush_entity(self, entity_id, drop=False):
+        """
+        Send, or drop, all the delayed notifications for an entity.
+
+        :param entity_id: Entity ID
+        :param drop: Drop the notifications instead of sending them
+        """
+
+        for key in [key for key in self._pending if key[1] == entity_id]:
+            if drop:
+                self._cancel(key)
+                self._last_emit.pop(key, None)
+            else:
+                self._flush(key)
+
     def controller_emit(self, action, event):
         """
         Send a notification to clients connected to the controller stream
@@ -81,8 +216,32 @@ class Notification:
             except TypeError:  # If we receive a mock as an event it will raise TypeError when using json dump
                 pass
 
+        if not self._controller_listeners:
+            return
+        if self._coalesce(action, event, self._send_event_to_controller, action, event):
+            return
+        self._send_event_to_controller(action, event)
+
+    def _send_event_to_controller(self, action, event):
+        """
+        Send an event to all the clients listening for controller notifications
+
+        :param action: Action name
+        :param event: Event to send
+        """
+
+        frame = NotificationFrame(action, event, {})
         for controller_listener in self._controller_listeners:
-            controller_listener.put_nowait((action, event, {}))
+            controller_listener.put_nowait(frame)
+
+    def statistics(self):
+        """
+        :returns: counters of the controller and project notification queues
+        """
+
+        return {"controller": [queue.statistics() for queue in self._controller_listeners],
+                "projects": {project_id: [queue.statistics() for queue in listeners]
+                             for project_id, listeners in self._project_listeners.items() if listeners}}
 
     def project_has_listeners(self, project_id):
         """
@@ -137,7 +296,12 @@ class Notification:
                 pass
 
         if "project_id" in event or project_id:
-            self._send_event_to_project(event.get("project_id", project_id), action, event)
+            project_id = event.get("project_id", project_id)
+            if project_id not in self._project_listeners:
+                return
+            if self._coalesce(action, event, self._send_event_to_project, project_id, action, event):
+                return
+            self._send_event_to_project(project_id, action, event)
         else:
             self._send_event_to_all_projects(action, event)
 
@@ -154,8 +318,9 @@ class Notification:
             project_listeners = self._project_listeners[project_id]
         except KeyError:
             return
+        frame = NotificationFrame(action, event, {})
         for listener in project_listeners:
-            listener.put_nowait((action, event, {}))
+            listener.put_nowait(frame)
 
     def _send_event_to_all_projects(self, action, event):
         """
@@ -165,6 +330,7 @@ class Notification:
         :param action: Action name
         :param event: Event to send
         """
+        frame = NotificationFrame(action, event, {})
         for project_listeners in self._project_listeners.values():
             for listener in project_listeners:
-                listener.put_nowait((action, event, {}))
+                listener.put_nowait(frame)
@@ -24,15 +24,12 @@ import shutil
 import time
 import asyncio
 import aiohttp
-import aiofiles
-import tempfile
-import zipfile
 
 from uuid import UUID, uuid4
 
 from .node import Node
 from .compute import ComputeError
-from .snapshot import Snapshot
+from .snapshot import Snapshot, SNAPSHOT_EXTENSION, LEGACY_SNAPSHOT_EXTENSION
 from .drawing import Drawing
 from .topology import project_to_topology, load_topology
 from .udp_link import UDPLink
@@ -41,13 +38,16 @@ from ..utils.path import check_path_allowed, get_default_project_directory
 from ..utils.application_id import get_next_application_id
 from ..utils.asyncio.pool import Pool
 from ..utils.asyncio import locking
-from ..utils.asyncio import aiozipstream
-from .export_project import export_project
-from .import_project import import_project
+from ..utils.asyncio import wait_run_in_executor
+from ..utils.file_copy import copy_project_files
+from .export_project import _is_exportable
 
 import logging
 log = logging.getLogger(__name__)
 
+# Maximum number of nodes or links created at the same time on a compute when opening a project
+OPEN_CONCURRENCY = 10
+
 
 def open_required(func):
     """
@@ -122,12 +122,18 @@ class Project:
 
         self.reset()
 
+        self._dump_handle = None
+        self._dump_deadline = None
+        self._dump_task = None
+        self._saved_dumps = 0
+
         # At project creation we write an empty .gns3 with the meta
         if not os.path.exists(self._topology_file()):
             assert self._status != "closed"
-            self.dump()
+            self._write_topology(self._topology_file(), project_to_topology(self))
 
         self._iou_id_lock = asyncio.Lock()
+        self._snapshot_lock = asyncio.Lock()
 
         log.debug('Project "{name}" [{id}] loaded'.format(name=self.name, id=self._id))
 
@@ -180,7 +186,7 @@ class Project:
         snapshot_dir = os.path.join(self.path, "snapshots")
         if os.path.exists(snapshot_dir):
             for snap in os.listdir(snapshot_dir):
-                if snap.endswith(".gns3project"):
+                if snap.endswith((SNAPSHOT_EXTENSION, LEGACY_SNAPSHOT_EXTENSION)):
                     snapshot = Snapshot(self, filename=snap)
                     self._snapshots[snapshot.id] = snapshot
 
@@ -379,6 +385,15 @@ class Project:
     def controller(self):
         return self._controller
 
+    @property
+    def snapshot_lock(self):
+        """
+        Lock serializing the creation, deletion and restoration
+        of the snapshots sharing the snapshot store.
+        """
+
+        return self._snapshot_lock
+
     @property
     def name(self):
         return self._name
@@ -525,9 +540,13 @@ class Project:
         node = await self.add_node(compute, name, node_id, node_type=node_type, **template)
         return node
 
-    async def _create_node(self, compute, name, node_id, node_type=None, **kwargs):
+    async def _create_project_on_compute(self, compute):
+        """
+        Create the project on a compute if it doesn't exist yet.
+
+        :param compute: Compute instance
+        """
 
-        node = Node(self, compute, name, node_id=node_id, node_type=node_type, **kwargs)
         if compute not in self._project_created_on_compute:
             # For a local server we send the project path
             if compute.id == "local":
@@ -548,6 +567,10 @@ class Project:
             await compute.post("/projects", data=data)
             self._project_created_on_compute.add(compute)
 
+    async def _create_node(self, compute, name, node_id, node_type=None, **kwargs):
+
+        node = Node(self, compute, name, node_id=node_id, node_type=node_type, **kwargs)
+        await self._create_project_on_compute(compute)
         await node.create()
         self._nodes[node.id] = node
 
@@ -587,6 +610,171 @@ class Project:
             self.dump()
         return node
 
+    @open_required
+    async def add_nodes_and_links(self, nodes, links=None):
+        """
+        Create several nodes and the links between them.
+
+        The nodes of each compute are created in parallel, the UDP ports
+        required by the links are reserved with one request per compute and
+        the topology is written once. If something fails the nodes and links
+        already created are deleted.
+
+        :param nodes: list of node settings, with the compute_id (see add_node())
+        :param links: list of link settings (see the link creation API)
+
+        :returns: tuple (list of nodes, list of links)
+        """
+
+        if links is None:
+            links = []
+
+        # an existing node must not be returned and then deleted by the rollback
+        node_ids = set()
+        for settings in nodes:
+            node_id = settings.get("node_id")
+            if node_id is None:
+                continue
+            if node_id in self._nodes or node_id in node_ids:
+                raise aiohttp.web.HTTPConflict(text="Node ID {} already exists".format(node_id))
+            node_ids.add(node_id)
+
+        created_nodes = [None] * len(nodes)
+        created_links = []
+        reserved_udp_ports = {}
+        try:
+            nodes_by_compute = {}
+            for index, settings in enumerate(nodes):
+                settings = copy.copy(settings)
+                compute = self.controller.get_compute(settings.pop("compute_id"))
+                nodes_by_compute.setdefault(compute, []).append((index, settings))
+
+            await asyncio.gather(*[self._create_project_on_compute(compute) for compute in nodes_by_compute])
+
+            async def create_node(index, compute, settings):
+                created_nodes[index] = await self.add_node(compute,
+                                                           settings.pop("name"),
+                                                           settings.pop("node_id", None),
+                                                           dump=False,
+                                                           **settings)
+
+            pools = []
+            for compute, compute_nodes in nodes_by_compute.items():
+                pool = Pool()
+                for index, settings in compute_nodes:
+                    pool.append(create_node, index, compute, settings)
+                pools.append(pool)
+            self._raise_first_exception(await asyncio.gather(*[pool.join() for pool in pools], return_exceptions=True))
+
+            # Validate the links and count the UDP ports required on each compute
+            udp_ports = {}
+            used_ports = set()
+            for settings in links:
+                for link_node in settings["nodes"]:
+                    node = self.get_node(link_node["node_id"])
+                    port = (node.id, link_node.get("adapter_number", 0), link_node.get("port_number", 0))
+                    if port in used_ports:
+                        raise aiohttp.web.HTTPConflict(text="Port {}/{} of {} is used by several links".format(port[1], port[2], node.name))
+                    used_ports.add(port)
+                    if len(settings["nodes"]) == 2:
+                        udp_ports[node.compute] = udp_ports.get(node.compute, 0) + 1
+            await asyncio.gather(*[self.reserve_udp_ports(compute, count, reserved_udp_ports) for compute, count in udp_ports.items()])
+
+            async def create_link(settings):
+                link = await self.add_link(link_id=settings.get("link_id"), dump=False, reserved_udp_ports=reserved_udp_ports)
+                created_links.append(link)
+                if "filters" in settings:
+                    await link.update_filters(settings["filters"])
+                if "link_style" in settings:
+                    await link.update_link_style(settings["link_style"])
+                if "suspend" in settings:
+                    await link.update_suspend(settings["suspend"])
+                for link_node in settings["nodes"]:
+                    await link.add_node(self.get_node(link_node["node_id"]),
+                                        link_node.get("adapter_number", 0),
+                                        link_node.get("port_number", 0),
+                                        label=link_node.get("label"),
+                                        dump=False)
+
+            pool = Pool()
+            for settings in links:
+                pool.append(create_link, settings)
+            await pool.join()
+        except Exception:
+            for link in created_links:
+                try:
+                    await self.delete_link(link.id, force_delete=True)
+                except Exception as e:
+                    log.warning("Could not delete link {}: {}".format(link.id, e))
+            for node in created_nodes:
+                if node is not None and node.id in self._nodes:
+                    try:
+                        await self.delete_node(node.id)
+                    except Exception as e:
+                        log.warning("Could not delete node {}: {}".format(node.name, e))
+            raise
+        finally:
+            await self.release_udp_ports(reserved_udp_ports)
+
+        self.dump()
+        return created_nodes, created_links
+
+    @staticmethod
+    def _raise_first_exception(results):
+        """
+        Raise the first exception returned by asyncio.gather(return_exceptions=True)
+        """
+
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+
+    async def reserve_udp_ports(self, compute, count, reserved_ports):
+        """
+        Reserve UDP ports on a compute with a single request,
+        they are used by the links created with these reservations.
+
+        :param compute: Compute instance
+        :param count: number of ports
+        :param reserved_ports: dictionary of reserved ports indexed by compute, updated with the new ports
+        """
+
+        await self._create_project_on_compute(compute)
+        response = await compute.post("/projects/{}/ports/udp".format(self._id), data={"count": count})
+        reserved_ports.setdefault(compute, []).extend(response.json["udp_ports"])
+
+    async def release_udp_ports(self, reserved_ports):
+        """
+        Release the reserved UDP ports which have not been used by a link.
+
+        :param reserved_ports: dictionary of reserved ports indexed by compute
+        """
+
+        for compute, udp_ports in reserved_ports.items():
+            if not udp_ports:
+                continue
+            try:
+                await compute.post("/projects/{}/ports/udp/release".format(self._id), data={"udp_ports": udp_ports})
+            except (ComputeError, aiohttp.web.HTTPError, aiohttp.ClientError) as e:
+                log.warning("Could not release UDP ports on compute {}: {}".format(compute.id, e))
+        reserved_ports.clear()
+
+    async def allocate_udp_port(self, compute, reserved_ports=None):
+        """
+        Allocate a UDP port on a compute, the ports reserved
+        with reserve_udp_ports() are used first.
+
+        :param compute: Compute instance
+        :param reserved_ports: dictionary of reserved ports indexed by compute
+
+        :returns: UDP port
+        """
+
+        if reserved_ports and reserved_ports.get(compute):
+            return reserved_ports[compute].pop(0)
+        response = await compute.post("/projects/{}/ports/udp".format(self._id))
+        return response.json["udp_port"]
+
     @locking
     async def __delete_node_links(self, node):
         """
@@ -702,15 +890,16 @@ class Project:
         self.emit_notification("drawing.deleted", drawing.__json__())
 
     @open_required
-    async def add_link(self, link_id=None, dump=True):
+    async def add_link(self, link_id=None, dump=True, reserved_udp_ports=None):
         """
         Create a link. By default the link is empty
 
         :param dump: Dump topology to disk
+        :param reserved_udp_ports: UDP ports reserved with reserve_udp_ports() for this link
         """
         if link_id and link_id in self._links:
             return self._links[link_id]
-        link = UDPLink(self, link_id=link_id)
+        link = UDPLink(self, link_id=link_id, reserved_udp_ports=reserved_udp_ports)
         self._links[link.id] = link
         if dump:
             self.dump()
@@ -783,7 +972,7 @@ class Project:
     async def delete_snapshot(self, snapshot_id):
         snapshot = self.get_snapshot(snapshot_id)
         del self._snapshots[snapshot.id]
-        os.remove(snapshot.path)
+        await snapshot.delete()
 
     @locking
     async def close(self, ignore_notification=False):
@@ -793,6 +982,7 @@ class Project:
             log.warning("Closing project '{}' ignored because it is being loaded".format(self.name))
             return
         self._closing = True
+        await self.save(pending_only=True)
         await self.stop_all()
         for compute in list(self._project_created_on_compute):
             try:
@@ -945,33 +1135,7 @@ class Project:
                 if compute_id not in self._computes:
                     self._computes.append(compute_id)
 
-            for node in topology.get("nodes", []):
-                compute = self.controller.get_compute(node.pop("compute_id"))
-                name = node.pop("name")
-                node_id = node.pop("node_id", str(uuid.uuid4()))
-                await self.add_node(compute, name, node_id, dump=False, **node)
-            for link_data in topology.get("links", []):
-                if 'link_id' not in link_data.keys():
-                    # skip the link
-                    continue
-                link = await self.add_link(link_id=link_data["link_id"])
-                if "filters" in link_data:
-                    await link.update_filters(link_data["filters"])
-                if "link_style" in link_data:
-                    await link.update_link_style(link_data["link_style"])
-                for node_link in link_data.get("nodes", []):
-                    node = self.get_node(node_link["node_id"])
-                    port = node.get_port(node_link["adapter_number"], node_link["port_number"])
-                    if port is None:
-                        log.warning("Port {}/{} for {} not found".format(node_link["adapter_number"], node_link["port_number"], node.name))
-                        continue
-                    if port.link is not None:
-                        log.warning("Port {}/{} is already connected to link ID {}".format(node_link["adapter_number"], node_link["port_number"], port.link.id))
-                        continue
-                    await link.add_node(node, node_link["adapter_number"], node_link["port_number"], label=node_link.get("label"), dump=False)
-                if len(link.nodes) != 2:
-                    # a link should have 2 attached nodes, this can happen with corrupted projects
-                    await self.delete_link(link.id, force_delete=True)
+            await self._load_nodes_and_links(topology.get("nodes", []), topology.get("links", []))
             for drawing_data in topology.get("drawings", []):
                 await self.add_drawing(dump=False, **drawing_data)
 
@@ -984,6 +1148,13 @@ class Project:
                 # We don't care if a compute is down at this step
                 except (ComputeError, aiohttp.web.HTTPNotFound, aiohttp.web.HTTPConflict, aiohttp.ServerDisconnectedError):
                     pass
+            # the partly loaded topology must not be written over the backup
+            if self._dump_handle is not None:
+                self._dump_handle.cancel()
+                self._dump_handle = None
+            if self._dump_task is not None:
+                await asyncio.wait([self._dump_task])
+                self._dump_task = None
             try:
                 if os.path.exists(path + ".backup"):
                     shutil.copy(path + ".backup", path)
@@ -1008,6 +1179,140 @@ class Project:
             # their project and fix it
             asyncio.ensure_future(self.start_all())
 
+    async def _load_nodes_and_links(self, nodes, links):
+        """
+        Create the nodes and links of a topology.
+
+        The nodes are created in parallel, with at most OPEN_CONCURRENCY
+        requests at the same time on each compute. A link is created as soon
+        as its nodes exist. A "project.loading" notification reports the
+        progress. If something fails, no new creation is started and the
+        error is raised once the creations in progress are finished.
+
+        :param nodes: list of nodes from the topology
+        :param links: list of links from the topology
+        """
+
+        semaphores = {}
+        node_tasks = {}
+        failed = []
+        claimed_ports = {}
+        progress = {"project_id": self._id, "nodes": 0, "nodes_total": len(nodes), "links": 0, "links_total": 0}
+
+        def task_done(task):
+            if not task.cancelled() and task.exception() is not None:
+                failed.append(task.exception())
+
+        async def create_node(compute, name, node_id, settings):
+            async with semaphores[compute]:
+                if failed:
+                    # the loading has failed, no new node is created
+                    return None
+                node = await self.add_node(compute, name, node_id, dump=False, **settings)
+            progress["nodes"] += 1
+            self.emit_notification("project.loading", dict(progress))
+            return node
+
+        async def create_link(link_data):
+            tasks = [node_tasks[node_link["node_id"]] for node_link in link_data.get("nodes", []) if node_link["node_id"] in node_tasks]
+            if tasks:
+                await asyncio.wait(tasks)
+            if failed or any(task.cancelled() or task.exception() is not None or task.result() is None for task in tasks):
+                # the loading has failed or a node of the link has not been created
+                return
+
+            endpoints = []
+            for node_link in link_data.get("nodes", []):
+                node = self.get_node(node_link["node_id"])
+                port = node.get_port(node_link["adapter_number"], node_link["port_number"])
+                if port is None:
+                    log.warning("Port {}/{} for {} not found".format(node_link["adapter_number"], node_link["port_number"], node.name))
+                    continue
+                # the port may be used by a link being created
+                link_id = port.link.id if port.link is not None else claimed_ports.get(port)
+                if link_id is not None:
+                    log.warning("Port {}/{} is already connected to link ID {}".format(node_link["adapter_number"], node_link["port_number"], link_id))
+                    continue
+                claimed_ports[port] = link_data["link_id"]
+                endpoints.append((node, node_link))
+            if len(endpoints) != 2:
+                # a link should have 2 attached nodes, this can happen with corrupted projects
+                log.warning("Link {} ignored because it is not connected to 2 nodes".format(link_data["link_id"]))
+                return
+
+            # the semaphores are always acquired in the same order to avoid deadlocks
+            computes = sorted(set(node.compute for node, _ in endpoints), key=lambda compute: compute.id)
+            for compute in computes:
+                await semaphores[compute].acquire()
+            try:
+                link = await self.add_link(link_id=link_data["link_id"], dump=False, reserved_udp_ports=reserved_udp_ports)
+                if "filters" in link_data:
+                    await link.update_filters(link_data["filters"])
+                if "link_style" in link_data:
+                    await link.update_link_style(link_data["link_style"])
+                for node, node_link in endpoints:
+                    await link.add_node(node, node_link["adapter_number"], node_link["port_number"], label=node_link.get("label"), dump=False)
+            finally:
+                for compute in computes:
+                    semaphores[compute].release()
+            progress["links"] += 1
+            self.emit_notification("project.loading", dict(progress))
+
+        nodes_by_compute = []
+        node_computes = {}
+        for settings in nodes:
+            settings = copy.copy(settings)
+            compute = self.controller.get_compute(settings.pop("compute_id"))
+            if compute not in semaphores:
+                semaphores[compute] = asyncio.Semaphore(OPEN_CONCURRENCY)
+            nodes_by_compute.append((compute, settings))
+            node_computes[settings.get("node_id")] = compute
+
+        # create the project on each compute before creating the nodes
+        await asyncio.gather(*[self._create_project_on_compute(compute) for compute in semaphores])
+
+        # reserve the UDP ports used by the links with one request per compute
+        reserved_udp_ports = {}
+        udp_ports = {}
+        for link_data in links:
+            link_computes = [node_computes.get(node_link["node_id"]) for node_link in link_data.get("nodes", [])]
+            if "link_id" in link_data and len(link_computes) == 2 and None not in link_computes:
+                for compute in link_computes:
+                    udp_ports[compute] = udp_ports.get(compute, 0) + 1
+        try:
+            await asyncio.gather(*[self.reserve_udp_ports(compute, count, reserved_udp_ports) for compute, count in udp_ports.items()])
+
+            tasks = []
+            for compute, settings in nodes_by_compute:
+                name = settings.pop("name")
+                node_id = settings.pop("node_id", str(uuid.uuid4()))
+                task = asyncio.ensure_future(create_node(compute, name, node_id, settings))
+                task.add_done_callback(task_done)
+                node_tasks[node_id] = task
+                tasks.append(task)
+
+            for link_data in links:
+                if "link_id" not in link_data:
+                    # skip the link
+                    continue
+                task = asyncio.ensure_future(create_link(link_data))
+                task.add_done_callback(task_done)
+                tasks.append(task)
+            progress["links_total"] = len(tasks) - len(nodes_by_compute)
+
+            await asyncio.gather(*tasks, return_exceptions=True)
+        finally:
+            await self.release_udp_ports(reserved_udp_ports)
+
+        # record the nodes and links in the order of the topology,
+        # not in the order their creation has finished
+        node_order = {node_id: index for index, node_id in enumerate(node_tasks)}
+        self._nodes = dict(sorted(self._nodes.items(), key=lambda item: node_order.get(item[0], len(node_order))))
+        link_order = {link_data["link_id"]: index for index, link_data in enumerate(links) if "link_id" in link_data}
+        self._links = dict(sorted(self._links.items(), key=lambda item: link_order.get(item[0], len(link_order))))
+        if failed:
+            raise failed[0]
+
     async def wait_loaded(self):
         """
         Wait until the project finish loading
@@ -1019,12 +1324,12 @@ class Project:
         """
         Duplicate a project
 
-        It's the save as feature of the 1.X. It's implemented on top of the
-        export / import features. It will generate a gns3p and reimport it.
-        It's a little slower but we have only one implementation to maintain.
+        It's the save as feature of the 1.X. The topology is copied with new
+        IDs, the local files are copied in parallel and each remote compute
+        copies the files of its nodes.
 
         :param name: Name of the new project. A new one will be generated in case of conflicts
-        :param location: Parent directory of the new project
+        :param location: Directory of the new project
         :param reset_mac_addresses: Reset MAC addresses for the new project
         """
         # If the project was not open we open it temporary
@@ -1032,35 +1337,40 @@ class Project:
         if self._status == "closed":
             await self.open()
 
-        self.dump()
+        await self.save()
         assert self._status != "closed"
         try:
             begin = time.time()
-
-            # use the parent directory of the project we are duplicating as a
-            # temporary directory to avoid no space left issues when '/tmp'
-            # is location on another partition.
+            project_id = str(uuid.uuid4())
+            project_name = self._controller.get_free_project_name(name or self._name)
             if location:
-                working_dir = os.path.abspath(os.path.join(location, os.pardir))
+                path = location
             else:
-                working_dir = os.path.abspath(os.path.join(self.path, os.pardir))
+                path = os.path.join(self._controller.projects_directory(), project_id)
+            if os.path.exists(path) and os.listdir(path):
+                raise aiohttp.web.HTTPConflict(text="Cannot duplicate project: the directory '{}' is not empty".format(path))
 
-            with tempfile.TemporaryDirectory(dir=working_dir) as tmpdir:
-                # Do not compress the exported project when duplicating
-                with aiozipstream.ZipFile(compression=zipfile.ZIP_STORED) as zstream:
-                    await export_project(zstream, self, tmpdir, keep_compute_id=True, allow_all_nodes=True, reset_mac_addresses=reset_mac_addresses)
+            topology, node_ids = self._duplicate_topology(project_id, project_name, reset_mac_addresses)
 
-                    # export the project to a temporary location
-                    project_path = os.path.join(tmpdir, "project.gns3p")
-                    log.info("Exporting project to '{}'".format(project_path))
-                    async with aiofiles.open(project_path, 'wb') as f:
-                        async for chunk in zstream:
-                            await f.write(chunk)
-
-                    # import the temporary project
-                    with open(project_path, "rb") as f:
-                        project = await import_project(self._controller, str(uuid.uuid4()), f, location=location, name=name, keep_compute_id=True)
+            local_node_ids = {}
+            compute_node_ids = {}
+            for old_node_id, node_id in node_ids.items():
+                compute_id = self.get_node(old_node_id).compute.id
+                if compute_id == "local":
+                    local_node_ids[old_node_id] = node_id
+                else:
+                    compute_node_ids.setdefault(compute_id, {})[old_node_id] = node_id
 
+            os.makedirs(path, exist_ok=True)
+            copies = [copy_project_files(self._path, path, local_node_ids, ignore=self._ignore_duplicated_file)]
+            for compute_id, ids in compute_node_ids.items():
+                compute = self._controller.get_compute(compute_id)
+                copies.append(compute.post("/projects/{}/duplicate".format(self._id), data={"project_id": project_id, "node_ids": ids}))
+            self._raise_first_exception(await asyncio.gather(*copies, return_exceptions=True))
+
+            dot_gns3_path = os.path.join(path, project_name + ".gns3")
+            await wait_run_in_executor(self._write_topology, dot_gns3_path, topology)
+            project = await self._controller.load_project(dot_gns3_path, load=False)
             log.info("Project '{}' duplicated in {:.4f} seconds".format(project.name, time.time() - begin))
         except (ValueError, OSError, UnicodeEncodeError) as e:
             raise aiohttp.web.HTTPConflict(text="Cannot duplicate project: {}".format(str(e)))
@@ -1070,6 +1380,54 @@ class Project:
 
         return project
 
+    def _duplicate_topology(self, project_id, project_name, reset_mac_addresses):
+        """
+        Returns the topology of the project with new IDs.
+
+        :returns: tuple (topology, dictionary of new node IDs indexed by node ID)
+        """
+
+        topology = project_to_topology(self)
+        topology["project_id"] = project_id
+        topology["name"] = project_name
+        # To avoid unexpected behavior (project start without manual operations just after duplication)
+        topology["auto_start"] = False
+        topology["auto_open"] = False
+        topology["auto_close"] = True
+
+        node_ids = {}
+        for node in topology["topology"]["nodes"]:
+            if node["node_type"] == "virtualbox" and node.get("properties", {}).get("linked_clone"):
+                raise aiohttp.web.HTTPConflict(text="Projects with a linked {} clone node cannot not be duplicated. Please use Qemu instead.".format(node["node_type"]))
+            node_ids[node["node_id"]] = str(uuid.uuid4())
+            node["node_id"] = node_ids[node["node_id"]]
+            if reset_mac_addresses and node["node_type"] != "docker":
+                for prop in ("mac_addr", "mac_address"):
+                    if prop in node.get("properties", {}):
+                        node["properties"][prop] = None
+
+        for link in topology["topology"]["links"]:
+            link["link_id"] = str(uuid.uuid4())
+            for node in link["nodes"]:
+                node["node_id"] = node_ids[node["node_id"]]
+
+        for drawing in topology["topology"]["drawings"]:
+            drawing["drawing_id"] = str(uuid.uuid4())
+
+        return topology, node_ids
+
+    def _ignore_duplicated_file(self, path):
+        """
+        Returns True for the files which are not copied when duplicating a project.
+
+        :param path: path of the file relative to the project directory
+        """
+
+        # the topology is written with the new IDs
+        if path.endswith(".gns3") and os.path.sep not in path:
+            return True
+        return not _is_exportable(os.path.join(self._path, path))
+
     def is_running(self):
         """
         If a node is started or paused return True
@@ -1083,17 +1441,84 @@ class Project:
     def dump(self):
         """
         Dump topology to disk
+
+        The topology is written in the background once no other change
+        happened for topology_save_delay seconds, so a burst of changes
+        is saved with a single write. Use save() to wait for the write.
         """
+
+        delay = float(self._config().get("topology_save_delay", 1))
+        loop = asyncio.get_event_loop()
+        if delay <= 0 or not loop.is_running():
+            self._write_topology(self._topology_file(), project_to_topology(self))
+            return
+
+        now = loop.time()
+        if self._dump_handle is not None:
+            # a write is already waiting, it will include this change
+            self._dump_handle.cancel()
+            self._saved_dumps += 1
+        else:
+            # do not delay the write forever if the project keeps changing
+            self._dump_deadline = now + delay * 10
+        self._dump_handle = loop.call_at(min(now + delay, self._dump_deadline), self._dump_in_background)
+
+    def _dump_in_background(self):
+        """
+        Write the topology in a thread, the writes are done in order.
+        """
+
+        self._dump_handle = None
+        if self._loading or self._status == "closed":
+            return
+        topology = project_to_topology(self)
+        self._dump_task = asyncio.ensure_future(self._write_topology_after(self._dump_task, self._topology_file(), topology))
+
+    async def _write_topology_after(self, previous_task, path, topology):
+
+        if previous_task is not None:
+            await asyncio.wait([previous_task])
+        try:
+            await wait_run_in_executor(self._write_topology, path, topology)
+        except aiohttp.web.HTTPInternalServerError as e:
+            log.error(e.text)
+
+    @staticmethod
+    def _write_topology(path, topology):
+
         try:
-            topo = project_to_topology(self)
-            path = self._topology_file()
             log.debug("Write %s", path)
             with open(path + ".tmp", "w+", encoding="utf-8") as f:
-                json.dump(topo, f, indent=4, sort_keys=True)
+                json.dump(topology, f, indent=4, sort_keys=True)
             shutil.move(path + ".tmp", path)
         except OSError as e:
             raise aiohttp.web.HTTPInternalServerError(text="Could not write topology: {}".format(e))
 
+    async def save(self, pending_only=False):
+        """
+        Write the topology to disk now and wait for the writes in progress
+
+        :param pending_only: only write the topology if changes are waiting to be saved
+        """
+
+        pending = self._dump_handle is not None
+        if pending:
+            self._dump_handle.cancel()
+            self._dump_handle = None
+        if self._dump_task is not None:
+            await asyncio.wait([self._dump_task])
+            self._dump_task = None
+        if pending or not pending_only:
+            await wait_run_in_executor(self._write_topology, self._topology_file(), project_to_topology(self))
+
+    @property
+    def saved_dumps(self):
+        """
+        :returns: number of topology writes saved by merging changes
+        """
+
+        return self._saved_dumps
+
     @open_required
     async def start_all(self):
         """
@@ -1180,7 +1605,8 @@ class Project:
             "nodes": len(self._nodes),
             "links": len(self._links),
             "drawings": len(self._drawings),
-            "snapshots": len(self._snapshots)
+            "snapshots": len(self._snapshots),
+            "saved_dumps": self._saved_dumps
         }
 
     def __json__(self):
@@ -17,19 +17,19 @@
 
 
 import os
+import json
 import uuid
 import shutil
 import tempfile
 import aiofiles
-import zipfile
 import time
 import aiohttp.web
 from datetime import datetime, timezone
 
 from ..utils.asyncio import wait_run_in_executor
-from ..utils.asyncio import aiozipstream
-from .export_project import export_project
-from .import_project import import_project
+from .export_project import _is_exportable, CHUNK_SIZE
+from .import_project import import_project, _upload_file
+from .snapshot_store import SnapshotStore
 
 import logging
 log = logging.getLogger(__name__)
@@ -37,6 +37,59 @@ log = logging.getLogger(__name__)
 
 # The string use to extract the date from the filename
 FILENAME_TIME_FORMAT = "%d%m%y_%H%M%S"
+# Snapshots are stored in a snapshot store, .gns3project are full archives created by previous versions
+SNAPSHOT_EXTENSION = ".gns3snapshot"
+LEGACY_SNAPSHOT_EXTENSION = ".gns3project"
+
+
+def snapshot_files(project):
+    """
+    Returns the files of the snapshot store of a project
+    used by a snapshot.
+
+    :param project: Project instance
+    :returns: set of checksums, None if a snapshot cannot be read
+    """
+
+    used = set()
+    snapshot_directory = os.path.join(project.path, "snapshots")
+    if not os.path.isdir(snapshot_directory):
+        return used
+    for filename in os.listdir(snapshot_directory):
+        if filename.endswith(SNAPSHOT_EXTENSION):
+            try:
+                manifest = Snapshot._load_manifest(os.path.join(snapshot_directory, filename))
+            except aiohttp.web.HTTPConflict as e:
+                log.warning(e.text)
+                return None
+            used.add(manifest["topology"])
+            used.update(manifest["files"].values())
+            for files in manifest["computes"].values():
+                used.update(files.values())
+    return used
+
+
+async def collect_unused_files(project, used=None):
+    """
+    Deletes the files of the snapshot store of a project which are not
+    used by a snapshot. The snapshot lock of the project must be held.
+
+    :param project: Project instance
+    :param used: checksums of other files to keep
+    """
+
+    snapshot_directory = os.path.join(project.path, "snapshots")
+    if not os.path.isdir(snapshot_directory):
+        return
+    snapshots_used = snapshot_files(project)
+    if snapshots_used is None:
+        # keep the files if we don't know which ones are used
+        log.warning("Cannot delete unused snapshot files")
+        return
+    used = snapshots_used | set(used or ())
+    store = SnapshotStore(os.path.join(snapshot_directory, "store"))
+    deleted = await wait_run_in_executor(store.collect_garbage, used)
+    log.debug("{} unused snapshot files deleted".format(deleted))
 
 
 class Snapshot:
@@ -53,7 +106,7 @@ class Snapshot:
         if name:
             self._name = name
             self._created_at = datetime.now().timestamp()
-            filename = self._name + "_" + datetime.utcfromtimestamp(self._created_at).replace(tzinfo=None).strftime(FILENAME_TIME_FORMAT) + ".gns3project"
+            filename = self._name + "_" + datetime.utcfromtimestamp(self._created_at).replace(tzinfo=None).strftime(FILENAME_TIME_FORMAT) + SNAPSHOT_EXTENSION
         else:
             self._name = filename.split("_")[0]
             datestring = filename.replace(self._name + "_", "").split(".")[0]
@@ -79,6 +132,14 @@ class Snapshot:
     def created_at(self):
         return int(self._created_at)
 
+    @property
+    def store(self):
+        """
+        :returns: the snapshot store of the project
+        """
+
+        return SnapshotStore(os.path.join(self._project.path, "snapshots", "store"))
+
     async def create(self):
         """
         Create the snapshot
@@ -87,30 +148,193 @@ class Snapshot:
         if os.path.exists(self.path):
             raise aiohttp.web.HTTPConflict(text="The snapshot file '{}' already exists".format(self.name))
 
-        snapshot_directory = os.path.join(self._project.path, "snapshots")
-        try:
-            os.makedirs(snapshot_directory, exist_ok=True)
-        except OSError as e:
-            raise aiohttp.web.HTTPInternalServerError(text="Could not create the snapshot directory '{}': {}".format(snapshot_directory, e))
+        # To avoid issue with data not saved we disallow snapshots of a running project
+        if self._project.is_running():
+            raise aiohttp.web.HTTPConflict(text="Project must be stopped in order to create a snapshot")
+
+        # Make sure we save the project
+        await self._project.save()
+
+        store = self.store
+        # the files of the store are not deleted while they are added to the snapshot
+        async with self._project.snapshot_lock:
+            try:
+                begin = time.time()
+                os.makedirs(store.path, exist_ok=True)
+                manifest = {
+                    "project_id": self._project.id,
+                    "topology": await wait_run_in_executor(store.add, self._project._topology_file()),
+                    "files": await wait_run_in_executor(self._store_local_files, store, self._project.path),
+                    "computes": {}
+                }
+                for compute in self._project.computes:
+                    if compute.id != "local":
+                        manifest["computes"][compute.id] = await self._store_compute_files(store, compute)
+                try:
+                    with open(self.path + ".tmp", "w+", encoding="utf-8") as f:
+                        json.dump(manifest, f, indent=4, sort_keys=True)
+                    os.replace(self.path + ".tmp", self.path)
+                except (ValueError, OSError):
+                    if os.path.exists(self.path + ".tmp"):
+                        os.remove(self.path + ".tmp")
+                    raise
+                log.info("Snapshot '{}' created in {:.4f} seconds".format(self.name, time.time() - begin))
+            except (ValueError, OSError) as e:
+                raise aiohttp.web.HTTPConflict(text="Could not create snapshot file '{}': {}".format(self.path, e))
+
+    @staticmethod
+    def _store_local_files(store, project_path):
+        """
+        Adds the files of the project directory to the store.
+
+        :returns: dictionary of the file checksums indexed by path relative to the project
+        """
+
+        files = {}
+        for root, dirs, filenames in os.walk(project_path, topdown=True, followlinks=False):
+            for filename in filenames:
+                path = os.path.join(root, filename)
+                # the .gns3 file is stored as the topology of the snapshot
+                if filename.endswith(".gns3") or not _is_exportable(path):
+                    continue
+                try:
+                    files[os.path.relpath(path, project_path)] = store.add(path)
+                except FileNotFoundError as e:
+                    log.warning("Cannot add file to snapshot: {}".format(e))
+        return files
+
+    async def _store_compute_files(self, store, compute):
+        """
+        Adds the files of the project on a remote compute to the store,
+        only the files not already in the store are downloaded.
+
+        :returns: dictionary of the file checksums indexed by path relative to the project
+        """
+
+        files = {}
+        for compute_file in await compute.list_files(self._project):
+            if not _is_exportable(compute_file["path"]):
+                continue
+            if store.has(compute_file["md5sum"]):
+                files[compute_file["path"]] = compute_file["md5sum"]
+                continue
+
+            log.debug("Downloading file '{}' from compute '{}'".format(compute_file["path"], compute.id))
+            response = await compute.download_file(self._project, compute_file["path"])
+            if response.status != 200:
+                log.warning("Cannot add file to snapshot from compute '{}'. Compute returned status code {}.".format(compute.id, response.status))
+                continue
+            (fd, temp_path) = tempfile.mkstemp(dir=store.path)
+            try:
+                async with aiofiles.open(fd, 'wb') as f:
+                    while True:
+                        data = await response.content.read(CHUNK_SIZE)
+                        if not data:
+                            break
+                        await f.write(data)
+                files[compute_file["path"]] = await wait_run_in_executor(store.add, temp_path, True)
+            finally:
+                response.close()
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+        return files
+
+    async def delete(self):
+        """
+        Delete the snapshot and the files no other snapshot uses
+        """
+
+        # a snapshot being created uses files not yet listed in a manifest
+        async with self._project.snapshot_lock:
+            os.remove(self.path)
+            if self.path.endswith(SNAPSHOT_EXTENSION):
+                await collect_unused_files(self._project)
+
+    @staticmethod
+    def _load_manifest(path):
 
         try:
-            begin = time.time()
-            with tempfile.TemporaryDirectory(dir=snapshot_directory) as tmpdir:
-                # Do not compress the snapshots
-                with aiozipstream.ZipFile(compression=zipfile.ZIP_STORED) as zstream:
-                    await export_project(zstream, self._project, tmpdir, keep_compute_id=True, allow_all_nodes=True)
-                    async with aiofiles.open(self.path, 'wb') as f:
-                        async for chunk in zstream:
-                            await f.write(chunk)
-            log.info("Snapshot '{}' created in {:.4f} seconds".format(self.name, time.time() - begin))
-        except (ValueError, OSError, RuntimeError) as e:
-            raise aiohttp.web.HTTPConflict(text="Could not create snapshot file '{}': {}".format(self.path, e))
+            with open(path, encoding="utf-8") as f:
+                manifest = json.load(f)
+            for key in ("topology", "files", "computes"):
+                manifest[key]
+            return manifest
+        except (OSError, ValueError, KeyError) as e:
+            raise aiohttp.web.HTTPConflict(text="Cannot read snapshot '{}': {}".format(os.path.basename(path), e))
 
     async def restore(self):
         """
         Restore the snapshot
         """
 
+        if self._path.endswith(LEGACY_SNAPSHOT_EXTENSION):
+            return await self._restore_archive()
+
+        manifest = self._load_manifest(self._path)
+        await self._project.delete_on_computes()
+        # We don't send close notification to clients because the close / open dance is purely internal
+        await self._project.close(ignore_notification=True)
+
+        store = self.store
+        async with self._project.snapshot_lock:
+            try:
+                begin = time.time()
+                restored = await wait_run_in_executor(self._restore_local_files, store, self._project.path, manifest["files"])
+                for compute_id, files in manifest["computes"].items():
+                    compute = self._project.controller.get_compute(compute_id)
+                    await compute.post("/projects", data={"name": self._project.name, "project_id": self._project.id})
+                    for path, md5 in files.items():
+                        await _upload_file(compute, self._project.id, store.object_path(md5), path)
+                        restored += 1
+
+                with open(store.object_path(manifest["topology"]), encoding="utf-8") as f:
+                    topology = json.load(f)
+                topology["project_id"] = self._project.id
+                topology["name"] = self._project.name
+                topology["auto_start"] = self._project.auto_start
+                topology["auto_open"] = self._project.auto_open
+                topology["auto_close"] = self._project.auto_close
+                await wait_run_in_executor(self._project._write_topology, self._project._topology_file(), topology)
+                log.info("Snapshot '{}' restored in {:.4f} seconds, {} files restored".format(self.name, time.time() - begin, restored))
+            except (ValueError, OSError) as e:
+                raise aiohttp.web.HTTPConflict(text="Could not restore snapshot '{}': {}".format(self.name, e))
+        await self._project.open()
+        self._project.emit_notification("snapshot.restored", self.__json__())
+        return self._project
+
+    @staticmethod
+    def _restore_local_files(store, project_path, files):
+        """
+        Restores the files of the project directory which
+        are different from the ones in the snapshot.
+
+        :returns: number of restored files
+        """
+
+        # delete the project files created after the snapshot
+        project_files_path = os.path.join(project_path, "project-files")
+        for root, dirs, filenames in os.walk(project_files_path, topdown=False, followlinks=False):
+            for filename in filenames:
+                path = os.path.join(root, filename)
+                if os.path.relpath(path, project_path) not in files:
+                    os.remove(path)
+            if root != project_files_path and not os.listdir(root):
+                os.rmdir(root)
+
+        restored = 0
+        for relpath, md5 in files.items():
+            path = os.path.join(project_path, relpath)
+            if os.path.isfile(path) and not os.path.islink(path) and store.checksum(path) == md5:
+                continue
+            store.restore(md5, path)
+            restored += 1
+        return restored
+
+    async def _restore_archive(self):
+        """
+        Restore a snapshot created by a previous version
+        """
+
         await self._project.delete_on_computes()
         # We don't send close notification to clients because the close / open dance is purely internal
         await self._project.close(ignore_notification=True)
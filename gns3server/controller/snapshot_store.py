@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2022 GNS3 Technologies Inc.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import tempfile
+
+from ..utils.checksum import ChecksumIndex, compute_md5
+from ..utils.file_copy import clone_file
+
+import logging
+log = logging.getLogger(__name__)
+
+
+class SnapshotStore:
+    """
+    Content addressed storage of the files of the snapshots.
+
+    Each file is stored once whatever the number of snapshots using it,
+    under the name of its checksum. The checksums of the project files
+    are kept in an index to only read the files modified since the
+    previous snapshot.
+
+    :param path: directory of the store
+    """
+
+    def __init__(self, path):
+
+        self._path = path
+        self._index = None
+
+    @property
+    def path(self):
+
+        return self._path
+
+    def _checksum_index(self):
+
+        if self._index is None:
+            self._index = ChecksumIndex(os.path.join(self._path, "checksums"))
+        return self._index
+
+    def object_path(self, md5):
+        """
+        :param md5: checksum of a file
+        :returns: path of the file in the store
+        """
+
+        return os.path.join(self._path, "objects", md5[:2], md5)
+
+    def has(self, md5):
+        """
+        :param md5: checksum of a file
+        :returns: True if the file is in the store
+        """
+
+        return os.path.exists(self.object_path(md5))
+
+    def checksum(self, path):
+        """
+        Returns the checksum of a file, the file is read
+        only if it has changed since the last call.
+
+        :param path: path of the file
+        :returns: md5 of the file
+        """
+
+        path = os.path.abspath(path)
+        st = os.stat(path)
+        index = self._checksum_index()
+        md5 = index.get(path, st)
+        if md5 is None:
+            md5 = compute_md5(path)
+            index.set(path, st, md5)
+        return md5
+
+    def add(self, path, move=False):
+        """
+        Adds a file to the store, nothing is copied if
+        a file with the same content is already stored.
+
+        :param path: path of the file
+        :param move: move the file to the store instead of copying it
+
+        :returns: md5 of the file
+        """
+
+        if move:
+            md5 = compute_md5(path)
+        else:
+            md5 = self.checksum(path)
+        object_path = self.object_path(md5)
+        if os.path.exists(object_path):
+            if move:
+                os.remove(path)
+            return md5
+
+        os.makedirs(os.path.dirname(object_path), exist_ok=True)
+        if move:
+            os.replace(path, object_path)
+        else:
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(object_path))
+            os.close(fd)
+            try:
+                clone_file(path, tmp_path)
+                os.replace(tmp_path, object_path)
+            except OSError:
+                os.remove(tmp_path)
+                raise
+        return md5
+
+    def restore(self, md5, path):
+        """
+        Writes a file of the store to the disk.
+
+        :param md5: checksum of the file
+        :param path: destination
+        """
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + ".tmp"
+        try:
+            clone_file(self.object_path(md5), tmp_path)
+            os.replace(tmp_path, path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        # the content is known, no need to read the file again for the next snapshot
+        self._checksum_index().set(os.path.abspath(path), os.stat(path), md5)
+
+    def collect_garbage(self, used):
+        """
+        Deletes the files which are not used anymore.
+
+        :param used: set of the checksums still in use
+
+        :returns: number of deleted files
+        """
+
+        deleted = 0
+        objects_path = os.path.join(self._path, "objects")
+        if not os.path.exists(objects_path):
+            return deleted
+        for directory in os.listdir(objects_path):
+            directory = os.path.join(objects_path, directory)
+            for md5 in os.listdir(directory):
+                if md5 not in used:
+                    try:
+                        os.remove(os.path.join(directory, md5))
+                        deleted += 1
+                    except OSError as e:
+                        log.warning("Could not delete snapshot file '{}': {}".format(md5, e))
+        return deleted
@@ -17,6 +17,7 @@
 
 
 import aiohttp
+import asyncio
 
 
 from .link import Link
@@ -24,10 +25,12 @@ from .link import Link
 
 class UDPLink(Link):
 
-    def __init__(self, project, link_id=None):
+    def __init__(self, project, link_id=None, reserved_udp_ports=None):
         super().__init__(project, link_id=link_id)
         self._created = False
         self._link_data = []
+        # UDP ports reserved in advance for the creation of this link
+        self._reserved_udp_ports = reserved_udp_ports
 
     @property
     def debug_link_data(self):
@@ -55,10 +58,9 @@ class UDPLink(Link):
             raise aiohttp.web.HTTPConflict(text="Cannot get an IP address on same subnet: {}".format(e))
 
         # Reserve a UDP port on both side
-        response = await node1.compute.post("/projects/{}/ports/udp".format(self._project.id))
-        self._node1_port = response.json["udp_port"]
-        response = await node2.compute.post("/projects/{}/ports/udp".format(self._project.id))
-        self._node2_port = response.json["udp_port"]
+        self._node1_port, self._node2_port = await asyncio.gather(self._project.allocate_udp_port(node1.compute, self._reserved_udp_ports),
+                                                                  self._project.allocate_udp_port(node2.compute, self._reserved_udp_ports))
+        self._reserved_udp_ports = None
 
         node1_filters = {}
         node2_filters = {}
@@ -77,8 +79,6 @@ class UDPLink(Link):
             "filters": node1_filters,
             "suspend": self._suspended
         })
-        await node1.post("/adapters/{adapter_number}/ports/{port_number}/nio".format(adapter_number=adapter_number1, port_number=port_number1), data=self._link_data[0], timeout=120)
-
         self._link_data.append({
             "lport": self._node2_port,
             "rhost": node1_host,
@@ -87,12 +87,16 @@ class UDPLink(Link):
             "filters": node2_filters,
             "suspend": self._suspended
         })
-        try:
-            await node2.post("/adapters/{adapter_number}/ports/{port_number}/nio".format(adapter_number=adapter_number2, port_number=port_number2), data=self._link_data[1], timeout=120)
-        except Exception as e:
-            # We clean the first NIO
-            await node1.delete("/adapters/{adapter_number}/ports/{port_number}/nio".format(adapter_number=adapter_number1, port_number=port_number1), timeout=120)
-            raise e
+        results = await asyncio.gather(node1.compute.add_udp_nio(self._project.id, node1.node_type, node1.id, adapter_number1, port_number1, self._link_data[0]),
+                                       node2.compute.add_udp_nio(self._project.id, node2.node_type, node2.id, adapter_number2, port_number2, self._link_data[1]),
+                                       return_exceptions=True)
+        if isinstance(results[0], BaseException) or isinstance(results[1], BaseException):
+            # We clean the NIO created on the other side
+            if not isinstance(results[0], BaseException):
+                await node1.delete("/adapters/{adapter_number}/ports/{port_number}/nio".format(adapter_number=adapter_number1, port_number=port_number1), timeout=120)
+            if not isinstance(results[1], BaseException):
+                await node2.delete("/adapters/{adapter_number}/ports/{port_number}/nio".format(adapter_number=adapter_number2, port_number=port_number2), timeout=120)
+            raise results[0] if isinstance(results[0], BaseException) else results[1]
         self._created = True
 
     async def update(self):
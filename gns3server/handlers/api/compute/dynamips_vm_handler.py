@@ -28,6 +28,7 @@ from gns3server.compute.project_manager import ProjectManager
 from gns3server.schemas.node import (
     NODE_CAPTURE_SCHEMA,
     NODE_LIST_IMAGES_SCHEMA,
+    NODE_LIST_IMAGES_QUERY_SCHEMA,
 )
 
 from gns3server.schemas.dynamips_vm import (
@@ -449,11 +450,14 @@ class DynamipsVMHandler:
             200: "List of Dynamips IOS images",
         },
         description="Retrieve the list of Dynamips IOS images",
+        input=NODE_LIST_IMAGES_QUERY_SCHEMA,
         output=NODE_LIST_IMAGES_SCHEMA)
     async def list_images(request, response):
 
         dynamips_manager = Dynamips.instance()
-        images = await dynamips_manager.list_images()
+        images = await dynamips_manager.list_images(filter=request.json.get("filter"),
+                                                    offset=int(request.json.get("offset", 0)),
+                                                    limit=int(request.json["limit"]) if "limit" in request.json else None)
         response.set_status(200)
         response.json(images)
 
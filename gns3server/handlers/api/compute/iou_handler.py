@@ -26,6 +26,7 @@ from gns3server.compute.iou import IOU
 from gns3server.schemas.node import (
     NODE_CAPTURE_SCHEMA,
     NODE_LIST_IMAGES_SCHEMA,
+    NODE_LIST_IMAGES_QUERY_SCHEMA,
 )
 
 from gns3server.schemas.iou import (
@@ -407,11 +408,14 @@ class IOUHandler:
             200: "List of IOU images",
         },
         description="Retrieve the list of IOU images",
+        input=NODE_LIST_IMAGES_QUERY_SCHEMA,
         output=NODE_LIST_IMAGES_SCHEMA)
     async def list_iou_images(request, response):
 
         iou_manager = IOU.instance()
-        images = await iou_manager.list_images()
+        images = await iou_manager.list_images(filter=request.json.get("filter"),
+                                               offset=int(request.json.get("offset", 0)),
+                                               limit=int(request.json["limit"]) if "limit" in request.json else None)
         response.set_status(200)
         response.json(images)
 
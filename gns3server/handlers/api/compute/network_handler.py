@@ -19,6 +19,8 @@ from gns3server.web.route import Route
 from gns3server.compute.port_manager import PortManager
 from gns3server.compute.project_manager import ProjectManager
 from gns3server.utils.interfaces import interfaces
+from gns3server.schemas.port import UDP_PORTS_ALLOCATE_SCHEMA, UDP_PORTS_RELEASE_SCHEMA
+from gns3server.schemas.nio import UDP_NIOS_CREATE_SCHEMA, UDP_NIOS_OBJECT_SCHEMA
 
 
 class NetworkHandler:
@@ -32,15 +34,56 @@ class NetworkHandler:
             201: "UDP port allocated",
             404: "The project doesn't exist"
         },
-        description="Allocate an UDP port on the server")
+        description="Allocate an UDP port on the server, several ports are allocated if a count is given",
+        input=UDP_PORTS_ALLOCATE_SCHEMA)
     def allocate_udp_port(request, response):
 
         pm = ProjectManager.instance()
         project = pm.get_project(request.match_info["project_id"])
         m = PortManager.instance()
-        udp_port = m.get_free_udp_port(project)
+        udp_ports = m.reserve_many(project, request.json.get("count", 1))
         response.set_status(201)
-        response.json({"udp_port": udp_port})
+        response.json({"udp_port": udp_ports[0], "udp_ports": udp_ports})
+
+    @Route.post(
+        r"/projects/{project_id}/ports/udp/release",
+        parameters={
+            "project_id": "Project UUID",
+        },
+        status_codes={
+            204: "UDP ports released",
+            404: "The project doesn't exist"
+        },
+        description="Release UDP ports allocated but not used",
+        input=UDP_PORTS_RELEASE_SCHEMA)
+    def release_udp_ports(request, response):
+
+        pm = ProjectManager.instance()
+        project = pm.get_project(request.match_info["project_id"])
+        m = PortManager.instance()
+        for udp_port in request.json["udp_ports"]:
+            m.release_udp_port(udp_port, project)
+        response.set_status(204)
+
+    @Route.post(
+        r"/projects/{project_id}/nios/udp",
+        parameters={
+            "project_id": "Project UUID",
+        },
+        status_codes={
+            201: "NIOs processed, the status of each NIO is in the result",
+            404: "The project doesn't exist"
+        },
+        description="Add UDP NIOs to several nodes of the project",
+        input=UDP_NIOS_CREATE_SCHEMA,
+        output=UDP_NIOS_OBJECT_SCHEMA)
+    async def create_udp_nios(request, response):
+
+        pm = ProjectManager.instance()
+        project = pm.get_project(request.match_info["project_id"])
+        nios = await project.add_udp_nios(request.json["nios"])
+        response.set_status(201)
+        response.json({"nios": nios})
 
     @Route.get(
         r"/network/interfaces",
@@ -32,6 +32,7 @@ from gns3server.schemas.project import (
     PROJECT_CREATE_SCHEMA,
     PROJECT_UPDATE_SCHEMA,
     PROJECT_FILE_LIST_SCHEMA,
+    PROJECT_FILES_DUPLICATE_SCHEMA,
     PROJECT_LIST_SCHEMA
 )
 
@@ -161,6 +162,25 @@ class ProjectHandler:
         pm.remove_project(project.id)
         response.set_status(204)
 
+    @Route.post(
+        r"/projects/{project_id}/duplicate",
+        description="Copy the files of a project to a new project",
+        parameters={
+            "project_id": "Project UUID",
+        },
+        status_codes={
+            204: "Files copied",
+            404: "The project doesn't exist",
+            409: "The files cannot be copied"
+        },
+        input=PROJECT_FILES_DUPLICATE_SCHEMA)
+    async def duplicate(request, response):
+
+        pm = ProjectManager.instance()
+        project = pm.get_project(request.match_info["project_id"])
+        await project.duplicate_files(request.json["project_id"], request.json["node_ids"])
+        response.set_status(204)
+
     @Route.get(
         r"/projects/{project_id}/notifications",
         description="Receive notifications about the project",
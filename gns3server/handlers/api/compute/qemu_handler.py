@@ -28,6 +28,7 @@ from gns3server.config import Config
 
 from gns3server.schemas.node import (
     NODE_LIST_IMAGES_SCHEMA,
+    NODE_LIST_IMAGES_QUERY_SCHEMA,
     NODE_CAPTURE_SCHEMA
 )
 
@@ -531,11 +532,14 @@ class QEMUHandler:
             200: "List of Qemu images",
         },
         description="Retrieve the list of Qemu images",
+        input=NODE_LIST_IMAGES_QUERY_SCHEMA,
         output=NODE_LIST_IMAGES_SCHEMA)
     async def list_qemu_images(request, response):
 
         qemu_manager = Qemu.instance()
-        images = await qemu_manager.list_images()
+        images = await qemu_manager.list_images(filter=request.json.get("filter"),
+                                                offset=int(request.json.get("offset", 0)),
+                                                limit=int(request.json["limit"]) if "limit" in request.json else None)
         response.set_status(200)
         response.json(images)
 
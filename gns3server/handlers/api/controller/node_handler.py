@@ -26,7 +26,9 @@ from gns3server.schemas.node import (
     NODE_OBJECT_SCHEMA,
     NODE_UPDATE_SCHEMA,
     NODE_CREATE_SCHEMA,
-    NODE_DUPLICATE_SCHEMA
+    NODE_DUPLICATE_SCHEMA,
+    NODE_BULK_CREATE_SCHEMA,
+    NODE_BULK_OBJECT_SCHEMA
 )
 
 
@@ -56,6 +58,27 @@ class NodeHandler:
         response.set_status(201)
         response.json(node)
 
+    @Route.post(
+        r"/projects/{project_id}/nodes/bulk",
+        parameters={
+            "project_id": "Project UUID"
+        },
+        status_codes={
+            201: "Nodes and links created",
+            400: "Invalid request",
+            409: "Conflict, nothing has been created"
+        },
+        description="Create several nodes and the links between them, the topology is written once",
+        input=NODE_BULK_CREATE_SCHEMA,
+        output=NODE_BULK_OBJECT_SCHEMA)
+    async def create_bulk(request, response):
+
+        controller = Controller.instance()
+        project = await controller.get_loaded_project(request.match_info["project_id"])
+        nodes, links = await project.add_nodes_and_links(request.json["nodes"], request.json.get("links", []))
+        response.set_status(201)
+        response.json({"nodes": [node.__json__() for node in nodes], "links": [link.__json__() for link in links]})
+
     @Route.get(
         r"/projects/{project_id}/nodes",
         parameters={
@@ -335,7 +335,8 @@ class ProjectHandler:
             # use the parent directory as a temporary working dir
             working_dir = os.path.abspath(os.path.join(project.path, os.pardir))
             with tempfile.TemporaryDirectory(dir=working_dir) as tmpdir:
-                with aiozipstream.ZipFile(compression=compression) as zstream:
+                workers = Config.instance().get_section_config("Server").getint("export_compression_workers", os.cpu_count() or 1)
+                with aiozipstream.ZipFile(compression=compression, workers=workers) as zstream:
                     await export_project(zstream, project, tmpdir, include_snapshots=include_snapshots, include_images=include_images, reset_mac_addresses=reset_mac_addresses)
 
                     # We need to do that now because export could failed and raise an HTTP error
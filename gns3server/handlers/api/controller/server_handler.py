@@ -25,6 +25,7 @@ from gns3server.version import __version__
 from aiohttp.web import HTTPConflict, HTTPForbidden
 
 import os
+import json
 import psutil
 import shutil
 import asyncio
@@ -256,4 +257,5 @@ Processus:
             for link in project.links.values():
                 data += "Link {}: {}".format(link.id, link.debug_link_data)
 
+        data += "\n\nNotification queues\n{}\n".format(json.dumps(Controller.instance().notification.statistics(), indent=4))
         return data
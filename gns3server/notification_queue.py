@@ -18,21 +18,150 @@
 import asyncio
 import json
 import psutil
+from collections import namedtuple
 
+from gns3server.config import Config
 from gns3server.utils.cpu_percent import CpuPercent
 
 import logging
 log = logging.getLogger(__name__)
 
 
+class NotificationFrame(namedtuple("NotificationFrame", ["action", "event", "kwargs"])):
+    """
+    A notification shared by all the listeners. The JSON is
+    serialized only once whatever the number of listeners.
+    """
+
+    def json(self):
+        """
+        :returns: the notification serialized as a JSON string
+        """
+
+        try:
+            return self._json
+        except AttributeError:
+            pass
+        if hasattr(self.event, "__json__"):
+            msg = {"action": self.action, "event": self.event.__json__()}
+        else:
+            msg = {"action": self.action, "event": self.event}
+        msg.update(self.kwargs)
+        self._json = json.dumps(msg, sort_keys=True)
+        return self._json
+
+    def coalesce_key(self):
+        """
+        :returns: key identifying the entity of an update notification or None
+        """
+
+        if not self.action.endswith(".updated"):
+            return None
+        if isinstance(self.event, dict):
+            for key in ("link_id", "drawing_id", "node_id", "compute_id", "project_id"):
+                if key in self.event:
+                    return self.action, self.event[key]
+        elif hasattr(self.event, "id"):
+            return self.action, self.event.id
+        return None
+
+
 class NotificationQueue(asyncio.Queue):
     """
     Queue returned by the notification manager.
+
+    The queue is bounded so a slow client cannot make the memory
+    grow without limit. When full, the "coalesce" overflow policy replaces
+    a pending update of the same entity by the new one and otherwise drops
+    the oldest notification, the "drop" policy always drops the oldest one.
     """
 
-    def __init__(self):
-        super().__init__()
+    def __init__(self, maxsize=None, overflow_policy=None):
+
+        server_config = Config.instance().get_section_config("Server")
+        if maxsize is None:
+            maxsize = server_config.getint("notification_queue_size", 1000)
+        if overflow_policy is None:
+            overflow_policy = server_config.get("notification_overflow_policy", "coalesce")
+        super().__init__(maxsize=maxsize)
+        self._overflow_policy = overflow_policy
         self._first = True
+        self._dropped = 0
+        self._coalesced = 0
+        self._max_depth = 0
+
+    @property
+    def dropped(self):
+        """
+        :returns: number of notifications dropped because the queue was full
+        """
+
+        return self._dropped
+
+    @property
+    def coalesced(self):
+        """
+        :returns: number of notifications merged with a pending one because the queue was full
+        """
+
+        return self._coalesced
+
+    @property
+    def max_depth(self):
+        """
+        :returns: maximum number of pending notifications
+        """
+
+        return self._max_depth
+
+    def statistics(self):
+        """
+        :returns: dictionary with the queue counters
+        """
+
+        return {"depth": self.qsize(),
+                "max_depth": self._max_depth,
+                "dropped": self._dropped,
+                "coalesced": self._coalesced}
+
+    def put_nowait(self, item):
+        """
+        Put a notification in the queue without blocking,
+        apply the overflow policy if the queue is full.
+
+        :param item: tuple (action, event, kwargs) or NotificationFrame
+        """
+
+        if not isinstance(item, NotificationFrame):
+            item = NotificationFrame(*item)
+        if self.full():
+            if self._overflow_policy == "coalesce" and self._coalesce(item):
+                return
+            if self._dropped == 0:
+                log.warning("Notification queue is full ({} notifications), dropping the oldest notifications for a slow client".format(self.maxsize))
+            self.get_nowait()
+            self.task_done()
+            self._dropped += 1
+        super().put_nowait(item)
+        if self.qsize() > self._max_depth:
+            self._max_depth = self.qsize()
+
+    def _coalesce(self, item):
+        """
+        Replace a pending update of the same entity by this one.
+
+        :returns: True if the notification has been coalesced
+        """
+
+        key = item.coalesce_key()
+        if key is None:
+            return False
+        for index, pending in enumerate(self._queue):
+            if pending.coalesce_key() == key:
+                self._queue[index] = item
+                self._coalesced += 1
+                return True
+        return False
 
     async def get(self, timeout):
         """
@@ -45,10 +174,9 @@ class NotificationQueue(asyncio.Queue):
             return ("ping", self._getPing(), {})
 
         try:
-            (action, msg, kwargs) = await asyncio.wait_for(super().get(), timeout)
+            return await asyncio.wait_for(super().get(), timeout)
         except asyncio.TimeoutError:
             return ("ping", self._getPing(), {})
-        return (action, msg, kwargs)
 
     def _getPing(self):
         """
@@ -68,10 +196,7 @@ class NotificationQueue(asyncio.Queue):
         """
         Get a message as a JSON
         """
-        (action, msg, kwargs) = await self.get(timeout)
-        if hasattr(msg, "__json__"):
-            msg = {"action": action, "event": msg.__json__()}
-        else:
-            msg = {"action": action, "event": msg}
-        msg.update(kwargs)
-        return json.dumps(msg, sort_keys=True)
+        frame = await self.get(timeout)
+        if not isinstance(frame, NotificationFrame):
+            frame = NotificationFrame(*frame)
+        return frame.json()
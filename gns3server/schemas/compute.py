@@ -50,6 +50,10 @@ COMPUTE_CREATE_SCHEMA = {
         "password": {
             "description": "Password for authentication",
             "type": ["string", "null"]
+        },
+        "keep_alive": {
+            "description": "Keep connections to the compute alive, null to use the server configuration",
+            "type": ["boolean", "null"]
         }
     },
     "additionalProperties": False,
@@ -88,6 +92,10 @@ COMPUTE_OBJECT_SCHEMA = {
             "description": "User for authentication",
             "type": ["string", "null"]
         },
+        "keep_alive": {
+            "description": "Whether connections to the compute are kept alive or not",
+            "type": "boolean"
+        },
         "connected": {
             "description": "Whether the controller is connected to the compute or not",
             "type": "boolean"
@@ -190,3 +190,80 @@ NIO_SCHEMA = {
     "additionalProperties": True,
     "required": ["type"]
 }
+
+
+UDP_NIOS_CREATE_SCHEMA = {
+    "$schema": "http://json-schema.org/draft-04/schema#",
+    "description": "Request validation to add UDP NIOs to several nodes",
+    "type": "object",
+    "properties": {
+        "nios": {
+            "description": "NIOs to create",
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "node_type": {
+                        "description": "Type of the node",
+                        "type": "string",
+                        "minLength": 1
+                    },
+                    "node_id": {
+                        "description": "Node UUID",
+                        "type": "string",
+                        "minLength": 36,
+                        "maxLength": 36,
+                        "pattern": "^[a-fA-F0-9]{8}-[a-fA-F0-9]{4}-[a-fA-F0-9]{4}-[a-fA-F0-9]{4}-[a-fA-F0-9]{12}$"
+                    },
+                    "adapter_number": {
+                        "description": "Adapter number",
+                        "type": "integer",
+                        "minimum": 0
+                    },
+                    "port_number": {
+                        "description": "Port number",
+                        "type": "integer",
+                        "minimum": 0
+                    },
+                    "nio": NIO_SCHEMA["definitions"]["UDP"]
+                },
+                "required": ["node_type", "node_id", "adapter_number", "port_number", "nio"],
+                "additionalProperties": False
+            }
+        }
+    },
+    "required": ["nios"],
+    "additionalProperties": False
+}
+
+UDP_NIOS_OBJECT_SCHEMA = {
+    "$schema": "http://json-schema.org/draft-04/schema#",
+    "description": "Result of the creation of UDP NIOs, in the order of the request",
+    "type": "object",
+    "properties": {
+        "nios": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "status": {
+                        "description": "HTTP status of the NIO creation",
+                        "type": "integer"
+                    },
+                    "nio": {
+                        "description": "NIO created",
+                        "type": "object"
+                    },
+                    "message": {
+                        "description": "Error message if the NIO could not be created",
+                        "type": "string"
+                    }
+                },
+                "required": ["status"],
+                "additionalProperties": False
+            }
+        }
+    },
+    "required": ["nios"],
+    "additionalProperties": False
+}
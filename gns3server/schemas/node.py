@@ -18,6 +18,7 @@
 import copy
 from .label import LABEL_OBJECT_SCHEMA
 from .custom_adapters import CUSTOM_ADAPTERS_ARRAY_SCHEMA
+from .link import LINK_OBJECT_SCHEMA
 
 NODE_TYPE_SCHEMA = {
     "description": "Type of node",
@@ -66,6 +67,10 @@ NODE_LIST_IMAGES_SCHEMA = {
                     "description": "size of the image if available",
                     "type": ["integer", "null"],
                     "minimum": 0
+                },
+                "hashing": {
+                    "description": "the md5sum of the image is being computed",
+                    "type": "boolean"
                 }
             },
             "required": ["filename", "path"],
@@ -75,6 +80,28 @@ NODE_LIST_IMAGES_SCHEMA = {
     "additionalProperties": False,
 }
 
+NODE_LIST_IMAGES_QUERY_SCHEMA = {
+    "$schema": "http://json-schema.org/draft-04/schema#",
+    "description": "Request validation to list binary images",
+    "type": "object",
+    "properties": {
+        "filter": {
+            "description": "Only return the images with this string in their path",
+            "type": "string"
+        },
+        "offset": {
+            "description": "Number of images to skip",
+            "type": "string",
+            "pattern": "^[0-9]+$"
+        },
+        "limit": {
+            "description": "Maximum number of images to return",
+            "type": "string",
+            "pattern": "^[0-9]+$"
+        }
+    }
+}
+
 
 NODE_CAPTURE_SCHEMA = {
     "$schema": "http://json-schema.org/draft-04/schema#",
@@ -289,3 +316,47 @@ NODE_DUPLICATE_SCHEMA = {
     "additionalProperties": False,
     "required": ["x", "y"]
 }
+
+
+NODE_BULK_CREATE_SCHEMA = {
+    "$schema": "http://json-schema.org/draft-04/schema#",
+    "description": "Create several nodes and the links between them",
+    "type": "object",
+    "properties": {
+        "nodes": {
+            "description": "Nodes to create",
+            "type": "array",
+            "items": NODE_CREATE_SCHEMA
+        },
+        "links": {
+            "description": "Links to create between the new or existing nodes",
+            "type": "array",
+            "items": {
+                "allOf": [
+                    LINK_OBJECT_SCHEMA,
+                    {"required": ["nodes"]}
+                ]
+            }
+        }
+    },
+    "additionalProperties": False,
+    "required": ["nodes"]
+}
+
+NODE_BULK_OBJECT_SCHEMA = {
+    "$schema": "http://json-schema.org/draft-04/schema#",
+    "description": "Nodes and links created in bulk",
+    "type": "object",
+    "properties": {
+        "nodes": {
+            "type": "array",
+            "items": NODE_OBJECT_SCHEMA
+        },
+        "links": {
+            "type": "array",
+            "items": LINK_OBJECT_SCHEMA
+        }
+    },
+    "additionalProperties": False,
+    "required": ["nodes", "links"]
+}
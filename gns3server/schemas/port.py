@@ -113,3 +113,39 @@ PORT_OBJECT_SCHEMA = {
         }
     ]
 }
+
+
+UDP_PORTS_ALLOCATE_SCHEMA = {
+    "$schema": "http://json-schema.org/draft-04/schema#",
+    "description": "Request validation to allocate UDP ports",
+    "type": "object",
+    "properties": {
+        "count": {
+            "description": "Number of UDP ports to allocate",
+            "type": "integer",
+            "minimum": 1,
+            "maximum": 10000
+        }
+    },
+    "additionalProperties": False
+}
+
+
+UDP_PORTS_RELEASE_SCHEMA = {
+    "$schema": "http://json-schema.org/draft-04/schema#",
+    "description": "Request validation to release UDP ports",
+    "type": "object",
+    "properties": {
+        "udp_ports": {
+            "description": "UDP ports to release",
+            "type": "array",
+            "items": {
+                "type": "integer",
+                "minimum": 1,
+                "maximum": 65535
+            }
+        }
+    },
+    "required": ["udp_ports"],
+    "additionalProperties": False
+}
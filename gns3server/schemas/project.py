@@ -137,6 +137,33 @@ PROJECT_DUPLICATE_SCHEMA["properties"].update({"reset_mac_addresses": {"type": "
                                                                        "description": "Reset MAC addresses for this project"
                                                                       }})
 
+PROJECT_FILES_DUPLICATE_SCHEMA = {
+    "$schema": "http://json-schema.org/draft-04/schema#",
+    "description": "Request validation to copy the files of a project to a new project on a compute",
+    "type": "object",
+    "properties": {
+        "project_id": {
+            "description": "UUID of the new project",
+            "type": "string",
+            "minLength": 36,
+            "maxLength": 36,
+            "pattern": "^[a-fA-F0-9]{8}-[a-fA-F0-9]{4}-[a-fA-F0-9]{4}-[a-fA-F0-9]{4}-[a-fA-F0-9]{12}$"
+        },
+        "node_ids": {
+            "description": "New node UUIDs indexed by the node UUIDs of the project",
+            "type": "object",
+            "additionalProperties": {
+                "type": "string",
+                "minLength": 36,
+                "maxLength": 36,
+                "pattern": "^[a-fA-F0-9]{8}-[a-fA-F0-9]{4}-[a-fA-F0-9]{4}-[a-fA-F0-9]{4}-[a-fA-F0-9]{12}$"
+            }
+        }
+    },
+    "additionalProperties": False,
+    "required": ["project_id", "node_ids"]
+}
+
 PROJECT_UPDATE_SCHEMA = {
     "$schema": "http://json-schema.org/draft-04/schema#",
     "description": "Request validation to update a Project instance",
@@ -30,6 +30,7 @@ import time
 import zipfile
 import asyncio
 import aiofiles
+import collections
 from concurrent import futures
 
 from zipfile import (structCentralDir, structEndArchive64, structEndArchive, structEndArchive64Locator,
@@ -37,15 +38,28 @@ from zipfile import (structCentralDir, structEndArchive64, structEndArchive, str
 
 stringDataDescriptor = b'PK\x07\x08'  # magic number for data descriptor
 
+# Size of the blocks of a file deflated in parallel
+PARALLEL_BLOCK_SIZE = 1024 * 1024  # 1MB
+# Size of the deflate window, the end of a block is the dictionary of the next one
+DEFLATE_WINDOW_SIZE = 32768
 
-def _get_compressor(compress_type):
+# Files already compressed, deflating them again only costs CPU time
+STORED_EXTENSIONS = (".qcow2", ".gz", ".bz2", ".xz", ".zip", ".7z", ".png", ".jpg", ".jpeg", ".gif",
+                     ".gns3project", ".gns3p")
+# Large disk images, mostly compressible but too big for a good compression level
+FAST_EXTENSIONS = (".img", ".image", ".bin", ".iso", ".vmdk", ".vdi", ".vhd", ".vhdx")
+
+
+def _get_compressor(compress_type, compresslevel=None):
     """
     Return the compressor.
     """
 
     if compress_type == zipfile.ZIP_DEFLATED:
         from zipfile import zlib
-        return zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15)
+        if compresslevel is None:
+            compresslevel = zlib.Z_DEFAULT_COMPRESSION
+        return zlib.compressobj(compresslevel, zlib.DEFLATED, -15)
     elif compress_type == zipfile.ZIP_BZIP2:
         from zipfile import bz2
         return bz2.BZ2Compressor()
@@ -56,6 +70,51 @@ def _get_compressor(compress_type):
         return None
 
 
+def _get_compression(arcname, compression):
+    """
+    Choose the compression of a file from its extension.
+
+    :param arcname: Name of the file in the archive
+    :param compression: Compression of the archive
+
+    :returns: Tuple (compress type, compress level)
+    """
+
+    if compression != zipfile.ZIP_DEFLATED:
+        return compression, None
+    extension = os.path.splitext(arcname)[1].lower()
+    if extension in STORED_EXTENSIONS:
+        return zipfile.ZIP_STORED, None
+    if extension in FAST_EXTENSIONS:
+        from zipfile import zlib
+        return compression, zlib.Z_BEST_SPEED
+    return compression, None
+
+
+def _deflate_block(data, compresslevel, zdict):
+    """
+    Deflate a block of a file independently of the other blocks.
+
+    The output ends on a byte boundary without a final block, so
+    the outputs of consecutive blocks can be concatenated.
+
+    :param data: Data of the block
+    :param compresslevel: Compression level
+    :param zdict: End of the previous block, used as the dictionary
+
+    :returns: Deflated data
+    """
+
+    from zipfile import zlib
+    if compresslevel is None:
+        compresslevel = zlib.Z_DEFAULT_COMPRESSION
+    if zdict:
+        cmpr = zlib.compressobj(compresslevel, zlib.DEFLATED, -15, zdict=zdict)
+    else:
+        cmpr = zlib.compressobj(compresslevel, zlib.DEFLATED, -15)
+    return cmpr.compress(data) + cmpr.flush(zlib.Z_SYNC_FLUSH)
+
+
 class PointerIO(object):
 
     def __init__(self, mode='wb'):
@@ -121,8 +180,13 @@ class ZipInfo(zipfile.ZipInfo):
 
 class ZipFile(zipfile.ZipFile):
 
-    def __init__(self, fileobj=None, mode='w', compression=zipfile.ZIP_STORED, allowZip64=True, chunksize=32768):
-        """Open the ZIP file with mode write "w"."""
+    def __init__(self, fileobj=None, mode='w', compression=zipfile.ZIP_STORED, allowZip64=True, chunksize=32768, workers=1):
+        """
+        Open the ZIP file with mode write "w".
+
+        With more than one worker, files are deflated by blocks on several
+        threads (zlib releases the GIL) while the output stays in order.
+        """
 
         if mode not in ('w', ):
             raise RuntimeError('aiozipstream.ZipFile() requires mode "w"')
@@ -132,6 +196,8 @@ class ZipFile(zipfile.ZipFile):
         self._comment = b''
         zipfile.ZipFile.__init__(self, fileobj, mode=mode, compression=compression, allowZip64=allowZip64)
         self._chunksize = chunksize
+        self._workers = max(1, workers)
+        self._executor = futures.ThreadPoolExecutor(max_workers=self._workers)
         self.paths_to_write = []
 
     def __aiter__(self):
@@ -161,11 +227,11 @@ class ZipFile(zipfile.ZipFile):
         self._comment = comment
         self._didModify = True
 
-    async def data_generator(self, path):
+    async def data_generator(self, path, chunksize=None):
 
         async with aiofiles.open(path, "rb") as f:
             while True:
-                part = await f.read(self._chunksize)
+                part = await f.read(chunksize or self._chunksize)
                 if not part:
                     break
                 yield part
@@ -177,7 +243,31 @@ class ZipFile(zipfile.ZipFile):
         """
 
         loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(futures.ThreadPoolExecutor(max_workers=1), task, *args, **kwargs)
+        return await loop.run_in_executor(self._executor, task, *args, **kwargs)
+
+    async def _deflate_parallel(self, path, compresslevel):
+        """
+        Deflate the blocks of a file on the workers, at most two
+        blocks per worker are in memory at the same time.
+
+        :param path: Path of the file
+        :param compresslevel: Compression level
+
+        :returns: Iterator of tuples (block, deflated block) in the file order
+        """
+
+        loop = asyncio.get_event_loop()
+        pending = collections.deque()
+        zdict = None
+        async for block in self.data_generator(path, PARALLEL_BLOCK_SIZE):
+            pending.append((block, loop.run_in_executor(self._executor, _deflate_block, block, compresslevel, zdict)))
+            zdict = block[-DEFLATE_WINDOW_SIZE:]
+            if len(pending) >= self._workers * 2:
+                block, future = pending.popleft()
+                yield block, await future
+        while pending:
+            block, future = pending.popleft()
+            yield block, await future
 
     async def _stream(self):
 
@@ -243,8 +333,9 @@ class ZipFile(zipfile.ZipFile):
             zinfo.external_attr = (st[0] & 0xFFFF) << 16      # Unix attributes
         else:
             zinfo.external_attr = 0o600 << 16     # ?rw-------
+        compresslevel = None
         if compress_type is None:
-            zinfo.compress_type = self.compression
+            zinfo.compress_type, compresslevel = _get_compression(arcname, self.compression)
         else:
             zinfo.compress_type = compress_type
 
@@ -271,7 +362,7 @@ class ZipFile(zipfile.ZipFile):
             yield self.fp.write(zinfo.FileHeader(False))
             return
 
-        cmpr = _get_compressor(zinfo.compress_type)
+        cmpr = _get_compressor(zinfo.compress_type, compresslevel)
 
         # Must overwrite CRC and sizes with correct data later
         zinfo.CRC = CRC = 0
@@ -281,7 +372,14 @@ class ZipFile(zipfile.ZipFile):
         yield self.fp.write(zinfo.FileHeader(zip64))
 
         file_size = 0
-        if filename:
+        if filename and zinfo.compress_type == zipfile.ZIP_DEFLATED and self._workers > 1:
+            # blocks are deflated in parallel, the compressor only writes the final block
+            async for buf, compressed in self._deflate_parallel(filename, compresslevel):
+                file_size = file_size + len(buf)
+                CRC = zipfile.crc32(buf, CRC) & 0xffffffff
+                compress_size = compress_size + len(compressed)
+                yield self.fp.write(compressed)
+        elif filename:
             async for buf in self.data_generator(filename):
                 file_size = file_size + len(buf)
                 CRC = zipfile.crc32(buf, CRC) & 0xffffffff
@@ -420,6 +518,7 @@ class ZipFile(zipfile.ZipFile):
                 yield self.fp.write(self._comment)
                 self.fp.flush()
         finally:
+            self._executor.shutdown(wait=False)
             fp = self.fp
             self.fp = None
             if not self._filePassed:
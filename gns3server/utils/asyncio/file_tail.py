@@ -0,0 +1,289 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2020 GNS3 Technologies Inc.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Follow files growing while they are read, like the packet captures.
+
+One watcher per file detects the new data (with inotify on Linux or by
+polling with an adaptive delay) and the readers following the end of the
+file share the same block read, so streaming a file to several clients
+does not multiply the disk reads and the wakeups.
+"""
+
+import os
+import sys
+import asyncio
+import threading
+import contextlib
+
+from . import wait_run_in_executor
+
+import logging
+log = logging.getLogger(__name__)
+
+BLOCK_SIZE = 1024 * 64  # 64KB
+# Delays between two checks of the file size when inotify is not available
+MIN_POLL_DELAY = 0.05
+MAX_POLL_DELAY = 1
+
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+_inotify = None
+_tails = {}
+
+
+def _libc_inotify():
+    """
+    :returns: libc with the inotify functions or None if not available
+    """
+
+    global _inotify
+    if _inotify is None:
+        _inotify = False
+        if sys.platform.startswith("linux"):
+            try:
+                import ctypes
+                import ctypes.util
+                libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+                libc.inotify_init1.argtypes = [ctypes.c_int]
+                libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+                _inotify = libc
+            except (OSError, AttributeError) as e:
+                log.debug("inotify is not available: {}".format(e))
+    return _inotify or None
+
+
+class FileTail:
+    """
+    Watch a file and read its new data for several readers.
+
+    :param path: Path of the file
+    """
+
+    def __init__(self, path):
+
+        self._path = path
+        self._file = open(path, "rb")
+        self._file_lock = threading.Lock()
+        self._size = os.fstat(self._file.fileno()).st_size
+        self._block = (0, b"")
+        self._pending_reads = {}
+        self._readers = 0
+        self._closed = False
+        self._loop = asyncio.get_event_loop()
+        self._changed = asyncio.Event()
+        self._inotify_fd = None
+        self._poll_delay = MIN_POLL_DELAY
+        self._poll_handle = None
+        if not self._watch_inotify():
+            self._poll_handle = self._loop.call_later(self._poll_delay, self._poll)
+
+    @property
+    def size(self):
+        """
+        :returns: Size of the file when it changed the last time
+        """
+
+        return self._size
+
+    def _watch_inotify(self):
+        """
+        Watch the file with inotify
+
+        :returns: False if inotify cannot be used
+        """
+
+        libc = _libc_inotify()
+        if libc is None:
+            return False
+        fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            return False
+        if libc.inotify_add_watch(fd, os.fsencode(self._path), IN_MODIFY | IN_CLOSE_WRITE) < 0:
+            os.close(fd)
+            return False
+        try:
+            self._loop.add_reader(fd, self._inotify_event)
+        except NotImplementedError:
+            os.close(fd)
+            return False
+        self._inotify_fd = fd
+        return True
+
+    def _inotify_event(self):
+
+        try:
+            while os.read(self._inotify_fd, 4096):
+                pass
+        except BlockingIOError:
+            pass
+        except OSError as e:
+            log.warning("Error while reading inotify events for '{}': {}".format(self._path, e))
+        self._check_size()
+
+    def _poll(self):
+
+        if self._closed:
+            return
+        if self._check_size():
+            self._poll_delay = MIN_POLL_DELAY
+        else:
+            # the file doesn't change, check it less often
+            self._poll_delay = min(self._poll_delay * 2, MAX_POLL_DELAY)
+        self._poll_handle = self._loop.call_later(self._poll_delay, self._poll)
+
+    def _check_size(self):
+        """
+        Wake up the readers if the file has grown
+
+        :returns: True if the file has grown
+        """
+
+        try:
+            size = os.fstat(self._file.fileno()).st_size
+        except (OSError, ValueError):
+            return False
+        if size == self._size:
+            return False
+        self._size = size
+        self._notify()
+        return True
+
+    def _notify(self):
+
+        # wake up the current waiters only
+        self._changed.set()
+        self._changed.clear()
+
+    async def wait(self, offset, timeout=None):
+        """
+        Wait for data after an offset
+
+        :param offset: Offset in the file
+        :param timeout: Maximum time to wait in seconds
+        """
+
+        if offset < self._size or self._closed:
+            return
+        try:
+            # the waiter is removed from the event when the timeout expires
+            await asyncio.wait_for(self._changed.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    def _read_at(self, offset):
+
+        with self._file_lock:
+            if self._file.closed:
+                return b""
+            self._file.seek(offset)
+            return self._file.read(BLOCK_SIZE)
+
+    async def read(self, offset):
+        """
+        Read a block of data starting at an offset, the last block is
+        kept for the next readers and concurrent reads are shared.
+
+        :param offset: Offset in the file
+
+        :returns: The data, empty if there is no data after this offset
+        """
+
+        block_offset, block = self._block
+        if block_offset <= offset < block_offset + len(block):
+            return block[offset - block_offset:]
+        if offset >= self._size:
+            return b""
+
+        future = self._pending_reads.get(offset)
+        if future is None:
+            future = self._pending_reads[offset] = asyncio.ensure_future(wait_run_in_executor(self._read_at, offset))
+            future.add_done_callback(lambda f: self._pending_reads.pop(offset, None))
+        data = await asyncio.shield(future)
+        if data and offset >= self._block[0]:
+            self._block = (offset, data)
+        return data
+
+    def close(self):
+
+        self._closed = True
+        self._notify()
+        if self._poll_handle:
+            self._poll_handle.cancel()
+        if self._inotify_fd is not None:
+            self._loop.remove_reader(self._inotify_fd)
+            os.close(self._inotify_fd)
+            self._inotify_fd = None
+        with self._file_lock:
+            self._file.close()
+
+
+class FileTailReader:
+    """
+    Read a file from the beginning and follow its growth.
+
+    :param tail: FileTail instance of the file
+    """
+
+    def __init__(self, tail):
+
+        self._tail = tail
+        self._offset = 0
+
+    async def read(self, timeout=1):
+        """
+        Read the next data of the file, wait for new
+        data if the end of the file has been reached.
+
+        :param timeout: Maximum time to wait for new data
+
+        :returns: The data, empty if nothing has been written during the timeout
+        """
+
+        await self._tail.wait(self._offset, timeout=timeout)
+        data = await self._tail.read(self._offset)
+        self._offset += len(data)
+        return data
+
+
+@contextlib.contextmanager
+def follow_file(path):
+    """
+    Follow a file, the readers of the same file share its watcher.
+
+    You must handle OSError exceptions when the file cannot be opened.
+
+    :param path: Path of the file
+
+    :returns: FileTailReader instance
+    """
+
+    path = os.path.abspath(path)
+    tail = _tails.get(path)
+    if tail is None:
+        tail = _tails[path] = FileTail(path)
+    tail._readers += 1
+    try:
+        yield FileTailReader(tail)
+    finally:
+        tail._readers -= 1
+        if tail._readers == 0:
+            del _tails[path]
+            tail.close()
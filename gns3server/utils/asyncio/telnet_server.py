@@ -19,6 +19,9 @@ import socket
 import asyncio
 import asyncio.subprocess
 import struct
+import collections
+
+from gns3server.config import Config
 
 import logging
 log = logging.getLogger(__name__)
@@ -56,6 +59,170 @@ NAWS = 31     # Negotiate About Window Size
 LINEMO = 34     # Line Mode
 
 READ_SIZE = 1024
+# Maximum number of bytes of output waiting to be sent to a slow client
+CLIENT_BUFFER_SIZE = 1024 * 256  # 256KB
+# Maximum number of bytes sent to a client in one write
+CLIENT_WRITE_SIZE = 1024 * 64  # 64KB
+
+
+class TelnetClientBuffer:
+    """
+    Bounded buffer of the output sent to one client, data is written to
+    the client by its own task so a slow client cannot block the others.
+    Everything sent to the client must go through this buffer, only its
+    task drains the writer.
+
+    When the buffer is full, the "drop" overflow policy drops the
+    oldest data and the "disconnect" policy closes the connection.
+
+    :param writer: Stream writer of the client
+    :param maxsize: Maximum number of bytes waiting to be sent
+    :param overflow_policy: "drop" or "disconnect"
+    """
+
+    def __init__(self, writer, maxsize=CLIENT_BUFFER_SIZE, overflow_policy="drop"):
+
+        self._writer = writer
+        self._maxsize = maxsize
+        self._overflow_policy = overflow_policy
+        self._chunks = collections.deque()
+        self._size = 0
+        self._data_available = asyncio.Event()
+        self._closed = False
+        self._eof = False
+        self._bytes_sent = 0
+        self._bytes_received = 0
+        self._bytes_dropped = 0
+        self._chunks_sent = 0
+        self._total_latency = 0.0
+        self._max_latency = 0.0
+        self._task = asyncio.ensure_future(self._send())
+
+    @property
+    def closed(self):
+
+        return self._closed
+
+    def received(self, size):
+        """
+        Counts the bytes received from the client
+
+        :param size: Number of bytes
+        """
+
+        self._bytes_received += size
+
+    def write(self, data):
+        """
+        Queues data for the client, never blocks.
+
+        :param data: Data to send
+        """
+
+        if self._closed or self._eof or not data:
+            return
+        self._chunks.append((asyncio.get_event_loop().time(), data))
+        self._size += len(data)
+        if self._size > self._maxsize:
+            if self._overflow_policy == "disconnect":
+                log.warning("Console client is too slow, {} bytes are waiting, disconnecting".format(self._size))
+                self.close()
+                self._writer.close()
+                return
+            if self._bytes_dropped == 0:
+                log.warning("Console client is too slow, dropping the oldest output")
+            while self._size > self._maxsize:
+                timestamp, chunk = self._chunks.popleft()
+                excess = self._size - self._maxsize
+                if len(chunk) > excess:
+                    # keep the most recent part of the chunk
+                    self._chunks.appendleft((timestamp, chunk[excess:]))
+                    chunk = chunk[:excess]
+                self._size -= len(chunk)
+                self._bytes_dropped += len(chunk)
+        self._data_available.set()
+
+    def _pop(self):
+        """
+        :returns: Tuple (timestamps, data) of the next data to send
+        """
+
+        timestamps = []
+        data = []
+        size = 0
+        while self._chunks and size < CLIENT_WRITE_SIZE:
+            timestamp, chunk = self._chunks.popleft()
+            timestamps.append(timestamp)
+            data.append(chunk)
+            size += len(chunk)
+        self._size -= size
+        return timestamps, b"".join(data)
+
+    async def _send(self):
+
+        loop = asyncio.get_event_loop()
+        try:
+            while not self._closed:
+                await self._data_available.wait()
+                self._data_available.clear()
+                while self._chunks:
+                    timestamps, data = self._pop()
+                    self._writer.write(data)
+                    await self._writer.drain()
+                    now = loop.time()
+                    for timestamp in timestamps:
+                        latency = now - timestamp
+                        self._total_latency += latency
+                        self._max_latency = max(self._max_latency, latency)
+                    self._chunks_sent += len(timestamps)
+                    self._bytes_sent += len(data)
+                if self._eof:
+                    self._writer.write_eof()
+                    await self._writer.drain()
+                    break
+        except (AttributeError, ConnectionError):
+            self._closed = True
+
+    async def write_eof(self):
+        """
+        Closes the write end of the connection once the
+        pending data is sent and waits for it.
+        """
+
+        if self._closed or self._eof:
+            return
+        self._eof = True
+        self._data_available.set()
+        try:
+            await asyncio.shield(self._task)
+        except asyncio.CancelledError:
+            pass
+
+    def close(self):
+        """
+        Stops sending data to the client
+        """
+
+        self._closed = True
+        self._chunks.clear()
+        self._size = 0
+        self._task.cancel()
+
+    def statistics(self):
+        """
+        :returns: dictionary with the counters of the client, latencies are in seconds
+        """
+
+        if self._chunks_sent:
+            average_latency = self._total_latency / self._chunks_sent
+        else:
+            average_latency = 0.0
+        return {"bytes_sent": self._bytes_sent,
+                "bytes_received": self._bytes_received,
+                "bytes_dropped": self._bytes_dropped,
+                "pending": self._size,
+                "average_latency": average_latency,
+                "max_latency": self._max_latency}
 
 
 class TelnetConnection(object):
@@ -114,11 +281,14 @@ class TelnetConnection(object):
 class AsyncioTelnetServer:
     MAX_NEGOTIATION_READ = 10
 
-    def __init__(self, reader=None, writer=None, binary=True, echo=False, naws=False, window_size_changed_callback=None, connection_factory=None):
+    def __init__(self, reader=None, writer=None, binary=True, echo=False, naws=False, window_size_changed_callback=None, connection_factory=None,
+                 buffer_size=None, overflow_policy=None):
         """
         Initializes telnet server
         :param naws when True make a window size negotiation
         :param connection_factory: when set it's possible to inject own implementation of connection
+        :param buffer_size: maximum number of bytes of output waiting to be sent to each client
+        :param overflow_policy: "drop" the oldest output or "disconnect" a client when its buffer is full
         """
         assert connection_factory is None or (connection_factory is not None and reader is None and writer is None), \
             "Please use either reader and writer either connection_factory, otherwise duplicate data may be produced."
@@ -126,6 +296,7 @@ class AsyncioTelnetServer:
         self._reader = reader
         self._writer = writer
         self._connections = dict()
+        self._buffers = dict()
         self._lock = asyncio.Lock()
         self._reader_process = None
         self._current_read = None
@@ -138,6 +309,14 @@ class AsyncioTelnetServer:
         self._echo = echo
         self._naws = naws
 
+        server_config = Config.instance().get_section_config("Server")
+        if buffer_size is None:
+            buffer_size = int(server_config.get("console_buffer_size", CLIENT_BUFFER_SIZE))
+        if overflow_policy is None:
+            overflow_policy = server_config.get("console_overflow_policy", "drop")
+        self._buffer_size = buffer_size
+        self._overflow_policy = overflow_policy
+
         def default_connection_factory(reader, writer, window_size_changed_callback):
             return TelnetConnection(reader, writer, window_size_changed_callback)
 
@@ -158,7 +337,8 @@ class AsyncioTelnetServer:
         await writer.drain()
 
     async def _write_intro(self, writer, binary=False, echo=False, naws=False):
-        # Send initial telnet session opening
+        # Send initial telnet session opening, writer is the
+        # buffer of the client, it's drained by the buffer task
         if echo:
             writer.write(bytes([IAC, WILL, ECHO]))
         else:
@@ -182,7 +362,6 @@ class AsyncioTelnetServer:
             writer.write(bytes([
                 IAC, DO, NAWS
             ]))
-        await writer.drain()
 
     async def run(self, network_reader, network_writer):
 
@@ -194,9 +373,11 @@ class AsyncioTelnetServer:
         # Keep track of connected clients
         connection = self._connection_factory(network_reader, network_writer, self._window_size_changed_callback)
         self._connections[network_writer] = connection
+        client_buffer = TelnetClientBuffer(network_writer, self._buffer_size, self._overflow_policy)
+        self._buffers[network_writer] = client_buffer
 
         try:
-            await self._write_intro(network_writer, echo=self._echo, binary=self._binary, naws=self._naws)
+            await self._write_intro(client_buffer, echo=self._echo, binary=self._binary, naws=self._naws)
             await connection.connected()
             await self._process(network_reader, network_writer, connection)
         except ConnectionError:
@@ -210,14 +391,20 @@ class AsyncioTelnetServer:
 
             await connection.disconnected()
             del self._connections[network_writer]
+            del self._buffers[network_writer]
+            client_buffer.close()
+            log.debug("Console client disconnected: {}".format(client_buffer.statistics()))
+
+    def statistics(self):
+        """
+        :returns: list with the counters of each connected client
+        """
+
+        return [client_buffer.statistics() for client_buffer in self._buffers.values()]
 
     async def close(self):
-        for writer, connection in self._connections.items():
-            try:
-                writer.write_eof()
-                await writer.drain()
-            except (AttributeError, ConnectionError):
-                continue
+        for client_buffer in list(self._buffers.values()):
+            await client_buffer.write_eof()
 
     async def client_connected_hook(self):
         pass
@@ -263,6 +450,7 @@ class AsyncioTelnetServer:
                         raise ConnectionResetError()
 
                     network_read = asyncio.ensure_future(network_reader.read(READ_SIZE))
+                    self._buffers[network_writer].received(len(data))
 
                     if IAC in data:
                         data = await self._IAC_parser(data, network_reader, network_writer, connection)
@@ -287,10 +475,10 @@ class AsyncioTelnetServer:
 
                     reader_read = await self._get_reader(network_reader)
 
-                    # Replicate the output on all clients
-                    for connection in self._connections.values():
-                        connection.writer.write(data)
-                        await connection.writer.drain()
+                    # Replicate the output on all clients, each client
+                    # has its own buffer so a slow one doesn't block the others
+                    for client_buffer in self._buffers.values():
+                        client_buffer.write(data)
 
     async def _read(self, cmd, buffer, location, reader):
         """ Reads next op from the buffer or reader"""
@@ -319,13 +507,14 @@ class AsyncioTelnetServer:
 
     async def _IAC_parser(self, buf, network_reader, network_writer, connection):
         """
-        Processes and removes any Telnet commands from the buffer.
+        Processes and removes any Telnet commands from the buffer,
+        the replies are queued after the output already sent to the client.
 
         :param buf: buffer
         :returns: buffer minus Telnet commands
         """
 
-
+        client_buffer = self._buffers[network_writer]
         skip_to = 0
         while True:
             # Locate an IAC to process
@@ -346,7 +535,7 @@ class AsyncioTelnetServer:
             if iac_cmd[1] not in [WILL, WONT, DO, DONT, SB]:
                 if iac_cmd[1] == AYT:
                     log.debug("Telnet server received Are-You-There (AYT)")
-                    network_writer.write(b'\r\nYour Are-You-There received. I am here.\r\n')
+                    client_buffer.write(b'\r\nYour Are-You-There received. I am here.\r\n')
                 elif iac_cmd[1] == IAC:
                     # It's data, not an IAC
                     iac_cmd.pop()
@@ -382,14 +571,14 @@ class AsyncioTelnetServer:
                 # We do ECHO, SGA, and BINARY. Period.
                 if iac_cmd[1] == DO:
                     if iac_cmd[2] not in [ECHO, SGA, BINARY]:
-                        network_writer.write(bytes([IAC, WONT, iac_cmd[2]]))
+                        client_buffer.write(bytes([IAC, WONT, iac_cmd[2]]))
                         log.debug("Telnet WON'T {:#x}".format(iac_cmd[2]))
                     else:
                         if iac_cmd[2] == SGA:
                             if self._binary:
-                                network_writer.write(bytes([IAC, WILL, iac_cmd[2]]))
+                                client_buffer.write(bytes([IAC, WILL, iac_cmd[2]]))
                             else:
-                                network_writer.write(bytes([IAC, WONT, iac_cmd[2]]))
+                                client_buffer.write(bytes([IAC, WONT, iac_cmd[2]]))
                                 log.debug("Telnet WON'T {:#x}".format(iac_cmd[2]))
 
                 elif iac_cmd[1] == DONT:
@@ -409,8 +598,6 @@ class AsyncioTelnetServer:
             # Remove the entire TELNET command from the buffer
             buf = buf.replace(iac_cmd, b'', 1)
 
-            await network_writer.drain()
-
         # Return the new copy of the buffer, minus telnet commands
         return buf
 
@@ -0,0 +1,369 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2022 GNS3 Technologies Inc.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Checksum engine for images and project files.
+
+Files are hashed with large blocks on a bounded thread pool and the
+results are stored in a persistent index keyed on the path, size,
+modification time and inode of each file.
+"""
+
+import os
+import json
+import errno
+import asyncio
+import hashlib
+import threading
+import concurrent.futures
+
+from ..config import Config
+
+import logging
+log = logging.getLogger(__name__)
+
+BLOCK_SIZE = 1024 * 1024  # 1MB
+INDEX_FILENAME = ".md5sums"
+# Hashing is I/O bound, more threads only make the disks seek
+MAX_WORKERS = min(4, os.cpu_count() or 1)
+
+_ZERO_BLOCK = memoryview(bytes(BLOCK_SIZE))
+_indexes = {}
+_indexes_lock = threading.Lock()
+_executor = None
+_pending = {}
+
+
+def compute_md5(path, stopped_event=None):
+    """
+    Compute the md5 of a file without using the cache.
+    Holes of sparse files are hashed without being read.
+
+    :param path: Path to the file
+    :param stopped_event: threading.Event to cancel the computation
+    :returns: hexadecimal md5 or None if cancelled
+    """
+
+    m = hashlib.md5()
+    buf = bytearray(BLOCK_SIZE)
+    view = memoryview(buf)
+    with open(path, "rb") as f:
+        for offset, length, is_hole in _segments(f):
+            while length > 0:
+                if stopped_event is not None and stopped_event.is_set():
+                    log.error("MD5 sum calculation of `{}` has stopped due to cancellation".format(path))
+                    return None
+                size = min(length, BLOCK_SIZE)
+                if is_hole:
+                    m.update(_ZERO_BLOCK[:size])
+                else:
+                    f.seek(offset)
+                    read = f.readinto(view[:size])
+                    if not read:
+                        # the file has been truncated while reading it
+                        return m.hexdigest()
+                    m.update(view[:read])
+                    size = read
+                offset += size
+                length -= size
+    return m.hexdigest()
+
+
+def _segments(f):
+    """
+    Split a file in data and hole segments.
+
+    :param f: file object
+    :returns: iterator of (offset, length, is_hole)
+    """
+
+    size = os.fstat(f.fileno()).st_size
+    if not hasattr(os, "SEEK_DATA"):
+        yield 0, size, False
+        return
+
+    fd = f.fileno()
+    offset = 0
+    while offset < size:
+        try:
+            data = os.lseek(fd, offset, os.SEEK_DATA)
+        except OSError as e:
+            # ENXIO means there is no more data until the end of the file
+            yield offset, size - offset, e.errno == errno.ENXIO
+            return
+        if data > offset:
+            yield offset, data - offset, True
+        try:
+            hole = os.lseek(fd, data, os.SEEK_HOLE)
+        except OSError:
+            hole = size
+        hole = min(hole, size)
+        yield data, hole - data, False
+        offset = hole
+
+
+class ChecksumIndex:
+    """
+    Persistent index of file checksums.
+
+    The index is an append only file with a JSON entry per line,
+    the latest entry for a path wins. It is compacted when loaded.
+
+    :param path: Path of the index file
+    """
+
+    def __init__(self, path):
+
+        self._path = path
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._load()
+
+    @property
+    def path(self):
+
+        return self._path
+
+    def _load(self):
+
+        lines = 0
+        try:
+            with open(self._path, encoding="utf-8") as f:
+                for line in f:
+                    lines += 1
+                    try:
+                        entry = json.loads(line)
+                        if entry.get("md5") is None:
+                            self._entries.pop(entry["path"], None)
+                        else:
+                            self._entries[entry["path"]] = (entry["size"], entry["mtime_ns"], entry["inode"], entry["md5"])
+                    except (ValueError, KeyError, TypeError):
+                        continue
+        except FileNotFoundError:
+            return
+        except OSError as e:
+            log.warning("Cannot read checksum index '{}': {}".format(self._path, e))
+            return
+        if lines > 2 * len(self._entries) + 100:
+            self._compact()
+
+    def _compact(self):
+
+        # forget the files which have been deleted
+        self._entries = {path: entry for path, entry in self._entries.items() if os.path.exists(path)}
+        tmp_path = self._path + ".tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                for path, (size, mtime_ns, inode, md5) in self._entries.items():
+                    f.write(self._line(path, size, mtime_ns, inode, md5))
+            os.replace(tmp_path, self._path)
+        except OSError as e:
+            log.warning("Cannot compact checksum index '{}': {}".format(self._path, e))
+
+    @staticmethod
+    def _line(path, size, mtime_ns, inode, md5):
+
+        return json.dumps({"path": path, "size": size, "mtime_ns": mtime_ns, "inode": inode, "md5": md5}) + "\n"
+
+    def _append(self, line):
+
+        try:
+            os.makedirs(os.path.dirname(self._path), exist_ok=True)
+            with open(self._path, "a", encoding="utf-8") as f:
+                f.write(line)
+        except OSError as e:
+            log.warning("Cannot write checksum index '{}': {}".format(self._path, e))
+
+    def get(self, path, st):
+        """
+        Returns the checksum of a file if the file has not changed.
+
+        :param path: Absolute path of the file
+        :param st: os.stat_result of the file
+        :returns: md5 or None
+        """
+
+        entry = self._entries.get(path)
+        if entry and entry[:3] == (st.st_size, st.st_mtime_ns, st.st_ino):
+            return entry[3]
+        return None
+
+    def set(self, path, st, md5):
+        """
+        Stores the checksum of a file.
+
+        :param path: Absolute path of the file
+        :param st: os.stat_result of the file when the checksum was computed
+        :param md5: md5 of the file
+        """
+
+        with self._lock:
+            self._entries[path] = (st.st_size, st.st_mtime_ns, st.st_ino, md5)
+            self._append(self._line(path, st.st_size, st.st_mtime_ns, st.st_ino, md5))
+
+    def remove(self, path):
+        """
+        Removes a file from the index.
+
+        :param path: Absolute path of the file
+        """
+
+        with self._lock:
+            if self._entries.pop(path, None) is not None:
+                self._append(self._line(path, None, None, None, None))
+
+
+def checksum_index(directory=None):
+    """
+    Returns the checksum index stored at the root of a directory.
+
+    :param directory: Directory of the files, the images directory by default
+    """
+
+    if directory is None:
+        server_config = Config.instance().get_section_config("Server")
+        directory = os.path.expanduser(server_config.get("images_path", "~/GNS3/images"))
+    index_path = os.path.join(directory, INDEX_FILENAME)
+    with _indexes_lock:
+        if index_path not in _indexes:
+            _indexes[index_path] = ChecksumIndex(index_path)
+        return _indexes[index_path]
+
+
+def release_checksum_index(directory):
+    """
+    Forgets the checksum index of a directory, the index file is kept.
+
+    :param directory: Directory of the files
+    """
+
+    with _indexes_lock:
+        _indexes.pop(os.path.join(directory, INDEX_FILENAME), None)
+
+
+def _legacy_checksum(path):
+    """
+    Reads a checksum from a .md5sum file written by previous versions.
+    """
+
+    try:
+        with open(path + ".md5sum") as f:
+            md5 = f.read().strip()
+            if len(md5) == 32:
+                return md5
+    # Unicode error is when user rename an image to .md5sum ....
+    except (OSError, UnicodeDecodeError):
+        pass
+    return None
+
+
+def md5sum(path, stopped_event=None, index=None):
+    """
+    Returns the md5 of a file, the checksum is computed only if
+    the file is not in the index or has changed.
+
+    :param path: Path to the file
+    :param stopped_event: In case you execute this function on thread and would like to have possibility
+                          to cancel operation pass the `threading.Event`
+    :param index: ChecksumIndex storing the checksum, the index of the images by default
+    :returns: Digest of the file or None
+    """
+
+    if path is None or len(path) == 0:
+        return None
+    path = os.path.abspath(path)
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+
+    images = index is None
+    if images:
+        index = checksum_index()
+    md5 = index.get(path, st)
+    if md5 is not None:
+        return md5
+
+    # only the images have .md5sum files
+    if images:
+        md5 = _legacy_checksum(path)
+    if md5 is None:
+        try:
+            md5 = compute_md5(path, stopped_event=stopped_event)
+        except OSError as e:
+            log.error("Can't create digest of %s: %s", path, str(e))
+            return None
+        if md5 is None:
+            return None
+    index.set(path, st, md5)
+    return md5
+
+
+def remove_checksum(path):
+    """
+    Removes the checksum of a file from the index.
+
+    :param path: Path to the file
+    """
+
+    path = os.path.abspath(path)
+    checksum_index().remove(path)
+    legacy_path = path + ".md5sum"
+    if os.path.exists(legacy_path):
+        os.remove(legacy_path)
+
+
+def _get_executor():
+
+    global _executor
+    if _executor is None:
+        _executor = concurrent.futures.ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="checksum")
+    return _executor
+
+
+async def md5sum_async(path, index=None):
+    """
+    Returns the md5 of a file, computed on the checksum thread pool.
+    Concurrent requests for the same file share the same computation.
+
+    :param path: Path to the file
+    :param index: ChecksumIndex storing the checksum, the index of the images by default
+    :returns: Digest of the file or None
+    """
+
+    if path is None or len(path) == 0:
+        return None
+    path = os.path.abspath(path)
+    key = (path, index.path if index is not None else None)
+    future = _pending.get(key)
+    if future is None:
+        loop = asyncio.get_event_loop()
+        stopped_event = threading.Event()
+        future = loop.run_in_executor(_get_executor(), md5sum, path, stopped_event, index)
+        future.stopped_event = stopped_event
+        future.waiters = 0
+        _pending[key] = future
+        future.add_done_callback(lambda f: _pending.pop(key, None) if _pending.get(key) is f else None)
+    future.waiters += 1
+    try:
+        return await asyncio.shield(future)
+    except asyncio.CancelledError:
+        future.waiters -= 1
+        if future.waiters == 0:
+            # Nobody is waiting for the result anymore
+            future.stopped_event.set()
+        raise
@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2022 GNS3 Technologies Inc.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import sys
+import shutil
+
+from .asyncio import wait_run_in_executor
+from .asyncio.pool import Pool
+
+import logging
+log = logging.getLogger(__name__)
+
+# ioctl to share the blocks of a file with another one on Btrfs and XFS (Linux)
+FICLONE = 0x40049409
+# Number of files copied at the same time
+COPY_CONCURRENCY = 8
+
+
+def clone_file(source, destination):
+    """
+    Copy a file. On filesystems supporting it the copy shares the
+    blocks of the source (reflink), otherwise the data is copied
+    by the kernel when possible.
+
+    :param source: path of the file to copy
+    :param destination: path of the copy
+    """
+
+    if sys.platform.startswith("linux"):
+        import fcntl
+        with open(source, "rb") as src, open(destination, "wb") as dst:
+            try:
+                fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+                return
+            except OSError:
+                # the filesystem doesn't support reflinks
+                pass
+            if hasattr(os, "copy_file_range"):
+                try:
+                    size = os.fstat(src.fileno()).st_size
+                    offset = 0
+                    while offset < size:
+                        copied = os.copy_file_range(src.fileno(), dst.fileno(), size - offset)
+                        if copied == 0:
+                            break
+                        offset += copied
+                    return
+                except OSError:
+                    # not supported between these filesystems, copy the file in user space
+                    dst.seek(0)
+                    dst.truncate()
+    shutil.copyfile(source, destination)
+
+
+def _copy_file(source, destination):
+
+    os.makedirs(os.path.dirname(destination), exist_ok=True)
+    clone_file(source, destination)
+    shutil.copymode(source, destination)
+
+
+async def copy_project_files(source, destination, node_ids=None, ignore=None):
+    """
+    Copy the files of a project to another project directory,
+    several files are copied at the same time.
+
+    :param source: project directory to copy
+    :param destination: directory of the new project
+    :param node_ids: dictionary of new node IDs indexed by old node ID, used to rename the node directories
+    :param ignore: function called with the path of each file relative to the project, the file is not copied if it returns True
+
+    :returns: number of copied files
+    """
+
+    if node_ids is None:
+        node_ids = {}
+
+    pool = Pool(concurrency=COPY_CONCURRENCY)
+    copied = 0
+    for root, dirs, files in os.walk(source, followlinks=False):
+        for filename in files:
+            path = os.path.join(root, filename)
+            if os.path.islink(path):
+                continue
+            relpath = os.path.relpath(path, source)
+            if ignore and ignore(relpath):
+                continue
+
+            # project-files/<node type>/<node id>/...
+            parts = relpath.split(os.path.sep)
+            if len(parts) > 3 and parts[0] == "project-files" and parts[2] in node_ids:
+                parts[2] = node_ids[parts[2]]
+            pool.append(wait_run_in_executor, _copy_file, path, os.path.join(destination, *parts))
+            copied += 1
+    await pool.join()
+    log.debug("{} files copied from '{}' to '{}'".format(copied, source, destination))
+    return copied
@@ -16,15 +16,25 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import os
-import hashlib
+import time
+import threading
 
 from ..config import Config
 from . import force_unix_path
+from .checksum import md5sum
 
 
 import logging
 log = logging.getLogger(__name__)
 
+# Seconds during which the image directories and their indexes are trusted
+# without checking the file system for changes
+REVALIDATE_INTERVAL = 2
+
+_images_directories = {}
+_file_indexes = {}
+_file_indexes_lock = threading.Lock()
+
 
 def list_images(type):
     """
@@ -32,8 +42,32 @@ def list_images(type):
 
     :param type: emulator type (dynamips, qemu, iou)
     """
+
+    images = []
+    for path, image, _ in scan_images(type)[0]:
+        image["md5sum"] = md5sum(path)
+        images.append(image)
+    return images
+
+
+def scan_images(type, known=None):
+    """
+    Scan directories for available images for a type without
+    computing their checksums.
+
+    :param type: emulator type (dynamips, qemu, iou)
+    :param known: dictionary of absolute image paths and their os.stat_result,
+                  images which have not changed since are not opened again
+
+    :returns: tuple (list of (absolute path, image, os.stat_result),
+                     dictionary of the scanned directories and their modification time)
+    """
+
     files = set()
     images = []
+    directories = {}
+    if known is None:
+        known = {}
 
     server_config = Config.instance().get_section_config("Server")
     general_images_directory = os.path.expanduser(server_config.get("images_path", "~/GNS3/images"))
@@ -52,6 +86,10 @@ def list_images(type):
 
         directory = os.path.normpath(directory)
         for root, _, filenames in _os_walk(directory, recurse=recurse):
+            try:
+                directories[root] = os.stat(root).st_mtime_ns
+            except OSError:
+                continue
             for filename in filenames:
                 path = os.path.join(root, filename)
                 if filename not in files:
@@ -68,23 +106,50 @@ def list_images(type):
                         else:
                             path = os.path.relpath(os.path.join(root, filename), default_directory)
 
+                        abs_path = os.path.abspath(os.path.join(root, filename))
                         try:
-                            if type in ["dynamips", "iou"]:
-                                with open(os.path.join(root, filename), "rb") as f:
+                            st = os.stat(abs_path)
+                            if type in ["dynamips", "iou"] and not _same_file(known.get(abs_path), st):
+                                with open(abs_path, "rb") as f:
                                     # read the first 7 bytes of the file.
                                     elf_header_start = f.read(7)
                                 # valid IOS images must start with the ELF magic number, be 32-bit, big endian and have an ELF version of 1
                                 if not elf_header_start == b'\x7fELF\x01\x02\x01' and not elf_header_start == b'\x7fELF\x01\x01\x01':
                                     continue
 
-                            images.append({
-                                "filename": filename,
-                                "path": force_unix_path(path),
-                                "md5sum": md5sum(os.path.join(root, filename)),
-                                "filesize": os.stat(os.path.join(root, filename)).st_size})
+                            images.append((abs_path,
+                                           {"filename": filename,
+                                            "path": force_unix_path(path),
+                                            "filesize": st.st_size},
+                                           st))
                         except OSError as e:
                             log.warning("Can't add image {}: {}".format(path, str(e)))
-    return images
+    return images, directories
+
+
+def directories_changed(directories):
+    """
+    Checks if files have been added or removed in scanned directories.
+
+    :param directories: dictionary of directories and their modification time returned by scan_images()
+
+    :returns: boolean
+    """
+
+    for directory, mtime_ns in directories.items():
+        try:
+            if os.stat(directory).st_mtime_ns != mtime_ns:
+                return True
+        except OSError:
+            return True
+    return False
+
+
+def _same_file(st1, st2):
+
+    if st1 is None or st2 is None:
+        return False
+    return (st1.st_size, st1.st_mtime_ns, st1.st_ino) == (st2.st_size, st2.st_mtime_ns, st2.st_ino)
 
 
 def _os_walk(directory, recurse=True, **kwargs):
@@ -127,74 +192,118 @@ def images_directories(type):
     """
     server_config = Config.instance().get_section_config("Server")
 
-    paths = []
     img_dir = os.path.expanduser(server_config.get("images_path", "~/GNS3/images"))
     type_img_directory = default_images_directory(type)
+    additional_images_path = server_config.get("additional_images_path", "")
+
+    key = (type_img_directory, additional_images_path, img_dir)
+    now = time.monotonic()
+    cached = _images_directories.get(key)
+    if cached is not None and now - cached[0] < REVALIDATE_INTERVAL:
+        return list(cached[1])
+
+    paths = []
     try:
         os.makedirs(type_img_directory, exist_ok=True)
         paths.append(type_img_directory)
     except (OSError, PermissionError):
         pass
-    for directory in server_config.get("additional_images_path", "").split(";"):
+    for directory in additional_images_path.split(";"):
         paths.append(directory)
     # Compatibility with old topologies we look in parent directory
     paths.append(img_dir)
     # Return only the existing paths
-    return [force_unix_path(p) for p in paths if os.path.exists(p)]
+    paths = [force_unix_path(p) for p in paths if os.path.exists(p)]
+    _images_directories[key] = (now, paths)
+    return list(paths)
 
 
-def md5sum(path, stopped_event=None):
+class FileIndex:
     """
-    Return the md5sum of an image and cache it on disk
+    Index of the files of a directory and its subdirectories by filename.
+
+    The index is rebuilt when files are added or removed in one of the
+    directories, this is checked at most every REVALIDATE_INTERVAL seconds
+    and when a file is not found.
 
-    :param path: Path to the image
-    :param stopped_event: In case you execute this function on thread and would like to have possibility
-                          to cancel operation pass the `threading.Event`
-    :returns: Digest of the image
+    :param directory: Directory to index
     """
 
-    if path is None or len(path) == 0 or not os.path.exists(path):
-        return None
+    def __init__(self, directory):
 
-    try:
-        with open(path + '.md5sum') as f:
-            md5 = f.read().strip()
-            if len(md5) == 32:
-                return md5
-    # Unicode error is when user rename an image to .md5sum ....
-    except (OSError, UnicodeDecodeError):
-        pass
+        self._directory = directory
+        self._files = {}  # filename -> list of paths in os.walk order
+        self._directories = {}  # directory -> modification time
+        self._checked = None
+        self._lock = threading.Lock()
+        self._build()
 
-    try:
-        m = hashlib.md5()
-        with open(path, 'rb') as f:
-            while True:
-                if stopped_event is not None and stopped_event.is_set():
-                    log.error("MD5 sum calculation of `{}` has stopped due to cancellation".format(path))
-                    return
-                buf = f.read(128)
-                if not buf:
-                    break
-                m.update(buf)
-        digest = m.hexdigest()
-    except OSError as e:
-        log.error("Can't create digest of %s: %s", path, str(e))
+    def _build(self):
+
+        files = {}
+        directories = {self._directory: None}
+        for root, _, filenames in os.walk(self._directory):
+            try:
+                directories[root] = os.stat(root).st_mtime_ns
+            except OSError:
+                continue
+            for filename in filenames:
+                files.setdefault(filename, []).append(os.path.normpath(os.path.join(root, filename)))
+        self._files = files
+        self._directories = directories
+        self._checked = time.monotonic()
+
+    def _refresh(self):
+        """
+        Rebuilds the index if the directories have changed.
+
+        :returns: True if the index has been rebuilt
+        """
+
+        with self._lock:
+            self._checked = time.monotonic()
+            if directories_changed(self._directories):
+                self._build()
+                return True
+        return False
+
+    def _lookup(self, filename, parent):
+
+        for path in self._files.get(filename, []):
+            if (parent is None or os.path.dirname(path) == parent) and os.path.exists(path):
+                return path
         return None
 
-    try:
-        with open('{}.md5sum'.format(path), 'w+') as f:
-            f.write(digest)
-    except OSError as e:
-        log.error("Can't write digest of %s: %s", path, str(e))
+    def find(self, searched_file):
+        """
+        Search for a file in the directory and its subdirectories.
 
-    return digest
+        :param searched_file: filename, optionally with the subdirectory containing it
+        :returns: Path or None if not found
+        """
 
+        if time.monotonic() - self._checked >= REVALIDATE_INTERVAL:
+            self._refresh()
+        dirname, filename = os.path.split(searched_file)
+        parent = os.path.normpath(os.path.join(self._directory, dirname)) if dirname else None
+        path = self._lookup(filename, parent)
+        if path is None and self._refresh():
+            path = self._lookup(filename, parent)
+        return path
 
-def remove_checksum(path):
+
+def find_image_file(directory, searched_file):
     """
-    Remove the checksum of an image from cache if exists
+    Search for a file in directory and is subdirectories using
+    an index shared by all the node types.
+
+    :param directory: Directory where to search
+    :param searched_file: filename, optionally with the subdirectory containing it
+    :returns: Path or None if not found
     """
 
-    path = '{}.md5sum'.format(path)
-    if os.path.exists(path):
-        os.remove(path)
+    with _file_indexes_lock:
+        index = _file_indexes.get(directory)
+        if index is None:
+            index = _file_indexes[directory] = FileIndex(directory)
+    return index.find(searched_file)
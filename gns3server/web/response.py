@@ -26,6 +26,7 @@ import jinja2
 import sys
 import os
 
+from . import validators
 from ..utils.get_resource import get_resource
 from ..version import __version__
 
@@ -41,7 +42,11 @@ class Response(aiohttp.web.Response):
         self._route = route
         self._output_schema = output_schema
         self._request = request
-        headers['Connection'] = "close"  # Disable keep alive because create trouble with old Qt (5.2, 5.3 and 5.4)
+        headers = dict(headers)
+        # Disable keep alive because create trouble with old Qt (5.2, 5.3 and 5.4)
+        # only a controller can ask a compute to keep the connection alive
+        if request is None or request.headers.get("X-GNS3-Keep-Alive") != "true":
+            headers['Connection'] = "close"
         headers['X-Route'] = self._route
         headers['Server'] = "Python/{0[0]}.{0[1]} GNS3/{1}".format(sys.version_info, __version__)
         super().__init__(headers=headers, **kwargs)
@@ -106,9 +111,9 @@ class Response(aiohttp.web.Response):
                     elem = elem.__json__()
                 newanswer.append(elem)
             answer = newanswer
-        if self._output_schema is not None:
+        if self._output_schema:
             try:
-                jsonschema.validate(answer, self._output_schema)
+                validators.validate(answer, self._output_schema)
             except jsonschema.ValidationError as e:
                 log.error("Invalid output query. JSON schema error: {}".format(e.message))
                 raise aiohttp.web.HTTPBadRequest(text="{}".format(e))
@@ -117,12 +122,19 @@ class Response(aiohttp.web.Response):
     async def stream_file(self, path, status=200, set_content_type=None, set_content_length=True):
         """
         Stream a file as a response
+
+        A "Range: bytes=<offset>-" request header is supported
+        to resume an interrupted download.
         """
         encoding = None
 
         if not os.path.exists(path):
             raise aiohttp.web.HTTPNotFound()
 
+        offset = 0
+        if status == 200 and set_content_length and self._request is not None:
+            offset = self._range_offset(self._request.headers.get(aiohttp.hdrs.RANGE))
+
         if not set_content_type:
             ct, encoding = mimetypes.guess_type(path)
             if not ct:
@@ -137,7 +149,13 @@ class Response(aiohttp.web.Response):
         if set_content_length:
             st = os.stat(path)
             self.last_modified = st.st_mtime
-            self.headers[aiohttp.hdrs.CONTENT_LENGTH] = str(st.st_size)
+            self.headers[aiohttp.hdrs.ACCEPT_RANGES] = "bytes"
+            if 0 < offset < st.st_size:
+                status = 206
+                self.headers[aiohttp.hdrs.CONTENT_RANGE] = "bytes {}-{}/{}".format(offset, st.st_size - 1, st.st_size)
+            else:
+                offset = 0
+            self.headers[aiohttp.hdrs.CONTENT_LENGTH] = str(st.st_size - offset)
         else:
             self.enable_chunked_encoding()
 
@@ -145,6 +163,8 @@ class Response(aiohttp.web.Response):
 
         try:
             async with aiofiles.open(path, 'rb') as f:
+                if offset:
+                    await f.seek(offset)
                 await self.prepare(self._request)
                 while True:
                     data = await f.read(CHUNK_SIZE)
@@ -156,6 +176,20 @@ class Response(aiohttp.web.Response):
         except PermissionError:
             raise aiohttp.web.HTTPForbidden()
 
+    @staticmethod
+    def _range_offset(range_header):
+        """
+        :param range_header: value of the Range header
+        :returns: offset of a "bytes=<offset>-" range, 0 for other ranges
+        """
+
+        if isinstance(range_header, str) and range_header.startswith("bytes=") and range_header.endswith("-"):
+            try:
+                return max(0, int(range_header[6:-1]))
+            except ValueError:
+                pass
+        return 0
+
     def redirect(self, url):
         """
         Redirect to url
@@ -24,6 +24,7 @@ import traceback
 import jsonschema
 import jsonschema.exceptions
 
+from . import validators
 from ..compute.error import NodeError, ImageMissingError
 from ..controller.controller_error import ControllerError
 from ..ubridge.ubridge_error import UbridgeError
@@ -57,7 +58,7 @@ async def parse_request(request, input_schema, raw):
 
     if input_schema:
         try:
-            jsonschema.validate(request.json, input_schema)
+            validators.validate(request.json, input_schema)
         except jsonschema.ValidationError as e:
             message = "JSON schema error with API request '{}' and JSON data '{}': {}".format(request.path_qs,
                                                                                               request.json,
@@ -82,6 +83,27 @@ class Route(object):
 
     _node_locks = {}
 
+    @classmethod
+    async def run_with_node_lock(cls, lock_key, func, *args):
+        """
+        Runs a coroutine function while holding the lock of a node,
+        like the requests to the endpoints of the node.
+
+        :param lock_key: "compute:<project_id>:<node_id>" or "controller:<project_id>:<node_id>"
+        :param func: coroutine function
+        """
+
+        cls._node_locks.setdefault(lock_key, {"lock": asyncio.Lock(), "concurrency": 0})
+        cls._node_locks[lock_key]["concurrency"] += 1
+        try:
+            async with cls._node_locks[lock_key]["lock"]:
+                return await func(*args)
+        finally:
+            cls._node_locks[lock_key]["concurrency"] -= 1
+            # No more waiting requests, garbage collect the lock
+            if cls._node_locks[lock_key]["concurrency"] <= 0:
+                del cls._node_locks[lock_key]
+
     @classmethod
     def get(cls, path, *args, **kw):
         return cls._route('GET', path, *args, **kw)
@@ -138,6 +160,12 @@ class Route(object):
         api_version = kw.get("api_version", 2)
         raw = kw.get("raw", False)
 
+        # Compile the schemas once, validators are reused for each request
+        if input_schema:
+            validators.compile_schema(input_schema)
+        if output_schema:
+            validators.compile_schema(output_schema)
+
         def register(func):
             # Add the type of server to the route
             if "controller" in func.__module__:
@@ -194,7 +222,10 @@ class Route(object):
                                 f.write("\n")
                         except OSError as e:
                             log.warning("Could not write to the record file {}: {}".format(record_file, e))
-                    response = Response(request=request, route=route, output_schema=output_schema)
+                    if server_config.getboolean("validate_output", True):
+                        response = Response(request=request, route=route, output_schema=output_schema)
+                    else:
+                        response = Response(request=request, route=route)
                     await func(request, response)
                 except aiohttp.web.HTTPBadRequest as e:
                     response = Response(request=request, route=route)
@@ -270,16 +301,7 @@ class Route(object):
                     else:
                         type = "controller"
                     lock_key = "{}:{}:{}".format(type, request.match_info["project_id"], node_id)
-                    cls._node_locks.setdefault(lock_key, {"lock": asyncio.Lock(), "concurrency": 0})
-                    cls._node_locks[lock_key]["concurrency"] += 1
-
-                    async with cls._node_locks[lock_key]["lock"]:
-                        response = await control_schema(request)
-                    cls._node_locks[lock_key]["concurrency"] -= 1
-
-                    # No more waiting requests, garbage collect the lock
-                    if cls._node_locks[lock_key]["concurrency"] <= 0:
-                        del cls._node_locks[lock_key]
+                    response = await cls.run_with_node_lock(lock_key, control_schema, request)
                 else:
                     response = await control_schema(request)
                 return response
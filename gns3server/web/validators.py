@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2022 GNS3 Technologies Inc.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Registry of compiled JSON schema validators.
+
+jsonschema.validate() checks the schema against its meta-schema and builds
+a new validator on every call. API schemas never change at runtime so we
+compile each of them once and reuse the validator for every request.
+"""
+
+import jsonschema
+import jsonschema.exceptions
+import jsonschema.validators
+
+import logging
+log = logging.getLogger(__name__)
+
+
+# schema id -> (schema, validator), the schema is kept to make sure its id is never reused
+_validators = {}
+
+
+def compile_schema(schema):
+    """
+    Returns the compiled validator for a schema, compiling it on first use.
+
+    :param schema: JSON schema (dictionary)
+
+    :returns: jsonschema validator instance
+    """
+
+    entry = _validators.get(id(schema))
+    if entry is not None and entry[0] is schema:
+        return entry[1]
+
+    cls = jsonschema.validators.validator_for(schema)
+    cls.check_schema(schema)
+    validator = cls(schema)
+    _validators[id(schema)] = (schema, validator)
+    return validator
+
+
+def validate(instance, schema):
+    """
+    Validates an instance against a schema using the compiled validator.
+    Behaves like jsonschema.validate().
+
+    :param instance: instance to validate
+    :param schema: JSON schema (dictionary)
+
+    :raises: jsonschema.ValidationError
+    """
+
+    error = jsonschema.exceptions.best_match(compile_schema(schema).iter_errors(instance))
+    if error is not None:
+        raise error
+
@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2022 GNS3 Technologies Inc.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Benchmark of the checksum of sparse disk images.
+
+Compares the 128 bytes reads used before the checksum engine with
+compute_md5() on sparse files of 1GB and 4GB.
+"""
+
+import os
+import sys
+import time
+import hashlib
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from gns3server.utils.checksum import compute_md5
+
+SIZES = [1, 4]  # GB
+
+
+def legacy_md5(path):
+
+    m = hashlib.md5()
+    with open(path, 'rb') as f:
+        while True:
+            buf = f.read(128)
+            if not buf:
+                break
+            m.update(buf)
+    return m.hexdigest()
+
+
+def create_sparse_file(path, size):
+
+    with open(path, "wb") as f:
+        f.write(b"GNS3")
+        f.seek(size // 2)
+        f.write(b"GNS3")
+        f.truncate(size)
+
+
+def main():
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for size in SIZES:
+            path = os.path.join(tmpdir, "sparse.qcow2")
+            create_sparse_file(path, size * 1024 * 1024 * 1024)
+
+            start = time.perf_counter()
+            legacy = legacy_md5(path)
+            legacy_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            digest = compute_md5(path)
+            engine_time = time.perf_counter() - start
+
+            assert digest == legacy
+            print("{}GB sparse file: 128 bytes reads {:.2f}s, checksum engine {:.2f}s ({:.1f}x)".format(size,
+                                                                                                         legacy_time,
+                                                                                                         engine_time,
+                                                                                                         legacy_time / engine_time))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2022 GNS3 Technologies Inc.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Benchmark of the telnet console server with many clients.
+
+Sends 10MB of console output to 50 clients connected to the same console
+and prints the throughput, the maximum latency and the dropped bytes.
+"""
+
+import os
+import sys
+import time
+import asyncio
+from unittest.mock import MagicMock
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from gns3server.utils.asyncio.telnet_server import AsyncioTelnetServer
+
+CLIENTS = 50
+SIZE = 10 * 1024 * 1024
+
+
+async def read_console(port):
+
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    received = 0
+    end = b""
+    while end != b"END":
+        data = await reader.read(65536)
+        if not data:
+            break
+        received += data.count(b"x")
+        end = (end + data)[-3:]
+    writer.close()
+    return received
+
+
+async def main():
+
+    output = asyncio.StreamReader()
+    server = AsyncioTelnetServer(reader=output, writer=MagicMock(), binary=True, echo=True)
+    tcp_server = await asyncio.start_server(server.run, "127.0.0.1", 0)
+    port = tcp_server.sockets[0].getsockname()[1]
+    readers = [asyncio.ensure_future(read_console(port)) for i in range(CLIENTS)]
+    while len(server.statistics()) < CLIENTS:
+        await asyncio.sleep(0.01)
+
+    start = time.perf_counter()
+    for i in range(SIZE // 1024):
+        output.feed_data(b"x" * 1024)
+        await asyncio.sleep(0)
+    output.feed_data(b"END")
+    await asyncio.gather(*readers)
+    elapsed = time.perf_counter() - start
+
+    statistics = server.statistics()
+    print("{} clients: {:.2f}s, {:.1f}MB/s per client, {:.1f}ms max latency, {} bytes dropped".format(
+        CLIENTS,
+        elapsed,
+        SIZE / 1024 / 1024 / elapsed,
+        max(s["max_latency"] for s in statistics) * 1000,
+        sum(s["bytes_dropped"] for s in statistics)))
+    tcp_server.close()
+    await tcp_server.wait_closed()
+
+
+if __name__ == '__main__':
+    loop = asyncio.get_event_loop()
+    loop.run_until_complete(main())
@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2022 GNS3 Technologies Inc.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Benchmark of the copy of the project files when a project is duplicated.
+
+Compares the archive written and extracted by the export/import used
+before with the direct copy done by the duplication, for 50 qcow2
+overlays of 16MB.
+"""
+
+import os
+import sys
+import time
+import uuid
+import asyncio
+import zipfile
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from gns3server.utils.asyncio import aiozipstream
+from gns3server.utils.file_copy import copy_project_files
+
+NODES = 50
+SIZE = 16  # MB
+
+
+def create_project(path):
+
+    for i in range(NODES):
+        node_dir = os.path.join(path, "project-files", "qemu", str(uuid.uuid4()))
+        os.makedirs(node_dir)
+        with open(os.path.join(node_dir, "hda_disk.qcow2"), "wb") as f:
+            f.write(os.urandom(SIZE * 1024 * 1024))
+
+
+async def export_import(source, destination, archive):
+
+    with aiozipstream.ZipFile(compression=zipfile.ZIP_STORED) as zstream:
+        for root, dirs, files in os.walk(source):
+            for filename in files:
+                path = os.path.join(root, filename)
+                zstream.write(path, os.path.relpath(path, source))
+        with open(archive, "wb") as f:
+            async for chunk in zstream:
+                f.write(chunk)
+    with zipfile.ZipFile(archive) as myzip:
+        myzip.extractall(destination)
+
+
+async def main():
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        source = os.path.join(tmpdir, "project")
+        create_project(source)
+
+        start = time.perf_counter()
+        await export_import(source, os.path.join(tmpdir, "imported"), os.path.join(tmpdir, "project.gns3project"))
+        zip_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        await copy_project_files(source, os.path.join(tmpdir, "duplicated"))
+        duplicate_time = time.perf_counter() - start
+
+        print("{} qcow2 overlays of {}MB: export/import {:.2f}s, duplicate {:.2f}s ({:.1f}x)".format(NODES,
+                                                                                                     SIZE,
+                                                                                                     zip_time,
+                                                                                                     duplicate_time,
+                                                                                                     zip_time / duplicate_time))
+
+
+if __name__ == '__main__':
+    loop = asyncio.get_event_loop()
+    loop.run_until_complete(main())
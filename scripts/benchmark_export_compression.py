@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2022 GNS3 Technologies Inc.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Benchmark of the compression of a project export.
+
+Deflates a 512MB disk image, half compressible and half random data,
+with one worker and with one worker per CPU, and prints the throughput.
+"""
+
+import os
+import sys
+import time
+import asyncio
+import zipfile
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from gns3server.utils.asyncio import aiozipstream
+
+SIZE = 512  # MB
+
+
+def create_file(path, size):
+
+    with open(path, "wb") as f:
+        while size > 0:
+            f.write(b"interface FastEthernet0/0\n ip address 10.0.0.1 255.255.255.0\n" * 4096)
+            f.write(os.urandom(256 * 1024))
+            size -= 512 * 1024
+
+
+async def zip_file(path, workers):
+
+    size = 0
+    with aiozipstream.ZipFile(compression=zipfile.ZIP_DEFLATED, workers=workers) as z:
+        z.write(path, "hda.img")
+        async for chunk in z:
+            size += len(chunk)
+    return size
+
+
+async def main():
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, "hda.img")
+        create_file(path, SIZE * 1024 * 1024)
+        for workers in (1, os.cpu_count() or 1):
+            start = time.perf_counter()
+            size = await zip_file(path, workers)
+            elapsed = time.perf_counter() - start
+            print("{} worker(s): {:.2f}s, {:.1f}MB/s, {} bytes".format(workers, elapsed, SIZE / elapsed, size))
+
+
+if __name__ == '__main__':
+    loop = asyncio.get_event_loop()
+    loop.run_until_complete(main())
@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2022 GNS3 Technologies Inc.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Micro benchmark of the JSON schema validation done for node update requests
+(PUT /v2/compute/projects/{project_id}/{type}/nodes/{node_id}).
+
+Compares jsonschema.validate() with the compiled validators used by the routes
+and prints the number of requests per second the validation step can handle.
+"""
+
+import os
+import sys
+import timeit
+import jsonschema
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from gns3server.web import validators
+from gns3server.schemas.qemu import QEMU_UPDATE_SCHEMA, QEMU_OBJECT_SCHEMA
+from gns3server.schemas.dynamips_vm import VM_UPDATE_SCHEMA, VM_OBJECT_SCHEMA
+
+NUMBER = 2000
+
+ENDPOINTS = {
+    "qemu": (QEMU_UPDATE_SCHEMA, QEMU_OBJECT_SCHEMA, {"name": "QEMU-1", "ram": 1024, "cpus": 2, "adapters": 4,
+                                                      "console_type": "telnet", "mac_address": "00:de:ad:be:ef:00"}),
+    "dynamips": (VM_UPDATE_SCHEMA, VM_OBJECT_SCHEMA, {"name": "R1", "ram": 256, "nvram": 256, "idlepc": "0x60bec828",
+                                                      "slot0": "C7200-IO-FE", "wic0": "WIC-1T"}),
+}
+
+
+def old_validation(input_schema, output_schema, payload):
+    jsonschema.validate(payload, input_schema)
+    try:
+        jsonschema.validate(payload, output_schema)
+    except jsonschema.ValidationError:
+        pass
+
+
+def new_validation(input_schema, output_schema, payload):
+    validators.validate(payload, input_schema)
+    try:
+        validators.validate(payload, output_schema)
+    except jsonschema.ValidationError:
+        pass
+
+
+def main():
+    for name, (input_schema, output_schema, payload) in ENDPOINTS.items():
+        old = timeit.timeit(lambda: old_validation(input_schema, output_schema, payload), number=NUMBER)
+        new = timeit.timeit(lambda: new_validation(input_schema, output_schema, payload), number=NUMBER)
+        print("{:<10} jsonschema.validate: {:>9.0f} req/s   compiled validators: {:>9.0f} req/s   ({:.1f}x)".format(name,
+                                                                                                                  NUMBER / old,
+                                                                                                                  NUMBER / new,
+                                                                                                                  old / new))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2022 GNS3 Technologies Inc.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Benchmark of the allocation of UDP ports for the links.
+
+Compares the linear scan used before the free port bitmap with
+get_free_udp_port() and reserve_many() for 5000 ports.
+"""
+
+import os
+import sys
+import time
+import uuid
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from gns3server.config import Config
+from gns3server.compute.port_manager import PortManager
+from gns3server.compute.project import Project
+
+COUNT = 5000
+
+
+def main():
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        Config.instance().set_section_config("Server", {"projects_path": tmpdir})
+        project = Project(project_id=str(uuid.uuid4()))
+
+        pm = PortManager()
+        start = time.perf_counter()
+        for _ in range(COUNT):
+            # allocation as done before the free port bitmap
+            port = pm.find_unused_port(pm.udp_port_range[0], pm.udp_port_range[1], host=pm.udp_host, socket_type="UDP", ignore_ports=pm.udp_ports)
+            pm.udp_ports.add(port)
+        linear_time = time.perf_counter() - start
+
+        pm = PortManager()
+        start = time.perf_counter()
+        for _ in range(COUNT):
+            pm.get_free_udp_port(project)
+        bitmap_time = time.perf_counter() - start
+
+        pm = PortManager()
+        start = time.perf_counter()
+        pm.reserve_many(project, COUNT)
+        reserve_many_time = time.perf_counter() - start
+
+        print("{} UDP ports: linear scan {:.2f}s, bitmap {:.2f}s, reserve_many {:.2f}s".format(COUNT,
+                                                                                              linear_time,
+                                                                                              bitmap_time,
+                                                                                              reserve_many_time))
+
+
+if __name__ == '__main__':
+    main()
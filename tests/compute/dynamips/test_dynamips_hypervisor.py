@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2020 GNS3 Technologies Inc.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+import pytest
+
+from gns3server.compute.dynamips.dynamips_hypervisor import DynamipsHypervisor
+from gns3server.compute.dynamips.dynamips_error import DynamipsError
+
+
+RESPONSES = {
+    "hypervisor version": b"100-0.2.21\r\n",
+    'vm get_status "R1"': b"100-0\r\n",
+    "vm list": b"101 R1 c7200\r\n101 R2 c3600\r\n100-OK\r\n",
+    "vm fail": b"209-unknown VM\r\n",
+}
+
+
+class FakeDynamipsServer:
+    """
+    Dynamips hypervisor sending its responses byte per byte.
+    """
+
+    def __init__(self):
+
+        self.commands = []
+        self._server = None
+        self._closed = asyncio.Event()
+
+    async def start(self):
+
+        self._server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        return self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+
+        self._server.close()
+        await self._server.wait_closed()
+        await self._closed.wait()
+
+    async def _handle(self, reader, writer):
+
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            command = line.decode().strip()
+            self.commands.append(command)
+            for byte in RESPONSES.get(command, b"100-OK\r\n"):
+                writer.write(bytes([byte]))
+                await writer.drain()
+        writer.close()
+        self._closed.set()
+
+
+async def connect(server):
+
+    port = await server.start()
+    hypervisor = DynamipsHypervisor("/tmp", "127.0.0.1", port)
+    await hypervisor.connect()
+    return hypervisor
+
+
+async def test_send():
+
+    server = FakeDynamipsServer()
+    hypervisor = await connect(server)
+    assert hypervisor.version == "0.2.21"
+    assert await hypervisor.send("vm list") == ["R1 c7200", "R2 c3600"]
+    assert await hypervisor.send('vm get_status "R1"') == ["0"]
+    await hypervisor.stop()
+    await server.stop()
+
+
+async def test_send_batch():
+
+    server = FakeDynamipsServer()
+    hypervisor = await connect(server)
+    results = await hypervisor.send_batch(["vm list", 'vm create "R1" 1 c7200', 'vm get_status "R1"'])
+    assert results == [["R1 c7200", "R2 c3600"], [], ["0"]]
+    assert server.commands[-3:] == ["vm list", 'vm create "R1" 1 c7200', 'vm get_status "R1"']
+    await hypervisor.stop()
+    await server.stop()
+
+
+async def test_send_batch_error():
+
+    server = FakeDynamipsServer()
+    hypervisor = await connect(server)
+    with pytest.raises(DynamipsError) as e:
+        await hypervisor.send_batch(["vm fail", 'vm get_status "R1"'])
+    assert "unknown VM" in str(e.value)
+    # the responses of the whole batch have been read
+    assert await hypervisor.send("vm list") == ["R1 c7200", "R2 c3600"]
+    await hypervisor.stop()
+    await server.stop()
@@ -24,7 +24,7 @@ import os
 
 from gns3server.compute.dynamips import Dynamips
 from gns3server.compute.dynamips.dynamips_error import DynamipsError
-from unittest.mock import patch
+from unittest.mock import patch, MagicMock
 from tests.utils import asyncio_patch, AsyncioMagicMock
 
 
@@ -126,3 +126,124 @@ async def test_duplicate_node(manager, compute_project):
         with open(destination_node.startup_config_path) as f:
             content = f.read()
             assert content == '!\nhostname R2\necho TEST'
+
+
+@pytest.fixture
+def idlepc_vm(loop, tmpdir):
+
+    image = str(tmpdir / "c7200.image")
+    with open(image, "wb") as f:
+        f.write(b"\x7fELF\x01\x02\x01")
+    vm = AsyncioMagicMock()
+    vm.image = image
+    vm.ram = 256
+    vm.check_available_ram = MagicMock()
+    vm.get_idle_pc_prop = AsyncioMagicMock(return_value=["0x60606f54 [33]", "invalid", "0x60606f80 [21]", "0x6060710c [40]"])
+    return vm
+
+
+def _idlepc_routers(routers):
+    """
+    Patches the creation of the throwaway routers
+
+    :param routers: list where the created routers are added
+    """
+
+    async def start_routers(self, vm, count, created):
+        for index in range(count):
+            router = MagicMock()
+            router.name = "idlepc-{}".format(index + 1)
+            created.append(router)
+            routers.append(router)
+
+    return patch("gns3server.compute.dynamips.Dynamips._start_idlepc_routers", new=start_routers)
+
+
+async def test_auto_idlepc(manager, idlepc_vm, tmpdir):
+
+    manager._idlepcs = None
+    manager.config.set("Dynamips", "auto_idlepc_workers", "2")
+    routers = []
+    with patch("gns3server.compute.dynamips.Dynamips.get_images_directory", return_value=str(tmpdir)), _idlepc_routers(routers):
+        with patch("gns3server.compute.dynamips.IDLEPC_BOOT_TIME", 0):
+            with asyncio_patch("gns3server.compute.dynamips.Dynamips._delete_idlepc_routers") as delete_mock:
+                with asyncio_patch("gns3server.compute.dynamips.Dynamips._measure_idlepcs", return_value=[(90, "0x60606f54"), (20, "0x60606f80")]) as mock:
+                    assert await manager.auto_idlepc(idlepc_vm) == "0x60606f80"
+                    # the values are tried 2 by 2 and the first ones are good enough
+                    mock.assert_called_once_with(routers, ["0x60606f54", "0x60606f80"])
+                delete_mock.assert_called_once_with(routers)
+        idlepc_vm.set_idlepc.assert_called_with("0x60606f80")
+
+        # the validated value is remembered for this image
+        manager._idlepcs = None
+        with asyncio_patch("gns3server.compute.dynamips.Dynamips._measure_idlepcs") as mock:
+            assert await manager.auto_idlepc(idlepc_vm) == "0x60606f80"
+            assert not mock.called
+
+
+async def test_auto_idlepc_available_ram(manager, idlepc_vm, tmpdir):
+
+    manager._idlepcs = None
+    manager.config.set("Dynamips", "auto_idlepc_workers", "4")
+    routers = []
+    with patch("gns3server.compute.dynamips.Dynamips.get_images_directory", return_value=str(tmpdir)), _idlepc_routers(routers):
+        with patch("gns3server.compute.dynamips.IDLEPC_BOOT_TIME", 0):
+            with patch("psutil.virtual_memory", return_value=MagicMock(available=600 * 1024 * 1024)):
+                with asyncio_patch("gns3server.compute.dynamips.Dynamips._delete_idlepc_routers"):
+                    with asyncio_patch("gns3server.compute.dynamips.Dynamips._measure_idlepcs", return_value=[(20, "0x60606f54")]) as mock:
+                        await manager.auto_idlepc(idlepc_vm)
+                        # only 2 routers with 256MB of RAM can run at the same time
+                        assert len(routers) == 2
+                        mock.assert_called_once_with(routers, ["0x60606f54", "0x60606f80"])
+    idlepc_vm.check_available_ram.assert_called_with(256)
+
+
+async def test_auto_idlepc_no_suitable_value(manager, idlepc_vm, tmpdir):
+
+    manager._idlepcs = None
+    manager.config.set("Dynamips", "auto_idlepc_workers", "1")
+    routers = []
+    with patch("gns3server.compute.dynamips.Dynamips.get_images_directory", return_value=str(tmpdir)), _idlepc_routers(routers):
+        with patch("gns3server.compute.dynamips.IDLEPC_BOOT_TIME", 0):
+            with asyncio_patch("gns3server.compute.dynamips.Dynamips._delete_idlepc_routers") as delete_mock:
+                with asyncio_patch("gns3server.compute.dynamips.Dynamips._measure_idlepcs", return_value=[(90, "0x60606f54")]) as mock:
+                    with pytest.raises(DynamipsError):
+                        await manager.auto_idlepc(idlepc_vm)
+                    # the same router is used for all the values
+                    assert mock.call_count == 3
+                    assert len(routers) == 1
+                delete_mock.assert_called_once_with(routers)
+        assert not os.path.exists(str(tmpdir / ".idlepcs"))
+
+
+async def test_auto_idlepc_unused_routers(manager, idlepc_vm, tmpdir):
+
+    manager._idlepcs = None
+    manager.config.set("Dynamips", "auto_idlepc_workers", "8")
+    routers = []
+    with patch("gns3server.compute.dynamips.Dynamips.get_images_directory", return_value=str(tmpdir)), _idlepc_routers(routers):
+        with patch("gns3server.compute.dynamips.IDLEPC_BOOT_TIME", 0):
+            with patch("psutil.virtual_memory", return_value=MagicMock(available=8192 * 1024 * 1024)):
+                with asyncio_patch("gns3server.compute.dynamips.Dynamips._delete_idlepc_routers") as delete_mock:
+                    with asyncio_patch("gns3server.compute.dynamips.Dynamips._measure_idlepcs", return_value=[(20, "0x60606f54")]) as mock:
+                        await manager.auto_idlepc(idlepc_vm)
+                        # all the values are tried at once
+                        mock.assert_called_once_with(routers[:3], ["0x60606f54", "0x60606f80", "0x6060710c"])
+                    # the routers without a value are deleted before the measure
+                    assert delete_mock.call_args_list[0][0][0] == routers[3:]
+
+
+async def test_start_idlepc_routers_create_failure(manager, compute_project):
+
+    vm = MagicMock()
+    vm.project = compute_project
+    vm.manager = manager
+    vm.platform = "c7200"
+    directories = os.listdir(compute_project.module_working_directory("dynamips"))
+    routers = []
+    with asyncio_patch("gns3server.compute.dynamips.nodes.router.Router.create", side_effect=DynamipsError("Could not start the hypervisor")):
+        with pytest.raises(DynamipsError):
+            await manager._start_idlepc_routers(vm, 1, routers)
+    await manager._delete_idlepc_routers(routers)
+    # the directory of the throwaway router is not left in the project
+    assert os.listdir(compute_project.module_working_directory("dynamips")) == directories
@@ -19,7 +19,9 @@ import os
 import uuid
 import pytest
 import asyncio
+from unittest.mock import MagicMock
 
+from tests.utils import AsyncioMagicMock
 from gns3server.compute.dynamips.nodes.router import Router
 from gns3server.compute.dynamips.dynamips_error import DynamipsError
 from gns3server.compute.dynamips import Dynamips
@@ -75,3 +77,40 @@ async def test_router_invalid_dynamips_path(compute_project, manager):
         await router.create()
         assert router.name == "test"
         assert router.id == "00010203-0405-0607-0809-0a0b0c0d0e0e"
+
+
+async def test_slot_add_nio_binding_running(router):
+
+    adapter = MagicMock()
+    adapter.port_exists.return_value = True
+    router._slots = [adapter]
+    router._hypervisor = MagicMock()
+    router._hypervisor.send_batch = AsyncioMagicMock(return_value=[[], ["2"]])
+    router._hypervisor.send = AsyncioMagicMock()
+    nio = MagicMock()
+    nio.__str__.return_value = "nio_udp1"
+
+    await router.slot_add_nio_binding(0, 0, nio)
+    router._hypervisor.send_batch.assert_called_once_with(['vm slot_add_nio_binding "test" 0 0 nio_udp1', 'vm get_status "test"'])
+    # the status of the router is not requested again to enable the NIO
+    router._hypervisor.send.assert_called_once_with('vm slot_enable_nio "test" 0 0')
+    adapter.add_nio.assert_called_once_with(0, nio)
+
+
+async def test_slot_add_nio_binding_remove_failure(router):
+
+    adapter = MagicMock()
+    adapter.port_exists.return_value = True
+    router._slots = [adapter]
+    router._hypervisor = MagicMock()
+    router._hypervisor.send_batch = AsyncioMagicMock(side_effect=DynamipsError("Port in use"))
+    router._hypervisor.send = AsyncioMagicMock(side_effect=DynamipsError("Could not remove the binding"))
+    nio = MagicMock()
+    nio.__str__.return_value = "nio_udp1"
+
+    with pytest.raises(DynamipsError):
+        await router.slot_add_nio_binding(0, 0, nio)
+    # the NIO is not bound again when the previous binding could not be removed
+    router._hypervisor.send_batch.assert_called_once_with(['vm slot_add_nio_binding "test" 0 0 nio_udp1', 'vm get_status "test"'])
+    router._hypervisor.send.assert_called_once_with('vm slot_remove_nio_binding "test" 0 0')
+    assert not adapter.add_nio.called
@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2020 GNS3 Technologies Inc.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import json
+import asyncio
+import pytest
+
+from tests.utils import asyncio_patch
+from gns3server.compute.qemu.utils.image_cache import QemuImageCache, QemuImageCacheError
+
+
+INFO = json.dumps({"filename": "linux.qcow2", "format": "qcow2", "virtual-size": 8589934592, "backing-filename": "base.img"})
+
+
+@pytest.fixture
+def image(tmpdir):
+
+    path = str(tmpdir / "linux.qcow2")
+    with open(path, "wb") as f:
+        f.write(b"QFI\xfb")
+    return path
+
+
+async def test_info(image):
+
+    cache = QemuImageCache()
+    with asyncio_patch("gns3server.compute.qemu.utils.image_cache.subprocess_check_output", return_value=INFO) as mock:
+        info = await cache.info("qemu-img", image)
+        assert info == {"format": "qcow2", "virtual_size": 8589934592}
+        assert await cache.info("qemu-img", image) == info
+        mock.assert_called_once_with("qemu-img", "info", "--output=json", image)
+
+
+async def test_info_no_output(image):
+
+    cache = QemuImageCache()
+    with asyncio_patch("gns3server.compute.qemu.utils.image_cache.subprocess_check_output", return_value=""):
+        assert await cache.info("qemu-img", image) == {"format": None, "virtual_size": None}
+
+
+async def test_info_image_changed(image):
+
+    cache = QemuImageCache()
+    with asyncio_patch("gns3server.compute.qemu.utils.image_cache.subprocess_check_output", return_value=INFO) as mock:
+        await cache.info("qemu-img", image)
+        with open(image, "ab") as f:
+            f.write(b"\x00")
+        await cache.info("qemu-img", image)
+        assert mock.call_count == 2
+
+
+async def test_info_invalid_json(image):
+
+    cache = QemuImageCache()
+    with asyncio_patch("gns3server.compute.qemu.utils.image_cache.subprocess_check_output", return_value="{"):
+        with pytest.raises(QemuImageCacheError):
+            await cache.info("qemu-img", image)
+
+
+async def test_check_shared(image):
+
+    cache = QemuImageCache()
+    checks = []
+
+    async def check():
+        checks.append(image)
+        await asyncio.sleep(0.1)
+        return 0
+
+    results = await asyncio.gather(*[cache.check(image, check) for _ in range(10)])
+    assert results == [0] * 10
+    assert await cache.check(image, check) == 0
+    assert len(checks) == 1
+
+
+async def test_check_failure_not_cached(image):
+
+    cache = QemuImageCache()
+
+    async def check():
+        raise OSError("qemu-img not found")
+
+    with pytest.raises(OSError):
+        await cache.check(image, check)
+
+    async def check_ok():
+        return 0
+
+    assert await cache.check(image, check_ok) == 0
+
+
+async def test_check_repaired(image):
+
+    cache = QemuImageCache()
+    checks = []
+
+    async def check():
+        # the repair of the image changes it
+        checks.append(image)
+        with open(image, "ab") as f:
+            f.write(b"\x00")
+        return 0
+
+    assert await cache.check(image, check) == 0
+    assert await cache.check(image, check) == 0
+    assert len(checks) == 1
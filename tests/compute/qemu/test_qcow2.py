@@ -19,6 +19,7 @@ import os
 import pytest
 import shutil
 
+from tests.utils import asyncio_patch
 from gns3server.compute.qemu.utils.qcow2 import Qcow2, Qcow2Error
 
 
@@ -75,3 +76,53 @@ async def test_rebase(loop, tmpdir):
     assert qcow2.backing_file == "empty8G.qcow2"
     await qcow2.rebase(qemu_img(), str(tmpdir / "empty16G.qcow2"), "qcow2")
     assert qcow2.backing_file == str(tmpdir / "empty16G.qcow2")
+
+
+def test_create(tmpdir):
+
+    Qcow2.create(str(tmpdir / "linked.qcow2"), 8589934592, "empty8G.qcow2", "qcow2")
+    qcow2 = Qcow2(str(tmpdir / "linked.qcow2"))
+    assert qcow2.version == 3
+    assert qcow2.size == 8589934592
+    assert qcow2.backing_file == "empty8G.qcow2"
+
+    # same refcount and L1 tables than an image created by qemu-img
+    with open(str(tmpdir / "linked.qcow2"), "rb") as f:
+        created = f.read()
+    with open("tests/resources/linked.qcow2", "rb") as f:
+        expected = f.read()
+    assert len(created) == len(expected)
+    assert created[65536:] == expected[65536:]
+
+
+async def test_rebase_in_place(tmpdir):
+
+    shutil.copy("tests/resources/empty8G.qcow2", str(tmpdir / "empty16G.qcow2"))
+    shutil.copy("tests/resources/linked.qcow2", str(tmpdir / "linked.qcow2"))
+    qcow2 = Qcow2(str(tmpdir / "linked.qcow2"))
+    with asyncio_patch("asyncio.create_subprocess_exec") as mock:
+        await qcow2.rebase("qemu-img", str(tmpdir / "empty16G.qcow2"), "qcow2")
+        assert not mock.called
+    assert qcow2.backing_file == str(tmpdir / "empty16G.qcow2")
+    assert Qcow2(str(tmpdir / "linked.qcow2")).backing_file == str(tmpdir / "empty16G.qcow2")
+
+
+def test_set_backing_file_keep_extensions(tmpdir):
+
+    shutil.copy("tests/resources/linked.qcow2", str(tmpdir / "linked.qcow2"))
+    qcow2 = Qcow2(str(tmpdir / "linked.qcow2"))
+    assert qcow2._set_backing_file("base.img", "raw")
+    assert qcow2.backing_file == "base.img"
+    with open(str(tmpdir / "linked.qcow2"), "rb") as f:
+        header = f.read(65536)
+    # the feature name table is still there
+    assert b"dirty bit" in header
+    assert b"\xe2\x79\x2a\xca\x00\x00\x00\x03raw" in header
+
+
+def test_set_backing_file_too_long(tmpdir):
+
+    shutil.copy("tests/resources/linked.qcow2", str(tmpdir / "linked.qcow2"))
+    qcow2 = Qcow2(str(tmpdir / "linked.qcow2"))
+    assert not qcow2._set_backing_file("a" * 2048, "qcow2")
+    assert qcow2.backing_file == "empty8G.qcow2"
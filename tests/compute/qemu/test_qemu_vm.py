@@ -20,6 +20,7 @@ import asyncio
 import os
 import sys
 import stat
+import shutil
 from tests.utils import asyncio_patch, AsyncioMagicMock
 
 
@@ -28,9 +29,12 @@ from unittest.mock import patch, MagicMock
 
 from gns3server.compute.qemu.qemu_vm import QemuVM
 from gns3server.compute.qemu.qemu_error import QemuError
+from gns3server.compute.qemu.utils.qmp import QmpError
+from gns3server.compute.qemu.utils.qcow2 import Qcow2
 from gns3server.compute.qemu import Qemu
 from gns3server.utils import force_unix_path, macaddress_to_int, int_to_macaddress
 from gns3server.compute.notification_manager import NotificationManager
+from gns3server.utils.checksum import checksum_index
 
 
 @pytest.fixture
@@ -107,7 +111,7 @@ async def test_vm_create(tmpdir, compute_project, manager, fake_qemu_binary):
     await vm.create()
 
     # tests if `create` created md5sums
-    assert os.path.exists(str(tmpdir / 'hello.md5sum'))
+    assert checksum_index().get(fake_img, os.stat(fake_img)) == '5d41402abc4b2a76b9719d911017c592'
 
 
 async def test_vm_invalid_qemu_with_platform(compute_project, manager, fake_qemu_binary):
@@ -364,6 +368,25 @@ async def test_disk_options(vm, tmpdir, fake_qemu_img_binary):
     assert options == ['-drive', 'file=' + os.path.join(vm.working_dir, "hda_disk.qcow2") + ',if=ide,index=0,media=disk,id=drive0']
 
 
+async def test_disk_options_qcow2_base_image(vm, tmpdir, fake_qemu_img_binary):
+
+    vm._hda_disk_image = str(tmpdir / "test.qcow2")
+    shutil.copy("tests/resources/empty8G.qcow2", vm._hda_disk_image)
+
+    with asyncio_patch("gns3server.compute.qemu.qemu_vm.QemuVM._find_disk_file_format", return_value="qcow2"):
+        with asyncio_patch("asyncio.create_subprocess_exec", return_value=MagicMock()) as process:
+            options = await vm._disk_options()
+            # the linked clone is created without qemu-img
+            for args, kwargs in process.call_args_list:
+                assert "create" not in args
+
+    disk = os.path.join(vm.working_dir, "hda_disk.qcow2")
+    qcow2 = Qcow2(disk)
+    assert qcow2.backing_file == vm._hda_disk_image
+    assert qcow2.size == 8589934592
+    assert options == ['-drive', 'file=' + disk + ',if=ide,index=0,media=disk,id=drive0']
+
+
 async def test_cdrom_option(vm, tmpdir, fake_qemu_img_binary):
 
     vm.manager.get_qemu_version = AsyncioMagicMock(return_value="3.1.0")
@@ -454,33 +477,87 @@ def test_json(vm, compute_project):
     assert json["project_id"] == compute_project.id
 
 
-async def test_control_vm(vm):
+async def test_control_vm(vm, running_subprocess_mock):
+
+    vm._process = running_subprocess_mock
+    vm._monitor = 4242
+    with asyncio_patch("gns3server.compute.qemu.utils.qmp.QmpClient.connect") as connect:
+        with asyncio_patch("gns3server.compute.qemu.utils.qmp.QmpClient.execute", return_value={"status": "running"}) as execute:
+            res = await vm._control_vm("test")
+            assert connect.called
+            execute.assert_called_with("human-monitor-command", {"command-line": "test"})
+    assert res == {"status": "running"}
+
 
-    vm._process = MagicMock()
-    reader = MagicMock()
-    writer = MagicMock()
-    with asyncio_patch("asyncio.open_connection", return_value=(reader, writer)):
-        res = await vm._control_vm("test")
-        assert writer.write.called_with("test")
-    assert res is None
+async def test_control_vm_not_running(vm):
 
+    with asyncio_patch("gns3server.compute.qemu.utils.qmp.QmpClient.execute") as execute:
+        assert await vm._control_vm("test") is None
+        assert not execute.called
 
-async def test_control_vm_expect_text(vm, running_subprocess_mock):
+
+async def test_qmp_command_error(vm, running_subprocess_mock):
 
     vm._process = running_subprocess_mock
-    reader = MagicMock()
-    writer = MagicMock()
-    with asyncio_patch("asyncio.open_connection", return_value=(reader, writer)):
+    vm._monitor = 4242
+    with asyncio_patch("gns3server.compute.qemu.utils.qmp.QmpClient.connect"):
+        with asyncio_patch("gns3server.compute.qemu.utils.qmp.QmpClient.execute", return_value={"status": "running"}):
+            await vm._connect_qmp()
+        with asyncio_patch("gns3server.compute.qemu.utils.qmp.QmpClient.execute", side_effect=QmpError("Boom")):
+            assert await vm._qmp_command("stop") is None
 
-        future = asyncio.Future()
-        future.set_result(b"epic product")
-        reader.readline.return_value = future
 
-        vm._monitor = 4242
-        res = await vm._control_vm("test", [b"epic"])
-        assert writer.write.called_with("test")
+async def test_qmp_events(vm, running_subprocess_mock):
 
-    assert res == "epic product"
+    vm._process = running_subprocess_mock
+    vm._monitor = 4242
+    vm.status = "started"
+    with asyncio_patch("gns3server.compute.qemu.utils.qmp.QmpClient.connect"):
+        with asyncio_patch("gns3server.compute.qemu.utils.qmp.QmpClient.execute", return_value={"status": "running"}) as execute:
+            # the connection stays open, the status is then only updated by the events
+            with patch("gns3server.compute.qemu.utils.qmp.QmpClient.connected", new_callable=mock.PropertyMock, return_value=True):
+                assert await vm._get_vm_status() == "running"
+                vm._qmp_event("STOP", {})
+                assert vm.status == "suspended"
+                assert await vm._get_vm_status() == "paused"
+                vm._qmp_event("RESUME", {})
+                assert vm.status == "started"
+                assert await vm._get_vm_status() == "running"
+                assert execute.call_count == 1
+
+
+async def test_qmp_guest_events(vm, running_subprocess_mock):
+
+    vm._process = running_subprocess_mock
+    vm._monitor = 4242
+    vm.status = "started"
+    with asyncio_patch("gns3server.compute.qemu.utils.qmp.QmpClient.connect"):
+        with asyncio_patch("gns3server.compute.qemu.utils.qmp.QmpClient.execute", return_value={"status": "running"}) as execute:
+            with patch("gns3server.compute.qemu.utils.qmp.QmpClient.connected", new_callable=mock.PropertyMock, return_value=True):
+                assert await vm._get_vm_status() == "running"
+                # the guest suspends itself
+                vm._qmp_event("SUSPEND", {})
+                assert vm.status == "suspended"
+                assert await vm._get_vm_status() == "suspended"
+                vm._qmp_event("WAKEUP", {})
+                assert vm.status == "started"
+                assert await vm._get_vm_status() == "running"
+                assert execute.call_count == 1
+                # the status is queried again after a reset
+                vm._qmp_event("RESET", {})
+                with asyncio_patch("gns3server.compute.qemu.utils.qmp.QmpClient.execute", return_value={"status": "prelaunch"}) as execute:
+                    assert await vm._get_vm_status() == "prelaunch"
+                    execute.assert_called_once_with("query-status", None)
+
+
+async def test_set_link(vm, running_subprocess_mock):
+
+    vm._process = running_subprocess_mock
+    vm._monitor = 4242
+    with asyncio_patch("gns3server.compute.qemu.utils.qmp.QmpClient.connect"):
+        with asyncio_patch("gns3server.compute.qemu.utils.qmp.QmpClient.execute", return_value={"status": "running"}) as execute:
+            await vm._set_link(1, False)
+            execute.assert_called_with("set_link", {"name": "gns3-1", "up": False})
 
 
 async def test_build_command(vm, fake_qemu_binary):
@@ -740,6 +817,19 @@ def test_hda_disk_image(vm, images_dir):
     assert vm.hda_disk_image == force_unix_path(os.path.join(images_dir, "QEMU", "test2"))
 
 
+async def test_create_linked_clone_raw_base(vm, tmpdir):
+
+    base = str(tmpdir / "base.img")
+    with open(base, "wb") as f:
+        f.write(b"\0" * 1000)
+    disk = str(tmpdir / "hda_disk.qcow2")
+    with patch("gns3server.compute.qemu.qemu_vm.QemuVM._get_qemu_img", return_value="qemu-img"):
+        with asyncio_patch("gns3server.compute.qemu.qemu_vm.QemuVM._find_disk_file_format", return_value="raw"):
+            await vm._create_linked_clone("hda", base, disk)
+    # the virtual size is rounded up to a sector like qemu-img does
+    assert Qcow2(disk).size == 1024
+
+
 async def test_hda_disk_image_non_linked_clone(vm, images_dir, compute_project, manager, fake_qemu_binary):
     """
     Two non linked can't use the same image at the same time
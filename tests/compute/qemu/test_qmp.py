@@ -0,0 +1,143 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2020 GNS3 Technologies Inc.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import json
+import asyncio
+import pytest
+
+from gns3server.compute.qemu.utils.qmp import QmpClient, QmpError
+
+
+class FakeQmpServer:
+    """
+    QMP server answering the commands in the reverse order
+    they have been received, like QEMU would for slow commands.
+    """
+
+    def __init__(self, batch=1):
+
+        self.commands = []
+        self.writer = None
+        self._batch = batch
+        self._server = None
+
+    async def start(self):
+
+        self._server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        return self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+
+        self._server.close()
+        await self._server.wait_closed()
+
+    def send(self, message):
+
+        self.writer.write(json.dumps(message).encode() + b"\n")
+
+    async def _handle(self, reader, writer):
+
+        self.writer = writer
+        self.send({"QMP": {"version": {}, "capabilities": []}})
+        waiting = []
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            command = json.loads(line.decode())
+            self.commands.append(command["execute"])
+            if command["execute"] == "qmp_capabilities":
+                self.send({"return": {}, "id": command["id"]})
+                continue
+            waiting.append(command)
+            if len(waiting) < self._batch:
+                continue
+            for command in reversed(waiting):
+                if command["execute"] == "fail":
+                    self.send({"error": {"class": "GenericError", "desc": "Boom"}, "id": command["id"]})
+                else:
+                    self.send({"return": command["execute"], "id": command["id"]})
+            waiting = []
+        writer.close()
+
+
+async def test_execute():
+
+    server = FakeQmpServer()
+    port = await server.start()
+    client = QmpClient("127.0.0.1", port)
+    await client.connect()
+    assert client.connected
+    assert await client.execute("query-status") == "query-status"
+    assert server.commands == ["qmp_capabilities", "query-status"]
+    with pytest.raises(QmpError):
+        await client.execute("fail")
+    client.close()
+    assert not client.connected
+    await server.stop()
+
+
+async def test_execute_pipelined():
+
+    server = FakeQmpServer(batch=3)
+    port = await server.start()
+    client = QmpClient("127.0.0.1", port)
+    await client.connect()
+    # the commands are sent without waiting for the previous results
+    results = await asyncio.gather(client.execute("stop"), client.execute("set_link"), client.execute("cont"))
+    assert results == ["stop", "set_link", "cont"]
+    client.close()
+    await server.stop()
+
+
+async def test_events():
+
+    events = []
+    server = FakeQmpServer()
+    port = await server.start()
+    client = QmpClient("127.0.0.1", port, event_callback=lambda event, data: events.append((event, data)))
+    await client.connect()
+    server.send({"event": "STOP", "data": {}, "timestamp": {"seconds": 1, "microseconds": 0}})
+    server.send({"event": "RESET", "data": {"guest": True}, "timestamp": {"seconds": 2, "microseconds": 0}})
+    assert await client.execute("query-status") == "query-status"
+    assert events == [("STOP", {}), ("RESET", {"guest": True})]
+    client.close()
+    await server.stop()
+
+
+async def test_connection_closed():
+
+    server = FakeQmpServer(batch=2)
+    port = await server.start()
+    client = QmpClient("127.0.0.1", port)
+    await client.connect()
+    command = asyncio.ensure_future(client.execute("stop"))
+    await asyncio.sleep(0.1)
+    server.writer.close()
+    with pytest.raises(ConnectionError):
+        await command
+    assert not client.connected
+    with pytest.raises(ConnectionError):
+        await client.execute("cont")
+    await server.stop()
+
+
+async def test_connect_timeout():
+
+    client = QmpClient("127.0.0.1", 1)
+    with pytest.raises(QmpError):
+        await client.connect(timeout=0.1)
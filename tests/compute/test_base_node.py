@@ -145,6 +145,20 @@ async def test_update_ubridge_udp_connection(node):
     mock.assert_called_with("VPCS-10", filters)
 
 
+async def test_add_ubridge_udp_connection(node):
+
+    snio = NIOUDP(1245, "localhost", 1246)
+    dnio = NIOUDP(1247, "localhost", 1248)
+    node._ubridge_send_batch = AsyncioMagicMock()
+    node._ubridge_send = AsyncioMagicMock()
+    await node.add_ubridge_udp_connection("VPCS-10", snio, dnio)
+    node._ubridge_send_batch.assert_called_once_with(["bridge create VPCS-10",
+                                                      "bridge add_nio_udp VPCS-10 1245 localhost 1246",
+                                                      "bridge add_nio_udp VPCS-10 1247 localhost 1248",
+                                                      "bridge start VPCS-10"])
+    node._ubridge_send.assert_called_with("bridge reset_packet_filters VPCS-10")
+
+
 async def test_ubridge_apply_filters(node):
 
     filters = OrderedDict((
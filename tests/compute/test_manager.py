@@ -17,6 +17,7 @@
 
 import uuid
 import os
+import asyncio
 import pytest
 from unittest.mock import patch, MagicMock
 from tests.utils import asyncio_patch
@@ -242,6 +243,12 @@ async def test_list_images(qemu, tmpdir):
             f.write("1")
 
     with patch("gns3server.utils.images.default_images_directory", return_value=str(tmp_images_dir)):
+        # the listing does not wait for the checksums
+        assert sorted(await qemu.list_images(), key=lambda k: k['filename']) == [
+            {"filename": "a.qcow2", "path": "a.qcow2", "md5sum": None, "filesize": 1, "hashing": True},
+            {"filename": "b.qcow2", "path": "b.qcow2", "md5sum": None, "filesize": 1, "hashing": True}
+        ]
+        await qemu.image_inventory.wait_hashing()
         assert sorted(await qemu.list_images(), key=lambda k: k['filename']) == [
             {"filename": "a.qcow2", "path": "a.qcow2", "md5sum": "c4ca4238a0b923820dcc509a6f75849b", "filesize": 1},
             {"filename": "b.qcow2", "path": "b.qcow2", "md5sum": "c4ca4238a0b923820dcc509a6f75849b", "filesize": 1}
@@ -264,6 +271,8 @@ async def test_list_images_recursives(qemu, tmpdir):
 
     with patch("gns3server.utils.images.default_images_directory", return_value=str(tmp_images_dir)):
 
+        await qemu.list_images()
+        await qemu.image_inventory.wait_hashing()
         assert sorted(await qemu.list_images(), key=lambda k: k['filename']) == [
             {"filename": "a.qcow2", "path": "a.qcow2", "md5sum": "c4ca4238a0b923820dcc509a6f75849b", "filesize": 1},
             {"filename": "b.qcow2", "path": "b.qcow2", "md5sum": "c4ca4238a0b923820dcc509a6f75849b", "filesize": 1},
@@ -283,6 +292,67 @@ async def test_list_images_directory_not_exist(qemu):
         assert await qemu.list_images() == []
 
 
+async def test_list_images_filter_and_paging(qemu, images_dir):
+
+    qemu_images_dir = os.path.join(images_dir, "QEMU")
+    for image in ["a.qcow2", "b.qcow2", "c.vmdk", "d.qcow2"]:
+        with open(os.path.join(qemu_images_dir, image), "w+") as f:
+            f.write("1")
+
+    images = [image["filename"] for image in await qemu.list_images(filter="QCOW2")]
+    assert sorted(images) == ["a.qcow2", "b.qcow2", "d.qcow2"]
+    all_images = [image["filename"] for image in await qemu.list_images()]
+    assert [image["filename"] for image in await qemu.list_images(offset=1, limit=2)] == all_images[1:3]
+
+
+async def test_list_images_new_image_hashing(qemu, images_dir):
+
+    qemu_images_dir = os.path.join(images_dir, "QEMU")
+    with open(os.path.join(qemu_images_dir, "a.qcow2"), "w+") as f:
+        f.write("1")
+
+    assert len(await qemu.list_images()) == 1
+
+    with open(os.path.join(qemu_images_dir, "b.qcow2"), "w+") as f:
+        f.write("1")
+    # the new image is found by a scan in the background, it is hashed without blocking the listing
+    hashed = asyncio.Event()
+
+    async def md5sum_async(path):
+        await hashed.wait()
+        return "c4ca4238a0b923820dcc509a6f75849b"
+
+    with patch("gns3server.compute.image_inventory.md5sum_async", side_effect=md5sum_async):
+        await qemu.image_inventory._scan()
+        images = {image["filename"]: image for image in await qemu.list_images()}
+        assert images["b.qcow2"]["md5sum"] is None
+        assert images["b.qcow2"]["hashing"] is True
+        assert "hashing" not in images["a.qcow2"]
+        assert qemu.image_inventory.hashing == 1
+
+        hashed.set()
+        await qemu.image_inventory.wait_hashing()
+        images = {image["filename"]: image for image in await qemu.list_images()}
+        assert images["b.qcow2"] == {"filename": "b.qcow2", "path": "b.qcow2", "md5sum": "c4ca4238a0b923820dcc509a6f75849b", "filesize": 1}
+        assert qemu.image_inventory.hashing == 0
+
+
+async def test_list_images_scan_once(qemu, images_dir):
+
+    qemu_images_dir = os.path.join(images_dir, "QEMU")
+    with open(os.path.join(qemu_images_dir, "a.qcow2"), "w+") as f:
+        f.write("1")
+
+    await qemu.list_images()
+    with patch("gns3server.compute.image_inventory.scan_images") as mock:
+        assert len(await qemu.list_images()) == 1
+        assert not mock.called
+    qemu.image_inventory.invalidate()
+    with patch("gns3server.compute.image_inventory.scan_images", return_value=([], {})) as mock:
+        assert await qemu.list_images() == []
+        assert mock.called
+
+
 async def test_delete_node(vpcs, compute_project):
 
     compute_project._nodes = set()
@@ -20,7 +20,7 @@ import pytest
 import uuid
 from unittest.mock import patch
 
-from gns3server.compute.port_manager import PortManager
+from gns3server.compute.port_manager import PortManager, PortAllocator
 from gns3server.compute.project import Project
 
 
@@ -115,6 +115,88 @@ def test_release_udp_port():
     pm.reserve_udp_port(20000, project)
 
 
+def test_reserve_many():
+
+    pm = PortManager()
+    project = Project(project_id=str(uuid.uuid4()))
+    ports = pm.reserve_many(project, 10)
+    assert len(set(ports)) == 10
+    for port in ports:
+        assert port in pm.udp_ports
+        assert 20000 <= port <= 30000
+    pm.release_udp_port(ports[0], project)
+    # released ports are not reused immediately
+    assert ports[0] not in pm.reserve_many(project, 5)
+
+    ports = pm.reserve_many(project, 2, socket_type="TCP", port_range_start=7000, port_range_end=7100)
+    for port in ports:
+        assert port in pm.tcp_ports
+        assert 7000 <= port <= 7100
+
+
+def test_reserve_many_not_enough_ports():
+
+    pm = PortManager()
+    project = Project(project_id=str(uuid.uuid4()))
+    pm.udp_port_range = (20000, 20004)
+    pm.reserve_udp_port(20002, project)
+    with pytest.raises(aiohttp.web.HTTPConflict):
+        pm.reserve_many(project, 5)
+    assert sorted(pm.reserve_many(project, 4)) == [20000, 20001, 20003, 20004]
+
+
+def test_reserve_many_port_used_by_another_program():
+
+    pm = PortManager()
+    project = Project(project_id=str(uuid.uuid4()))
+    pm.udp_port_range = (20000, 20010)
+    with patch("gns3server.compute.port_manager.PortManager._check_port") as mock_check:
+
+        def execute_mock(host, port, *args):
+            if port == 20001:
+                raise OSError("Port is already used")
+            return True
+
+        mock_check.side_effect = execute_mock
+        assert pm.reserve_many(project, 2) == [20000, 20002]
+
+
+def test_port_allocator():
+
+    allocator = PortAllocator(6663, 6671, used_ports=[6670])
+    # ports 6665 to 6669 are banned
+    assert list(allocator.free_ports()) == [6663, 6664, 6671]
+    allocator.mark_free(6670)
+    allocator.mark_free(6665)
+    assert next(allocator.free_ports()) == 6663
+    # the search restarts after the last returned port
+    assert list(allocator.free_ports()) == [6664, 6670, 6671, 6663]
+
+
+def test_port_allocator_lowest_first():
+
+    allocator = PortAllocator(7000, 7003, rotate=False)
+    assert next(allocator.free_ports()) == 7000
+    allocator.mark_used(7000)
+    allocator.mark_used(7001)
+    allocator.mark_free(7000)
+    assert list(allocator.free_ports()) == [7000, 7002, 7003]
+
+
+def test_get_free_tcp_port_lowest_first():
+
+    pm = PortManager()
+    project = Project(project_id=str(uuid.uuid4()))
+    pm.console_host = "127.0.0.1"
+    pm.console_port_range = (7000, 7100)
+    with patch("gns3server.compute.port_manager.PortManager._check_port"):
+        assert pm.get_free_tcp_port(project) == 7000
+        assert pm.get_free_tcp_port(project) == 7001
+        pm.release_tcp_port(7000, project)
+        # released console ports are reused first
+        assert pm.get_free_tcp_port(project) == 7000
+
+
 def test_find_unused_port():
 
     p = PortManager().find_unused_port(1000, 10000)
@@ -204,6 +204,22 @@ async def test_list_files(tmpdir):
         ]
 
 
+async def test_list_files_indexed(tmpdir):
+
+    with patch("gns3server.config.Config.get_section_config", return_value={"projects_path": str(tmpdir)}):
+        project = Project(project_id=str(uuid4()))
+        with open(os.path.join(project.path, "test.txt"), "w+") as f:
+            f.write("test2")
+
+        await project.list_files()
+        assert os.path.exists(os.path.join(project.path, ".md5sums"))
+        with patch("gns3server.utils.checksum.compute_md5") as mock:
+            files = await project.list_files()
+            assert not mock.called
+
+        assert files == [{"path": "test.txt", "md5sum": "ad0234829205b9033196ba818f7a872b"}]
+
+
 async def test_emit():
 
     with NotificationManager.instance().queue() as queue:
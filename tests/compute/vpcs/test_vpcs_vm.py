@@ -211,6 +211,7 @@ async def test_reload(vm):
                 assert vm.is_running()
 
                 vm._ubridge_send = AsyncioMagicMock()
+                vm._ubridge_send_batch = AsyncioMagicMock()
                 with asyncio_patch("gns3server.utils.asyncio.wait_for_process_termination"):
                     await vm.reload()
                 assert vm.is_running() is True
@@ -17,11 +17,12 @@
 
 import json
 import pytest
+import asyncio
 import aiohttp
 from unittest.mock import patch, MagicMock
 
 from gns3server.controller.project import Project
-from gns3server.controller.compute import Compute, ComputeConflict
+from gns3server.controller.compute import Compute, ComputeConflict, ComputeError, UDP_NIO_BATCH_SIZE
 from tests.utils import asyncio_patch, AsyncioMagicMock
 
 
@@ -218,6 +219,62 @@ async def test_compute_httpQuery_project(compute):
         mock.assert_called_with("POST", "https://example.com:84/v2/compute/projects", data=json.dumps(project.__json__()), headers={'content-type': 'application/json'}, auth=None, chunked=None, timeout=20)
         await compute.close()
 
+async def test_compute_httpQuery_keep_alive(compute):
+
+    compute.keep_alive = True
+    response = MagicMock()
+    with asyncio_patch("aiohttp.ClientSession.request", return_value=response) as mock:
+        response.status = 200
+        await compute.get("/projects")
+        mock.assert_called_with("GET", "https://example.com:84/v2/compute/projects", data=None, headers={'content-type': 'application/json', 'X-GNS3-Keep-Alive': 'true'}, auth=None, chunked=None, timeout=20)
+    assert compute._session().connector.force_close is False
+    await compute.close()
+
+
+async def test_keep_alive_change_session(compute):
+
+    compute.keep_alive = False
+    session = compute._session()
+    assert session.connector.force_close is True
+    compute.keep_alive = True
+    await asyncio.sleep(0)
+    assert session.closed
+    assert compute._session().connector.force_close is False
+    # the session is kept when the value doesn't change
+    session = compute._session()
+    compute.keep_alive = True
+    assert compute._session() is session
+    await compute.close()
+
+
+def test_keep_alive_from_config(compute, config):
+
+    assert compute.keep_alive is False
+    config.set_section_config("Server", {"compute_keep_alive": True})
+    assert compute.keep_alive is True
+    compute.keep_alive = False
+    assert compute.keep_alive is False
+
+
+async def test_compute_httpQuery_keep_alive_retry(compute):
+
+    compute.keep_alive = True
+    response = MagicMock()
+    response.status = 200
+    future = asyncio.Future()
+    future.set_result(response)
+    with asyncio_patch("aiohttp.ClientSession.request", side_effect=[aiohttp.ServerDisconnectedError(), future]) as mock:
+        await compute.get("/projects")
+        assert mock.call_count == 2
+
+    # POST requests are not replayed
+    with asyncio_patch("aiohttp.ClientSession.request", side_effect=[aiohttp.ServerDisconnectedError(), future]) as mock:
+        with pytest.raises(ComputeError):
+            await compute.post("/projects", {"a": "b"})
+        assert mock.call_count == 1
+    await compute.close()
+
+
 # FIXME: https://github.com/aio-libs/aiohttp/issues/2525
 # async def test_connectNotification(compute):
 #
@@ -290,6 +347,7 @@ async def test_json(compute):
         "host": "example.com",
         "port": 84,
         "user": "test",
+        "keep_alive": False,
         "cpu_usage_percent": None,
         "memory_usage_percent": None,
         "connected": True,
@@ -515,3 +573,81 @@ async def test_get_ip_on_same_subnet(controller):
         },
     ]
     assert await compute1.get_ip_on_same_subnet(compute2) == ('192.168.2.1', '192.168.1.2')
+
+
+async def test_get_ip_on_same_subnet_cache(controller):
+
+    compute1 = Compute("compute1", host="127.0.0.1", controller=controller)
+    compute1._interfaces_cache = [{"ip_address": "192.168.1.1", "netmask": "255.255.255.0"}]
+    compute2 = Compute("compute2", host="127.0.0.1", controller=controller)
+    compute2._interfaces_cache = [{"ip_address": "192.168.1.2", "netmask": "255.255.255.0"}]
+    assert await compute1.get_ip_on_same_subnet(compute2) == ("192.168.1.1", "192.168.1.2")
+
+    # the result is cached
+    compute2._interfaces_cache = [{"ip_address": "192.168.2.2", "netmask": "255.255.255.0"}]
+    assert await compute1.get_ip_on_same_subnet(compute2) == ("192.168.1.1", "192.168.1.2")
+
+    # until the interfaces of one of the computes change
+    response = MagicMock()
+    response.json = [{"ip_address": "192.168.2.1", "netmask": "255.255.255.0"}]
+    with asyncio_patch("gns3server.controller.compute.Compute.get", return_value=response):
+        await compute1._fetch_interfaces()
+    assert await compute1.get_ip_on_same_subnet(compute2) == ("192.168.2.1", "192.168.2.2")
+
+    # or its host
+    compute2.host = "192.168.3.2"
+    compute2._interfaces_cache = [{"ip_address": "192.168.3.2", "netmask": "255.255.255.0"}]
+    with pytest.raises(ValueError):
+        await compute1.get_ip_on_same_subnet(compute2)
+
+
+async def test_interfaces_cache(compute):
+
+    response = MagicMock()
+    response.json = [{"ip_address": "192.168.1.1", "netmask": "255.255.255.0"}]
+    with asyncio_patch("gns3server.controller.compute.Compute.get", return_value=response) as mock:
+        results = await asyncio.gather(compute.interfaces(), compute.interfaces())
+        assert results == [response.json, response.json]
+        assert mock.call_count == 1
+
+        # an outdated list is returned while it is refreshed in background
+        compute._interfaces_updated -= 3600
+        response.json = [{"ip_address": "192.168.2.1", "netmask": "255.255.255.0"}]
+        assert await compute.interfaces() == [{"ip_address": "192.168.1.1", "netmask": "255.255.255.0"}]
+        await compute._interfaces_refresh
+        assert await compute.interfaces() == response.json
+        assert mock.call_count == 2
+
+
+async def test_add_udp_nio(compute):
+
+    response = MagicMock()
+    response.json = {"nios": [{"status": 201, "nio": {"type": "nio_udp", "lport": 1024}},
+                              {"status": 404, "message": "Node ID 2 doesn't exist"}]}
+    nio = {"type": "nio_udp", "lport": 1024, "rhost": "127.0.0.1", "rport": 2048}
+    with asyncio_patch("gns3server.controller.compute.Compute.post", return_value=response) as mock:
+        results = await asyncio.gather(compute.add_udp_nio("p1", "vpcs", "1", 0, 0, nio),
+                                       compute.add_udp_nio("p1", "qemu", "2", 1, 0, nio),
+                                       return_exceptions=True)
+        # only one request for both NIOs
+        mock.assert_called_once_with("/projects/p1/nios/udp", data={"nios": [
+            {"node_type": "vpcs", "node_id": "1", "adapter_number": 0, "port_number": 0, "nio": nio},
+            {"node_type": "qemu", "node_id": "2", "adapter_number": 1, "port_number": 0, "nio": nio}
+        ]}, timeout=120)
+    assert results[0] == {"type": "nio_udp", "lport": 1024}
+    assert isinstance(results[1], aiohttp.web.HTTPNotFound)
+
+
+async def test_add_udp_nio_batch_size(compute):
+
+    async def post(path, data=None, **kwargs):
+        response = MagicMock()
+        response.json = {"nios": [{"status": 201, "nio": settings["nio"]} for settings in data["nios"]]}
+        return response
+
+    nios = [{"type": "nio_udp", "lport": 1024 + i, "rhost": "127.0.0.1", "rport": 2048} for i in range(UDP_NIO_BATCH_SIZE * 2 + 1)]
+    with asyncio_patch("gns3server.controller.compute.Compute.post", side_effect=post) as mock:
+        results = await asyncio.gather(*[compute.add_udp_nio("p1", "vpcs", str(i), 0, 0, nio) for i, nio in enumerate(nios)])
+    assert results == nios
+    # the NIOs are split in requests of at most UDP_NIO_BATCH_SIZE NIOs
+    assert [len(call[1]["data"]["nios"]) for call in mock.call_args_list] == [UDP_NIO_BATCH_SIZE, UDP_NIO_BATCH_SIZE, 1]
@@ -204,7 +204,8 @@ async def test_addComputeConfigFile(controller, controller_config_path):
                 'port': 3080,
                 'protocol': 'http',
                 'user': None,
-                'password': None
+                'password': None,
+                'keep_alive': None
             }
         ]
 
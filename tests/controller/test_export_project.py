@@ -28,7 +28,7 @@ from unittest.mock import MagicMock
 from tests.utils import AsyncioMagicMock, AsyncioBytesIO
 
 from gns3server.controller.project import Project
-from gns3server.controller.export_project import export_project, _is_exportable
+from gns3server.controller.export_project import export_project, export_cache_path, _is_exportable
 from gns3server.utils.asyncio import aiozipstream
 
 
@@ -37,6 +37,7 @@ async def project(loop, controller):
 
     p = Project(controller=controller, name="test")
     p.dump = MagicMock()
+    p.save = AsyncioMagicMock()
     return p
 
 
@@ -70,6 +71,7 @@ def test_exportable_files():
     assert not _is_exportable("test/snapshots")
     assert not _is_exportable("test/project-files/snapshots")
     assert not _is_exportable("test/project-files/snapshots/test.gns3p")
+    assert not _is_exportable("test/.md5sums")
 
 
 async def test_export(tmpdir, project):
@@ -426,6 +428,254 @@ async def test_export_images_from_vm(tmpdir, project):
             assert content == b"IMAGE"
 
 
+@pytest.mark.parametrize("compression,compress_type", [(zipfile.ZIP_DEFLATED, zipfile.ZIP_STORED),
+                                                       (zipfile.ZIP_STORED, zipfile.ZIP_STORED),
+                                                       (zipfile.ZIP_LZMA, zipfile.ZIP_LZMA)])
+async def test_export_remote_qcow2_image(tmpdir, project, compression, compress_type):
+    """
+    The compression of an image from a remote compute is chosen
+    like the compression of a local image.
+    """
+
+    compute = MagicMock()
+    compute.id = "vm"
+    compute.list_files = AsyncioMagicMock(return_value=[])
+    compute.download_image = AsyncioMagicMock(return_value=_mock_response(b"QFI\xfb" + b"\x00" * 1024))
+    project._project_created_on_compute.add(compute)
+
+    topology = {
+        "topology": {
+            "nodes": [
+                    {
+                        "compute_id": "vm",
+                        "properties": {
+                            "hda_disk_image": "linux.qcow2"
+                        },
+                        "node_type": "qemu"
+                    }
+            ]
+        }
+    }
+
+    with open(os.path.join(project.path, "test.gns3"), 'w+') as f:
+        f.write(json.dumps(topology))
+
+    with aiozipstream.ZipFile(compression=compression) as z:
+        await export_project(z, project, str(tmpdir), include_images=True)
+        await write_file(str(tmpdir / 'zipfile.zip'), z)
+
+    with zipfile.ZipFile(str(tmpdir / 'zipfile.zip')) as myzip:
+        assert myzip.getinfo("images/qemu/linux.qcow2").compress_type == compress_type
+        assert myzip.read("images/qemu/linux.qcow2") == b"QFI\xfb" + b"\x00" * 1024
+
+
+class _Content:
+
+    def __init__(self, data):
+        self._data = data
+
+    async def read(self, length=-1):
+        data, self._data = self._data[:length], self._data[length:]
+        return data
+
+
+def _mock_response(data, status=200):
+
+    response = MagicMock()
+    response.content = _Content(data)
+    response.status = status
+    return response
+
+
+async def test_export_remote_files_cached(tmpdir, project):
+    """
+    A file already downloaded from a compute is not downloaded again.
+    """
+
+    compute = MagicMock()
+    compute.id = "vm"
+    compute.list_files = AsyncioMagicMock(return_value=[{"path": "vm-1/dynamips/test", "md5sum": "eb61eead90e3b899c6bcbe27ac581660"}])
+
+    async def download_file(project, path, offset=0):
+        return _mock_response(b"HELLO")
+
+    compute.download_file = AsyncioMagicMock(side_effect=download_file)
+    project._project_created_on_compute.add(compute)
+
+    for _ in range(2):
+        with aiozipstream.ZipFile() as z:
+            await export_project(z, project, str(tmpdir))
+            await write_file(str(tmpdir / 'zipfile.zip'), z)
+
+        with zipfile.ZipFile(str(tmpdir / 'zipfile.zip')) as myzip:
+            with myzip.open("vm-1/dynamips/test") as myfile:
+                assert myfile.read() == b"HELLO"
+
+    assert compute.download_file.call_count == 1
+
+
+async def test_export_remote_files_resume(tmpdir, project):
+    """
+    An interrupted download is resumed where it stopped.
+    """
+
+    class InterruptedContent(_Content):
+
+        async def read(self, length=-1):
+            data = await super().read(length)
+            if not data:
+                raise aiohttp.ClientPayloadError("Connection lost")
+            return data
+
+    offsets = []
+
+    async def download_file(project, path, offset=0):
+        offsets.append(offset)
+        if offset == 0:
+            response = _mock_response(b"HEL")
+            response.content = InterruptedContent(b"HEL")
+            return response
+        return _mock_response(b"HELLO"[offset:], status=206)
+
+    compute = MagicMock()
+    compute.id = "vm"
+    compute.list_files = AsyncioMagicMock(return_value=[{"path": "vm-1/dynamips/test", "md5sum": "eb61eead90e3b899c6bcbe27ac581660"}])
+    compute.download_file = AsyncioMagicMock(side_effect=download_file)
+    project._project_created_on_compute.add(compute)
+
+    with aiozipstream.ZipFile() as z:
+        await export_project(z, project, str(tmpdir))
+        await write_file(str(tmpdir / 'zipfile.zip'), z)
+
+    assert offsets == [0, 3]
+    with zipfile.ZipFile(str(tmpdir / 'zipfile.zip')) as myzip:
+        with myzip.open("vm-1/dynamips/test") as myfile:
+            assert myfile.read() == b"HELLO"
+
+
+async def test_export_remote_files_connection_error(tmpdir, project):
+    """
+    A download request failing to connect is retried.
+    """
+
+    calls = []
+
+    async def download_file(project, path, offset=0):
+        calls.append(offset)
+        if len(calls) == 1:
+            raise aiohttp.ClientConnectionError("Connection refused")
+        return _mock_response(b"HELLO")
+
+    compute = MagicMock()
+    compute.id = "vm"
+    compute.list_files = AsyncioMagicMock(return_value=[{"path": "vm-1/dynamips/test", "md5sum": "eb61eead90e3b899c6bcbe27ac581660"}])
+    compute.download_file = AsyncioMagicMock(side_effect=download_file)
+    project._project_created_on_compute.add(compute)
+
+    with aiozipstream.ZipFile() as z:
+        await export_project(z, project, str(tmpdir))
+        await write_file(str(tmpdir / 'zipfile.zip'), z)
+
+    assert calls == [0, 0]
+    with zipfile.ZipFile(str(tmpdir / 'zipfile.zip')) as myzip:
+        with myzip.open("vm-1/dynamips/test") as myfile:
+            assert myfile.read() == b"HELLO"
+
+
+async def test_export_remote_files_cache_cleaned(tmpdir, project):
+    """
+    Only the files of the last export are kept in the cache, the partial
+    downloads are removed when they fail. The snapshot store is not used
+    as a cache.
+    """
+
+    store_path = export_cache_path(project)
+    compute = MagicMock()
+    compute.id = "vm"
+    project._project_created_on_compute.add(compute)
+
+    for data, md5 in ((b"HELLO", "eb61eead90e3b899c6bcbe27ac581660"), (b"WORLD", "5289492cf082446ca4a6eec9f72f1ec3")):
+        compute.list_files = AsyncioMagicMock(return_value=[{"path": "vm-1/dynamips/test", "md5sum": md5}])
+        compute.download_file = AsyncioMagicMock(return_value=_mock_response(data))
+        with aiozipstream.ZipFile() as z:
+            await export_project(z, project, str(tmpdir))
+            await write_file(str(tmpdir / 'zipfile.zip'), z)
+        assert os.listdir(os.path.join(store_path, "objects", md5[:2])) == [md5]
+
+    assert os.listdir(os.path.join(store_path, "objects", "eb")) == []
+    with zipfile.ZipFile(str(tmpdir / 'zipfile.zip')) as myzip:
+        with myzip.open("vm-1/dynamips/test") as myfile:
+            assert myfile.read() == b"WORLD"
+
+    compute.list_files = AsyncioMagicMock(return_value=[{"path": "vm-1/dynamips/test2", "md5sum": None}])
+    compute.download_file = AsyncioMagicMock(return_value=_mock_response(b"", status=500))
+    with aiozipstream.ZipFile() as z:
+        await export_project(z, project, str(tmpdir))
+    assert os.listdir(os.path.join(store_path, "partial")) == []
+    assert not os.path.exists(os.path.join(project.path, "snapshots"))
+
+
+async def test_export_snapshots_without_export_cache(tmpdir, project):
+    """
+    The files cached in the store by the last export are not
+    exported with the snapshots.
+    """
+
+    compute = MagicMock()
+    compute.id = "vm"
+    compute.list_files = AsyncioMagicMock(return_value=[{"path": "vm-1/dynamips/test", "md5sum": "eb61eead90e3b899c6bcbe27ac581660"}])
+    compute.download_file = AsyncioMagicMock(return_value=_mock_response(b"HELLO"))
+    project._project_created_on_compute.add(compute)
+
+    snapshots_dir = os.path.join(project.path, "snapshots")
+    os.makedirs(snapshots_dir)
+    with open(os.path.join(snapshots_dir, "snap_010118_000000.gns3snapshot"), "w+") as f:
+        json.dump({"topology": "5289492cf082446ca4a6eec9f72f1ec3", "files": {}, "computes": {}}, f)
+    snapshot_object = os.path.join("snapshots", "store", "objects", "52", "5289492cf082446ca4a6eec9f72f1ec3")
+    os.makedirs(os.path.dirname(os.path.join(project.path, snapshot_object)))
+    with open(os.path.join(project.path, snapshot_object), "w+") as f:
+        f.write("WORLD")
+
+    for i in range(2):
+        with aiozipstream.ZipFile() as z:
+            await export_project(z, project, str(tmpdir), include_snapshots=True)
+            await write_file(str(tmpdir / 'zipfile.zip'), z)
+
+    with zipfile.ZipFile(str(tmpdir / 'zipfile.zip')) as myzip:
+        names = myzip.namelist()
+    assert snapshot_object in names
+    assert "vm-1/dynamips/test" in names
+    assert [name for name in names if name.startswith("snapshots/store")] == [snapshot_object]
+
+
+async def test_export_remote_files_from_snapshot_store(tmpdir, project):
+    """
+    A file of a remote compute already in the snapshot store is not downloaded
+    and the modification time of the stored file is not changed by the export.
+    """
+
+    compute = MagicMock()
+    compute.id = "vm"
+    compute.list_files = AsyncioMagicMock(return_value=[{"path": "vm-1/dynamips/test", "md5sum": "5289492cf082446ca4a6eec9f72f1ec3"}])
+    compute.download_file = AsyncioMagicMock()
+    project._project_created_on_compute.add(compute)
+
+    snapshot_object = os.path.join(project.path, "snapshots", "store", "objects", "52", "5289492cf082446ca4a6eec9f72f1ec3")
+    os.makedirs(os.path.dirname(snapshot_object))
+    with open(snapshot_object, "w+") as f:
+        f.write("WORLD")
+    os.utime(snapshot_object, (0, 0))
+
+    with aiozipstream.ZipFile() as z:
+        await export_project(z, project, str(tmpdir))
+        await write_file(str(tmpdir / 'zipfile.zip'), z)
+
+    assert not compute.download_file.called
+    assert os.stat(snapshot_object).st_mtime == 0
+    with zipfile.ZipFile(str(tmpdir / 'zipfile.zip')) as myzip:
+        assert myzip.read("vm-1/dynamips/test") == b"WORLD"
+
+
 async def test_export_with_ignoring_snapshots(tmpdir, project):
 
     with open(os.path.join(project.path, "test.gns3"), 'w+') as f:
@@ -19,10 +19,14 @@ import os
 import uuid
 import json
 import zipfile
+import asyncio
+import aiohttp
+import pytest
 
+from unittest.mock import MagicMock, patch
 from tests.utils import asyncio_patch, AsyncioMagicMock
 
-from gns3server.controller.import_project import import_project, _move_files_to_compute
+from gns3server.controller.import_project import import_project, _move_files_to_compute, _extract_files, _extract_member
 from gns3server.version import __version__
 
 
@@ -217,6 +221,7 @@ async def test_import_iou_linux_with_vm(loop, linux_platform, tmpdir, controller
 
     project_id = str(uuid.uuid4())
     controller._computes["vm"] = AsyncioMagicMock()
+    controller._computes["vm"].post = AsyncioMagicMock(return_value=MagicMock())
 
     topology = {
         "project_id": str(uuid.uuid4()),
@@ -262,6 +267,7 @@ async def test_import_nat_non_linux(loop, windows_platform, tmpdir, controller):
 
     project_id = str(uuid.uuid4())
     controller._computes["vm"] = AsyncioMagicMock()
+    controller._computes["vm"].post = AsyncioMagicMock(return_value=MagicMock())
 
     topology = {
         "project_id": str(uuid.uuid4()),
@@ -307,6 +313,7 @@ async def test_import_iou_non_linux(loop, windows_platform, tmpdir, controller):
 
     project_id = str(uuid.uuid4())
     controller._computes["vm"] = AsyncioMagicMock()
+    controller._computes["vm"].post = AsyncioMagicMock(return_value=MagicMock())
 
     topology = {
         "project_id": str(uuid.uuid4()),
@@ -456,6 +463,7 @@ async def test_import_keep_compute_id(loop, windows_platform, tmpdir, controller
 
     project_id = str(uuid.uuid4())
     controller._computes["vm"] = AsyncioMagicMock()
+    controller._computes["vm"].post = AsyncioMagicMock(return_value=MagicMock())
 
     topology = {
         "project_id": str(uuid.uuid4()),
@@ -502,7 +510,7 @@ async def test_move_files_to_compute(tmpdir):
     (tmpdir / "project-files" / "docker" / "test").open("w").close()
     (tmpdir / "project-files" / "docker" / "test2").open("w").close()
 
-    with asyncio_patch("gns3server.controller.import_project._upload_file") as mock:
+    with asyncio_patch("gns3server.controller.import_project._upload_file", return_value=True) as mock:
         await _move_files_to_compute(None, project_id, str(tmpdir), os.path.join("project-files", "docker"))
 
     mock.assert_any_call(None, project_id, str(tmpdir / "project-files" / "docker" / "test"), os.path.join("project-files", "docker", "test"))
@@ -542,3 +550,176 @@ async def test_import_project_name_and_location(tmpdir, controller):
     with open(zip_path, "rb") as f:
         project = await import_project(controller, str(uuid.uuid4()), f, name="hello", location=str(tmpdir / "test"))
     assert project.name == "hello-1"
+
+
+async def test_import_project_stream_files(loop, windows_platform, tmpdir, controller):
+    """
+    Files of recent topologies are extracted directly to their destination,
+    node files of remote nodes are uploaded without being written on the controller
+    """
+
+    project_id = str(uuid.uuid4())
+    controller._computes["vm"] = AsyncioMagicMock()
+    controller._computes["vm"].post = AsyncioMagicMock(return_value=MagicMock())
+
+    topology = {
+        "project_id": str(uuid.uuid4()),
+        "name": "test",
+        "type": "topology",
+        "topology": {
+            "nodes": [
+                {
+                    "compute_id": "local",
+                    "node_id": "0fd3dd4d-dc93-4a04-a9b9-7396a9e22e8b",
+                    "node_type": "qemu",
+                    "name": "test",
+                    "properties": {}
+                },
+                {
+                    "compute_id": "local",
+                    "node_id": "c3ae286c-c81f-40d9-a2d0-5874b2f2478d",
+                    "node_type": "vpcs",
+                    "name": "test2",
+                    "properties": {}
+                }
+            ],
+            "links": [],
+            "computes": [],
+            "drawings": []
+        },
+        "revision": 9,
+        "version": "2.2.0"
+    }
+
+    zip_path = str(tmpdir / "project.zip")
+    with zipfile.ZipFile(zip_path, 'w') as myzip:
+        myzip.writestr("project.gns3", json.dumps(topology))
+        myzip.writestr("b.png", "B")
+        myzip.writestr("project-files/qemu/0fd3dd4d-dc93-4a04-a9b9-7396a9e22e8b/hda_disk.qcow2", "test")
+        myzip.writestr("project-files/vpcs/c3ae286c-c81f-40d9-a2d0-5874b2f2478d/startup.vpc", "test")
+        myzip.writestr("../evil", "test")
+
+    with open(zip_path, "rb") as f:
+        with asyncio_patch("gns3server.controller.import_project._move_files_to_compute") as mock_move:
+            with asyncio_patch("gns3server.controller.import_project._upload_member") as mock_upload:
+                project = await import_project(controller, project_id, f)
+
+    assert not mock_move.called
+    with open(os.path.join(project.path, "test.gns3")) as f:
+        topo = json.load(f)
+    qemu_id = topo["topology"]["nodes"][0]["node_id"]
+    vpcs_id = topo["topology"]["nodes"][1]["node_id"]
+    assert topo["topology"]["nodes"][0]["compute_id"] == "vm"
+
+    args, _ = mock_upload.call_args
+    assert args[0] == controller._computes["vm"]
+    assert args[1] == project_id
+    assert args[4] == "project-files/qemu/{}/hda_disk.qcow2".format(qemu_id)
+    assert not os.path.exists(os.path.join(project.path, "project-files", "qemu"))
+
+    assert os.path.exists(os.path.join(project.path, "b.png"))
+    assert os.path.exists(os.path.join(project.path, "project-files", "vpcs", vpcs_id, "startup.vpc"))
+    assert not os.path.exists(os.path.join(project.path, "project.gns3"))
+    assert not os.path.exists(os.path.join(os.path.dirname(project.path), "evil"))
+
+
+async def test_import_project_stream_images(tmpdir, controller):
+    """
+    An image already in the images directory with the same content is not extracted again
+    """
+
+    project_id = str(uuid.uuid4())
+    topology = {
+        "project_id": str(uuid.uuid4()),
+        "name": "test",
+        "type": "topology",
+        "topology": {
+            "nodes": [],
+            "links": [],
+            "computes": [],
+            "drawings": []
+        },
+        "revision": 9,
+        "version": "2.2.0"
+    }
+
+    zip_path = str(tmpdir / "project.zip")
+    with zipfile.ZipFile(zip_path, 'w') as myzip:
+        myzip.writestr("project.gns3", json.dumps(topology))
+        myzip.writestr("images/QEMU/same.qcow2", "A")
+        myzip.writestr("images/QEMU/new.qcow2", "B")
+
+    images_path = os.path.join(controller.images_path(), "QEMU")
+    os.makedirs(images_path, exist_ok=True)
+    with open(os.path.join(images_path, "same.qcow2"), "w+") as f:
+        f.write("A")
+    os.utime(os.path.join(images_path, "same.qcow2"), (0, 0))
+
+    with open(zip_path, "rb") as f:
+        project = await import_project(controller, project_id, f)
+
+    assert not os.path.exists(os.path.join(project.path, "images"))
+    assert os.stat(os.path.join(images_path, "same.qcow2")).st_mtime == 0
+    with open(os.path.join(images_path, "new.qcow2")) as f:
+        assert f.read() == "B"
+
+
+async def test_extract_files_error(tmpdir, controller):
+    """
+    An error on a destination waits for the files of the other destinations
+    """
+
+    compute = MagicMock()
+    node_id = str(uuid.uuid4())
+    zip_path = str(tmpdir / "project.zip")
+    with zipfile.ZipFile(zip_path, 'w') as myzip:
+        myzip.writestr("a.png", "A")
+        myzip.writestr("project-files/qemu/{}/hda_disk.qcow2".format(node_id), "test")
+
+    extracted = []
+
+    async def extract_member(zip_file, info, path):
+        await asyncio.sleep(0.1)
+        extracted.append(info.filename)
+
+    with zipfile.ZipFile(zip_path) as zip_file:
+        with patch("gns3server.controller.import_project._extract_member", side_effect=extract_member):
+            with asyncio_patch("gns3server.controller.import_project._upload_member", side_effect=aiohttp.web.HTTPConflict(text="Upload error")):
+                with pytest.raises(aiohttp.web.HTTPConflict):
+                    await _extract_files(controller, zip_file, str(tmpdir / "project"), str(uuid.uuid4()), {node_id: node_id}, {node_id: compute})
+    assert extracted == ["a.png"]
+
+
+async def test_extract_member_replace(tmpdir):
+    """
+    A file is replaced once completely extracted, an interrupted
+    extraction leaves the previous file unchanged.
+    """
+
+    zip_path = str(tmpdir / "project.zip")
+    with zipfile.ZipFile(zip_path, 'w') as myzip:
+        myzip.writestr("images/QEMU/linux.qcow2", "B" * 1024)
+
+    images_path = str(tmpdir / "images" / "QEMU")
+    os.makedirs(images_path)
+    image_path = os.path.join(images_path, "linux.qcow2")
+    with open(image_path, "w+") as f:
+        f.write("A")
+
+    with zipfile.ZipFile(zip_path) as zip_file:
+        info = zip_file.getinfo("images/QEMU/linux.qcow2")
+        with open(image_path) as image:
+            with patch("shutil.copyfileobj", side_effect=OSError("No space left on device")):
+                with pytest.raises(OSError):
+                    await _extract_member(zip_file, info, image_path)
+            assert os.listdir(images_path) == ["linux.qcow2"]
+            with open(image_path) as f:
+                assert f.read() == "A"
+
+            await _extract_member(zip_file, info, image_path)
+            # the image in use keeps its content
+            assert image.read() == "A"
+
+    assert os.listdir(images_path) == ["linux.qcow2"]
+    with open(image_path) as f:
+        assert f.read() == "B" * 1024
@@ -15,6 +15,7 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import asyncio
 import pytest
 from unittest.mock import MagicMock
 
@@ -121,3 +122,142 @@ def test_various_notification(controller, node):
     notif.project_emit("log.warning", {"message": "Warning ASA 8 is not officially supported by GNS3"})
     notif.project_emit("log.error", {"message": "Permission denied on /tmp"})
     notif.project_emit("node.updated", node.__json__())
+
+
+async def test_emit_serialized_once(controller, project):
+
+    notif = controller.notification
+    with notif.project_queue(project.id) as queue1:
+        with notif.project_queue(project.id) as queue2:
+            await queue1.get(0.1)  # ping
+            await queue2.get(0.1)  # ping
+            notif.project_emit('test', {"project_id": project.id})
+            frame1 = await queue1.get(5)
+            frame2 = await queue2.get(5)
+            assert frame1 is frame2
+            assert frame1.json() is frame2.json()
+            assert await queue1.get_json(5) != frame1.json()  # ping
+
+
+def test_queue_overflow_coalesce(controller, project, config):
+
+    config.set_section_config("Server", {"notification_rate_limits": ""})
+    notif = controller.notification
+    with notif.project_queue(project.id) as queue:
+        queue._maxsize = 2
+        notif.project_emit("node.updated", {"project_id": project.id, "node_id": "1", "name": "a"})
+        notif.project_emit("node.updated", {"project_id": project.id, "node_id": "2", "name": "b"})
+        notif.project_emit("node.updated", {"project_id": project.id, "node_id": "1", "name": "c"})
+        assert queue.qsize() == 2
+        assert queue.coalesced == 1
+        assert queue.dropped == 0
+        assert queue.get_nowait().event["name"] == "c"
+
+        notif.project_emit("log.info", {"project_id": project.id, "message": "1"})
+        notif.project_emit("log.info", {"project_id": project.id, "message": "2"})
+        assert queue.dropped == 1
+        assert queue.get_nowait().event["message"] == "1"
+        assert notif.statistics()["projects"][project.id] == [{"depth": 1, "max_depth": 2, "dropped": 1, "coalesced": 1}]
+
+
+def test_queue_overflow_drop(controller, project, config):
+
+    config.set_section_config("Server", {"notification_rate_limits": ""})
+    notif = controller.notification
+    with notif.project_queue(project.id) as queue:
+        queue._maxsize = 1
+        queue._overflow_policy = "drop"
+        notif.project_emit("node.updated", {"project_id": project.id, "node_id": "1", "name": "a"})
+        notif.project_emit("node.updated", {"project_id": project.id, "node_id": "1", "name": "b"})
+        assert queue.dropped == 1
+        assert queue.coalesced == 0
+        assert queue.get_nowait().event["name"] == "b"
+
+
+async def test_rate_limit_node_updated(controller, project, config):
+
+    config.set_section_config("Server", {"notification_rate_limits": "node.updated:0.2"})
+    notif = controller.notification
+    with notif.project_queue(project.id) as queue:
+        await queue.get(0.1)  # ping
+        notif.project_emit("node.updated", {"project_id": project.id, "node_id": "1", "name": "a"})
+        notif.project_emit("node.updated", {"project_id": project.id, "node_id": "1", "name": "b"})
+        notif.project_emit("node.updated", {"project_id": project.id, "node_id": "1", "name": "c"})
+        notif.project_emit("node.updated", {"project_id": project.id, "node_id": "2", "name": "d"})
+        assert queue.qsize() == 2
+        assert queue.get_nowait().event["name"] == "a"
+        assert queue.get_nowait().event["name"] == "d"
+
+        # only the latest state is sent at the end of the interval
+        action, event, _ = await queue.get(1)
+        assert action == "node.updated"
+        assert event["name"] == "c"
+        assert queue.qsize() == 0
+
+
+async def test_rate_limit_compute_updated(controller, config):
+
+    config.set_section_config("Server", {"notification_rate_limits": "compute.updated:0.2"})
+    notif = controller.notification
+    with notif.controller_queue() as queue:
+        await queue.get(0.1)  # ping
+        notif.controller_emit("compute.updated", {"compute_id": "local", "cpu_usage_percent": 10})
+        notif.controller_emit("compute.updated", {"compute_id": "local", "cpu_usage_percent": 20})
+        notif.controller_emit("compute.created", {"compute_id": "local"})
+        # the delayed state is sent before the notification which is not rate limited
+        assert queue.get_nowait().event["cpu_usage_percent"] == 10
+        assert queue.get_nowait().event["cpu_usage_percent"] == 20
+        assert queue.get_nowait()[0] == "compute.created"
+        assert queue.qsize() == 0
+
+
+async def test_rate_limit_node_deleted(controller, project, config):
+
+    config.set_section_config("Server", {"notification_rate_limits": "node.updated:0.1"})
+    notif = controller.notification
+    with notif.project_queue(project.id) as queue:
+        await queue.get(0.1)  # ping
+        notif.project_emit("node.updated", {"project_id": project.id, "node_id": "1", "name": "a"})
+        notif.project_emit("node.updated", {"project_id": project.id, "node_id": "1", "name": "b"})
+        notif.project_emit("node.deleted", {"project_id": project.id, "node_id": "1"})
+        assert queue.get_nowait().event["name"] == "a"
+        assert queue.get_nowait()[0] == "node.deleted"
+        # the delayed update is never sent after the deletion
+        await asyncio.sleep(0.2)
+        assert queue.qsize() == 0
+
+
+async def test_rate_limit_node_status_change(controller, project, config):
+
+    config.set_section_config("Server", {"notification_rate_limits": "node.updated:0.1"})
+    notif = controller.notification
+    with notif.project_queue(project.id) as queue:
+        await queue.get(0.1)  # ping
+        notif.project_emit("node.updated", {"project_id": project.id, "node_id": "1", "name": "a", "status": "stopped"})
+        notif.project_emit("node.updated", {"project_id": project.id, "node_id": "1", "name": "b", "status": "stopped"})
+        notif.project_emit("node.updated", {"project_id": project.id, "node_id": "1", "name": "c", "status": "started"})
+        assert queue.get_nowait().event["name"] == "a"
+        # the status change is sent immediately and replaces the delayed state
+        assert queue.get_nowait().event["name"] == "c"
+        await asyncio.sleep(0.2)
+        assert queue.qsize() == 0
+
+
+async def test_rate_limit_status_change_cancels_timer(controller, project, config):
+
+    config.set_section_config("Server", {"notification_rate_limits": "node.updated:0.3"})
+    notif = controller.notification
+    with notif.project_queue(project.id) as queue:
+        await queue.get(0.1)  # ping
+        notif.project_emit("node.updated", {"project_id": project.id, "node_id": "1", "name": "a", "status": "stopped"})
+        notif.project_emit("node.updated", {"project_id": project.id, "node_id": "1", "name": "b", "status": "stopped"})
+        await asyncio.sleep(0.2)
+        notif.project_emit("node.updated", {"project_id": project.id, "node_id": "1", "name": "c", "status": "started"})
+        notif.project_emit("node.updated", {"project_id": project.id, "node_id": "1", "name": "d", "status": "started"})
+        assert queue.get_nowait().event["name"] == "a"
+        assert queue.get_nowait().event["name"] == "c"
+        # the timer of the replaced state doesn't send the new one before the end of its interval
+        await asyncio.sleep(0.15)
+        assert queue.qsize() == 0
+        action, event, _ = await queue.get(1)
+        assert event["name"] == "d"
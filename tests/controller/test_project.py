@@ -18,7 +18,9 @@
 
 import os
 import sys
+import json
 import uuid
+import asyncio
 import pytest
 import aiohttp
 from unittest.mock import MagicMock
@@ -26,7 +28,7 @@ from tests.utils import AsyncioMagicMock, asyncio_patch
 from unittest.mock import patch
 from uuid import uuid4
 
-from gns3server.controller.project import Project
+from gns3server.controller.project import Project, OPEN_CONCURRENCY
 from gns3server.controller.template import Template
 from gns3server.controller.node import Node
 from gns3server.controller.ports.ethernet_port import EthernetPort
@@ -522,6 +524,104 @@ async def test_add_link(project):
     project.emit_notification.assert_any_call("link.created", link.__json__())
 
 
+async def test_add_nodes_and_links(controller, project, compute):
+
+    async def post(path, data=None, **kwargs):
+        response = MagicMock()
+        if path.endswith("/ports/udp"):
+            response.json = {"udp_port": 20000, "udp_ports": list(range(20000, 20000 + data["count"]))}
+        else:
+            response.json = {"console": 2048}
+        return response
+
+    compute.post = AsyncioMagicMock(side_effect=post)
+    nodes = [{"compute_id": "example.com", "name": "PC{}".format(i), "node_id": str(uuid.uuid4()), "node_type": "vpcs"} for i in range(3)]
+    links = [{"nodes": [{"node_id": nodes[0]["node_id"], "adapter_number": 0, "port_number": 0},
+                        {"node_id": nodes[1]["node_id"], "adapter_number": 0, "port_number": 0}]}]
+
+    with asyncio_patch("gns3server.controller.udp_link.UDPLink.create") as mock_udp_create:
+        with patch("gns3server.controller.project.Project.dump") as mock_dump:
+            created_nodes, created_links = await project.add_nodes_and_links(nodes, links)
+            assert mock_dump.call_count == 1
+    assert mock_udp_create.called
+    assert [node.name for node in created_nodes] == ["PC0", "PC1", "PC2"]
+    assert len(created_links) == 1
+    assert len(project.nodes) == 3
+    assert len(project.links) == 1
+    assert nodes[0]["compute_id"] == "example.com"
+
+    # the project is created once on the compute and the UDP ports are reserved with one request
+    assert [c for c in compute.post.call_args_list if c[0][0] == "/projects"] == [
+        ((("/projects",), {"data": {"name": project.name, "project_id": project.id}}))
+    ]
+    compute.post.assert_any_call("/projects/{}/ports/udp".format(project.id), data={"count": 2})
+
+
+async def test_add_nodes_and_links_rollback(controller, project, compute):
+
+    response = MagicMock()
+    response.json = {"console": 2048}
+    compute.post = AsyncioMagicMock(return_value=response)
+    nodes = [{"compute_id": "example.com", "name": "PC{}".format(i), "node_id": str(uuid.uuid4()), "node_type": "vpcs"} for i in range(3)]
+    links = [{"nodes": [{"node_id": nodes[0]["node_id"], "adapter_number": 0, "port_number": 0},
+                        {"node_id": nodes[1]["node_id"], "adapter_number": 0, "port_number": 0}]},
+             {"nodes": [{"node_id": nodes[0]["node_id"], "adapter_number": 0, "port_number": 0},
+                        {"node_id": nodes[2]["node_id"], "adapter_number": 0, "port_number": 0}]}]
+
+    with pytest.raises(aiohttp.web.HTTPConflict):
+        await project.add_nodes_and_links(nodes, links)
+    assert len(project.nodes) == 0
+    assert len(project.links) == 0
+
+
+async def test_add_nodes_and_links_existing_node(controller, project, compute):
+
+    response = MagicMock()
+    response.json = {"console": 2048}
+    compute.post = AsyncioMagicMock(return_value=response)
+    node = await project.add_node(compute, "PC0", str(uuid.uuid4()), node_type="vpcs")
+    nodes = [{"compute_id": "example.com", "name": "PC1", "node_id": str(uuid.uuid4()), "node_type": "vpcs"},
+             {"compute_id": "example.com", "name": "PC2", "node_id": node.id, "node_type": "vpcs"}]
+
+    with pytest.raises(aiohttp.web.HTTPConflict):
+        await project.add_nodes_and_links(nodes)
+    # the existing node is kept and nothing has been created
+    assert list(project.nodes) == [node.id]
+
+    nodes[1]["node_id"] = nodes[0]["node_id"]
+    with pytest.raises(aiohttp.web.HTTPConflict):
+        await project.add_nodes_and_links(nodes)
+    assert list(project.nodes) == [node.id]
+
+
+async def test_allocate_udp_port(project, compute):
+
+    response = MagicMock()
+    response.json = {"udp_port": 20000, "udp_ports": [20000, 20001]}
+    compute.post = AsyncioMagicMock(return_value=response)
+    reserved_ports = {}
+    await project.reserve_udp_ports(compute, 2, reserved_ports)
+    compute.post.reset_mock()
+    assert await project.allocate_udp_port(compute, reserved_ports) == 20000
+    assert await project.allocate_udp_port(compute, reserved_ports) == 20001
+    assert not compute.post.called
+    assert await project.allocate_udp_port(compute, reserved_ports) == 20000
+    compute.post.assert_called_with("/projects/{}/ports/udp".format(project.id))
+
+
+async def test_release_udp_ports(project, compute):
+
+    response = MagicMock()
+    response.json = {"udp_port": 20000, "udp_ports": [20000, 20001, 20002]}
+    compute.post = AsyncioMagicMock(return_value=response)
+    reserved_ports = {}
+    await project.reserve_udp_ports(compute, 3, reserved_ports)
+    assert await project.allocate_udp_port(compute, reserved_ports) == 20000
+    await project.release_udp_ports(reserved_ports)
+    compute.post.assert_called_with("/projects/{}/ports/udp/release".format(project.id), data={"udp_ports": [20001, 20002]})
+    assert reserved_ports == {}
+
+
 async def test_list_links(project):
 
     compute = MagicMock()
@@ -656,6 +756,48 @@ async def test_dump(projects_dir):
             assert "00010203-0405-0607-0809-0a0b0c0d0e0f" in content
 
 
+async def test_dump_debounced(projects_dir):
+
+    directory = projects_dir
+    with patch("gns3server.utils.path.get_default_project_directory", return_value=directory):
+        p = Project(project_id='00010203-0405-0607-0809-0a0b0c0d0e0f', name="Test")
+        with patch("gns3server.controller.project.Project._write_topology") as mock:
+            p.dump()
+            p.dump()
+            p.dump()
+            assert not mock.called
+            assert p.saved_dumps == 2
+            await p.save(pending_only=True)
+            assert mock.call_count == 1
+
+            # nothing is waiting to be saved anymore
+            await p.save(pending_only=True)
+            assert mock.call_count == 1
+
+
+async def test_dump_without_delay(projects_dir):
+
+    directory = projects_dir
+    with patch("gns3server.utils.path.get_default_project_directory", return_value=directory):
+        p = Project(project_id='00010203-0405-0607-0809-0a0b0c0d0e0f', name="Test")
+        with patch("gns3server.config.Config.get_section_config", return_value={"topology_save_delay": "0"}):
+            with patch("gns3server.controller.project.Project._write_topology") as mock:
+                p.dump()
+                assert mock.call_count == 1
+
+
+async def test_close_saves_pending_dump(controller, projects_dir):
+
+    directory = projects_dir
+    with patch("gns3server.utils.path.get_default_project_directory", return_value=directory):
+        p = Project(controller=controller, project_id='00010203-0405-0607-0809-0a0b0c0d0e0f', name="Test")
+        p._status = "opened"
+        p.dump()
+        with patch("gns3server.controller.project.Project._write_topology") as mock:
+            await p.close()
+            assert mock.call_count == 1
+
+
 async def test_open_close(controller):
 
     project = Project(controller=controller, name="Test")
@@ -681,6 +823,132 @@ async def test_open_auto_start(controller):
     assert project.start_all.called
 
 
+def _lab_topology(node_count):
+
+    nodes = [{"compute_id": "example.com", "name": "PC{}".format(i), "node_id": str(uuid.uuid4()), "node_type": "vpcs"} for i in range(node_count)]
+    links = []
+    for i in range(0, node_count - 1, 2):
+        links.append({"link_id": str(uuid.uuid4()),
+                      "nodes": [{"node_id": nodes[i]["node_id"], "adapter_number": 0, "port_number": 0},
+                                {"node_id": nodes[i + 1]["node_id"], "adapter_number": 0, "port_number": 0}]})
+    return {"topology": {"nodes": nodes, "links": links, "computes": [], "drawings": []}}
+
+
+async def test_open_parallel(controller, compute):
+
+    project = Project(controller=controller, name="Test")
+    await project.close()
+
+    running = 0
+    max_running = 0
+
+    async def post(path, data=None, **kwargs):
+        nonlocal running, max_running
+        response = MagicMock()
+        if path.endswith("/ports/udp"):
+            response.json = {"udp_port": 20000, "udp_ports": list(range(20000, 20000 + data["count"]))}
+        elif path.endswith("/nodes"):
+            running += 1
+            max_running = max(max_running, running)
+            # the last nodes of the topology are created first
+            await asyncio.sleep(0.001 * (30 - int(data["name"][2:])))
+            running -= 1
+            response.json = {"console": 2048}
+        return response
+
+    compute.post = AsyncioMagicMock(side_effect=post)
+    project.emit_notification = MagicMock()
+    topology = _lab_topology(30)
+    with patch("gns3server.controller.project.load_topology", return_value=topology):
+        with asyncio_patch("gns3server.controller.udp_link.UDPLink.create"):
+            await project.open()
+
+    assert project.status == "opened"
+    assert len(project.nodes) == 30
+    assert len(project.links) == 15
+    # the nodes and links are kept in the topology order
+    assert list(project.nodes) == [node["node_id"] for node in topology["topology"]["nodes"]]
+    assert list(project.links) == [link["link_id"] for link in topology["topology"]["links"]]
+    # the links have not used the reserved ports, they are released
+    compute.post.assert_any_call("/projects/{}/ports/udp/release".format(project.id), data={"udp_ports": list(range(20000, 20030))})
+    assert 1 < max_running <= OPEN_CONCURRENCY
+    # the UDP ports of all the links are reserved with one request
+    compute.post.assert_any_call("/projects/{}/ports/udp".format(project.id), data={"count": 30})
+    project.emit_notification.assert_any_call("project.loading", {"project_id": project.id,
+                                                                  "nodes": 30,
+                                                                  "nodes_total": 30,
+                                                                  "links": 15,
+                                                                  "links_total": 15})
+
+
+async def test_open_port_used_by_several_links(controller, compute):
+
+    project = Project(controller=controller, name="Test")
+    await project.close()
+
+    response = MagicMock()
+    response.json = {"console": 2048, "udp_port": 20000, "udp_ports": list(range(20000, 20004))}
+    compute.post = AsyncioMagicMock(return_value=response)
+    topology = _lab_topology(3)
+    nodes = topology["topology"]["nodes"]
+    topology["topology"]["links"].append({"link_id": str(uuid.uuid4()),
+                                          "nodes": [{"node_id": nodes[0]["node_id"], "adapter_number": 0, "port_number": 0},
+                                                    {"node_id": nodes[2]["node_id"], "adapter_number": 0, "port_number": 0}]})
+    with patch("gns3server.controller.project.load_topology", return_value=topology):
+        with asyncio_patch("gns3server.controller.udp_link.UDPLink.create"):
+            await project.open()
+    assert len(project.nodes) == 3
+    assert len(project.links) == 1
+
+
+async def test_open_rollback(controller, compute):
+
+    project = Project(controller=controller, name="Test")
+    await project.close()
+
+    async def post(path, data=None, **kwargs):
+        response = MagicMock()
+        response.json = {"console": 2048, "udp_port": 20000, "udp_ports": list(range(20000, 20000 + 10))}
+        if path.endswith("/nodes") and data["name"] == "PC3":
+            raise aiohttp.web.HTTPConflict(text="Can't create PC3")
+        return response
+
+    compute.post = AsyncioMagicMock(side_effect=post)
+    with patch("gns3server.controller.project.load_topology", return_value=_lab_topology(10)):
+        with asyncio_patch("gns3server.controller.udp_link.UDPLink.create"):
+            with pytest.raises(aiohttp.web.HTTPConflict):
+                await project.open()
+    assert project.status == "closed"
+    compute.post.assert_any_call("/projects/{}/close".format(project.id))
+
+
+async def test_open_rollback_pending_dump(controller, compute):
+
+    project = Project(controller=controller, name="Test")
+    await project.close()
+    topology = _lab_topology(4)
+    for link_data in topology["topology"]["links"]:
+        link_data["link_style"] = {"color": "#ff0000"}
+    with open(project._topology_file(), "w+") as f:
+        json.dump(topology, f)
+    with open(project._topology_file()) as f:
+        content = f.read()
+
+    response = MagicMock()
+    response.json = {"console": 2048, "udp_port": 20000, "udp_ports": list(range(20000, 20000 + 4))}
+    compute.post = AsyncioMagicMock(return_value=response)
+    with patch("gns3server.controller.project.load_topology", return_value=topology):
+        with asyncio_patch("gns3server.controller.udp_link.UDPLink.create", side_effect=aiohttp.web.HTTPConflict(text="Can't create the link")):
+            with pytest.raises(aiohttp.web.HTTPConflict):
+                await project.open()
+    assert project.status == "closed"
+
+    # the topology changed while loading is not written over the backup
+    await asyncio.sleep(1.5)
+    with open(project._topology_file()) as f:
+        assert f.read() == content
+
+
 def test_is_running(project, node):
     """
     If a node is started or paused return True
@@ -721,6 +989,45 @@ async def test_duplicate(project, controller):
     assert list(new_project.nodes.values())[1].compute.id == "remote"
 
 
+async def test_duplicate_files(project, controller):
+
+    local = MagicMock()
+    local.id = "local"
+    remote = MagicMock()
+    remote.id = "remote"
+    controller._computes["local"] = local
+    controller._computes["remote"] = remote
+    response = MagicMock()
+    response.json = {"console": 2048}
+    local.post = AsyncioMagicMock(return_value=response)
+    remote.post = AsyncioMagicMock(return_value=response)
+
+    local_node = await project.add_node(local, "PC1", None, node_type="vpcs", properties={"mac_address": "00:50:79:68:68:00"})
+    remote_node = await project.add_node(remote, "PC2", None, node_type="vpcs")
+    node_dir = os.path.join(project.path, "project-files", "vpcs", local_node.id)
+    os.makedirs(node_dir)
+    with open(os.path.join(node_dir, "startup.vpc"), "w+") as f:
+        f.write("ip dhcp")
+    os.makedirs(os.path.join(project.path, "snapshots"))
+    open(os.path.join(project.path, "snapshots", "snap_260716_103713.gns3snapshot"), "w+").close()
+
+    new_project = await project.duplicate(name="Hello")
+    assert new_project.id != project.id
+    assert not os.path.exists(os.path.join(new_project.path, "snapshots"))
+
+    await new_project.open()
+    new_local_node = [n for n in new_project.nodes.values() if n.name == "PC1"][0]
+    assert new_local_node.id != local_node.id
+    assert new_local_node.properties.get("mac_address") is None
+    with open(os.path.join(new_project.path, "project-files", "vpcs", new_local_node.id, "startup.vpc")) as f:
+        assert f.read() == "ip dhcp"
+
+    # the remote compute copies the files of its nodes
+    new_remote_node = [n for n in new_project.nodes.values() if n.name == "PC2"][0]
+    remote.post.assert_any_call("/projects/{}/duplicate".format(project.id), data={"project_id": new_project.id,
+                                                                                    "node_ids": {remote_node.id: new_remote_node.id}})
+
+
 def test_snapshots(project):
     """
     List the snapshots
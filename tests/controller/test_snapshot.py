@@ -16,11 +16,20 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import os
+import json
+import uuid
+import time
+import asyncio
+import zipfile
 import pytest
 from unittest.mock import patch, MagicMock
 
 from gns3server.controller.project import Project
+from gns3server.controller import snapshot_store
 from gns3server.controller.snapshot import Snapshot
+from gns3server.controller.export_project import export_project
+from gns3server.controller.import_project import import_project
+from gns3server.utils.asyncio import aiozipstream
 
 from tests.utils import AsyncioMagicMock
 
@@ -41,7 +50,7 @@ def test_snapshot_name(project):
     assert snapshot.name == "test1"
     assert snapshot._created_at > 0
     assert snapshot.path.startswith(os.path.join(project.path, "snapshots", "test1_"))
-    assert snapshot.path.endswith(".gns3project")
+    assert snapshot.path.endswith(".gns3snapshot")
 
     # Check if UTC conversion doesn't corrupt the path
     snap2 = Snapshot(project, filename=os.path.basename(snapshot.path))
@@ -104,3 +113,206 @@ async def test_restore(project, controller):
     project = controller.get_project(project.id)
     assert not os.path.exists(test_file)
     assert len(project.nodes) == 1
+
+
+def _objects(project):
+
+    objects = []
+    for root, dirs, files in os.walk(os.path.join(project.path, "snapshots", "store", "objects")):
+        objects.extend(files)
+    return objects
+
+
+async def test_snapshot_incremental(project):
+
+    disk = os.path.join(project.path, "project-files", "qemu", "node1", "hda_disk.qcow2")
+    os.makedirs(os.path.dirname(disk))
+    with open(disk, "wb") as f:
+        f.write(b"disk" * 1024)
+
+    await project.snapshot(name="snap1")
+    objects = _objects(project)
+    assert len(objects) == 2  # the topology and the disk
+
+    # nothing changed, the disk is not read again
+    with patch("gns3server.controller.snapshot_store.compute_md5", wraps=snapshot_store.compute_md5) as mock:
+        await project.snapshot(name="snap2")
+        assert disk not in [c[0][0] for c in mock.call_args_list]
+    assert _objects(project) == objects
+
+    with open(disk, "ab") as f:
+        f.write(b"changed")
+    await project.snapshot(name="snap3")
+    assert len(_objects(project)) == 3
+
+
+async def test_restore_changed_files(project, controller):
+
+    controller._notification = MagicMock()
+    files_path = os.path.join(project.path, "project-files", "vpcs", "node1")
+    os.makedirs(files_path)
+    for name in ("a.txt", "b.txt"):
+        with open(os.path.join(files_path, name), "w+") as f:
+            f.write(name)
+    snapshot = await project.snapshot(name="test")
+
+    inode = os.stat(os.path.join(files_path, "a.txt")).st_ino
+    with open(os.path.join(files_path, "b.txt"), "w+") as f:
+        f.write("modified")
+    with patch("gns3server.controller.snapshot_store.clone_file", wraps=snapshot_store.clone_file) as mock:
+        await snapshot.restore()
+        # only the modified file is restored
+        assert mock.call_count == 1
+
+    assert os.stat(os.path.join(files_path, "a.txt")).st_ino == inode
+    with open(os.path.join(files_path, "b.txt")) as f:
+        assert f.read() == "b.txt"
+
+
+async def test_delete_snapshot(project):
+
+    disk = os.path.join(project.path, "project-files", "qemu", "node1", "hda_disk.qcow2")
+    os.makedirs(os.path.dirname(disk))
+    with open(disk, "wb") as f:
+        f.write(b"disk1")
+    snap1 = await project.snapshot(name="snap1")
+    with open(disk, "wb") as f:
+        f.write(b"disk2")
+    snap2 = await project.snapshot(name="snap2")
+    assert len(_objects(project)) == 3
+
+    # the topology is shared by the 2 snapshots, the first disk is not used anymore
+    await project.delete_snapshot(snap1.id)
+    assert not os.path.exists(snap1.path)
+    assert len(_objects(project)) == 2
+
+    await project.delete_snapshot(snap2.id)
+    assert _objects(project) == []
+
+
+async def test_delete_snapshot_during_create(project):
+
+    disk = os.path.join(project.path, "project-files", "qemu", "node1", "hda_disk.qcow2")
+    os.makedirs(os.path.dirname(disk))
+    with open(disk, "wb") as f:
+        f.write(b"disk")
+    snap1 = await project.snapshot(name="snap1")
+
+    def store_local_files(store, project_path):
+        # give time to the deletion to collect the unused files
+        time.sleep(0.2)
+        return store_files(store, project_path)
+
+    # the files shared with the deleted snapshot are kept for the new one
+    store_files = Snapshot._store_local_files
+    with patch("gns3server.controller.snapshot.Snapshot._store_local_files", side_effect=store_local_files):
+        task = asyncio.ensure_future(project.snapshot(name="snap2"))
+        await asyncio.sleep(0.05)
+        await project.delete_snapshot(snap1.id)
+        snap2 = await task
+    with open(snap2.path) as f:
+        manifest = json.load(f)
+    for md5 in [manifest["topology"]] + list(manifest["files"].values()):
+        assert snap2.store.has(md5)
+
+
+async def test_restore_legacy_snapshot(project, controller):
+
+    controller._notification = MagicMock()
+    await project.add_drawing(svg="<svg></svg>")
+    snapshot = Snapshot(project, filename="test_260716_100439.gns3project")
+    os.makedirs(os.path.dirname(snapshot.path))
+    with aiozipstream.ZipFile(compression=zipfile.ZIP_STORED) as zstream:
+        await export_project(zstream, project, str(project.path), keep_compute_id=True, allow_all_nodes=True)
+        with open(snapshot.path, "wb") as f:
+            async for chunk in zstream:
+                f.write(chunk)
+
+    await project.add_drawing(svg="<svg></svg>")
+    assert len(project.drawings) == 2
+    with patch("gns3server.config.Config.get_section_config", return_value={"local": True}):
+        await snapshot.restore()
+    project = controller.get_project(project.id)
+    assert len(project.drawings) == 1
+
+
+
+async def test_snapshot_remote_files(project, compute):
+
+    project._project_created_on_compute.add(compute)
+    compute.list_files = AsyncioMagicMock(return_value=[{"path": "project-files/qemu/node1/hda_disk.qcow2",
+                                                         "md5sum": "bd2a6da7135b99b58586927440f15081"}])
+    response = MagicMock()
+    response.status = 200
+    chunks = [b"remote disk", b""]
+
+    async def read(size):
+        return chunks.pop(0)
+
+    response.content.read = read
+    compute.download_file = AsyncioMagicMock(return_value=response)
+
+    snapshot = await project.snapshot(name="snap1")
+    assert compute.download_file.call_count == 1
+    assert "bd2a6da7135b99b58586927440f15081" in _objects(project)
+
+    # the file is not downloaded again if its content is already stored
+    await project.snapshot(name="snap2")
+    assert compute.download_file.call_count == 1
+
+    compute.post = AsyncioMagicMock()
+    compute.delete = AsyncioMagicMock()
+    compute.http_query = AsyncioMagicMock()
+    with patch("gns3server.controller.project.Project.open"):
+        await snapshot.restore()
+    args, kwargs = compute.http_query.call_args
+    assert args[0] == "POST"
+    assert args[1] == "/projects/{}/files/project-files/qemu/node1/hda_disk.qcow2".format(project.id)
+
+
+async def test_restore_imported_snapshot(project, controller, tmpdir):
+    """
+    A snapshot exported with its project is restored with the
+    node IDs and the computes of the imported project.
+    """
+
+    compute = AsyncioMagicMock()
+    compute.id = "local"
+    controller._computes["local"] = compute
+    response = AsyncioMagicMock()
+    response.json = {"console": 2048}
+    compute.post = AsyncioMagicMock(return_value=response)
+    controller._notification = MagicMock()
+
+    node = await project.add_node(compute, "test1", None, node_type="vpcs", properties={"startup_config": "test.cfg"})
+    node_path = os.path.join(project.path, "project-files", "vpcs", node.id)
+    os.makedirs(node_path)
+    with open(os.path.join(node_path, "startup.vpc"), "w+") as f:
+        f.write("ip 192.168.1.1")
+    await project.snapshot(name="test")
+
+    zip_path = str(tmpdir / "project.gns3project")
+    with aiozipstream.ZipFile() as zstream:
+        await export_project(zstream, project, str(tmpdir), include_snapshots=True)
+        with open(zip_path, "wb") as f:
+            async for chunk in zstream:
+                f.write(chunk)
+
+    project_id = str(uuid.uuid4())
+    with open(zip_path, "rb") as f:
+        imported_project = await import_project(controller, project_id, f)
+    with open(imported_project._topology_file()) as f:
+        imported_node_id = json.load(f)["topology"]["nodes"][0]["node_id"]
+    assert imported_node_id != node.id
+    imported_node_path = os.path.join(imported_project.path, "project-files", "vpcs", imported_node_id)
+    assert os.path.exists(os.path.join(imported_node_path, "startup.vpc"))
+
+    snapshot = list(imported_project.snapshots.values())[0]
+    with patch("gns3server.config.Config.get_section_config", return_value={"local": True}):
+        await snapshot.restore()
+
+    imported_project = controller.get_project(project_id)
+    assert list(imported_project.nodes) == [imported_node_id]
+    with open(os.path.join(imported_node_path, "startup.vpc")) as f:
+        assert f.read() == "ip 192.168.1.1"
+    assert not os.path.exists(os.path.join(imported_project.path, "project-files", "vpcs", node.id))
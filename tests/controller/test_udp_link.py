@@ -71,23 +71,23 @@ async def test_create(project):
     compute2.host = "example.org"
     await link.add_node(node2, 3, 1)
 
-    compute1.post.assert_any_call("/projects/{}/vpcs/nodes/{}/adapters/0/ports/4/nio".format(project.id, node1.id), data={
+    compute1.add_udp_nio.assert_any_call(project.id, "vpcs", node1.id, 0, 4, {
         "lport": 1024,
         "rhost": "192.168.1.2",
         "rport": 2048,
         "type": "nio_udp",
         "filters": {"latency": [10]},
         "suspend": False,
-    }, timeout=120)
+    })
 
-    compute2.post.assert_any_call("/projects/{}/vpcs/nodes/{}/adapters/3/ports/1/nio".format(project.id, node2.id), data={
+    compute2.add_udp_nio.assert_any_call(project.id, "vpcs", node2.id, 3, 1, {
         "lport": 2048,
         "rhost": "192.168.1.1",
         "rport": 1024,
         "type": "nio_udp",
         "filters": {},
         "suspend": False,
-    }, timeout=120)
+    })
 
 
 async def test_create_one_side_failure(project):
@@ -128,33 +128,38 @@ async def test_create_one_side_failure(project):
             response = MagicMock()
             response.json = {"udp_port": 2048}
             return response
-        elif "/adapters" in path:
-            raise aiohttp.web.HTTPConflict(text="Error when creating the NIO")
+
+    async def compute2_nio_callback(*args, **kwargs):
+        """
+        Fake NIO creation
+        """
+        raise aiohttp.web.HTTPConflict(text="Error when creating the NIO")
 
     compute1.post.side_effect = compute1_callback
+    compute2.add_udp_nio.side_effect = compute2_nio_callback
     compute1.host = "example.com"
     compute2.post.side_effect = compute2_callback
     compute2.host = "example.org"
     with pytest.raises(aiohttp.web.HTTPConflict):
         await link.add_node(node2, 3, 1)
 
-    compute1.post.assert_any_call("/projects/{}/vpcs/nodes/{}/adapters/0/ports/4/nio".format(project.id, node1.id), data={
+    compute1.add_udp_nio.assert_any_call(project.id, "vpcs", node1.id, 0, 4, {
         "lport": 1024,
         "rhost": "192.168.1.2",
         "rport": 2048,
         "type": "nio_udp",
         "filters": {},
         "suspend": False,
-    }, timeout=120)
+    })
 
-    compute2.post.assert_any_call("/projects/{}/vpcs/nodes/{}/adapters/3/ports/1/nio".format(project.id, node2.id), data={
+    compute2.add_udp_nio.assert_any_call(project.id, "vpcs", node2.id, 3, 1, {
         "lport": 2048,
         "rhost": "192.168.1.1",
         "rport": 1024,
         "type": "nio_udp",
         "filters": {},
         "suspend": False,
-    }, timeout=120)
+    })
     # The link creation has failed we rollback the nio
     compute1.delete.assert_any_call("/projects/{}/vpcs/nodes/{}/adapters/0/ports/4/nio".format(project.id, node1.id), timeout=120)
 
@@ -332,23 +337,23 @@ async def test_update(project):
     compute2.host = "example.org"
     await link.add_node(node2, 3, 1)
 
-    compute1.post.assert_any_call("/projects/{}/vpcs/nodes/{}/adapters/0/ports/4/nio".format(project.id, node1.id), data={
+    compute1.add_udp_nio.assert_any_call(project.id, "vpcs", node1.id, 0, 4, {
         "lport": 1024,
         "rhost": "192.168.1.2",
         "rport": 2048,
         "type": "nio_udp",
         "suspend": False,
         "filters": {"latency": [10]}
-    }, timeout=120)
+    })
 
-    compute2.post.assert_any_call("/projects/{}/vpcs/nodes/{}/adapters/3/ports/1/nio".format(project.id, node2.id), data={
+    compute2.add_udp_nio.assert_any_call(project.id, "vpcs", node2.id, 3, 1, {
         "lport": 2048,
         "rhost": "192.168.1.1",
         "rport": 1024,
         "type": "nio_udp",
         "suspend": False,
         "filters": {}
-    }, timeout=120)
+    })
 
     assert link.created
     await link.update_filters({"drop": [5], "bpf": ["icmp[icmptype] == 8"]})
@@ -411,20 +416,20 @@ async def test_update_suspend(project):
     compute2.host = "example.org"
     await link.add_node(node2, 3, 1)
 
-    compute1.post.assert_any_call("/projects/{}/vpcs/nodes/{}/adapters/0/ports/4/nio".format(project.id, node1.id), data={
+    compute1.add_udp_nio.assert_any_call(project.id, "vpcs", node1.id, 0, 4, {
         "lport": 1024,
         "rhost": "192.168.1.2",
         "rport": 2048,
         "type": "nio_udp",
         "filters": {"frequency_drop": [-1]},
         "suspend": True
-    }, timeout=120)
+    })
 
-    compute2.post.assert_any_call("/projects/{}/vpcs/nodes/{}/adapters/3/ports/1/nio".format(project.id, node2.id), data={
+    compute2.add_udp_nio.assert_any_call(project.id, "vpcs", node2.id, 3, 1, {
         "lport": 2048,
         "rhost": "192.168.1.1",
         "rport": 1024,
         "type": "nio_udp",
         "filters": {},
         "suspend": True
-    }, timeout=120)
+    })
@@ -22,6 +22,8 @@ import stat
 from unittest.mock import patch
 
 from tests.utils import asyncio_patch
+from gns3server.utils.checksum import checksum_index
+from gns3server.compute.dynamips import Dynamips
 
 
 # @pytest.yield_fixture(scope="module")
@@ -163,6 +165,9 @@ def fake_file(tmpdir):
 async def test_images(compute_api, tmpdir, fake_image, fake_file):
 
     with patch("gns3server.utils.images.default_images_directory", return_value=str(tmpdir)):
+        # the checksums are computed in the background
+        await compute_api.get("/dynamips/images")
+        await Dynamips.instance().image_inventory.wait_hashing()
         response = await compute_api.get("/dynamips/images")
     assert response.status == 200
     assert response.json == [{"filename": "7200.bin",
@@ -180,9 +185,8 @@ async def test_upload_image(compute_api, images_dir):
     with open(os.path.join(images_dir, "IOS", "test2")) as f:
         assert f.read() == "TEST"
 
-    with open(os.path.join(images_dir, "IOS", "test2.md5sum")) as f:
-        checksum = f.read()
-        assert checksum == "033bd94b1168d7e4f0d644c3c95e35bf"
+    path = os.path.join(images_dir, "IOS", "test2")
+    assert checksum_index().get(os.path.abspath(path), os.stat(path)) == "033bd94b1168d7e4f0d644c3c95e35bf"
 
 
 @pytest.mark.skipif(not sys.platform.startswith("win") and os.getuid() == 0, reason="Root can delete any image")
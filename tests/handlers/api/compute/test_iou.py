@@ -24,6 +24,9 @@ import uuid
 from tests.utils import asyncio_patch
 from unittest.mock import patch
 
+from gns3server.utils.checksum import checksum_index
+from gns3server.compute.iou import IOU
+
 pytestmark = pytest.mark.skipif(sys.platform.startswith("win"), reason="Not supported on Windows")
 
 
@@ -324,6 +327,9 @@ async def test_iou_pcap(compute_api, vm, compute_project):
 
 async def test_images(compute_api, fake_iou_bin):
 
+    # the checksums are computed in the background
+    await compute_api.get("/iou/images")
+    await IOU.instance().image_inventory.wait_hashing()
     response = await compute_api.get("/iou/images")
     assert response.status == 200
     assert response.json == [{"filename": "iou.bin", "path": "iou.bin", "filesize": 7, "md5sum": "e573e8f5c93c6c00783f20c7a170aa6c"}]
@@ -338,9 +344,8 @@ async def test_image_vm(compute_api, tmpdir):
     with open(str(tmpdir / "test2")) as f:
         assert f.read() == "TEST"
 
-    with open(str(tmpdir / "test2.md5sum")) as f:
-        checksum = f.read()
-        assert checksum == "033bd94b1168d7e4f0d644c3c95e35bf"
+    path = str(tmpdir / "test2")
+    assert checksum_index().get(os.path.abspath(path), os.stat(path)) == "033bd94b1168d7e4f0d644c3c95e35bf"
 
 
 async def test_iou_duplicate(compute_api, vm):
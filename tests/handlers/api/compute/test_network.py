@@ -16,7 +16,12 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import os
+import uuid
 import pytest
+import asyncio
+
+from gns3server.web.route import Route
+from tests.utils import asyncio_patch
 
 
 async def test_udp_allocation(compute_api, compute_project):
@@ -26,6 +31,24 @@ async def test_udp_allocation(compute_api, compute_project):
     assert response.json['udp_port'] is not None
 
 
+async def test_udp_allocation_count(compute_api, compute_project):
+
+    response = await compute_api.post('/projects/{}/ports/udp'.format(compute_project.id), {"count": 3})
+    assert response.status == 201
+    assert len(set(response.json['udp_ports'])) == 3
+    assert response.json['udp_port'] == response.json['udp_ports'][0]
+
+
+async def test_udp_release(compute_api, compute_project):
+
+    response = await compute_api.post('/projects/{}/ports/udp'.format(compute_project.id), {"count": 2})
+    udp_ports = response.json['udp_ports']
+    assert set(udp_ports) <= compute_project._used_udp_ports
+    response = await compute_api.post('/projects/{}/ports/udp/release'.format(compute_project.id), {"udp_ports": udp_ports})
+    assert response.status == 204
+    assert not set(udp_ports) & compute_project._used_udp_ports
+
+
 # Netfifaces is not available on Travis
 @pytest.mark.skipif(os.environ.get("TRAVIS", False) is not False, reason="Not supported on Travis")
 async def test_interfaces(compute_api):
@@ -33,3 +56,60 @@ async def test_interfaces(compute_api):
     response = await compute_api.get('/network/interfaces')
     assert response.status == 200
     assert isinstance(response.json, list)
+
+
+async def test_create_udp_nios(compute_api, compute_project):
+
+    response = await compute_api.post("/projects/{}/vpcs/nodes".format(compute_project.id), {"name": "PC TEST 1"})
+    assert response.status == 201
+    node_id = response.json["node_id"]
+
+    nio = {
+        "type": "nio_udp",
+        "lport": 4242,
+        "rport": 4343,
+        "rhost": "127.0.0.1"
+    }
+    params = {"nios": [
+        {"node_type": "vpcs", "node_id": node_id, "adapter_number": 0, "port_number": 0, "nio": nio},
+        {"node_type": "vpcs", "node_id": str(uuid.uuid4()), "adapter_number": 0, "port_number": 0, "nio": nio},
+        {"node_type": "qemu", "node_id": node_id, "adapter_number": 0, "port_number": 0, "nio": nio}
+    ]}
+    with asyncio_patch("gns3server.compute.vpcs.vpcs_vm.VPCSVM.add_ubridge_udp_connection"):
+        response = await compute_api.post("/projects/{}/nios/udp".format(compute_project.id), params)
+    assert response.status == 201
+    assert response.json["nios"][0]["status"] == 201
+    assert response.json["nios"][0]["nio"]["lport"] == 4242
+    assert response.json["nios"][1]["status"] == 404
+    # the node is not a Qemu VM
+    assert response.json["nios"][2]["status"] == 404
+
+
+async def test_create_udp_nios_node_lock(compute_api, compute_project):
+
+    response = await compute_api.post("/projects/{}/vpcs/nodes".format(compute_project.id), {"name": "PC TEST 1"})
+    node_id = response.json["node_id"]
+    nio = {
+        "type": "nio_udp",
+        "lport": 4242,
+        "rport": 4343,
+        "rhost": "127.0.0.1"
+    }
+    params = {"nios": [{"node_type": "vpcs", "node_id": node_id, "adapter_number": 0, "port_number": 0, "nio": nio}]}
+
+    # another request to the node is running
+    released = asyncio.Event()
+    lock_key = "compute:{}:{}".format(compute_project.id, node_id)
+    request = asyncio.ensure_future(Route.run_with_node_lock(lock_key, released.wait))
+    await asyncio.sleep(0)
+
+    with asyncio_patch("gns3server.compute.vpcs.vpcs_vm.VPCSVM.port_add_nio_binding") as mock:
+        create = asyncio.ensure_future(compute_api.post("/projects/{}/nios/udp".format(compute_project.id), params))
+        await asyncio.sleep(0.1)
+        assert not mock.called
+        released.set()
+        response = await create
+        assert mock.called
+    await request
+    assert response.json["nios"][0]["status"] == 201
+    assert lock_key not in Route._node_locks
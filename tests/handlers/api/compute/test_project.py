@@ -166,6 +166,24 @@ async def test_get_file(compute_api, tmpdir):
     assert response.status == 404
 
 
+async def test_get_file_range(compute_api, tmpdir):
+
+    with patch("gns3server.config.Config.get_section_config", return_value={"projects_path": str(tmpdir)}):
+        project = ProjectManager.instance().create_project(project_id="01010203-0405-0607-0809-0a0b0c0d0e0b")
+
+    with open(os.path.join(project.path, "hello"), "w+") as f:
+        f.write("world")
+
+    response = await compute_api.get("/projects/{project_id}/files/hello".format(project_id=project.id), headers={"Range": "bytes=2-"}, raw=True)
+    assert response.status == 206
+    assert response.body == b"rld"
+    assert response.headers["Content-Range"] == "bytes 2-4/5"
+
+    response = await compute_api.get("/projects/{project_id}/files/hello".format(project_id=project.id), headers={"Range": "bytes=0-1"}, raw=True)
+    assert response.status == 200
+    assert response.body == b"world"
+
+
 async def test_write_file(compute_api, tmpdir):
 
     with patch("gns3server.config.Config.get_section_config", return_value={"projects_path": str(tmpdir)}):
@@ -198,3 +216,35 @@ async def test_stream_file(compute_api, tmpdir):
 
     response = await compute_api.get("/projects/{project_id}/files/../hello".format(project_id=project.id), raw=True)
     assert response.status == 404
+
+
+async def test_duplicate_files(compute_api, tmpdir):
+
+    with patch("gns3server.config.Config.get_section_config", return_value={"projects_path": str(tmpdir)}):
+        project = ProjectManager.instance().create_project(project_id="01010203-0405-0607-0809-0a0b0c0d0e0b")
+
+    with patch("gns3server.compute.project.get_default_project_directory", return_value=str(tmpdir)):
+        node_path = os.path.join(project.path, "project-files", "qemu", "2c1b5d3a-4f6e-4b7a-9c8d-0e1f2a3b4c5d")
+        os.makedirs(node_path)
+        with open(os.path.join(node_path, "hda_disk.qcow2"), "w+") as f:
+            f.write("disk")
+        os.makedirs(os.path.join(project.path, "project-files", "captures"))
+        open(os.path.join(project.path, "project-files", "captures", "capture.pcap"), "w+").close()
+
+        response = await compute_api.post("/projects/{project_id}/duplicate".format(project_id=project.id), {
+            "project_id": "01010203-0405-0607-0809-0a0b0c0d0e0c",
+            "node_ids": {"2c1b5d3a-4f6e-4b7a-9c8d-0e1f2a3b4c5d": "8a2d8f51-1b6c-4d5e-8f7a-9b0c1d2e3f40"}
+        })
+        assert response.status == 204
+
+        new_path = os.path.join(str(tmpdir), "01010203-0405-0607-0809-0a0b0c0d0e0c")
+        with open(os.path.join(new_path, "project-files", "qemu", "8a2d8f51-1b6c-4d5e-8f7a-9b0c1d2e3f40", "hda_disk.qcow2")) as f:
+            assert f.read() == "disk"
+        assert not os.path.exists(os.path.join(new_path, "project-files", "captures"))
+
+        # the destination must not exist
+        response = await compute_api.post("/projects/{project_id}/duplicate".format(project_id=project.id), {
+            "project_id": "01010203-0405-0607-0809-0a0b0c0d0e0c",
+            "node_ids": {}
+        })
+        assert response.status == 409
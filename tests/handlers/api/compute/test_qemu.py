@@ -23,6 +23,9 @@ import stat
 from tests.utils import asyncio_patch
 from unittest.mock import patch
 
+from gns3server.utils.checksum import checksum_index
+from gns3server.compute.qemu import Qemu
+
 
 @pytest.fixture
 def fake_qemu_bin(monkeypatch, tmpdir):
@@ -275,11 +278,30 @@ async def test_qemu_list_binaries_filter(compute_api, vm):
 
 async def test_images(compute_api, fake_qemu_vm):
 
+    # the checksums are computed in the background
+    await compute_api.get("/qemu/images")
+    await Qemu.instance().image_inventory.wait_hashing()
     response = await compute_api.get("/qemu/images")
     assert response.status == 200
     assert {"filename": "linux载.img", "path": "linux载.img", "md5sum": "c4ca4238a0b923820dcc509a6f75849b", "filesize": 1} in response.json
 
 
+async def test_images_filter(compute_api, fake_qemu_vm):
+
+    response = await compute_api.get("/qemu/images?filter=linux&offset=0&limit=10")
+    assert response.status == 200
+    assert [image["filename"] for image in response.json] == ["linux载.img"]
+    response = await compute_api.get("/qemu/images?filter=notfound")
+    assert response.status == 200
+    assert response.json == []
+    response = await compute_api.get("/qemu/images?limit=abc")
+    assert response.status == 400
+    # other parameters like a cache buster are ignored
+    response = await compute_api.get("/qemu/images?filter=linux&_=1234")
+    assert response.status == 200
+    assert [image["filename"] for image in response.json] == ["linux载.img"]
+
+
 @pytest.mark.skipif(sys.platform.startswith("win"), reason="Does not work on Windows")
 async def test_upload_image(compute_api, tmpdir):
 
@@ -290,9 +312,8 @@ async def test_upload_image(compute_api, tmpdir):
     with open(str(tmpdir / "test2使")) as f:
         assert f.read() == "TEST"
 
-    with open(str(tmpdir / "test2使.md5sum")) as f:
-        checksum = f.read()
-        assert checksum == "033bd94b1168d7e4f0d644c3c95e35bf"
+    path = str(tmpdir / "test2使")
+    assert checksum_index().get(os.path.abspath(path), os.stat(path)) == "033bd94b1168d7e4f0d644c3c95e35bf"
 
 
 async def test_upload_image_ova(compute_api, tmpdir):
@@ -304,9 +325,8 @@ async def test_upload_image_ova(compute_api, tmpdir):
     with open(str(tmpdir / "test2.ova" / "test2.vmdk")) as f:
         assert f.read() == "TEST"
 
-    with open(str(tmpdir / "test2.ova" / "test2.vmdk.md5sum")) as f:
-        checksum = f.read()
-        assert checksum == "033bd94b1168d7e4f0d644c3c95e35bf"
+    path = str(tmpdir / "test2.ova" / "test2.vmdk")
+    assert checksum_index().get(os.path.abspath(path), os.stat(path)) == "033bd94b1168d7e4f0d644c3c95e35bf"
 
 
 async def test_upload_image_forbiden_location(compute_api, tmpdir):
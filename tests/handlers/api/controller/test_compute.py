@@ -130,6 +130,7 @@ async def test_compute_list(controller_api):
                 'port': 84,
                 'protocol': 'http',
                 'user': 'julien',
+                'keep_alive': False,
                 'name': 'My super server',
                 'cpu_usage_percent': None,
                 'memory_usage_percent': None,
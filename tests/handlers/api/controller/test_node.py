@@ -52,6 +52,22 @@ async def test_create_node(controller_api, project, compute):
     assert "name" not in response.json["properties"]
 
 
+async def test_create_nodes_bulk(controller_api, project, compute):
+
+    response = MagicMock()
+    response.json = {"console": 2048}
+    compute.post = AsyncioMagicMock(return_value=response)
+
+    response = await controller_api.post("/projects/{}/nodes/bulk".format(project.id), {
+        "nodes": [{"name": "PC{}".format(i), "node_type": "vpcs", "compute_id": "example.com"} for i in range(3)]
+    })
+
+    assert response.status == 201
+    assert [node["name"] for node in response.json["nodes"]] == ["PC0", "PC1", "PC2"]
+    assert response.json["links"] == []
+    assert len(project.nodes) == 3
+
+
 async def test_list_node(controller_api, project, compute):
 
     response = MagicMock()
@@ -22,7 +22,7 @@ import zipfile
 import json
 
 from unittest.mock import patch, MagicMock
-from tests.utils import asyncio_patch
+from tests.utils import asyncio_patch, AsyncioMagicMock
 
 
 @pytest.fixture
@@ -215,6 +215,7 @@ async def test_notification_ws(controller_api, http_client, controller, project)
 async def test_export_with_images(controller_api, tmpdir, project):
 
     project.dump = MagicMock()
+    project.save = AsyncioMagicMock()
     os.makedirs(project.path, exist_ok=True)
     with open(os.path.join(project.path, 'a'), 'w+') as f:
         f.write('hello')
@@ -257,6 +258,7 @@ async def test_export_with_images(controller_api, tmpdir, project):
 async def test_export_without_images(controller_api, tmpdir, project):
 
     project.dump = MagicMock()
+    project.save = AsyncioMagicMock()
     os.makedirs(project.path, exist_ok=True)
     with open(os.path.join(project.path, 'a'), 'w+') as f:
         f.write('hello')
@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2020 GNS3 Technologies Inc.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import io
+import os
+import pytest
+import zipfile
+
+from gns3server.utils.asyncio import aiozipstream
+
+
+def _create_file(path, size):
+
+    # half compressible, half random data
+    with open(path, "wb") as f:
+        while size > 0:
+            f.write(b"interface FastEthernet0/0\n ip address 10.0.0.1 255.255.255.0\n" * 4096)
+            f.write(os.urandom(256 * 1024))
+            size -= 512 * 1024
+
+
+async def _zip(files, compression=zipfile.ZIP_DEFLATED, workers=1):
+
+    data = io.BytesIO()
+    with aiozipstream.ZipFile(compression=compression, workers=workers) as z:
+        for path, arcname in files:
+            z.write(path, arcname)
+        z.writestr("project.gns3", b"{}")
+        async for chunk in z:
+            data.write(chunk)
+    data.seek(0)
+    return data
+
+
+@pytest.mark.parametrize("workers", [1, 4])
+async def test_zip_deflated(tmpdir, workers):
+
+    path = str(tmpdir / "hda.img")
+    _create_file(path, 5 * 1024 * 1024)
+    data = await _zip([(path, "images/QEMU/hda.img")], workers=workers)
+
+    with zipfile.ZipFile(data) as myzip:
+        assert myzip.testzip() is None
+        info = myzip.getinfo("images/QEMU/hda.img")
+        assert info.compress_type == zipfile.ZIP_DEFLATED
+        assert info.compress_size < info.file_size
+        with open(path, "rb") as f:
+            assert myzip.read("images/QEMU/hda.img") == f.read()
+        assert myzip.read("project.gns3") == b"{}"
+
+
+async def test_zip_compression_by_file_type(tmpdir):
+
+    with open(str(tmpdir / "test.qcow2"), "wb") as f:
+        f.write(b"A" * 1024)
+    with open(str(tmpdir / "startup.cfg"), "wb") as f:
+        f.write(b"A" * 1024)
+    files = [(str(tmpdir / "test.qcow2"), "test.qcow2"), (str(tmpdir / "startup.cfg"), "startup.cfg")]
+
+    with zipfile.ZipFile(await _zip(files, workers=2)) as myzip:
+        assert myzip.getinfo("test.qcow2").compress_type == zipfile.ZIP_STORED
+        assert myzip.getinfo("startup.cfg").compress_type == zipfile.ZIP_DEFLATED
+        assert myzip.read("test.qcow2") == b"A" * 1024
+
+    # an archive without compression stores everything
+    with zipfile.ZipFile(await _zip(files, compression=zipfile.ZIP_STORED)) as myzip:
+        assert myzip.getinfo("startup.cfg").compress_type == zipfile.ZIP_STORED
@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2020 GNS3 Technologies Inc.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+import pytest
+from unittest.mock import patch
+
+from gns3server.utils.asyncio import file_tail
+from gns3server.utils.asyncio.file_tail import follow_file
+
+
+async def _follow(path, size):
+
+    data = b""
+    with follow_file(path) as reader:
+        while len(data) < size:
+            data += await reader.read(timeout=0.5)
+    return data
+
+
+async def _append(path):
+
+    with open(path, "ab") as f:
+        for i in range(5):
+            await asyncio.sleep(0.05)
+            f.write(b"B" * 1000)
+            f.flush()
+
+
+@pytest.mark.parametrize("inotify", [True, False])
+async def test_follow_file(tmpdir, inotify):
+
+    path = str(tmpdir / "test.pcap")
+    with open(path, "wb") as f:
+        f.write(b"A" * 100000)
+
+    # without inotify the file size is polled
+    with patch("gns3server.utils.asyncio.file_tail._libc_inotify", wraps=file_tail._libc_inotify if inotify else lambda: None):
+        results = await asyncio.wait_for(asyncio.gather(_follow(path, 105000), _follow(path, 105000), _append(path)), 10)
+
+    assert results[0] == b"A" * 100000 + b"B" * 5000
+    assert results[1] == results[0]
+    # the watcher is shared and removed with the last reader
+    assert file_tail._tails == {}
+
+
+async def test_follow_file_shared_read(tmpdir):
+
+    path = str(tmpdir / "test.pcap")
+    with open(path, "wb") as f:
+        f.write(b"A" * 1000)
+
+    with patch("gns3server.utils.asyncio.file_tail.FileTail._read_at", autospec=True, side_effect=lambda tail, offset: b"A" * (1000 - offset)) as mock:
+        with follow_file(path) as reader1, follow_file(path) as reader2:
+            assert await asyncio.gather(reader1.read(), reader2.read()) == [b"A" * 1000, b"A" * 1000]
+    assert mock.call_count == 1
+
+
+async def test_follow_file_idle(tmpdir):
+
+    path = str(tmpdir / "test.pcap")
+    open(path, "wb").close()
+    with follow_file(path) as reader:
+        for _ in range(3):
+            assert await reader.read(timeout=0.01) == b""
+        # the readers which have timed out don't wait for a change anymore
+        assert not file_tail._tails[path]._changed._waiters
+
+
+async def test_follow_file_not_found(tmpdir):
+
+    with pytest.raises(FileNotFoundError):
+        with follow_file(str(tmpdir / "test.pcap")):
+            pass
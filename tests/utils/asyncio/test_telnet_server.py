@@ -0,0 +1,179 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2020 GNS3 Technologies Inc.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+from unittest.mock import MagicMock
+
+from gns3server.utils.asyncio.telnet_server import AsyncioTelnetServer, TelnetClientBuffer, IAC, DO, WONT, TTYPE
+
+
+class SlowWriter:
+    """
+    Writer whose drain() blocks until it is released
+    """
+
+    def __init__(self):
+
+        self.data = b""
+        self.released = asyncio.Event()
+        self.close = MagicMock()
+
+    def write(self, data):
+
+        self.data += data
+
+    async def drain(self):
+
+        await self.released.wait()
+
+
+async def test_client_buffer():
+
+    writer = SlowWriter()
+    writer.released.set()
+    client_buffer = TelnetClientBuffer(writer, maxsize=100)
+    client_buffer.write(b"hello")
+    client_buffer.write(b" world")
+    await asyncio.sleep(0.01)
+    assert writer.data == b"hello world"
+    statistics = client_buffer.statistics()
+    assert statistics["bytes_sent"] == 11
+    assert statistics["bytes_dropped"] == 0
+    assert statistics["pending"] == 0
+    client_buffer.close()
+
+
+async def test_client_buffer_drop_oldest():
+
+    writer = SlowWriter()
+    client_buffer = TelnetClientBuffer(writer, maxsize=10, overflow_policy="drop")
+    client_buffer.write(b"a" * 4)
+    await asyncio.sleep(0.01)
+    # the first chunk is blocked in drain() the next ones are buffered
+    client_buffer.write(b"b" * 6)
+    client_buffer.write(b"c" * 6)
+    assert client_buffer.statistics()["bytes_dropped"] == 2
+    assert client_buffer.statistics()["pending"] == 10
+    writer.released.set()
+    await asyncio.sleep(0.01)
+    assert writer.data == b"a" * 4 + b"b" * 4 + b"c" * 6
+    assert client_buffer.statistics()["bytes_sent"] == 14
+    client_buffer.close()
+
+
+async def test_client_buffer_disconnect():
+
+    writer = SlowWriter()
+    client_buffer = TelnetClientBuffer(writer, maxsize=10, overflow_policy="disconnect")
+    client_buffer.write(b"a" * 4)
+    await asyncio.sleep(0.01)
+    client_buffer.write(b"b" * 11)
+    assert client_buffer.closed
+    assert writer.close.called
+    client_buffer.write(b"c")
+    assert client_buffer.statistics()["pending"] == 0
+
+
+async def _start_server(output, **kwargs):
+
+    server = AsyncioTelnetServer(reader=output, writer=MagicMock(), binary=True, echo=True, **kwargs)
+    tcp_server = await asyncio.start_server(server.run, "127.0.0.1", 0)
+    port = tcp_server.sockets[0].getsockname()[1]
+    return server, tcp_server, port
+
+
+async def _read_console(port):
+    """
+    Read the console output until the end marker
+
+    :returns: Tuple (number of bytes of output received, writer of the connection)
+    """
+
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    received = 0
+    end = b""
+    while end != b"END":
+        data = await reader.read(65536)
+        if not data:
+            break
+        received += data.count(b"x")
+        end = (end + data)[-3:]
+    return received, writer
+
+
+async def _write_output(output, size):
+
+    for i in range(size // 1024):
+        output.feed_data(b"x" * 1024)
+        await asyncio.sleep(0)
+    output.feed_data(b"END")
+
+
+async def test_slow_client_does_not_block_others():
+
+    output = asyncio.StreamReader()
+    server, tcp_server, port = await _start_server(output, buffer_size=1024)
+    slow_writer = SlowWriter()
+    size = 1024 * 1024
+    fast_client = asyncio.ensure_future(_read_console(port))
+    while len(server.statistics()) < 1:
+        await asyncio.sleep(0.01)
+    # a client that never gets its data
+    slow_buffer = TelnetClientBuffer(slow_writer, maxsize=1024)
+    server._buffers[slow_writer] = slow_buffer
+
+    await _write_output(output, size)
+    received, writer = await asyncio.wait_for(fast_client, timeout=10)
+    assert received == size
+    assert slow_buffer.statistics()["pending"] <= 1024
+    assert slow_buffer.statistics()["bytes_dropped"] > 0
+
+    slow_buffer.close()
+    del server._buffers[slow_writer]
+    writer.close()
+    tcp_server.close()
+    await tcp_server.wait_closed()
+
+
+async def test_iac_replies_are_queued_after_the_output():
+
+    server = AsyncioTelnetServer(reader=MagicMock(), writer=MagicMock(), binary=True, echo=True)
+    writer = SlowWriter()
+    client_buffer = TelnetClientBuffer(writer, maxsize=1024)
+    server._buffers[writer] = client_buffer
+    client_buffer.write(b"output")
+    data = await server._IAC_parser(bytearray([IAC, DO, TTYPE]) + b"input", MagicMock(), writer, MagicMock())
+    assert data == b"input"
+    assert writer.data == b""
+    writer.released.set()
+    await asyncio.sleep(0.01)
+    assert writer.data == b"output" + bytes([IAC, WONT, TTYPE])
+    client_buffer.close()
+
+
+async def test_client_buffer_write_eof():
+
+    writer = SlowWriter()
+    writer.write_eof = MagicMock()
+    writer.released.set()
+    client_buffer = TelnetClientBuffer(writer, maxsize=100)
+    client_buffer.write(b"hello")
+    await client_buffer.write_eof()
+    assert writer.data == b"hello"
+    assert writer.write_eof.called
+    client_buffer.write(b"world")
+    assert writer.data == b"hello"
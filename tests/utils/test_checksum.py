@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2022 GNS3 Technologies Inc.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import asyncio
+import hashlib
+
+from unittest.mock import patch
+
+from gns3server.utils.checksum import ChecksumIndex, compute_md5, md5sum, md5sum_async, checksum_index, BLOCK_SIZE
+
+
+def _legacy_md5(path):
+    """
+    The checksum function used before the checksum engine.
+    """
+
+    m = hashlib.md5()
+    with open(path, 'rb') as f:
+        while True:
+            buf = f.read(128)
+            if not buf:
+                break
+            m.update(buf)
+    return m.hexdigest()
+
+
+def _create_sparse_file(path, size, data=b"GNS3"):
+
+    with open(path, "wb") as f:
+        f.write(data)
+        f.seek(size // 2)
+        f.write(data)
+        f.truncate(size)
+
+
+def test_compute_md5(tmpdir):
+
+    path = str(tmpdir / "hello")
+    with open(path, "wb") as f:
+        f.write(os.urandom(BLOCK_SIZE * 2 + 42))
+    assert compute_md5(path) == _legacy_md5(path)
+
+
+def test_compute_md5_sparse_file(tmpdir):
+
+    path = str(tmpdir / "sparse")
+    _create_sparse_file(path, BLOCK_SIZE * 10 + 7)
+    assert compute_md5(path) == _legacy_md5(path)
+
+
+def test_compute_md5_empty_file(tmpdir):
+
+    path = str(tmpdir / "empty")
+    open(path, "wb").close()
+    assert compute_md5(path) == "d41d8cd98f00b204e9800998ecf8427e"
+
+
+def test_checksum_index(tmpdir):
+
+    path = str(tmpdir / "hello")
+    with open(path, "w+") as f:
+        f.write("hello")
+    st = os.stat(path)
+
+    index = ChecksumIndex(str(tmpdir / ".md5sums"))
+    assert index.get(path, st) is None
+    index.set(path, st, "5d41402abc4b2a76b9719d911017c592")
+    assert index.get(path, st) == "5d41402abc4b2a76b9719d911017c592"
+
+    # the index is persistent
+    index = ChecksumIndex(str(tmpdir / ".md5sums"))
+    assert index.get(path, st) == "5d41402abc4b2a76b9719d911017c592"
+
+    index.remove(path)
+    index = ChecksumIndex(str(tmpdir / ".md5sums"))
+    assert index.get(path, st) is None
+
+
+def test_md5sum_file_changed(tmpdir):
+
+    path = str(tmpdir / "hello")
+    with open(path, "w+") as f:
+        f.write("hello")
+    assert md5sum(path) == "5d41402abc4b2a76b9719d911017c592"
+
+    mtime_ns = os.stat(path).st_mtime_ns
+    with open(path, "w+") as f:
+        f.write("world")
+    # make sure the modification time changes even on filesystems with a low resolution
+    os.utime(path, ns=(mtime_ns + 10 ** 9, mtime_ns + 10 ** 9))
+    assert md5sum(path) == "7d793037a0760186574b0282f2f435e7"
+
+
+def test_md5sum_uses_index(tmpdir):
+
+    path = str(tmpdir / "hello")
+    with open(path, "w+") as f:
+        f.write("hello")
+    assert md5sum(path) == "5d41402abc4b2a76b9719d911017c592"
+    with patch("gns3server.utils.checksum.compute_md5") as mock:
+        assert md5sum(path) == "5d41402abc4b2a76b9719d911017c592"
+        assert not mock.called
+    assert os.path.exists(checksum_index().path)
+
+
+def test_md5sum_other_index(tmpdir):
+
+    path = str(tmpdir / "hello")
+    with open(path, "w+") as f:
+        f.write("hello")
+    index = checksum_index(str(tmpdir))
+    assert md5sum(path, index=index) == "5d41402abc4b2a76b9719d911017c592"
+    assert index.get(path, os.stat(path)) == "5d41402abc4b2a76b9719d911017c592"
+    assert checksum_index().get(path, os.stat(path)) is None
+
+
+async def test_md5sum_async(tmpdir):
+
+    path = str(tmpdir / "hello")
+    with open(path, "w+") as f:
+        f.write("hello")
+    results = await asyncio.gather(md5sum_async(path), md5sum_async(path))
+    assert results == ["5d41402abc4b2a76b9719d911017c592"] * 2
+    assert await md5sum_async(None) is None
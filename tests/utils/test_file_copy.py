@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2022 GNS3 Technologies Inc.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+
+from gns3server.utils.file_copy import clone_file, copy_project_files
+
+
+def test_clone_file(tmpdir):
+
+    source = str(tmpdir / "source")
+    with open(source, "wb") as f:
+        f.write(os.urandom(1024 * 1024 + 42))
+    clone_file(source, str(tmpdir / "destination"))
+    with open(source, "rb") as f1, open(str(tmpdir / "destination"), "rb") as f2:
+        assert f1.read() == f2.read()
+
+
+async def test_copy_project_files(tmpdir):
+
+    source = tmpdir / "source"
+    node_dir = source / "project-files" / "vpcs" / "old_id"
+    os.makedirs(str(node_dir))
+    (node_dir / "startup.vpc").write("ip dhcp")
+    (source / "README.txt").write("hello")
+    (source / "debug.log").write("log")
+
+    copied = await copy_project_files(str(source), str(tmpdir / "destination"), {"old_id": "new_id"}, ignore=lambda path: path.endswith(".log"))
+    assert copied == 2
+    assert (tmpdir / "destination" / "project-files" / "vpcs" / "new_id" / "startup.vpc").read() == "ip dhcp"
+    assert (tmpdir / "destination" / "README.txt").read() == "hello"
+    assert not os.path.exists(str(tmpdir / "destination" / "debug.log"))
@@ -22,7 +22,8 @@ from unittest.mock import patch
 
 
 from gns3server.utils import force_unix_path
-from gns3server.utils.images import md5sum, remove_checksum, images_directories, list_images
+from gns3server.utils.images import md5sum, images_directories, list_images, find_image_file
+from gns3server.utils.checksum import checksum_index, remove_checksum
 
 
 def test_images_directories(tmpdir):
@@ -56,8 +57,8 @@ def test_md5sum(tmpdir):
         f.write('hello')
 
     assert md5sum(fake_img) == '5d41402abc4b2a76b9719d911017c592'
-    with open(str(tmpdir / 'hello载.md5sum')) as f:
-        assert f.read() == '5d41402abc4b2a76b9719d911017c592'
+    assert checksum_index().get(fake_img, os.stat(fake_img)) == '5d41402abc4b2a76b9719d911017c592'
+    assert not os.path.exists(str(tmpdir / 'hello载.md5sum'))
 
 
 def test_md5sum_stopped_event(tmpdir):
@@ -70,7 +71,7 @@ def test_md5sum_stopped_event(tmpdir):
     event.set()
 
     assert md5sum(fake_img, stopped_event=event) is None
-    assert not os.path.exists(str(tmpdir / 'hello_stopped.md5sum'))
+    assert checksum_index().get(fake_img, os.stat(fake_img)) is None
 
 
 def test_md5sum_existing_digest(tmpdir):
@@ -103,11 +104,16 @@ def test_md5sum_none(tmpdir):
 
 def test_remove_checksum(tmpdir):
 
+    fake_img = str(tmpdir / 'hello')
+    with open(fake_img, 'w+') as f:
+        f.write('hello')
     with open(str(tmpdir / 'hello.md5sum'), 'w+') as f:
         f.write('aaaaa02abc4b2a76b9719d911017c592')
-    remove_checksum(str(tmpdir / 'hello'))
+    md5sum(fake_img)
+    remove_checksum(fake_img)
 
     assert not os.path.exists(str(tmpdir / 'hello.md5sum'))
+    assert checksum_index().get(fake_img, os.stat(fake_img)) is None
 
     remove_checksum(str(tmpdir / 'not_exists'))
 
@@ -177,3 +183,41 @@ def test_list_images(tmpdir):
                 'path': 'test4.qcow2'
             }
         ]
+
+
+def test_images_directories_cache(tmpdir):
+
+    with patch("gns3server.config.Config.get_section_config", return_value={"images_path": str(tmpdir / "images")}):
+        res = images_directories("qemu")
+        with patch("os.makedirs") as mock:
+            assert images_directories("qemu") == res
+            assert not mock.called
+        # callers can modify the list
+        images_directories("qemu").append("/tmp")
+        assert images_directories("qemu") == res
+
+
+def test_find_image_file(tmpdir):
+
+    path1 = tmpdir / "images" / "demo" / "test.ova" / "test1.bin"
+    path1.write("1", ensure=True)
+    path2 = tmpdir / "images" / "test2.bin"
+    path2.write("1", ensure=True)
+
+    directory = str(tmpdir / "images")
+    assert find_image_file(directory, "test1.bin") == str(path1)
+    assert find_image_file(directory, "demo/test.ova/test1.bin") == str(path1)
+    assert find_image_file(directory, "test.ova/test1.bin") is None
+    assert find_image_file(directory, "test2.bin") == str(path2)
+
+    # files are found without walking the directories again
+    with patch("os.walk") as mock:
+        assert find_image_file(directory, "test2.bin") == str(path2)
+        assert not mock.called
+
+    # new and removed files are detected
+    path3 = tmpdir / "images" / "demo" / "test3.bin"
+    path3.write("1", ensure=True)
+    assert find_image_file(directory, "test3.bin") == str(path3)
+    os.remove(str(path2))
+    assert find_image_file(directory, "test2.bin") is None
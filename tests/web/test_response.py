@@ -18,7 +18,7 @@
 import pytest
 
 from tests.utils import AsyncioMagicMock
-from aiohttp.web import HTTPNotFound
+from aiohttp.web import HTTPNotFound, HTTPBadRequest
 
 from gns3server.web.response import Response
 
@@ -44,3 +44,26 @@ async def test_response_file_not_found(loop, tmpdir, response):
     filename = str(tmpdir / 'hello-not-found')
     with pytest.raises(HTTPNotFound):
         await response.stream_file(filename)
+
+
+def test_response_json_output_schema():
+
+    schema = {"type": "object", "properties": {"name": {"type": "string"}}}
+    response = Response(request=AsyncioMagicMock(), output_schema=schema)
+    response.json({"name": "test"})
+    assert response.body == b'{\n    "name": "test"\n}'
+
+    with pytest.raises(HTTPBadRequest):
+        response.json({"name": 42})
+
+
+def test_response_connection_close():
+
+    request = AsyncioMagicMock()
+    request.headers = {}
+    response = Response(request=request)
+    assert response.headers["Connection"] == "close"
+
+    request.headers = {"X-GNS3-Keep-Alive": "true"}
+    response = Response(request=request)
+    assert "Connection" not in response.headers
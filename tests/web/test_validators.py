@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2022 GNS3 Technologies Inc.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import pytest
+import jsonschema
+
+from gns3server.web import validators
+from gns3server.schemas.qemu import QEMU_UPDATE_SCHEMA
+
+
+def test_compile_schema_cached():
+
+    validator = validators.compile_schema(QEMU_UPDATE_SCHEMA)
+    assert validators.compile_schema(QEMU_UPDATE_SCHEMA) is validator
+
+
+def test_compile_invalid_schema():
+
+    with pytest.raises(jsonschema.SchemaError):
+        validators.compile_schema({"type": 42})
+
+
+def test_validate():
+
+    validators.validate({"name": "test", "ram": 256}, QEMU_UPDATE_SCHEMA)
+    with pytest.raises(jsonschema.ValidationError):
+        validators.validate({"ram": "a lot"}, QEMU_UPDATE_SCHEMA)
+
+
+def test_validate_same_error_as_jsonschema():
+
+    with pytest.raises(jsonschema.ValidationError) as e:
+        jsonschema.validate({"ram": "a lot"}, QEMU_UPDATE_SCHEMA)
+    with pytest.raises(jsonschema.ValidationError) as e2:
+        validators.validate({"ram": "a lot"}, QEMU_UPDATE_SCHEMA)
+    assert e.value.message == e2.value.message